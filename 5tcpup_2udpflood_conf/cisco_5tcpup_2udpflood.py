@@ -4,10 +4,19 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.latency_probe import LatencyProbe
+from helpers.qdisc_presets import PRESETS, qdisc_preset
 import argparse
 
 # Create the parser
@@ -15,7 +24,9 @@ parser = argparse.ArgumentParser()
 
 # Add an argument
 parser.add_argument('--tcp', type=str, default="cubic", help="TCP algorithm to use")
-parser.add_argument('--qdisc', type=str, default="", help= "Queue discipline")
+parser.add_argument('--qdisc', type=str, default="", choices=[""] + sorted(PRESETS), help= "Queue discipline preset, see helpers/qdisc_presets.py")
+parser.add_argument('--probe_rate', type=int, default=0, help= "Also probe RTT with a UDP echo at this many Hz (100 to 1000), 0 to disable")
+example.add_arguments(parser)
 
 # Parse the argument
 args = parser.parse_args()
@@ -84,51 +95,10 @@ n7 = Network("192.168.7.0/24")  # network consisting `r2` and `h6`
 # Assign IPv4 addresses to all the interfaces in the network.
 AddressHelper.assign_addresses()
 
+# Parameters of the qdisc on the bottleneck are derived from its rate and
+# delay, see `helpers/qdisc_presets.py` and, for every qdisc, `man tc-<qdisc>`.
 if args.qdisc:
-
-	if args.qdisc == 'choke':
-		# Configure the parameters of `choke` qdisc.  For more details about `choke`
-		# in Linux, use this command on CLI: `man tc-choke`.
-		qdisc = "choke"
-		qdisc_parameters = {
-		    "limit": "100",  # set the queue capacity to 100 packets
-		    "min": "5",  # set the minimum threshold to 5 packets
-		    "max": "15",  # set the maximum threshold to 15 packets
-		}
-		
-	elif args.qdisc == 'pfifo':
-		# Configure the parameters of `pfifo` qdisc.  For more details about `pfifo`
-		# in Linux, use this command on CLI: `man tc-pfifo`.
-		qdisc = "pfifo"
-		qdisc_parameters = {"limit": "100"}  # set the queue capacity to 100 packets
-		
-	elif args.qdisc == "codel":
-		qdisc = "codel"
-		qdisc_parameters = {
-	    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-	    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-	    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-	    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-	    		"ecn": "",  # enables ecn marking for codel
-		}
-			
-	elif args.qdisc == "pie":
-		# Configure the parameters of `pie` qdisc.  For more details about `pie`
-		# in Linux, use this command on CLI: `man tc-pie`.
-		qdisc = "pie"
-		qdisc_parameters = {
-		    "limit": "100",  # set the queue capacity to 100 packets
-		    "target": "2ms",  # set the target queue delay to 2ms (default is 15ms)
-		}
-	elif args.qdisc == "red":
-		# Configure the parameters of `red` qdisc.  For more details about `red`
-		# in Linux, use this command on CLI: `man tc-red`.
-		qdisc = "red"
-		qdisc_parameters = {
-		    "limit": "150000",  # set the queue capacity to 150000 bytes
-		    "min": "7500",  # set the minimum threshold to 7500 bytes
-		    "max": "22500",  # set the maximum threshold to 22500 bytes
-		}
+	(qdisc, qdisc_parameters) = qdisc_preset(args.qdisc, "10mbit", "10ms")
 	etr1b.set_attributes("10mbit", "10ms", qdisc, **qdisc_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1b.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -185,5 +155,12 @@ exp.add_udp_flow(flow6, '6mbit')
 exp.add_udp_flow(flow7, '6mbit')
 
 
+# Optionally, a UDP echo probe from `h1` to every host runs alongside the
+# flows, and RTT histograms per second are saved as `latency.json`.
+probe = LatencyProbe(rate=args.probe_rate)
+if args.probe_rate:
+	probe.add_flows(exp.flows)
+
 # Run the experiment
-exp.run()
+example.run(exp, args, etr1b, "10mbit", "10ms", qdisc if args.qdisc else None,
+	tools=[probe] if args.probe_rate else [])
@@ -4,10 +4,19 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.latency_probe import LatencyProbe
+from helpers.qdisc_presets import PRESETS, qdisc_preset
 import argparse
 
 # Create the parser
@@ -15,7 +24,11 @@ parser = argparse.ArgumentParser()
 
 # Add an argument
 parser.add_argument('--tcp', type=str, default="cubic", help="TCP algorithm to use")
-parser.add_argument('--qdisc', type=str, default="", help= "Queue discipline")
+parser.add_argument('--qdisc', type=str, default="", choices=[""] + sorted(PRESETS), help= "Queue discipline preset, see helpers/qdisc_presets.py")
+parser.add_argument('--qdisc_params', type=str, default="", help= "Override qdisc parameters, as KEY=VALUE,KEY=VALUE")
+parser.add_argument('--duration', type=int, default=200, help= "Duration of the flows in seconds")
+parser.add_argument('--probe_rate', type=int, default=0, help= "Also probe RTT with a UDP echo at this many Hz (100 to 1000), 0 to disable")
+example.add_arguments(parser)
 
 # Parse the argument
 args = parser.parse_args()
@@ -43,7 +56,7 @@ args = parser.parse_args()
 #                                                                            #
 ##############################################################################
 
-# This program runs for 200 seconds and creates a new directory called
+# This program runs for 200 seconds (see `--duration`) and creates a new directory called
 # `choke-point-to-point(date-timestamp)_dump`. It contains a `README` that
 # provides details about the sub-directories and files within this directory.
 # See the plots in `netperf`, `ping` and `ss` sub-directories for this program.
@@ -84,51 +97,13 @@ n7 = Network("192.168.7.0/24")  # network consisting `r2` and `h6`
 # Assign IPv4 addresses to all the interfaces in the network.
 AddressHelper.assign_addresses()
 
+# Parameters of the qdisc on the bottleneck are derived from its rate and
+# delay, see `helpers/qdisc_presets.py` and, for every qdisc, `man tc-<qdisc>`.
 if args.qdisc:
-
-	if args.qdisc == 'choke':
-		# Configure the parameters of `choke` qdisc.  For more details about `choke`
-		# in Linux, use this command on CLI: `man tc-choke`.
-		qdisc = "choke"
-		qdisc_parameters = {
-		    "limit": "100",  # set the queue capacity to 100 packets
-		    "min": "5",  # set the minimum threshold to 5 packets
-		    "max": "15",  # set the maximum threshold to 15 packets
-		}
-		
-	elif args.qdisc == 'pfifo':
-		# Configure the parameters of `pfifo` qdisc.  For more details about `pfifo`
-		# in Linux, use this command on CLI: `man tc-pfifo`.
-		qdisc = "pfifo"
-		qdisc_parameters = {"limit": "100"}  # set the queue capacity to 100 packets
-		
-	elif args.qdisc == "codel":
-		qdisc = "codel"
-		qdisc_parameters = {
-	    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-	    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-	    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-	    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-	    		"ecn": "",  # enables ecn marking for codel
-		}
-			
-	elif args.qdisc == "pie":
-		# Configure the parameters of `pie` qdisc.  For more details about `pie`
-		# in Linux, use this command on CLI: `man tc-pie`.
-		qdisc = "pie"
-		qdisc_parameters = {
-		    "limit": "100",  # set the queue capacity to 100 packets
-		    "target": "2ms",  # set the target queue delay to 2ms (default is 15ms)
-		}
-	elif args.qdisc == "red":
-		# Configure the parameters of `red` qdisc.  For more details about `red`
-		# in Linux, use this command on CLI: `man tc-red`.
-		qdisc = "red"
-		qdisc_parameters = {
-		    "limit": "150000",  # set the queue capacity to 150000 bytes
-		    "min": "7500",  # set the minimum threshold to 7500 bytes
-		    "max": "22500",  # set the maximum threshold to 22500 bytes
-		}
+	# Parameters given on the command line, such as by `helpers.tune`, replace
+	# the derived ones
+	overrides = dict(item.split("=", 1) for item in filter(None, args.qdisc_params.split(",")))
+	(qdisc, qdisc_parameters) = qdisc_preset(args.qdisc, "10mbit", "10ms", overrides=overrides)
 	etr1b.set_attributes("10mbit", "10ms", qdisc, **qdisc_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1b.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -166,11 +141,11 @@ exp = Experiment("cisco-5tcpup-conf")
 # Configure two flows from `h1` to `h3` and two more flows from `h2` to `h4`.
 
 # 5 TCP upload flows
-flow1 = Flow(h1, h2, eth2.get_address(), 0, 200, 1)
-flow2 = Flow(h1, h3, eth3.get_address(), 0, 200, 1)
-flow3 = Flow(h1, h4, eth4.get_address(), 0, 200, 1)
-flow4 = Flow(h1, h5, eth5.get_address(), 0, 200, 1)
-flow5 = Flow(h1, h6, eth6.get_address(), 0, 200, 1)
+flow1 = Flow(h1, h2, eth2.get_address(), 0, args.duration, 1)
+flow2 = Flow(h1, h3, eth3.get_address(), 0, args.duration, 1)
+flow3 = Flow(h1, h4, eth4.get_address(), 0, args.duration, 1)
+flow4 = Flow(h1, h5, eth5.get_address(), 0, args.duration, 1)
+flow5 = Flow(h1, h6, eth6.get_address(), 0, args.duration, 1)
 
 exp.add_tcp_flow(flow1, args.tcp)
 exp.add_tcp_flow(flow2, args.tcp)
@@ -179,5 +154,12 @@ exp.add_tcp_flow(flow4, args.tcp)
 exp.add_tcp_flow(flow5, args.tcp)
 
 
+# Optionally, a UDP echo probe from `h1` to every host runs alongside the
+# flows, and RTT histograms per second are saved as `latency.json`.
+probe = LatencyProbe(rate=args.probe_rate)
+if args.probe_rate:
+	probe.add_flows(exp.flows)
+
 # Run the experiment
-exp.run()
+example.run(exp, args, etr1b, "10mbit", "10ms", qdisc if args.qdisc else None,
+	tools=[probe] if args.probe_rate else [])
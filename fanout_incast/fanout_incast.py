@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+########################
+# SHOULD BE RUN AS ROOT
+########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
+from nest.experiment import *
+from helpers.topology import FanOut
+import argparse
+
+# Create the parser
+parser = argparse.ArgumentParser()
+
+# Add an argument
+parser.add_argument('--tcp', type=str, default="cubic", help="TCP algorithm to use")
+parser.add_argument('--leaves', type=int, default=100, help="Number of leaf hosts")
+parser.add_argument('--pool', type=str, default="10.0.0.0/8", help="Address pool for the links")
+parser.add_argument('--prefix', type=int, default=30, choices=[30, 31], help="Prefix length of each link")
+parser.add_argument('--incast', action="store_true", help="Send from every leaf to h1 instead")
+parser.add_argument('--workers', type=int, default=16, help="Parallel workers used during setup")
+example.add_arguments(parser)
+
+# Parse the argument
+args = parser.parse_args()
+
+
+# This program emulates a fan-out (or, with `--incast`, a fan-in) topology
+# with a single host `h1` on one side of the bottleneck and `--leaves` hosts
+# on the other. One TCP flow is configured between `h1` and every leaf. Each
+# link gets its own /30 (or /31) subnet from `--pool`, so the number of leaves
+# is not limited by the 192.168.x.0/24 scheme of the other examples.
+
+##############################################################################
+#                              Network Topology                              #
+#                                                                            #
+#                                                     <- 1000mbit, 1ms ->    #
+#                                                   |-------------------- h2 #
+#                                                   |       tcp_algo         #
+#                             <- 10mbit, 10ms ->    |                        #
+# h1 -------------------- r1 -------------------- r2            .            #
+#      tcp_algo                                     |           .            #
+#                                                   |        N leaves        #
+#                                                   |           .            #
+#                                                   |           .            #
+#                                                   |   tcp_algo             #
+#                                                   |------------------ hN+1 #
+#                                                     <- 1000mbit, 1ms ->    #
+#                                                                            #
+##############################################################################
+
+# This program runs for 200 seconds and creates a new directory called
+# `fanout-incast(date-timestamp)_dump`. It contains a `README` that
+# provides details about the sub-directories and files within this directory.
+# See the plots in `netperf`, `ping` and `ss` sub-directories for this program.
+
+# Create `h1`, `r1`, `r2` and the leaves `h2` onwards, connect them and
+# assign addresses and default routes to all of them.
+fan = FanOut(args.leaves, args.pool, args.prefix, args.workers)
+
+# Set the link attributes of the bottleneck `r1` <--> `r2`
+fan.set_bottleneck("10mbit", "10ms")
+
+# Set the link attributes of every edge link, in both directions
+fan.set_edges("1000mbit", "1ms")
+
+# Set up an Experiment. This API takes the name of the experiment as a string.
+exp = Experiment("fanout-incast")
+
+# One TCP flow between `h1` and every leaf
+fan.add_flows(exp, args.tcp, 0, 200, incast=args.incast)
+
+# Run the experiment
+example.run(exp, args, fan.etr1b, "10mbit", "10ms")
@@ -0,0 +1,12 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Helpers shared by the example programs in this repository.
+
+The example programs live in their own directories and add the repository
+root to `sys.path` before importing from this package, for example:
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from helpers.topology import FanOut
+"""
@@ -0,0 +1,357 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Check that the bottleneck of a run is set up as intended and is used.
+
+A program that sets the attributes of the wrong interface, sets them twice
+or leaves a narrower link elsewhere on the path still runs for its full
+duration, and its results describe a different network than the one in
+its comments. `BottleneckCheck` reads back what the kernel has installed
+on the intended bottleneck once the topology is built: the rate of the
+HTB class and the delay of the netem qdisc that NeST sets up on every link,
+and the qdisc that NeST puts on the IFB of the interface. It compares them
+with the rate, delay and qdisc the program meant to set, and looks for
+links narrower than the bottleneck. While the experiment runs it samples
+the bytes sent by the bottleneck, for the utilization of the link while
+it is busy:
+
+    collectors.append(BottleneckCheck(etr1c, "10mbit", "10ms", qdisc))
+    run_with_collectors(exp, collectors)
+
+Mismatches are logged as soon as they are found, before the traffic
+starts, and with `strict=True` they abort the run. Everything ends up in
+`bottleneck.json`:
+
+    {"interface": "r1:etr1c",
+     "expected": {"rate", "delay", "qdisc"},
+     "installed": {"rate", "delay", "qdisc"},
+     "narrower": [{"interface", "rate"}],
+     "utilization": {"busy", "mean", "p10", "p50", "p90"},
+     "series": {"timestamp": [...], "tx_bytes": [...]},
+     "problems": [...]}
+
+Rates are in bit/s and delays in seconds. A run has a problem when the
+installed rate, delay or qdisc differ from the expected ones, when another
+link is narrower, when no traffic crosses the bottleneck, or when its
+utilization while busy is below `UNDERUSED` or above `OVERRUN`, which
+means that the traffic is shaped elsewhere.
+
+Usage (from the repository root), to list the runs with problems; the exit
+status is 1 if there are any:
+
+    python3 -m helpers.bottleneck results/
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from nest.topology_map import TopologyMap
+
+from .collector import BackgroundCollector, netns
+from .qdisc_presets import parse_rate, parse_time
+
+logger = logging.getLogger(__name__)
+
+# Mean utilization while busy below which the bottleneck is underused
+UNDERUSED = 0.7
+# Mean utilization while busy above which the link is not the bottleneck
+OVERRUN = 1.05
+# Utilization of an interval above which the link counts as busy
+BUSY = 0.05
+# Relative difference between expected and installed rate or delay
+TOLERANCE = 0.02
+
+
+class BottleneckError(RuntimeError):
+    """The bottleneck is not set up as intended"""
+
+
+def _tc(ns_id, *arguments):
+    """JSON output of `tc -j <arguments>` in namespace `ns_id`"""
+    output = subprocess.run(
+        ["tc", "-n", ns_id, "-j", *arguments],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stdout
+    return json.loads(output) if output.strip() else []
+
+
+def _htb_rate(ns_id, device):
+    """Rate in bit/s of the HTB class 1:1 of `device`, or None"""
+    for entry in _tc(ns_id, "class", "show", "dev", device):
+        if entry.get("class") == "htb" and entry.get("handle") == "1:1":
+            # iproute2 prints rates in bytes per second in JSON
+            return float(entry["rate"]) * 8
+    return None
+
+
+def _netem_delay(ns_id, device):
+    """Delay in seconds of the netem qdisc 11: of `device`, or None"""
+    for entry in _tc(ns_id, "qdisc", "show", "dev", device):
+        if entry.get("kind") != "netem" or entry.get("handle") != "11:":
+            continue
+        delay = entry.get("options", {}).get("delay", 0)
+        if isinstance(delay, dict):
+            delay = delay.get("delay", 0)
+        return float(delay)
+    return None
+
+
+def _leaf_qdisc(ns_id, device):
+    """Kind of the qdisc that NeST puts under the HTB of an IFB, or None"""
+    for entry in _tc(ns_id, "qdisc", "show", "dev", device):
+        if entry.get("handle") == "11:":
+            return entry.get("kind")
+    return None
+
+
+def _read_tx_bytes(device):
+    """Bytes sent by `device` of this namespace"""
+    with open("/proc/thread-self/net/dev", "r") as dev:
+        for line in dev.readlines()[2:]:
+            (name, values) = line.split(":", 1)
+            if name.strip() == device:
+                return int(values.split()[8])
+    raise OSError(f"No interface {device}")
+
+
+def _differs(expected, installed):
+    if expected is None:
+        return False
+    if installed is None:
+        return True
+    return abs(installed - expected) > TOLERANCE * max(abs(expected), 1e-9)
+
+
+def utilization(timestamps, tx_bytes, rate):
+    """
+    Utilization of a link from samples of the bytes it sent
+
+    Parameters
+    ----------
+    timestamps : list(float)
+        Times of the samples
+    tx_bytes : list(int)
+        Bytes sent, a counter
+    rate : float
+        Rate of the link in bit/s
+
+    Returns
+    -------
+    dict
+        Seconds busy, and the mean and percentiles of the utilization of
+        the intervals in which the link was busy
+    """
+    intervals = []
+    for index in range(1, len(timestamps)):
+        elapsed = timestamps[index] - timestamps[index - 1]
+        if elapsed <= 0:
+            continue
+        used = (tx_bytes[index] - tx_bytes[index - 1]) * 8 / elapsed / rate
+        intervals.append((elapsed, used))
+    busy = [(elapsed, used) for (elapsed, used) in intervals if used > BUSY]
+    if not busy:
+        return {"busy": 0.0, "mean": None, "p10": None, "p50": None, "p90": None}
+    seconds = sum(elapsed for (elapsed, _) in busy)
+    ordered = sorted(used for (_, used) in busy)
+    percentile = lambda p: round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+    return {
+        "busy": round(seconds, 3),
+        "mean": round(sum(elapsed * used for (elapsed, used) in busy) / seconds, 4),
+        "p10": percentile(0.1),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+    }
+
+
+class BottleneckCheck(BackgroundCollector):
+    """
+    Reads back the setup of the bottleneck and samples its utilization
+
+    Parameters
+    ----------
+    interface : Interface
+        The intended bottleneck
+    rate : str
+        Rate it is meant to have, such as '10mbit'
+    delay : str
+        Delay it is meant to have, such as '10ms' (Default value = None,
+        not checked)
+    qdisc : str
+        Kind of qdisc it is meant to have, as returned by `qdisc_preset`,
+        or None for none (Default value = None)
+    interval : float
+        Seconds between two samples of the bytes sent (Default value = 1.0)
+    strict : bool
+        Abort the run if the setup differs (Default value = False)
+    """
+
+    name = "bottleneck"
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, interface, rate, delay=None, qdisc=None, interval=1.0, strict=False):
+        super().__init__(interval)
+        self.interface = interface
+        self.expected = {
+            "rate": parse_rate(rate),
+            "delay": parse_time(delay) if delay is not None else None,
+            "qdisc": qdisc,
+        }
+        self.strict = strict
+        self.installed = {}
+        self.narrower = []
+        self.problems = []
+        self.series = {"timestamp": [], "tx_bytes": []}
+        self.key = None
+
+    def _names(self):
+        return {ns["id"]: ns["name"] for ns in TopologyMap.get_namespaces()}
+
+    def read_back(self):
+        """
+        Installed rate, delay and qdisc of the bottleneck, and the links
+        narrower than it
+
+        Returns
+        -------
+        list(str)
+            Differences from the expected setup
+        """
+        (ns_id, device) = (self.interface.node_id, self.interface.id)
+        try:
+            ifb = self.interface.ifb_id
+        except AttributeError:
+            # No qdisc on the link, so no IFB
+            ifb = None
+        self.installed = {
+            "rate": _htb_rate(ns_id, device),
+            "delay": _netem_delay(ns_id, device),
+            "qdisc": _leaf_qdisc(ns_id, ifb) if ifb else None,
+        }
+
+        problems = []
+        for quantity in ("rate", "delay"):
+            if _differs(self.expected[quantity], self.installed[quantity]):
+                problems.append(
+                    f"{self.key} has {quantity} {self.installed[quantity]}, "
+                    f"expected {self.expected[quantity]}"
+                )
+        if self.installed["qdisc"] != self.expected["qdisc"]:
+            problems.append(
+                f"{self.key} has qdisc {self.installed['qdisc'] or 'none'}, "
+                f"expected {self.expected['qdisc'] or 'none'}"
+            )
+
+        rate = self.installed["rate"] or self.expected["rate"]
+        names = self._names()
+        self.narrower = []
+        for namespace in TopologyMap.get_namespaces():
+            for entry in namespace["interfaces"]:
+                if entry["id"] == device:
+                    continue
+                other = _htb_rate(namespace["id"], entry["id"])
+                if other is not None and other < rate * (1 - TOLERANCE):
+                    key = f"{names[namespace['id']]}:{entry['name']}"
+                    self.narrower.append({"interface": key, "rate": other})
+                    problems.append(f"{key} ({other:.0f} bit/s) is narrower than {self.key}")
+        return problems
+
+    def setup(self):
+        names = self._names()
+        self.key = f"{names.get(self.interface.node_id, self.interface.node_id)}:{self.interface.name}"
+        self.problems = self.read_back()
+        for problem in self.problems:
+            logger.error("Bottleneck: %s", problem)
+        if self.problems and self.strict:
+            raise BottleneckError("; ".join(self.problems))
+
+    def sample(self):
+        with netns(self.interface.node_id):
+            sent = _read_tx_bytes(self.interface.id)
+        self.series["timestamp"].append(round(time.time(), 3))
+        self.series["tx_bytes"].append(sent)
+
+    def teardown(self):
+        # One last sample, so the end of the traffic is in the series
+        try:
+            self.sample()
+        except OSError:
+            pass
+
+    def results(self):
+        rate = self.installed.get("rate") or self.expected["rate"]
+        used = utilization(self.series["timestamp"], self.series["tx_bytes"], rate)
+        problems = list(self.problems)
+        if used["mean"] is None:
+            problems.append(f"no traffic crossed {self.key}")
+        elif used["mean"] < UNDERUSED:
+            problems.append(f"{self.key} is {used['mean']:.0%} utilized while busy")
+        elif used["mean"] > OVERRUN:
+            problems.append(
+                f"{self.key} sends {used['mean']:.0%} of its rate while busy, "
+                "the traffic is shaped elsewhere"
+            )
+        for problem in problems[len(self.problems):]:
+            logger.warning("Bottleneck: %s", problem)
+        return {
+            "interface": self.key,
+            "expected": self.expected,
+            "installed": self.installed,
+            "narrower": self.narrower,
+            "utilization": used,
+            "series": self.series,
+            "problems": problems,
+        }
+
+
+def find_checks(paths):
+    """`bottleneck.json` files among and below `paths`"""
+    found = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "bottleneck.json")):
+            found.append(os.path.join(path, "bottleneck.json"))
+            continue
+        for (root, directories, files) in os.walk(path):
+            if "bottleneck.json" in files:
+                found.append(os.path.join(root, "bottleneck.json"))
+                directories.clear()
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="Dump folders, or directories holding dumps")
+    parser.add_argument("--all", action="store_true", help="Also list the runs without problems")
+    args = parser.parse_args()
+
+    checks = find_checks(args.paths)
+    if not checks:
+        parser.error("No bottleneck.json found")
+    failed = 0
+    for path in checks:
+        with open(path, "r") as file:
+            check = json.load(file)
+        dump = os.path.dirname(path)
+        mean = check["utilization"]["mean"]
+        used = f"{mean:.0%}" if mean is not None else "-"
+        if check["problems"]:
+            failed += 1
+        elif not args.all:
+            continue
+        print(f"{used:>5}  {check['interface']:12} {dump}")
+        for problem in check["problems"]:
+            print(f"       {problem}")
+    print(f"{failed} of {len(checks)} runs with problems")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Score the latency under load of a run from its `ping.json` and `netperf.json`.
+
+RRUL style programs, such as `rrul_var_up.py` and `rrul_var_down.py`, ping
+across the bottleneck while it is loaded by TCP flows in both directions.
+The scorer takes the baseline RTT of every host pair from the median of
+the pings sent before the first TCP flow starts, timed from the launch of
+the flows by NeST. The example programs start the pings with the flows, so
+no ping is idle and the baseline is estimated: the path RTT of the
+topology when given with `--rtt`, or else the smallest RTT of the pair,
+which is an upper bound. RTT inflation is every ping during the load minus
+the baseline of its pair, and its percentiles say how much latency the
+queues add. Throughput is the mean rate of every TCP flow over
+the load, summed per direction.
+
+Runs get a latency grade from the 95th percentile of the inflation, with
+the thresholds of common bufferbloat tests:
+
+    A+ below 5 ms, A below 30 ms, B below 60 ms, C below 200 ms,
+    D below 400 ms, F above
+
+With `--capacity`, the rate of the bottleneck in Mbps, the direction with
+the lowest utilization also gets a grade, A at 90% and B, C, D at 80%, 60%
+and 40%, and the overall grade is the worse of the two. The score ranks
+runs by both at once: total throughput in Mbps divided by the 95th
+percentile of the loaded RTT in seconds, the power of the run.
+
+Usage (from the repository root):
+
+    python3 -m helpers.bufferbloat "rrul_var_up/rrul_var_up(...)_dump" --capacity 10 --rtt 24
+    python3 -m helpers.bufferbloat results/ --catalog catalog.jsonl --upload h1,h2
+
+Directories that are not dumps are searched for dumps. Scores are written
+to `bufferbloat.json` in every dump and, with `--catalog`, recorded in the
+run catalog (see `helpers.catalog`) to rank the runs of a sweep. Samples are
+parsed into numpy columns once per file and all statistics are computed on
+whole columns.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .catalog import Catalog
+from .flow_index import FlowIndex
+from .metrics import mean_rates, ping_baselines, read_columns
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 95, 99)
+# Upper bound of the 95th percentile of the inflation in ms, per grade
+LATENCY_GRADES = ((5, "A+"), (30, "A"), (60, "B"), (200, "C"), (400, "D"))
+# Lower bound of the utilization, per grade
+THROUGHPUT_GRADES = ((0.9, "A"), (0.8, "B"), (0.6, "C"), (0.4, "D"))
+GRADES = ("A+", "A", "B", "C", "D", "F")
+
+
+def _grade(value, grades, higher_is_better=False):
+    for (bound, grade) in grades:
+        if (value >= bound) if higher_is_better else (value < bound):
+            return grade
+    return "F"
+
+
+def _percentiles(values):
+    if not len(values):
+        return {f"p{p}": None for p in PERCENTILES}
+    return {
+        f"p{p}": round(float(v), 3) for (p, v) in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+# pylint: disable=too-many-arguments
+def score(dump, upload=None, capacity=None, warmup=0.0, index=None, rtt=None):
+    """
+    Latency under load and throughput of the run in `dump`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    upload : list(str)
+        Nodes whose flows are uploads, to sum throughput per direction
+        (Default value = None, per pair of nodes)
+    capacity : float
+        Rate of the bottleneck in Mbps, per direction (Default value = None)
+    warmup : float
+        Seconds after the first TCP sample that are left out of the load
+        (Default value = 0.0)
+    index : FlowIndex
+        Flows of the dump (Default value = None, the index of `dump`)
+    rtt : float
+        Path RTT of the topology in ms, the baseline of the pairs without
+        idle pings (Default value = None, the smallest RTT of the pair)
+
+    Returns
+    -------
+    dict
+        Content of `bufferbloat.json`
+    """
+    index = index or FlowIndex.load(dump, upload=upload)
+    (flows, flow_of, flow_times, rates) = read_columns(dump, "netperf", "sending_rate")
+    (pairs, pair_of, ping_times, rtts) = read_columns(dump, "ping", "rtt")
+    if not len(flow_times):
+        raise ValueError(f"No TCP samples in the netperf.json of {dump}")
+    if not len(ping_times):
+        raise ValueError(f"No RTT samples in the ping.json of {dump}")
+
+    load_start = flow_times.min()
+    load_end = flow_times.max()
+    origin = min(load_start, ping_times.min())
+
+    # Baseline of every pair: median of the idle pings, timed from the
+    # launch of the flows, as the first report of a flow comes a reporting
+    # interval or more after its start, or an estimate without any
+    (baselines, sources) = ping_baselines(pairs, pair_of, ping_times, rtts, flows, rtt)
+
+    loaded = (ping_times >= load_start + warmup) & (ping_times <= load_end)
+    inflation = rtts - baselines[pair_of]
+    loaded_rtt = np.percentile(rtts[loaded], 95) if loaded.any() else np.nan
+
+    pair_scores = {}
+    for (pair, (source, address, meta)) in enumerate(pairs):
+        destination = meta.get("destination_node") or address
+        mine = loaded & (pair_of == pair)
+        pair_scores[f"{source}-{destination}"] = dict(
+            baseline=round(float(baselines[pair]), 3),
+            baseline_source=sources[pair],
+            samples=int(mine.sum()),
+            **_percentiles(inflation[mine]),
+        )
+
+    # Time-weighted mean rate of every flow over the load, see
+    # `helpers.metrics.mean_rates`
+    means = mean_rates(flow_of, flow_times, rates, len(flows), load_start, load_end, warmup)
+    means = np.nan_to_num(means)
+
+    flow_rates = {}
+    directions = {}
+    for (number, (source, name, meta)) in enumerate(flows):
+        flow_id = index.lookup("netperf", source, name)
+        record = index.flows.get(flow_id, {})
+        direction = record.get("direction") or (
+            f"{source}-{meta.get('destination_node') or record.get('destination')}"
+        )
+        flow_rates[flow_id or f"{source}:{name}"] = round(float(means[number]), 3)
+        directions[direction] = directions.get(direction, 0.0) + float(means[number])
+    total = float(means.sum())
+
+    p95 = float(np.percentile(inflation[loaded], 95)) if loaded.any() else np.nan
+    grades = {"latency": _grade(p95, LATENCY_GRADES) if loaded.any() else None}
+    results = {
+        "window": [round(float(load_start - origin), 3), round(float(load_end - origin), 3)],
+        "warmup": warmup,
+        "baseline": round(float(np.nanmedian(baselines)), 3),
+        "inflation": dict(samples=int(loaded.sum()), **_percentiles(inflation[loaded])),
+        "pairs": pair_scores,
+        "throughput": {
+            "total": round(total, 3),
+            "directions": {d: round(r, 3) for (d, r) in sorted(directions.items())},
+            "flows": flow_rates,
+        },
+    }
+    if capacity:
+        utilization = min(directions.values()) / capacity
+        results["utilization"] = round(utilization, 4)
+        grades["throughput"] = _grade(utilization, THROUGHPUT_GRADES, higher_is_better=True)
+    graded = [g for g in grades.values() if g]
+    grades["overall"] = max(graded, key=GRADES.index) if graded else None
+    results["grade"] = grades
+    results["score"] = round(total / (loaded_rtt / 1000), 3) if loaded_rtt > 0 else None
+    return results
+
+
+# pylint: disable=too-many-arguments
+def score_dump(dump, catalog=None, upload=None, capacity=None, warmup=0.0, rtt=None):
+    """
+    Score the run in `dump` into `bufferbloat.json` and the run catalog
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    catalog : str
+        Run catalog to record the scores in (Default value = None)
+    upload, capacity, warmup, rtt
+        See `score`
+
+    Returns
+    -------
+    dict
+        The scores
+    """
+    index = FlowIndex.load(dump, upload=upload)
+    results = score(dump, upload, capacity, warmup, index, rtt)
+    with open(os.path.join(dump, "bufferbloat.json"), "w") as file:
+        json.dump(results, file, indent=4)
+    if catalog:
+        Catalog(catalog).record(dump, "bufferbloat", results, index)
+    return results
+
+
+def find_dumps(paths):
+    """Dump folders among `paths` and below the directories of `paths`"""
+    dumps = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, "ping.json")):
+            dumps.append(path)
+            continue
+        for (root, directories, files) in os.walk(path):
+            if "ping.json" in files and "netperf.json" in files:
+                dumps.append(root)
+                directories.clear()
+    return sorted(dumps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="Dump folders, or directories holding dumps")
+    parser.add_argument("--upload", type=str, default=None, help="Upload nodes, as h1,h2")
+    parser.add_argument("--capacity", type=float, default=None, help="Bottleneck rate in Mbps")
+    parser.add_argument("--warmup", type=float, default=0.0, help="Seconds of load left out")
+    parser.add_argument("--rtt", type=float, default=None, help="Path RTT in ms, the baseline without idle pings")
+    parser.add_argument("--catalog", type=str, default=None, help="Run catalog to record into")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    dumps = find_dumps(args.paths)
+    if not dumps:
+        parser.error("No dumps with ping.json and netperf.json found")
+    upload = args.upload.split(",") if args.upload else None
+    catalog = args.catalog
+
+    started = time.perf_counter()
+    for dump in dumps:
+        try:
+            results = score_dump(dump, catalog, upload, args.capacity, args.warmup, args.rtt)
+        except ValueError as error:
+            logger.warning("%s", error)
+            continue
+        logger.info(
+            "%s: grade %s, p95 inflation %s ms over %s ms, %.2f Mbps",
+            os.path.basename(os.path.normpath(dump)),
+            results["grade"]["overall"],
+            results["inflation"]["p95"],
+            results["baseline"],
+            results["throughput"]["total"],
+        )
+    logger.info("Scored %d runs in %.3f s", len(dumps), time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
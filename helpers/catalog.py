@@ -0,0 +1,265 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Catalog of runs, with the results of every analysis, for ranking sweeps.
+
+The catalog is one JSON Lines file. Every line records one section of the
+results of one dump, such as the `bufferbloat` scores, together with what
+identifies the run: experiment, start time, TCP algorithms and qdiscs of
+the bottleneck and whether the host saturated during the run. Lines are
+only ever appended, under a lock, so the workers of a sweep can record
+their runs into one catalog concurrently; a later line for the same dump
+and section replaces the earlier one when the catalog is read. `compact`
+rewrites the catalog with one line per run; run it while no run is being
+recorded.
+
+    catalog = Catalog("catalog.jsonl")
+    catalog.record(dump, "bufferbloat", scores)
+    for run in catalog.rank("bufferbloat.score", top=10):
+        ...
+
+Usage (from the repository root):
+
+    python3 -m helpers.catalog catalog.jsonl rank bufferbloat.score --top 20
+    python3 -m helpers.catalog catalog.jsonl rank bufferbloat.inflation.p95 --ascending \\
+        --where experiment=rrul_var_up --where algorithms=cubic
+    python3 -m helpers.catalog catalog.jsonl compact
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import time
+
+from .flow_index import FlowIndex
+
+CATALOG = "catalog.jsonl"
+# Name of a dump folder, as created by `Pack.init`
+DUMP_NAME = re.compile(r"^(?P<experiment>.*)\((?P<time>[0-9:-]+)\)_dump$")
+# Qdiscs that NeST sets up on every link
+LINK_QDISCS = ("htb", "netem", "ingress")
+
+
+def _qdiscs(dump):
+    """Leaf qdiscs of the interfaces in `qdisc_stats.json`"""
+    path = os.path.join(dump, "qdisc_stats.json")
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r") as file:
+        data = json.load(file)
+    kinds = {
+        qdisc["kind"]
+        for qdiscs in data.get("interfaces", {}).values()
+        for qdisc in qdiscs
+        if qdisc.get("kind") and qdisc["kind"] not in LINK_QDISCS
+    }
+    return sorted(kinds)
+
+
+def describe(dump, index=None):
+    """
+    What identifies the run of `dump`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    index : FlowIndex
+        Flows of the dump (Default value = None, the index of `dump`)
+
+    Returns
+    -------
+    dict
+        "dump", "experiment", "started", "algorithms", "qdiscs", "suspect"
+    """
+    dump = os.path.abspath(dump)
+    match = DUMP_NAME.match(os.path.basename(dump))
+    (experiment, started) = (os.path.basename(dump), None)
+    if match:
+        experiment = match.group("experiment")
+        try:
+            started = time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.strptime(match.group("time"), "%d-%m-%Y-%H:%M:%S")
+            )
+        except ValueError:
+            pass
+
+    index = index or FlowIndex.load(dump)
+    algorithms = sorted({f["algorithm"] for f in index.flows.values() if f["algorithm"]})
+
+    suspect = None
+    host = os.path.join(dump, "host.json")
+    if os.path.isfile(host):
+        with open(host, "r") as file:
+            suspect = json.load(file).get("suspect")
+
+    return {
+        "dump": dump,
+        "experiment": experiment,
+        "started": started,
+        "algorithms": algorithms,
+        "qdiscs": _qdiscs(dump),
+        "suspect": suspect,
+    }
+
+
+def field(run, path):
+    """Value at a dotted `path` of a run, such as 'bufferbloat.score'"""
+    value = run
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _matches(run, where):
+    for (path, expected) in where.items():
+        value = field(run, path)
+        if isinstance(value, list):
+            if expected not in [str(v) for v in value]:
+                return False
+        elif str(value) != expected:
+            return False
+    return True
+
+
+class Catalog:
+    """
+    Append-only catalog of runs in a JSON Lines file
+
+    Parameters
+    ----------
+    path : str
+        Catalog file, created on the first record (Default value = 'catalog.jsonl')
+    """
+
+    def __init__(self, path=CATALOG):
+        self.path = os.path.abspath(path)
+
+    def record(self, dump, section, results, index=None):
+        """
+        Add the `results` of an analysis of `dump` as `section`
+
+        Parameters
+        ----------
+        dump : str
+            Dump folder of an experiment
+        section : str
+            Name of the analysis, such as 'bufferbloat'
+        results : dict
+            Results of the analysis
+        index : FlowIndex
+            Flows of the dump (Default value = None, the index of `dump`)
+        """
+        line = dict(describe(dump, index), recorded=time.time())
+        line[section] = results
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(json.dumps(line, sort_keys=True) + "\n")
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def runs(self):
+        """
+        Every run of the catalog, with all its sections
+
+        Returns
+        -------
+        dict
+            Dump -> run
+        """
+        runs = {}
+        if not os.path.isfile(self.path):
+            return runs
+        with open(self.path, "r") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                runs.setdefault(entry["dump"], {}).update(entry)
+        return runs
+
+    def rank(self, path, ascending=False, where=None, top=None):
+        """
+        Runs ordered by the value at `path`
+
+        Parameters
+        ----------
+        path : str
+            Dotted path of the value, such as 'bufferbloat.score'
+        ascending : bool
+            Smallest value first (Default value = False)
+        where : dict
+            Dotted path -> value that runs must have; a list matches if it
+            contains the value (Default value = None)
+        top : int
+            Number of runs to return (Default value = None, all)
+
+        Returns
+        -------
+        list(dict)
+            Runs that have a value at `path`
+        """
+        runs = [
+            run
+            for run in self.runs().values()
+            if field(run, path) is not None and _matches(run, where or {})
+        ]
+        runs.sort(key=lambda run: field(run, path), reverse=not ascending)
+        return runs[:top] if top else runs
+
+    def compact(self):
+        """Rewrite the catalog with one line per run"""
+        with open(self.path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            runs = self.runs()
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as file:
+                for run in runs.values():
+                    file.write(json.dumps(run, sort_keys=True) + "\n")
+            os.replace(temp_path, self.path)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        return len(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("catalog", help="Catalog file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rank = commands.add_parser("rank", help="List runs ordered by a value")
+    rank.add_argument("path", help="Dotted path of the value, such as bufferbloat.score")
+    rank.add_argument("--ascending", action="store_true", help="Smallest value first")
+    rank.add_argument("--top", type=int, default=None, help="Number of runs to list")
+    rank.add_argument(
+        "--where", action="append", default=[], help="PATH=VALUE that runs must have"
+    )
+    commands.add_parser("compact", help="Rewrite the catalog with one line per run")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog)
+    if args.command == "compact":
+        print(f"{catalog.compact()} runs")
+        return
+
+    where = dict(condition.split("=", 1) for condition in args.where)
+    for run in catalog.rank(args.path, args.ascending, where, args.top):
+        details = ", ".join(run["algorithms"] + run["qdiscs"])
+        suspect = " (suspect)" if run.get("suspect") else ""
+        print(f"{field(run, args.path)!s:>12}  {run['experiment']:24} {details:24} {run['dump']}{suspect}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""Base class for helpers that run next to NeST while an experiment runs"""
+
+import ctypes
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from nest.experiment.pack import Pack
+
+from .profiler import span
+
+logger = logging.getLogger(__name__)
+
+CLONE_NEWNET = 0x40000000
+_libc = ctypes.CDLL(None, use_errno=True)
+# Called with the processes of the runners when NeST launches the flows
+_launch_callbacks = []
+
+
+def namespace_inode(ns_id):
+    """Inode of the network namespace `ns_id`, as created by `ip netns add`"""
+    return os.stat(os.path.join("/var/run/netns", ns_id)).st_ino
+
+
+def _setns(fd):
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+@contextmanager
+def netns(ns_id):
+    """
+    Enter the network namespace `ns_id` in the calling thread only.
+
+    Unlike `ip netns exec`, this does not start a process, so collectors can
+    read per-namespace files such as `/proc/thread-self/net/dev` or open
+    netlink sockets in every namespace on every sample.
+
+    Parameters
+    ----------
+    ns_id : str
+        Namespace id, as in `Node.id`
+    """
+    with open("/proc/thread-self/ns/net", "r") as own, open(
+        os.path.join("/var/run/netns", ns_id), "r"
+    ) as target:
+        _setns(target.fileno())
+        try:
+            yield
+        finally:
+            _setns(own.fileno())
+
+
+def add_launch_callback(callback):
+    """
+    Call `callback(workers)` when NeST launches the processes of the flows,
+    which is time 0 of their schedules, until it is removed
+
+    `workers` are the processes of the runners, about to start.
+    """
+    # pylint: disable=import-outside-toplevel
+    from nest.experiment import run_exp
+
+    setup_flow_workers = run_exp.setup_flow_workers
+    if not getattr(setup_flow_workers, "launch_hook", False):
+
+        def launching_setup_flow_workers(*args, **kwargs):
+            workers = setup_flow_workers(*args, **kwargs)
+            # The workers are started right after they are set up
+            for function in list(_launch_callbacks):
+                function(workers)
+            return workers
+
+        launching_setup_flow_workers.launch_hook = True
+        run_exp.setup_flow_workers = launching_setup_flow_workers
+    _launch_callbacks.append(callback)
+
+
+def remove_launch_callback(callback):
+    """Stop calling `callback` at the launch of the flows"""
+    if callback in _launch_callbacks:
+        _launch_callbacks.remove(callback)
+
+
+class BackgroundCollector:
+    """
+    Calls `sample()` every `interval` seconds in a thread.
+
+    Use it as a context manager around `exp.run()`. NeST creates the dump
+    folder when the experiment starts, so `results()` is written into the
+    dump as `<name>.json` once the experiment is over.
+
+        with HostMonitor() as monitor:
+            exp.run()
+
+    Subclasses set `name` and implement `sample()` and `results()`.
+    `launched` is the `time.monotonic()` at which NeST launched the flows,
+    which is time 0 of their schedules, and None before; setup of the
+    topology, dependency checks and runners can take many seconds between
+    entering the collector and the launch.
+    """
+
+    name = ""
+
+    def __init__(self, interval=1.0):
+        """
+        Parameters
+        ----------
+        interval : float
+            Seconds between two samples (Default value = 1.0)
+        """
+        self.interval = interval
+        self.launched = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def setup(self):
+        """Called once before the first sample"""
+
+    def launch(self, workers):
+        """
+        Called when NeST launches the flows, after `launched` is set, with
+        the processes of the runners, which are about to start
+        """
+
+    def sample(self):
+        """Take one sample"""
+        raise NotImplementedError
+
+    def teardown(self):
+        """Called once after the last sample"""
+
+    def results(self):
+        """Content of `<name>.json`"""
+        raise NotImplementedError
+
+    def after(self):
+        """
+        Functions to call with the dump folder once the results of NeST
+        are written, such as plots of `<name>.json`; picklable, as they
+        may run in a worker of `helpers.postprocess`
+        """
+        return []
+
+    def _launched(self, workers):
+        self.launched = time.monotonic()
+        self.launch(workers)
+
+    def _loop(self):
+        # Sample on a fixed grid so that slow samples do not add up to drift
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("%s: sample failed", self.name)
+            deadline += self.interval
+            self._stop.wait(max(0.0, deadline - time.monotonic()))
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self.launched = None
+        self.setup()
+        add_launch_callback(self._launched)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the thread to exit"""
+        remove_launch_callback(self._launched)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.teardown()
+
+    def write(self):
+        """Write `results()` into the dump folder of the experiment"""
+        if not Pack.FOLDER or not os.path.isdir(Pack.FOLDER):
+            logger.warning("%s: no dump folder to write %s.json to", self.name, self.name)
+            return
+        Pack.dump_file(f"{self.name}.json", json.dumps(self.results(), indent=4))
+
+    def __enter__(self):
+        with span(f"{self.name} start", "collector"):
+            self.start()
+        return self
+
+    def __exit__(self, *args):
+        with span(f"{self.name} stop", "collector"):
+            self.stop()
+        with span(f"{self.name} write", "collector"):
+            self.write()
+
+
+def run_with_collectors(exp, collectors, queue=None, after=()):
+    """
+    Run `exp` with every collector in `collectors` active
+
+    Parameters
+    ----------
+    exp : Experiment
+        Experiment to run
+    collectors : list(BackgroundCollector)
+        Collectors started before and stopped after the experiment
+    queue : str
+        Post-processing queue to hand the parsing and plotting of NeST to,
+        see `helpers.postprocess` (Default value = None, done in the run)
+    after : list(callable)
+        Functions called with the dump folder once the results are written,
+        after those of the collectors (Default value = ())
+    """
+    hooks = [hook for collector in collectors for hook in collector.after()] + list(after)
+    if queue:
+        # pylint: disable=import-outside-toplevel
+        from .postprocess import run_deferred
+
+        run_deferred(exp, queue, hooks, collectors)
+        return
+    with ExitStack() as stack:
+        for collector in collectors:
+            stack.enter_context(collector)
+        exp.run()
+    for hook in hooks:
+        hook(Pack.FOLDER)
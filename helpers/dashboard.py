@@ -0,0 +1,410 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Browse the time series of any dump in a local web dashboard.
+
+The dashboard serves one page that plots any column of any collector of a
+dump, for any set of flows, and zooms with the mouse wheel and pans by
+dragging. It never reads the collector JSON while browsing. Every dump is
+summarized once, on first view or with `--build`, into tiles: for every
+column and flow, the min, max and mean of the samples in buckets of 0.1 s,
+0.4 s, 1.6 s, 6.4 s and 25.6 s. A view asks for the coarsest level that
+still has about one bucket per pixel in the visible range, so a 200 s run
+and a one hour run both draw a few hundred points per flow.
+
+Tiles are built from the numpy columns of `helpers.query` and kept next
+to them, as `.query/tiles-<collector>.npz` in the dump, and are rebuilt
+when the dump changes.
+
+Usage (from the repository root):
+
+    python3 -m helpers.dashboard --root . --port 8050
+    python3 -m helpers.dashboard --root /srv/spool/results --build
+
+and open http://localhost:8050/ in a browser.
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .query import CACHE, DumpCache, find_dumps
+
+logger = logging.getLogger(__name__)
+
+# Bucket widths in seconds, finest first
+LEVELS = (0.1, 0.4, 1.6, 6.4, 25.6)
+STATS = ("t", "min", "max", "mean", "count")
+
+
+def _buckets(times, values, width):
+    """min, max, mean and count of `values` in buckets of `width` seconds"""
+    keep = ~np.isnan(values)
+    (times, values) = (times[keep], values[keep])
+    if not len(times):
+        return {stat: np.zeros(0) for stat in STATS}
+    order = np.argsort(times, kind="stable")
+    (times, values) = (times[order], values[order])
+    bucket = np.floor(times / width)
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    counts = np.diff(np.append(starts, len(values)))
+    return {
+        "t": bucket[starts] * width,
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "mean": np.add.reduceat(values, starts) / counts,
+        "count": counts,
+    }
+
+
+def build_tiles(cache, collector):
+    """
+    Write the tiles of `collector` of a loaded `DumpCache`
+
+    Returns
+    -------
+    str
+        Path of the tile file
+    """
+    path = os.path.join(cache.path, f"tiles-{collector}.npz")
+    index_path = os.path.join(cache.path, "index.json")
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(index_path):
+        return path
+
+    columns = cache.columns(collector)
+    tiles = {}
+    for entry in range(len(cache.index["entries"][collector])):
+        mine = columns["entry"] == entry
+        times = columns["time"][mine]
+        for name in columns:
+            if not name.startswith("column_"):
+                continue
+            for (level, width) in enumerate(LEVELS):
+                for (stat, array) in _buckets(times, columns[name][mine], width).items():
+                    tiles[f"{name[7:]}/{entry}/{level}/{stat}"] = array
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(temp_path, **tiles)
+    os.replace(temp_path, path)
+    return path
+
+
+class Dashboard:
+    """
+    Dumps below `roots` and their tiles
+
+    Parameters
+    ----------
+    roots : list(str)
+        Directories holding dumps
+    """
+
+    def __init__(self, roots):
+        self.roots = roots
+        self.dumps = {}
+        self._tiles = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Look for new dumps"""
+        dumps = {}
+        for root in self.roots:
+            for dump in find_dumps([root]):
+                name = os.path.relpath(dump, root)
+                dumps[os.path.join(root, name) if len(self.roots) > 1 else name] = dump
+        self.dumps = dumps
+
+    def cache(self, name):
+        if name not in self.dumps:
+            raise FileNotFoundError(f"no dump {name}")
+        # The threads of the server would build the same cache together
+        with self._lock:
+            return DumpCache(self.dumps[name]).load()
+
+    def describe(self, name):
+        """Collectors, columns, entries and duration of a dump"""
+        cache = self.cache(name)
+        collectors = {}
+        for (collector, entries) in cache.index["entries"].items():
+            columns = cache.columns(collector)
+            names = sorted(n[7:] for n in columns if n.startswith("column_"))
+            labels = []
+            for entry in entries:
+                details = [d for d in (entry["algorithm"], entry["role"], entry["direction"]) if d]
+                details = ", ".join(dict.fromkeys(details))
+                labels.append(f"{entry['flow']} ({details})" if details else entry["flow"])
+            collectors[collector] = {
+                "columns": names,
+                "entries": labels,
+                "duration": float(columns["time"].max()) if len(columns["time"]) else 0.0,
+            }
+        return {"run": cache.index["run"], "collectors": collectors}
+
+    def tiles(self, name, collector, column, entries, start, end, points):
+        """
+        Buckets of `entries` between `start` and `end` at the coarsest level
+        with at least `points` buckets in the range
+        """
+        level = 0
+        for (number, width) in enumerate(LEVELS):
+            if (end - start) / width >= points:
+                level = number
+
+        cache = self.cache(name)
+        if collector not in cache.index["entries"]:
+            raise FileNotFoundError(f"no {collector} in {name}")
+
+        series = {}
+        # Tile files are shared by the threads of the server
+        with self._lock:
+            key = (name, collector)
+            path = build_tiles(cache, collector)
+            # Rebuilt since they were opened when the dump changed
+            mtime = os.path.getmtime(path)
+            if key not in self._tiles or self._tiles[key][0] != mtime:
+                if key in self._tiles:
+                    self._tiles[key][1].close()
+                self._tiles[key] = (mtime, np.load(path))
+            tiles = self._tiles[key][1]
+            for entry in entries:
+                prefix = f"{column}/{entry}/{level}"
+                if f"{prefix}/t" not in tiles.files:
+                    continue
+                times = tiles[f"{prefix}/t"]
+                # One bucket either side, so lines run to the edges of the view
+                low = max(int(np.searchsorted(times, start)) - 1, 0)
+                high = int(np.searchsorted(times, end)) + 1
+                series[entry] = {
+                    stat: np.round(tiles[f"{prefix}/{stat}"][low:high], 6).tolist()
+                    for stat in ("t", "min", "max", "mean")
+                }
+        return {"width": LEVELS[level], "series": series}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    dashboard = None
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urllib.parse.urlparse(self.path)
+        query = {k: v[0] for (k, v) in urllib.parse.parse_qs(url.query).items()}
+        try:
+            if url.path == "/":
+                self._send(200, PAGE, "text/html; charset=utf-8")
+            elif url.path == "/api/dumps":
+                self.dashboard.refresh()
+                self._send(200, json.dumps(sorted(self.dashboard.dumps)))
+            elif url.path == "/api/dump":
+                self._send(200, json.dumps(self.dashboard.describe(query["dump"])))
+            elif url.path == "/api/tiles":
+                result = self.dashboard.tiles(
+                    query["dump"],
+                    query["collector"],
+                    query["column"],
+                    [int(e) for e in query.get("entries", "").split(",") if e],
+                    float(query["start"]),
+                    float(query["end"]),
+                    int(query.get("points", 600)),
+                )
+                self._send(200, json.dumps(result))
+            else:
+                self._send(404, json.dumps({"error": "not found"}))
+        except FileNotFoundError as error:
+            self._send(404, json.dumps({"error": f"not found: {error}"}))
+        except (KeyError, ValueError) as error:
+            self._send(400, json.dumps({"error": f"bad request: {error}"}))
+
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>NeST dashboard</title>
+<style>
+body { font-family: sans-serif; margin: 0; display: flex; height: 100vh; }
+#side { width: 320px; padding: 8px; overflow-y: auto; border-right: 1px solid #ccc; font-size: 13px; }
+#main { flex: 1; display: flex; flex-direction: column; }
+select { width: 100%; margin-bottom: 6px; }
+canvas { flex: 1; width: 100%; cursor: grab; }
+#status { padding: 4px 8px; font-size: 12px; color: #555; }
+label { display: block; white-space: nowrap; }
+</style></head>
+<body>
+<div id="side">
+  <select id="dump"></select>
+  <select id="collector"></select>
+  <select id="column"></select>
+  <div id="entries"></div>
+</div>
+<div id="main"><canvas id="plot"></canvas>
+<div id="status">Wheel to zoom, drag to pan, double click to reset</div></div>
+<script>
+const $ = id => document.getElementById(id);
+const colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+                "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+let info = null, view = [0, 1], data = null, timer = null;
+
+async function get(path, params) {
+  const response = await fetch(path + "?" + new URLSearchParams(params));
+  return response.json();
+}
+function fill(select, options) {
+  select.replaceChildren(...options.map(text => {
+    const option = document.createElement("option");
+    option.textContent = text;
+    return option;
+  }));
+}
+async function loadDumps() {
+  fill($("dump"), await get("/api/dumps", {}));
+  await loadDump();
+}
+async function loadDump() {
+  info = await get("/api/dump", {dump: $("dump").value});
+  fill($("collector"), Object.keys(info.collectors));
+  loadCollector();
+}
+function loadCollector() {
+  const collector = info.collectors[$("collector").value];
+  if (!collector) return;
+  fill($("column"), collector.columns);
+  // Labels come from the dumps, so they are text, never markup
+  $("entries").replaceChildren(...collector.entries.map((label, i) => {
+    const row = document.createElement("label");
+    const box = document.createElement("input"), swatch = document.createElement("span");
+    box.type = "checkbox"; box.value = i; box.checked = i < 10; box.onchange = fetchTiles;
+    swatch.style.color = colors[i % 10]; swatch.textContent = "\u25a0";
+    row.append(box, swatch, " " + label);
+    return row;
+  }));
+  view = [0, collector.duration || 1];
+  fetchTiles();
+}
+function schedule() { clearTimeout(timer); timer = setTimeout(fetchTiles, 80); draw(); }
+async function fetchTiles() {
+  const entries = [...$("entries").querySelectorAll("input:checked")].map(b => b.value);
+  data = await get("/api/tiles", {
+    dump: $("dump").value, collector: $("collector").value, column: $("column").value,
+    entries: entries.join(","), start: view[0], end: view[1],
+    points: $("plot").clientWidth,
+  });
+  if (data.error) { $("status").textContent = data.error; data = null; draw(); return; }
+  $("status").textContent = `${view[0].toFixed(2)} s to ${view[1].toFixed(2)} s, ` +
+    `buckets of ${data.width} s (min/max band, mean line)`;
+  draw();
+}
+function draw() {
+  const canvas = $("plot"), ctx = canvas.getContext("2d");
+  canvas.width = canvas.clientWidth; canvas.height = canvas.clientHeight;
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  if (!data) return;
+  const pad = 50, w = canvas.width - 2 * pad, h = canvas.height - 2 * pad;
+  let low = Infinity, high = -Infinity;
+  for (const s of Object.values(data.series))
+    s.t.forEach((t, i) => { if (t + data.width >= view[0] && t <= view[1]) {
+      low = Math.min(low, s.min[i]); high = Math.max(high, s.max[i]); } });
+  if (!isFinite(low)) return;
+  if (high === low) high = low + 1;
+  const x = t => pad + (t - view[0]) / (view[1] - view[0]) * w;
+  const y = v => pad + h - (v - low) / (high - low) * h;
+  ctx.strokeStyle = "#999"; ctx.fillStyle = "#333"; ctx.font = "11px sans-serif";
+  ctx.strokeRect(pad, pad, w, h);
+  for (let i = 0; i <= 5; i++) {
+    const v = low + (high - low) * i / 5, t = view[0] + (view[1] - view[0]) * i / 5;
+    ctx.fillText(v.toPrecision(4), 2, y(v) + 4);
+    ctx.fillText(t.toFixed(1), x(t) - 10, pad + h + 15);
+  }
+  ctx.save(); ctx.beginPath(); ctx.rect(pad, pad, w, h); ctx.clip();
+  for (const [entry, s] of Object.entries(data.series)) {
+    const color = colors[entry % 10], mid = s.t.map(t => t + data.width / 2);
+    ctx.globalAlpha = 0.25; ctx.fillStyle = color; ctx.beginPath();
+    mid.forEach((t, i) => ctx.lineTo(x(t), y(s.max[i])));
+    for (let i = mid.length - 1; i >= 0; i--) ctx.lineTo(x(mid[i]), y(s.min[i]));
+    ctx.fill();
+    ctx.globalAlpha = 1; ctx.strokeStyle = color; ctx.beginPath();
+    mid.forEach((t, i) => ctx.lineTo(x(t), y(s.mean[i])));
+    ctx.stroke();
+  }
+  ctx.restore();
+}
+const canvas = $("plot");
+canvas.onwheel = event => {
+  event.preventDefault();
+  const rect = canvas.getBoundingClientRect(), pad = 50;
+  const at = view[0] + (event.clientX - rect.left - pad) / (rect.width - 2 * pad) * (view[1] - view[0]);
+  const scale = event.deltaY > 0 ? 1.25 : 0.8;
+  view = [at - (at - view[0]) * scale, at + (view[1] - at) * scale];
+  schedule();
+};
+let drag = null;
+canvas.onmousedown = event => drag = [event.clientX, view.slice()];
+window.onmouseup = () => drag = null;
+window.onmousemove = event => {
+  if (!drag) return;
+  const span = drag[1][1] - drag[1][0];
+  const shift = (drag[0] - event.clientX) / (canvas.clientWidth - 100) * span;
+  view = [drag[1][0] + shift, drag[1][1] + shift];
+  schedule();
+};
+canvas.ondblclick = () => { view = [0, info.collectors[$("collector").value].duration || 1]; fetchTiles(); };
+window.onresize = draw;
+$("dump").onchange = loadDump;
+$("collector").onchange = loadCollector;
+$("column").onchange = fetchTiles;
+loadDumps();
+</script></body></html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--root", action="append", default=[], help="Directory holding dumps (Default: .)"
+    )
+    parser.add_argument("--port", type=int, default=8050, help="Port to listen on")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--build", action="store_true", help="Build all tiles and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    dashboard = Dashboard(args.root or ["."])
+    if args.build:
+        started = time.perf_counter()
+        for dump in dashboard.dumps.values():
+            cache = DumpCache(dump).load()
+            for collector in cache.index["entries"]:
+                build_tiles(cache, collector)
+        logger.info(
+            "Built the tiles of %d dumps in %.3f s into %s/",
+            len(dashboard.dumps),
+            time.perf_counter() - started,
+            CACHE,
+        )
+        return
+
+    _Handler.dashboard = dashboard
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    logger.info("Serving %d dumps on http://%s:%d/", len(dashboard.dumps), args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
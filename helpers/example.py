@@ -0,0 +1,179 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Setup of the helpers shared by the example programs.
+
+The programs build their topology and flows as they always did, and leave
+the collectors and tools of the helpers around `exp.run()` to three calls:
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    from helpers import example
+    example.begin()
+
+    from nest.topology import *
+    from nest.experiment import *
+    ...
+    parser = argparse.ArgumentParser()
+    ...
+    example.add_arguments(parser)
+    args = parser.parse_args()
+    ...                             # build the topology and the flows
+    example.run(exp, args, etr1c, "10mbit", "10ms", qdisc)
+
+Every run is watched for host saturation (`host.json`, see
+`host_monitor.py`) and for flows that do not start, die or stall
+(`watchdog.json`, see `watchdog.py`). With a bottleneck, its queues are
+sampled (`qdisc_stats.json` and `tc/`, see `qdisc_stats.py`) and its setup
+and utilization checked (`bottleneck.json`, see `bottleneck.py`). The
+startup of the run is timed into `startup.json`, see `startup.py`.
+
+Options:
+
+* `--no_host_monitor`: do not watch the host for saturation
+* `--tc_interval SECONDS`: seconds between samples of the queues of the
+  bottleneck, 0.05 by default, 0 to disable
+* `--no_bottleneck_check`: do not check the setup and utilization of the
+  bottleneck
+* `--no_watchdog`: let the run go on when a flow does not start, dies or
+  stalls
+* `--pin_cpus`, `--rps`: pin the runners of every namespace to their own
+  cores, see `pinning.py`
+* `--postprocess QUEUE`: queue the parsing and plotting of the run, see
+  `postprocess.py`
+* `--profile`: time every phase and command of the run into `profile.json`,
+  see `profiler.py`
+
+This module imports NeST only in `run`, so that `begin` comes before it.
+"""
+
+import argparse
+import logging
+
+from . import profiler, startup
+
+logger = logging.getLogger(__name__)
+
+
+def begin(argv=None):
+    """
+    Defer the plotters of NeST and, with `--profile`, install the profiler;
+    call it before the program imports NeST
+
+    Parameters
+    ----------
+    argv : list(str)
+        Command line arguments (Default value = None, `sys.argv[1:]`)
+    """
+    startup.defer_imports()
+    # The profiler wraps NeST before the program imports from it
+    peek = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    peek.add_argument("--profile", action="store_true")
+    if peek.parse_known_args(argv)[0].profile:
+        profiler.install()
+
+
+def add_arguments(parser):
+    """Add the options of the helpers to the parser of a program"""
+    # The programs build their parser right after their imports
+    startup.mark("imports")
+    group = parser.add_argument_group("helpers")
+    group.add_argument(
+        "--no_host_monitor", action="store_true", help="Do not watch the host for saturation"
+    )
+    group.add_argument(
+        "--tc_interval",
+        type=float,
+        default=0.05,
+        metavar="SECONDS",
+        help="Sample the queues of the bottleneck every this many seconds, 0 to disable",
+    )
+    group.add_argument(
+        "--no_bottleneck_check",
+        action="store_true",
+        help="Do not check the setup and utilization of the bottleneck",
+    )
+    group.add_argument(
+        "--no_watchdog",
+        action="store_true",
+        help="Do not stop the run when a flow does not start, dies or stalls",
+    )
+    group.add_argument(
+        "--pin_cpus", action="store_true", help="Pin generators and collectors to dedicated cores"
+    )
+    group.add_argument(
+        "--rps",
+        action="store_true",
+        help="With --pin_cpus, steer veth receive processing to separate cores",
+    )
+    group.add_argument(
+        "--postprocess",
+        type=str,
+        default="",
+        metavar="QUEUE",
+        help="Queue the parsing and plotting of the run in this post-processing queue",
+    )
+    group.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every phase and command of the run into profile.json",
+    )
+
+
+# pylint: disable=too-many-arguments
+def run(exp, args, bottleneck=None, rate=None, delay=None, qdisc=None, tools=(), after=()):
+    """
+    Run `exp` with the collectors of the helpers
+
+    Parameters
+    ----------
+    exp : Experiment
+        Experiment to run
+    args : argparse.Namespace
+        Parsed options, see `add_arguments`
+    bottleneck : Interface
+        Bottleneck of the topology, whose queues are sampled and whose
+        setup is checked (Default value = None, none)
+    rate : str
+        Rate set on `bottleneck` (Default value = None)
+    delay : str
+        Delay set on `bottleneck` (Default value = None)
+    qdisc : str
+        Qdisc set on `bottleneck`, or None for none (Default value = None)
+    tools : list
+        Collectors and tools of the program itself, such as a `UdpFlood`
+        (Default value = ())
+    after : list(callable)
+        Functions called with the dump folder once the results are written
+        (Default value = ())
+    """
+    # pylint: disable=import-outside-toplevel
+    from .bottleneck import BottleneckCheck
+    from .collector import run_with_collectors
+    from .host_monitor import HostMonitor
+    from .qdisc_stats import QdiscStats
+    from .watchdog import FlowWatchdog
+
+    collectors = list(tools)
+    if not args.no_host_monitor:
+        # Judge the host only while the flows of NeST run
+        duration = max((flow.stop_time for flow in exp.flows), default=None)
+        collectors.append(HostMonitor(duration=duration))
+    if bottleneck is not None:
+        if args.tc_interval:
+            collectors.append(QdiscStats([bottleneck], args.tc_interval))
+        if not args.no_bottleneck_check:
+            collectors.append(BottleneckCheck(bottleneck, rate, delay, qdisc))
+    if args.pin_cpus:
+        from .pinning import CpuPinner
+
+        collectors.append(CpuPinner(exp, rps=args.rps))
+    if not args.no_watchdog:
+        collectors.append(FlowWatchdog(exp))
+
+    startup.mark("topology")
+    run_with_collectors(exp, collectors, args.postprocess, after)
+    startup.report()
+    if args.profile:
+        profiler.save()
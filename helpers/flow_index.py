@@ -0,0 +1,407 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+One identity for every flow of a dump, whatever the collector.
+
+Every NeST collector keys a flow differently: `netperf.json` by
+"<address>:<port>, <algorithm>", `ss.json` by address and then port,
+`iperf3.json` by address and client port, `iperf3Server.json` by client
+address and server port, and `ping.json` and `latency.json` by host pair
+only. `FlowIndex` reads the dump once and maps the key of every collector
+to a canonical flow id, "<source>-<destination>-<port>", with the protocol,
+algorithm, start and stop time of the flow, and optionally its role and
+direction in the experiment:
+
+    index = FlowIndex.load(dump, roles={"tcp1": "cubic", "tcp2": "bbr"},
+                           upload=["h1", "h2"])
+    flow_id = index.lookup("ss", "h1", "192.168.3.2", "42589")
+    index.key(flow_id, "netperf")   # ('h1', '192.168.3.2:42589, cubic')
+    index.pair("h1", "192.168.3.2") # flows that share the ping of h1 to h2
+
+Roles are given to every flow on its own. The TCP flows of a node are
+numbered by start time into their `order`, which is the order the program
+added them in wherever their start times differ; flows that start
+together keep the order of `netperf.json`, which NeST writes as its
+parsers finish. The flows of a node take, in that order, the next of the
+roles of their algorithm, or of all roles if the dump does not record
+algorithms, so `tcp1=cubic,tcp2=cubic` alternates between the two roles as
+the programs alternate between their flows, and a role gives its
+algorithm to flows without one. Where that does not fit, `order` lists the
+role of every flow of a node explicitly:
+
+    FlowIndex.load(dump, roles={"tcp1": "cubic", "tcp2": "bbr"},
+                   order={"h1": ["tcp1", "tcp1", "tcp2", "tcp2"]})
+
+Neither the roles nor the algorithm of a flow are in the dumps of older
+runs. `roles.json` in a dump holds the `roles`, `order` and `upload` of
+its run, written with `--save`, and is used whenever they are not given,
+so every analysis of the dump sees the same roles and algorithms.
+
+Lookups are dictionary accesses. The index is built from the collector
+files on every `load`, which leaves the dump as NeST wrote it; with
+`cache=True` (`--cache`) it is saved as `flow_index.json` in the dump and
+loaded from there while it is newer than the collector files and
+`roles.json`, for dumps that are analysed over and over. `helpers.query`
+keeps the index in its own cache instead.
+
+Usage (from the repository root):
+
+    python3 -m helpers.flow_index DUMP --role tcp1=cubic --role tcp2=bbr --upload h1,h2
+    python3 -m helpers.flow_index DUMP --role tcp1=cubic --role tcp2=bbr --order h1=tcp1,tcp1,tcp2,tcp2
+    python3 -m helpers.flow_index DUMP --role westwood=westwood --role cubic=cubic --save
+    python3 -m helpers.flow_index DUMP --cache
+"""
+
+import argparse
+import json
+import os
+
+INDEX = "flow_index.json"
+# Roles, order and upload nodes of the run of a dump, in roles.json
+ROLES = "roles"
+# Format of the saved index; older indexes are rebuilt
+VERSION = 2
+# Collector files with one entry per flow, and their protocol
+PER_FLOW = {
+    "netperf": "tcp",
+    "ss": "tcp",
+    "iperf3": "udp",
+    "udp_flood": "udp",
+}
+# Collector files with one entry per host pair
+PER_PAIR = ("ping", "latency")
+SERVER = {"iperf3Server": "iperf3", "udp_floodServer": "udp_flood"}
+
+
+def _read(dump, collector):
+    path = os.path.join(dump, f"{collector}.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def read_roles(dump):
+    """`roles.json` of `dump`, or an empty dict"""
+    return _read(dump, ROLES) or {}
+
+
+def save_roles(dump, roles=None, upload=None, order=None):
+    """Write the roles, upload nodes and order of the run of `dump`"""
+    content = {"roles": roles, "upload": upload, "order": order}
+    with open(os.path.join(dump, f"{ROLES}.json"), "w") as file:
+        json.dump({k: v for (k, v) in content.items() if v}, file, indent=4)
+
+
+def _meta(samples):
+    return samples[0] if samples and isinstance(samples[0], dict) and samples[0].get("meta") else {}
+
+
+def _entries(collector, data):
+    """(key, source, address, port, algorithm, meta) of every flow entry"""
+    for (source, entries) in data.items():
+        for entry in entries:
+            for (name, value) in entry.items():
+                if collector == "netperf":
+                    (endpoint, _, algorithm) = name.partition(", ")
+                    (address, _, port) = endpoint.rpartition(":")
+                    yield ((source, name), source, address, port, algorithm or None, _meta(value))
+                else:
+                    for (port, samples) in value.items():
+                        yield ((source, name, port), source, name, port, None, _meta(samples))
+
+
+class FlowIndex:
+    """
+    Canonical flows of a dump and the keys of every collector
+
+    Parameters
+    ----------
+    flows : dict
+        Flow id -> record, see `build`
+    """
+
+    def __init__(self, flows):
+        self.flows = flows
+        self._keys = {}
+        self._pairs = {}
+        self._rebuild()
+
+    def _rebuild(self):
+        self._keys = {}
+        self._pairs = {}
+        for (flow_id, flow) in self.flows.items():
+            for (collector, key) in flow["keys"].items():
+                self._keys[(collector,) + tuple(key)] = flow_id
+            self._pairs.setdefault((flow["source"], flow["address"]), []).append(flow_id)
+
+    @classmethod
+    def build(cls, dump, roles=None, upload=None, order=None):
+        """
+        Index the collector files of `dump`
+
+        Parameters
+        ----------
+        dump : str
+            Dump folder of an experiment
+        roles : dict
+            Role -> algorithm, such as {"tcp1": "cubic"} (Default value = None)
+        upload : list(str)
+            Nodes whose outgoing flows are uploads (Default value = None)
+        order : dict
+            Node -> role of each of its TCP flows, in the order the program
+            added them (Default value = None)
+
+        Returns
+        -------
+        FlowIndex
+        """
+        flows = {}
+        by_endpoint = {}
+        positions = {}
+
+        for (collector, protocol) in PER_FLOW.items():
+            data = _read(dump, collector)
+            if not data:
+                continue
+            for (key, source, address, port, algorithm, meta) in _entries(collector, data):
+                endpoint = (source, address, port)
+                flow_id = by_endpoint.get(endpoint)
+                if flow_id is None:
+                    destination = meta.get("destination_node") or address
+                    flow_id = f"{source}-{destination}-{port}"
+                    by_endpoint[endpoint] = flow_id
+                    flows[flow_id] = {
+                        "id": flow_id,
+                        "protocol": protocol,
+                        "source": source,
+                        "destination": meta.get("destination_node"),
+                        "address": address,
+                        "port": port,
+                        "algorithm": None,
+                        "order": None,
+                        "start": None,
+                        "stop": None,
+                        "keys": {},
+                    }
+                flow = flows[flow_id]
+                flow["keys"][collector] = list(key)
+                flow["algorithm"] = flow["algorithm"] or algorithm
+                if collector == "netperf":
+                    flow["order"] = positions.get(source, 0)
+                    positions[source] = flow["order"] + 1
+                flow["destination"] = flow["destination"] or meta.get("destination_node")
+                for field in ("start", "stop"):
+                    if flow[field] is None and f"{field}_time" in meta:
+                        flow[field] = float(meta[f"{field}_time"])
+
+        cls._add_servers(dump, flows)
+        cls._mark_control(flows)
+        for collector in PER_PAIR:
+            data = _read(dump, collector)
+            for (source, targets) in (data or {}).items():
+                addresses = targets if collector == "latency" else {
+                    name: None for entry in targets for name in entry
+                }
+                for address in addresses:
+                    for flow in flows.values():
+                        if (flow["source"], flow["address"]) == (source, address):
+                            flow["keys"][collector] = [source, address]
+
+        cls._assign_roles(flows, roles or {}, order or {})
+        for flow in flows.values():
+            flow["direction"] = None
+            if upload:
+                if flow["source"] in upload:
+                    flow["direction"] = "upload"
+                elif flow["destination"] in upload:
+                    flow["direction"] = "download"
+        return cls(flows)
+
+    @staticmethod
+    def _assign_roles(flows, roles, order):
+        """
+        Role of every flow, in the order of the TCP flows of each node
+
+        Flows without a role get their algorithm or protocol.
+        """
+        turns = {}
+        ordered = sorted(
+            (f for f in flows.values() if f["order"] is not None),
+            key=lambda f: (f["source"], f["start"] or 0.0, f["order"]),
+        )
+        counts = {}
+        for flow in ordered:
+            flow["order"] = counts.get(flow["source"], 0)
+            counts[flow["source"]] = flow["order"] + 1
+        for flow in ordered:
+            explicit = order.get(flow["source"], [])
+            if flow["order"] < len(explicit):
+                role = explicit[flow["order"]]
+            else:
+                candidates = tuple(
+                    r for (r, algorithm) in roles.items()
+                    if flow["algorithm"] is None or algorithm == flow["algorithm"]
+                )
+                if not candidates:
+                    continue
+                turn = turns.get((flow["source"], candidates), 0)
+                turns[(flow["source"], candidates)] = turn + 1
+                role = candidates[turn % len(candidates)]
+            flow["role"] = role
+            flow["algorithm"] = flow["algorithm"] or roles.get(role)
+        for flow in flows.values():
+            flow.setdefault("role", flow["algorithm"] or flow["protocol"])
+
+    @staticmethod
+    def _add_servers(dump, flows):
+        """
+        Match the server side of UDP flows to their client side
+
+        Servers report the client address and their own port, so the flows
+        of a pair are matched in the order of their ports.
+        """
+        for (server, client) in SERVER.items():
+            data = _read(dump, server)
+            if not data:
+                continue
+            entries = {}
+            for (key, node, address, port, _, _) in _entries(server, data):
+                entries.setdefault((node, address), []).append((int(port), key))
+            for ((node, address), keys) in entries.items():
+                candidates = sorted(
+                    (
+                        flow
+                        for flow in flows.values()
+                        if client in flow["keys"] and flow["destination"] == node
+                    ),
+                    key=lambda flow: int(flow["port"]),
+                )
+                sources = {flow["source"] for flow in candidates}
+                if len(sources) > 1:
+                    # Tell the clients apart by the address they are known by
+                    known = {
+                        flow["address"]: flow["destination"] for flow in flows.values()
+                    }
+                    candidates = [f for f in candidates if known.get(address) == f["source"]]
+                for (flow, (_, key)) in zip(candidates, sorted(keys)):
+                    flow["keys"][server] = list(key)
+
+    @staticmethod
+    def _mark_control(flows):
+        """
+        Mark the TCP control connections of iperf3 in `ss.json`
+
+        They go to the port of the server, which the server side of the UDP
+        flow is keyed by.
+        """
+        servers = {}
+        for flow in flows.values():
+            for server in SERVER:
+                if server in flow["keys"]:
+                    port = flow["keys"][server][2]
+                    servers[(flow["source"], flow["address"], port)] = flow["id"]
+        for flow in flows.values():
+            if list(flow["keys"]) == ["ss"]:
+                parent = servers.get((flow["source"], flow["address"], flow["port"]))
+                if parent:
+                    flow["protocol"] = "control"
+                    flow["parent"] = parent
+
+    @classmethod
+    def load(cls, dump, roles=None, upload=None, order=None, cache=False):
+        """
+        Index of `dump`, with the `roles`, `upload` and `order` of
+        `roles.json` for those not given
+
+        With `cache`, the index is read from `flow_index.json` in the dump
+        if it is up to date, and rebuilt and saved when it is older than
+        any collector file or `roles.json`, or when `roles`, `upload` or
+        `order` are given.
+        """
+        path = os.path.join(dump, INDEX)
+        fixed = roles is None and upload is None and order is None
+        if cache and fixed and os.path.isfile(path):
+            sources = [
+                os.path.join(dump, f"{name}.json")
+                for name in list(PER_FLOW) + list(PER_PAIR) + list(SERVER) + [ROLES]
+            ]
+            newest = max(
+                (os.path.getmtime(p) for p in sources if os.path.isfile(p)), default=0
+            )
+            if os.path.getmtime(path) >= newest:
+                with open(path, "r") as file:
+                    saved = json.load(file)
+                if saved.get("version") == VERSION:
+                    return cls(saved["flows"])
+        saved = read_roles(dump)
+        index = cls.build(
+            dump,
+            saved.get("roles") if roles is None else roles,
+            saved.get("upload") if upload is None else upload,
+            saved.get("order") if order is None else order,
+        )
+        if cache:
+            index.save(dump)
+        return index
+
+    def save(self, dump):
+        """Write the index to `flow_index.json` in `dump`"""
+        with open(os.path.join(dump, INDEX), "w") as file:
+            json.dump({"version": VERSION, "flows": self.flows}, file, indent=4)
+
+    def lookup(self, collector, *key):
+        """Flow id of `key` in `collector`, or None"""
+        return self._keys.get((collector,) + tuple(str(part) for part in key))
+
+    def key(self, flow_id, collector):
+        """Key of a flow in `collector`, as a tuple, or None"""
+        key = self.flows[flow_id]["keys"].get(collector)
+        return tuple(key) if key is not None else None
+
+    def pair(self, source, address):
+        """Flow ids from node `source` to `address`"""
+        return self._pairs.get((source, address), [])
+
+    def label(self, flow_id):
+        """Short description of a flow for plots and reports"""
+        flow = self.flows[flow_id]
+        details = [d for d in (flow["algorithm"], flow["role"], flow["direction"]) if d]
+        details = list(dict.fromkeys(details))
+        return f"{flow['source']} to {flow['destination']} ({', '.join(details)}, port {flow['port']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dump", help="Dump folder of an experiment")
+    parser.add_argument(
+        "--role", action="append", default=[], help="ROLE=ALGORITHM, such as tcp1=cubic"
+    )
+    parser.add_argument("--upload", type=str, default=None, help="Upload nodes, as h1,h2")
+    parser.add_argument(
+        "--order",
+        action="append",
+        default=[],
+        help="NODE=ROLE,ROLE,... roles of the TCP flows of NODE in the order they were added",
+    )
+    parser.add_argument("--save", action="store_true", help="Keep them in roles.json of the dump")
+    parser.add_argument(
+        "--cache", action="store_true", help="Keep the index in flow_index.json of the dump"
+    )
+    args = parser.parse_args()
+
+    roles = dict(role.split("=", 1) for role in args.role) or None
+    upload = args.upload.split(",") if args.upload else None
+    order = {node: roles_.split(",") for (node, roles_) in (o.split("=", 1) for o in args.order)} or None
+    if args.save:
+        save_roles(args.dump, roles, upload, order)
+        (roles, upload, order) = (None, None, None)
+    index = FlowIndex.load(args.dump, roles, upload, order, args.cache)
+    for flow_id in sorted(index.flows):
+        flow = index.flows[flow_id]
+        print(f"{flow_id:24} {index.label(flow_id):48} {', '.join(sorted(flow['keys']))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+HDR histograms of integer values, such as RTTs in microseconds.
+
+The bucket layout is the one of HdrHistogram: values are kept with a fixed
+number of significant decimal digits over the whole range, so a histogram
+of RTTs between 1 us and 60 s at three significant digits has a few tens of
+thousands of counters and any percentile is exact to 0.1%. Histograms are
+stored sparsely, as the indices and counts of the non-empty counters, and
+histograms with the same layout can be added.
+
+    histogram = HdrHistogram()
+    histogram.record_values(rtts_us)
+    histogram.percentile(99.9)
+    histogram.to_sparse()
+"""
+
+import math
+
+import numpy as np
+
+
+class HdrHistogram:
+    """
+    Parameters
+    ----------
+    lowest : int
+        Smallest value that can be told apart from 0 (Default value = 1)
+    highest : int
+        Largest value that can be recorded; larger values are clamped
+        (Default value = 60000000)
+    significant_figures : int
+        Decimal digits kept for every value (Default value = 3)
+    """
+
+    def __init__(self, lowest=1, highest=60 * 10 ** 6, significant_figures=3):
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_figures = significant_figures
+
+        self.unit_magnitude = int(math.floor(math.log2(lowest)))
+        largest_single_unit = 2 * 10 ** significant_figures
+        self.sub_bucket_count_magnitude = int(math.ceil(math.log2(largest_single_unit)))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        self.bucket_count = 1
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            self.bucket_count += 1
+
+        self.counts = np.zeros(
+            (self.bucket_count + 1) * self.sub_bucket_half_count, dtype=np.int64
+        )
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def layout(self):
+        """Parameters that histograms must share to be added"""
+        return {
+            "lowest": self.lowest,
+            "highest": self.highest,
+            "significant_figures": self.significant_figures,
+        }
+
+    def _indices(self, values):
+        values = np.clip(np.asarray(values, dtype=np.int64), 0, self.highest)
+        magnitudes = np.floor(
+            np.log2((values | self.sub_bucket_mask).astype(np.float64))
+        ).astype(np.int64)
+        buckets = magnitudes - self.unit_magnitude - self.sub_bucket_half_count_magnitude
+        sub_buckets = values >> (buckets + self.unit_magnitude)
+        return ((buckets + 1) << self.sub_bucket_half_count_magnitude) + (
+            sub_buckets - self.sub_bucket_half_count
+        )
+
+    def _values(self, indices):
+        """Lowest value counted by each of `indices`"""
+        indices = np.asarray(indices, dtype=np.int64)
+        buckets = (indices >> self.sub_bucket_half_count_magnitude) - 1
+        sub_buckets = (indices & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        first = buckets < 0
+        sub_buckets = np.where(first, sub_buckets - self.sub_bucket_half_count, sub_buckets)
+        buckets = np.maximum(buckets, 0)
+        return sub_buckets << (buckets + self.unit_magnitude)
+
+    def record_values(self, values):
+        """Count every value of `values`"""
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values):
+            return
+        np.add.at(self.counts, self._indices(values), 1)
+        self.total += len(values)
+        (low, high) = (int(values.min()), int(values.max()))
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def add(self, other):
+        """Add the counts of `other`, which must have the same layout"""
+        if other.layout() != self.layout():
+            raise ValueError("Histograms with different layouts cannot be added")
+        self.counts += other.counts
+        self.total += other.total
+        for (attribute, pick) in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, attribute), getattr(other, attribute)) if v is not None]
+            setattr(self, attribute, pick(values) if values else None)
+
+    def percentile(self, percentile):
+        """
+        Value below which `percentile` percent of the recorded values lie,
+        or None if nothing was recorded
+        """
+        if not self.total:
+            return None
+        rank = max(1, int(math.ceil(percentile / 100 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        # Report the top of the counter, but never beyond the largest value
+        return min(int(self._values(index + 1)) - 1, self.max)
+
+    def to_sparse(self):
+        """Layout, extremes and the non-empty counters, for JSON"""
+        (indices,) = np.nonzero(self.counts)
+        return dict(
+            self.layout(),
+            total=self.total,
+            min=self.min,
+            max=self.max,
+            index=indices.tolist(),
+            count=self.counts[indices].tolist(),
+        )
+
+    @classmethod
+    def from_sparse(cls, sparse):
+        """Histogram saved with `to_sparse`"""
+        histogram = cls(sparse["lowest"], sparse["highest"], sparse["significant_figures"])
+        histogram.counts[sparse["index"]] = sparse["count"]
+        histogram.total = sparse["total"]
+        histogram.min = sparse["min"]
+        histogram.max = sparse["max"]
+        return histogram
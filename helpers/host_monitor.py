@@ -0,0 +1,256 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Watch the emulating host for saturation while an experiment runs.
+
+All the links of an experiment are emulated by the CPUs of a single host. At
+high stream counts the host itself can become the bottleneck, and the dump
+then records host limits as protocol behaviour. `HostMonitor` samples CPU
+and softirq load of every core, the run queue, softnet drops and the drops
+of every veth, writes them to `host.json` and marks the run as suspect when
+any of them crosses its threshold. Drops and squeezes happen now and then
+on a healthy host, so they are compared as rates: the share of the packets
+that were dropped and the number of squeezes per second.
+
+Only the samples taken while the traffic runs are judged. The monitor
+samples from before NeST sets up its runners until after it has parsed and
+plotted the results, and these phases load the CPUs on their own.
+"""
+
+import logging
+import os
+import time
+
+from nest.topology_map import TopologyMap
+
+from .collector import BackgroundCollector, netns
+
+logger = logging.getLogger(__name__)
+
+# A run is suspect when any of these is reached in any sample of the traffic
+THRESHOLDS = {
+    "cpu_busy_max": 95.0,  # % busy of the busiest core
+    "softirq_max": 60.0,  # % of the busiest core spent in softirq
+    "run_queue": 1.5,  # runnable tasks per core
+    "softnet_drop_ratio": 0.001,  # share of the packets of the per-core backlogs dropped
+    "time_squeeze_rate": 100.0,  # softirq runs cut short for lack of budget, per second
+    "veth_drop_ratio": 0.001,  # share of the packets through the veths dropped
+}
+
+
+def _read_cpu_times():
+    """Per-core (busy, softirq, total) jiffies from /proc/stat"""
+    times = []
+    with open("/proc/stat", "r") as stat:
+        for line in stat:
+            if not line.startswith("cpu") or line.startswith("cpu "):
+                continue
+            values = [int(value) for value in line.split()[1:]]
+            # user nice system idle iowait irq softirq steal ...
+            idle = values[3] + values[4]
+            total = sum(values[:8])
+            times.append((total - idle, values[6], total))
+    return times
+
+
+def _read_run_queue():
+    """Number of runnable tasks other than the caller, from /proc/loadavg"""
+    with open("/proc/loadavg", "r") as loadavg:
+        return int(loadavg.read().split()[3].split("/")[0]) - 1
+
+
+def _read_softnet():
+    """Total (processed, dropped, time_squeeze) over all cores"""
+    processed = dropped = squeezed = 0
+    with open("/proc/net/softnet_stat", "r") as softnet:
+        for line in softnet:
+            values = line.split()
+            processed += int(values[0], 16)
+            dropped += int(values[1], 16)
+            squeezed += int(values[2], 16)
+    return (processed, dropped, squeezed)
+
+
+def _read_drops():
+    """
+    Receive plus transmit (drops, packets) of every interface of this
+    namespace
+    """
+    drops = {}
+    with open("/proc/thread-self/net/dev", "r") as dev:
+        for line in dev.readlines()[2:]:
+            (name, values) = line.split(":", 1)
+            values = values.split()
+            drops[name.strip()] = (int(values[3]) + int(values[11]), int(values[1]) + int(values[9]))
+    return drops
+
+
+def _ratio(part, whole):
+    return round(part / whole, 6) if whole > 0 else 0.0
+
+
+class HostMonitor(BackgroundCollector):
+    """
+    Samples host load and drops alongside the NeST collectors
+
+        with HostMonitor():
+            exp.run()
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between two samples (Default value = 1.0)
+    thresholds : dict
+        Overrides for `THRESHOLDS` (Default value = None)
+    duration : float
+        Seconds from the launch of the flows to the end of the traffic
+        (Default value = None, until the monitor stops)
+    """
+
+    name = "host"
+
+    def __init__(self, interval=1.0, thresholds=None, duration=None):
+        super().__init__(interval)
+        self.thresholds = dict(THRESHOLDS, **(thresholds or {}))
+        self.duration = duration
+        self.cpus = os.cpu_count()
+        self.series = {
+            "timestamp": [],
+            "cpu_busy_max": [],
+            "cpu_busy_mean": [],
+            "softirq_max": [],
+            "run_queue": [],
+            "softnet_drop_ratio": [],
+            "time_squeeze_rate": [],
+            "veth_drop_ratio": [],
+        }
+        # `time.monotonic()` at the start and end of every sample
+        self.intervals = []
+        self.drops_by_interface = {}
+        self._last = None
+
+    def _read_all_drops(self):
+        """Drops of every interface in every namespace, by interface name"""
+        drops = {}
+        for namespace in TopologyMap.get_namespaces():
+            try:
+                with netns(namespace["id"]):
+                    counters = _read_drops()
+            except OSError:
+                # Namespace already deleted during cleanup
+                continue
+            names = {
+                interface["id"]: interface["name"]
+                for interface in namespace["interfaces"]
+            }
+            for (int_id, count) in counters.items():
+                if int_id in names:
+                    drops[f"{namespace['name']}:{names[int_id]}"] = count
+        return drops
+
+    def _snapshot(self):
+        return (
+            time.monotonic(),
+            _read_cpu_times(),
+            _read_softnet(),
+            self._read_all_drops(),
+        )
+
+    def setup(self):
+        self._last = self._snapshot()
+
+    def sample(self):
+        current = self._snapshot()
+        ((last_time, last_cpu, last_softnet, last_drops), (now, cpu, softnet, drops)) = (
+            self._last,
+            current,
+        )
+        self._last = current
+
+        busy = []
+        softirq = []
+        for ((busy0, soft0, total0), (busy1, soft1, total1)) in zip(last_cpu, cpu):
+            elapsed = max(total1 - total0, 1)
+            busy.append(100.0 * (busy1 - busy0) / elapsed)
+            softirq.append(100.0 * (soft1 - soft0) / elapsed)
+
+        veth_drops = veth_packets = 0
+        for (name, (count, packets)) in drops.items():
+            (last_count, last_packets) = last_drops.get(name, (count, packets))
+            veth_packets += max(packets - last_packets, 0)
+            delta = count - last_count
+            if delta > 0:
+                veth_drops += delta
+                self.drops_by_interface[name] = (
+                    self.drops_by_interface.get(name, 0) + delta
+                )
+        (processed, dropped, squeezed) = (new - old for (new, old) in zip(softnet, last_softnet))
+
+        self.intervals.append((last_time, now))
+        self.series["timestamp"].append(round(time.time(), 3))
+        self.series["cpu_busy_max"].append(round(max(busy), 1))
+        self.series["cpu_busy_mean"].append(round(sum(busy) / len(busy), 1))
+        self.series["softirq_max"].append(round(max(softirq), 1))
+        self.series["run_queue"].append(round(_read_run_queue() / self.cpus, 2))
+        self.series["softnet_drop_ratio"].append(_ratio(dropped, processed + dropped))
+        self.series["time_squeeze_rate"].append(round(squeezed / max(now - last_time, 1e-3), 1))
+        self.series["veth_drop_ratio"].append(_ratio(veth_drops, veth_packets + veth_drops))
+
+    def traffic(self):
+        """Indices of the samples taken entirely while the traffic ran"""
+        if self.launched is None:
+            return []
+        end = self.launched + self.duration if self.duration is not None else float("inf")
+        return [
+            index
+            for (index, (start, stop)) in enumerate(self.intervals)
+            if start >= self.launched and stop <= end
+        ]
+
+    def violations(self):
+        """
+        Metrics that reached their threshold while the traffic ran
+
+        Returns
+        -------
+        list(dict)
+            metric, threshold, peak value, number of samples at or above the
+            threshold and the timestamp of the first one
+        """
+        judged = self.traffic()
+        found = []
+        for (metric, threshold) in self.thresholds.items():
+            values = [self.series[metric][index] for index in judged]
+            hits = [
+                index for (index, value) in zip(judged, values) if value >= threshold
+            ]
+            if hits:
+                found.append(
+                    {
+                        "metric": metric,
+                        "threshold": threshold,
+                        "peak": max(values),
+                        "samples": len(hits),
+                        "first_seen": self.series["timestamp"][hits[0]],
+                    }
+                )
+        return found
+
+    def results(self):
+        violations = self.violations()
+        if violations:
+            logger.warning(
+                "Host saturation during the run (%s); the results are suspect",
+                ", ".join(violation["metric"] for violation in violations),
+            )
+        return {
+            "cpus": self.cpus,
+            "interval": self.interval,
+            "thresholds": self.thresholds,
+            "judged": len(self.traffic()),
+            "suspect": bool(violations),
+            "violations": violations,
+            "veth_drops": self.drops_by_interface,
+            "samples": self.series,
+        }
@@ -0,0 +1,348 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Measure RTT at 100 to 1000 probes per second with a UDP echo.
+
+NeST pings every host pair a few times a second and stores every reply as
+its own JSON object, which is both too coarse to see queue oscillations
+within an RTT and bulky. `LatencyProbe` runs one UDP echo server in every
+destination namespace and one prober in every source namespace. Each RTT
+is recorded into an HDR histogram of the time window in which the probe
+was sent, so `latency.json` keeps exact tail percentiles of every window
+in a few hundred bytes instead of every sample.
+
+    probe = LatencyProbe(rate=500)
+    probe.add_pair(h1, eth2.get_address(), h2, 0, 200)
+    with probe:
+        exp.run()
+
+Layout of `latency.json`:
+
+    {"<source node>": {"<destination address>": {
+        "meta": {"destination_node", "start_time", "stop_time", "rate",
+                 "window", "offset"},
+        "windows": [{"timestamp", "sent", "received", "lost", "min",
+                     "p50", "p90", "p99", "p999", "max", "histogram"}]}}}
+
+Start and stop times count from the launch of the flows by NeST; `offset`
+is the seconds by which second 0 of the probes came after it, if the
+probers needed longer than `delay` to start. RTTs are in milliseconds;
+`histogram` holds the counts in microseconds, see
+`HdrHistogram.from_sparse`.
+"""
+
+import argparse
+import json
+import logging
+import select
+import socket
+import struct
+import time
+
+import numpy as np
+
+from .hdr import HdrHistogram
+from .netns_tool import NamespaceTool, StopFlag, wait_for_epoch
+
+PORT = 7007
+# Target index, sequence number and send time in ns
+PROBE = struct.Struct("!IIQ")
+# Replies later than this are counted as lost
+TIMEOUT = 2.0
+NOT_SENT = -2
+LOST = -1
+PERCENTILES = (("p50", 50), ("p90", 90), ("p99", 99), ("p999", 99.9))
+
+
+def echo(port=PORT, duration=None):
+    """
+    Send every datagram received on `port` back to its sender
+
+    Parameters
+    ----------
+    port : int
+        UDP port to listen on (Default value = 7007)
+    duration : float
+        Seconds to run for (Default value = None, until killed)
+    """
+    stop_flag = StopFlag()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("0.0.0.0", port))
+    sock.settimeout(0.5)
+    end = time.monotonic() + duration if duration else float("inf")
+
+    while not stop_flag.stopped and time.monotonic() < end:
+        try:
+            (data, address) = sock.recvfrom(2048)
+        except (socket.timeout, InterruptedError):
+            continue
+        sock.sendto(data, address)
+    sock.close()
+
+
+def probe(targets, epoch, rate, window=1.0, port=PORT):
+    """
+    Probe every target at `rate` Hz between its start and stop time
+
+    Parameters
+    ----------
+    targets : list(dict)
+        {"address", "start", "stop"}
+    epoch : float
+        Wall clock time of second 0 of the experiment
+    rate : float
+        Probes per second to every target
+    window : float
+        Seconds of probes summarized by one histogram (Default value = 1.0)
+    port : int
+        Port of the echo servers (Default value = 7007)
+
+    Returns
+    -------
+    list(list(dict))
+        Windows of every target, see the module documentation
+    """
+    stop_flag = StopFlag()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+
+    period = 1.0 / rate
+    counts = [int((t["stop"] - t["start"]) * rate) for t in targets]
+    # RTT in us of every probe, or NOT_SENT or LOST
+    rtts = [np.full(count, NOT_SENT, dtype=np.int64) for count in counts]
+    sent = [0] * len(targets)
+
+    end = max(t["stop"] for t in targets)
+    while not stop_flag.stopped:
+        now = time.time() - epoch
+        if now >= end + TIMEOUT:
+            break
+
+        # Probes that are due, without catching up after a stall
+        for (index, target) in enumerate(targets):
+            due = int((min(now, target["stop"]) - target["start"]) * rate) + 1
+            due = min(due, counts[index])
+            if due > sent[index]:
+                sent[index] = due
+                sequence = due - 1
+                try:
+                    sock.sendto(
+                        PROBE.pack(index, sequence, time.monotonic_ns()),
+                        (target["address"], port),
+                    )
+                    rtts[index][sequence] = LOST
+                except BlockingIOError:
+                    pass
+
+        next_probe = min(
+            [
+                target["start"] + sent[index] * period
+                for (index, target) in enumerate(targets)
+                if sent[index] < counts[index]
+            ]
+            or [end + TIMEOUT]
+        )
+        timeout = max(0.0, min(next_probe, end + TIMEOUT) - (time.time() - epoch))
+        try:
+            readable = select.select([sock], [], [], timeout)[0]
+        except InterruptedError:
+            continue
+        while readable:
+            try:
+                data = sock.recv(64)
+            except BlockingIOError:
+                break
+            received = time.monotonic_ns()
+            (index, sequence, sent_ns) = PROBE.unpack_from(data)
+            rtt = (received - sent_ns) // 1000
+            if (
+                index < len(rtts)
+                and sequence < len(rtts[index])
+                and rtt < TIMEOUT * 10 ** 6
+            ):
+                rtts[index][sequence] = max(rtt, 1)
+
+    sock.close()
+    return [
+        _windows(target, target_rtts, rate, window, epoch)
+        for (target, target_rtts) in zip(targets, rtts)
+    ]
+
+
+def _windows(target, rtts, rate, window, epoch):
+    """Summaries and histograms of the RTTs of one target, per window"""
+    per_window = max(1, int(round(window * rate)))
+    windows = []
+    for first in range(0, len(rtts), per_window):
+        chunk = rtts[first : first + per_window]
+        chunk = chunk[chunk != NOT_SENT]
+        replies = chunk[chunk >= 0]
+        histogram = HdrHistogram()
+        histogram.record_values(replies)
+        summary = {
+            "timestamp": epoch + target["start"] + first / rate,
+            "sent": len(chunk),
+            "received": len(replies),
+            "lost": len(chunk) - len(replies),
+            "min": histogram.min / 1000 if histogram.total else None,
+        }
+        for (name, percentile) in PERCENTILES:
+            value = histogram.percentile(percentile)
+            summary[name] = value / 1000 if value is not None else None
+        summary["max"] = histogram.max / 1000 if histogram.total else None
+        summary["histogram"] = histogram.to_sparse()
+        windows.append(summary)
+    return windows
+
+
+class LatencyProbe(NamespaceTool):
+    """
+    Runs UDP echo probes between host pairs while an experiment runs
+
+    Parameters
+    ----------
+    rate : float
+        Probes per second to every destination (Default value = 100)
+    window : float
+        Seconds summarized by one histogram (Default value = 1.0)
+    delay : float
+        Least seconds between starting the processes and second 0, the
+        launch of the flows by NeST (Default value = 1.0)
+    """
+
+    name = "latency"
+
+    def __init__(self, rate=100, window=1.0, delay=1.0):
+        super().__init__(delay)
+        self.rate = rate
+        self.window = window
+        self.pairs = []
+        self.outputs = {}
+
+    def add_pair(self, source, destination_address, destination, start, stop):
+        """
+        Probe `destination_address` of `destination` from `source`
+
+        Parameters
+        ----------
+        source : Node
+            Node that sends the probes
+        destination_address : Address
+            Address of `destination` to probe
+        destination : Node
+            Node that echoes the probes
+        start : float
+            Time to start probing (in seconds)
+        stop : float
+            Time to stop probing (in seconds)
+        """
+        self.pairs.append(
+            {
+                "source": source,
+                "destination": destination,
+                "address": destination_address.get_addr(with_subnet=False),
+                "start": start,
+                "stop": stop,
+            }
+        )
+
+    def add_flows(self, flows):
+        """Probe the destination of every flow in `flows`, once per pair"""
+        seen = set()
+        for flow in flows:
+            key = (flow.source_node.id, flow.destination_node.id)
+            if key in seen:
+                continue
+            seen.add(key)
+            self.add_pair(
+                flow.source_node,
+                flow.destination_address,
+                flow.destination_node,
+                flow.start_time,
+                flow.stop_time,
+            )
+
+    def end(self):
+        return max(pair["stop"] for pair in self.pairs) + TIMEOUT
+
+    def launch(self):
+        """Start the echo servers, then one prober per source"""
+        servers = {}
+        probers = {}
+        for pair in self.pairs:
+            servers[pair["destination"].id] = pair["destination"]
+            (_, specs) = probers.setdefault(pair["source"].id, (pair["source"], []))
+            specs.append(f"{pair['address']}:{pair['start']}:{pair['stop']}")
+
+        for node in servers.values():
+            # Until NeST kills the processes in the namespaces at the end
+            self.spawn(node, ["echo"])
+        for (node, specs) in probers.values():
+            arguments = ["probe", "--rate", str(self.rate), "--window", str(self.window)]
+            for spec in specs:
+                arguments += ["--target", spec]
+            self.outputs[node.id] = self.spawn(node, arguments, f"{node.id}.json")
+
+    def results(self):
+        """Content of `latency.json`"""
+        results = {}
+        outputs = {node_id: self.read(output) for (node_id, output) in self.outputs.items()}
+        positions = {}
+        for pair in self.pairs:
+            source = pair["source"]
+            index = positions.get(source.id, 0)
+            positions[source.id] = index + 1
+            if outputs[source.id] is None:
+                continue
+            results.setdefault(source.name, {})[pair["address"]] = {
+                "meta": {
+                    "destination_node": pair["destination"].name,
+                    "start_time": pair["start"],
+                    "stop_time": pair["stop"],
+                    "rate": self.rate,
+                    "window": self.window,
+                    "offset": self.offset,
+                },
+                "windows": outputs[source.id][index],
+            }
+        return {f"{self.name}.json": results}
+
+
+def _parse_target(spec):
+    (address, start, stop) = spec.split(":")
+    return {"address": address, "start": float(start), "stop": float(stop)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("role", choices=["echo", "probe"])
+    parser.add_argument("--target", action="append", help="ADDRESS:START:STOP")
+    parser.add_argument("--output")
+    parser.add_argument("--epoch", type=float, default=None)
+    parser.add_argument("--epoch_file", default=None, help="Wait for the epoch to be written here")
+    parser.add_argument("--rate", type=float, default=100)
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--duration", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+
+    if args.role == "echo":
+        echo(args.port, args.duration)
+        return
+
+    if not args.target or not args.output:
+        parser.error("probe needs --target and --output")
+    targets = [_parse_target(spec) for spec in args.target]
+    epoch = wait_for_epoch(args.epoch, args.epoch_file)
+    if epoch is None:
+        return
+    windows = probe(targets, epoch, args.rate, args.window, args.port)
+    with open(args.output, "w") as file:
+        json.dump(windows, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Vary the bandwidth, delay and loss of links while an experiment runs.
+
+`Interface.set_attributes` fixes a link for the whole run. A `LinkSchedule`
+is a list of steps, each giving the bandwidth, delay and loss of a link
+from a point in time on. It is built from a trace file or as a square
+wave. `LinkScheduler` applies the schedules of all links of a namespace
+from one program inside that namespace. The program keeps a single
+`tc -batch` open and changes the HTB class and netem qdisc that NeST
+installed in place, so the qdisc on the link and its queue survive every
+step. Steps are written to tc at their deadline, and each late step is
+timed to the millisecond.
+
+    schedule = LinkSchedule.square_wave("5mbit", "20mbit", period=10,
+                                        duration=200, delay="10ms")
+    with LinkScheduler({etr1c: schedule}):
+        exp.run()
+
+Step times count from the launch of the flows by NeST, as the times of the
+flows do. Every step is saved in `link_schedule.json`, both as planned and
+as applied, with its wall clock time and lateness, along with any messages
+from tc, and the `epoch` and `offset` of second 0.
+
+Trace files are CSV with a header row and any of the columns `time`
+(seconds, required), `bandwidth`, `delay` and `loss`:
+
+    time,bandwidth,delay,loss
+    0,10mbit,10ms,0%
+    5.5,2mbit,40ms,1%
+    12,8,20,0
+
+Plain numbers are read as mbit, ms and percent. Values that a row leaves
+out keep their previous value.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import subprocess
+import time
+
+from .netns_tool import NamespaceTool, StopFlag, wait_for_epoch
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTES = ("bandwidth", "delay", "loss")
+UNITS = {"bandwidth": "mbit", "delay": "ms", "loss": "%"}
+# Sleep until this long before a step, then spin
+SPIN = 0.002
+
+
+def _with_unit(attribute, value):
+    value = str(value).strip()
+    try:
+        float(value)
+    except ValueError:
+        return value
+    return f"{value}{UNITS[attribute]}"
+
+
+class LinkSchedule:
+    """
+    Steps of bandwidth, delay and loss of one link
+
+    Parameters
+    ----------
+    steps : list(dict)
+        {"time", "bandwidth", "delay", "loss"}, with any of the last three
+        left out to keep their previous value
+    bandwidth : str
+        Bandwidth before the first step that sets it (Default value = None)
+    delay : str
+        Delay before the first step that sets it (Default value = None)
+    loss : str
+        Loss before the first step that sets it (Default value = '0%')
+    """
+
+    def __init__(self, steps, bandwidth=None, delay=None, loss="0%"):
+        current = {"bandwidth": bandwidth, "delay": delay, "loss": loss}
+        self.steps = []
+        for step in sorted(steps, key=lambda step: float(step["time"])):
+            for attribute in ATTRIBUTES:
+                if step.get(attribute) not in (None, ""):
+                    current[attribute] = _with_unit(attribute, step[attribute])
+            self.steps.append(dict(current, time=float(step["time"])))
+
+        for attribute in ("bandwidth", "delay"):
+            if any(step[attribute] is None for step in self.steps):
+                raise ValueError(
+                    f"The {attribute} of the link before its first step is not known"
+                )
+
+    @classmethod
+    def from_trace(cls, path, **initial):
+        """
+        Schedule from a CSV trace file, see the module documentation
+
+        Parameters
+        ----------
+        path : str
+            Trace file
+        initial : dict
+            `bandwidth`, `delay` and `loss` before the first step that sets
+            them
+        """
+        with open(path, "r") as trace:
+            rows = [
+                {key.strip(): value for (key, value) in row.items()}
+                for row in csv.DictReader(trace)
+            ]
+        return cls(rows, **initial)
+
+    @classmethod
+    def square_wave(cls, low, high, period, duration, start=0, **initial):
+        """
+        Bandwidth that switches between `high` and `low` every half period
+
+        Parameters
+        ----------
+        low : str
+            Bandwidth of the second half of every period
+        high : str
+            Bandwidth of the first half of every period
+        period : float
+            Seconds of one high and one low half
+        duration : float
+            Seconds after `start` to stop switching
+        start : float
+            Time of the first step (Default value = 0)
+        initial : dict
+            `delay` and `loss` of the link
+        """
+        steps = []
+        half = period / 2
+        count = int(duration / half)
+        for index in range(count):
+            bandwidth = high if index % 2 == 0 else low
+            steps.append({"time": start + index * half, "bandwidth": bandwidth})
+        return cls(steps, **initial)
+
+
+def _commands(device, ifb, previous, step):
+    """tc batch lines that move a link from `previous` to `step`"""
+    lines = []
+    if previous is None or previous["bandwidth"] != step["bandwidth"]:
+        for name in [device] + ([ifb] if ifb else []):
+            lines.append(
+                f"class change dev {name} parent 1: classid 1:1 htb rate {step['bandwidth']}"
+            )
+    if previous is None or (previous["delay"], previous["loss"]) != (
+        step["delay"],
+        step["loss"],
+    ):
+        # netem resets every parameter that a change leaves out
+        lines.append(
+            f"qdisc change dev {device} parent 1:1 handle 11: netem"
+            f" delay {step['delay']} loss {step['loss']}"
+        )
+    return lines
+
+
+def apply(links, epoch, errors):
+    """
+    Apply the steps of every link at their time
+
+    Parameters
+    ----------
+    links : list(dict)
+        {"device", "ifb", "steps"} of every link in this namespace
+    epoch : float
+        Wall clock time of second 0 of the experiment
+    errors : str
+        File for the messages of tc
+
+    Returns
+    -------
+    list(list(dict))
+        Applied steps of every link, with `applied` (wall clock time) and
+        `lateness` (ms)
+    """
+    stop_flag = StopFlag()
+    events = sorted(
+        (step["time"], index, step)
+        for (index, link) in enumerate(links)
+        for step in link["steps"]
+    )
+    applied = [[] for _ in links]
+    previous = [None] * len(links)
+
+    with open(errors, "w") as error_file:
+        batch = subprocess.Popen(
+            ["tc", "-force", "-batch", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=error_file,
+            text=True,
+        )
+        for (offset, index, step) in events:
+            deadline = epoch + offset
+            while not stop_flag.stopped and time.time() < deadline - SPIN:
+                time.sleep(min(0.5, deadline - SPIN - time.time()))
+            if stop_flag.stopped:
+                break
+            while time.time() < deadline:
+                pass
+
+            link = links[index]
+            lines = _commands(link["device"], link["ifb"], previous[index], step)
+            previous[index] = step
+            if lines:
+                batch.stdin.write("\n".join(lines) + "\n")
+                batch.stdin.flush()
+            now = time.time()
+            applied[index].append(
+                dict(step, applied=now, lateness=round((now - deadline) * 1000, 3))
+            )
+
+        batch.stdin.close()
+        batch.wait()
+    return applied
+
+
+class LinkScheduler(NamespaceTool):
+    """
+    Applies link schedules with one program per namespace
+
+    Parameters
+    ----------
+    schedules : dict
+        Interface -> LinkSchedule
+    delay : float
+        Least seconds between starting the programs and second 0, the
+        launch of the flows by NeST (Default value = 1.0)
+    """
+
+    name = "link_schedule"
+
+    def __init__(self, schedules, delay=1.0):
+        super().__init__(delay)
+        self.schedules = schedules
+        self.outputs = {}
+
+    def end(self):
+        return max(
+            (step["time"] for schedule in self.schedules.values() for step in schedule.steps),
+            default=0,
+        )
+
+    def launch(self):
+        """Write the plan of every namespace and start its scheduler"""
+        namespaces = {}
+        for (interface, schedule) in self.schedules.items():
+            try:
+                ifb = interface.ifb_id
+            except AttributeError:
+                # No qdisc on the link, so no IFB
+                ifb = None
+            namespaces.setdefault(interface.node_id, []).append(
+                {
+                    "device": interface.id,
+                    "ifb": ifb,
+                    "name": interface.name,
+                    "steps": schedule.steps,
+                }
+            )
+
+        for (node_id, links) in namespaces.items():
+            plan = os.path.join(self.folder, f"plan-{node_id}.json")
+            with open(plan, "w") as file:
+                json.dump(links, file)
+            self.outputs[node_id] = (
+                links,
+                self.spawn(node_id, ["apply", "--plan", plan], f"applied-{node_id}.json"),
+            )
+
+    def results(self):
+        """Content of `link_schedule.json`"""
+        results = {"epoch": self.epoch, "offset": self.offset, "links": {}}
+        names = {}
+        for interface in self.schedules:
+            names[interface.id] = interface.name
+        for (links, output) in self.outputs.values():
+            applied = self.read(output) or {"steps": [[] for _ in links], "messages": []}
+            for (link, steps) in zip(links, applied["steps"]):
+                results["links"][names[link["device"]]] = {
+                    "planned": link["steps"],
+                    "applied": steps,
+                    "messages": applied["messages"],
+                }
+        return {f"{self.name}.json": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("role", choices=["apply"])
+    parser.add_argument("--plan", required=True)
+    parser.add_argument("--epoch", type=float, default=None)
+    parser.add_argument("--epoch_file", default=None, help="Wait for the epoch to be written here")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+
+    with open(args.plan, "r") as file:
+        links = json.load(file)
+    errors = f"{args.output}.errors"
+    epoch = wait_for_epoch(args.epoch, args.epoch_file)
+    if epoch is None:
+        return
+    steps = apply(links, epoch, errors)
+    with open(errors, "r") as file:
+        messages = [line.strip() for line in file if line.strip()]
+    with open(args.output, "w") as file:
+        json.dump({"steps": steps, "messages": messages}, file)
+
+
+if __name__ == "__main__":
+    main()
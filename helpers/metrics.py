@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Throughput and latency measures shared by the scores of runs.
+
+`helpers.bufferbloat`, `helpers.sweep_report` and `helpers.tune` rank runs
+by the same measures, computed on numpy columns of the samples:
+
+* The mean rate of a flow over a window counts every sample for the time
+  since the previous sample of its flow, and the first sample for one
+  reporting interval, as flows may start well after the window. netperf
+  stops reporting a starved flow, which then counts as idle: the sum is
+  divided by the length of the window, not by the number of samples.
+* The baseline RTT of a host pair is the median of its idle RTTs, those
+  sent before the first flow started, timed from the launch of the flows
+  by NeST. Without any, it is estimated: the path RTT of the topology when
+  known, or else the smallest RTT of the pair, which is an upper bound.
+  Queueing delay is the RTT above the baseline of its pair.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def read_columns(dump, collector, value):
+    """
+    Samples of every entry of a NeST JSON file as numpy columns
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    collector : str
+        Name of the file, such as 'netperf' or 'ping'
+    value : str
+        Field of the samples, such as 'sending_rate' or 'rtt'
+
+    Returns
+    -------
+    (list, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        Entry keys (source, name, meta), and the entry number, timestamp and
+        `value` of every sample
+    """
+    path = os.path.join(dump, f"{collector}.json")
+    if not os.path.isfile(path):
+        return ([], np.zeros(0, dtype=int), np.zeros(0), np.zeros(0))
+    with open(path, "r") as file:
+        data = json.load(file)
+
+    (keys, groups, times, values) = ([], [], [], [])
+    for (source, entries) in data.items():
+        for entry in entries:
+            for (name, samples) in entry.items():
+                meta = samples[0] if samples and samples[0].get("meta") else {}
+                samples = [s for s in samples if value in s]
+                groups.append(np.full(len(samples), len(keys)))
+                times.extend(s["timestamp"] for s in samples)
+                values.extend(s[value] for s in samples)
+                keys.append((source, name, meta))
+    if not keys:
+        return ([], np.zeros(0, dtype=int), np.zeros(0), np.zeros(0))
+    return (
+        keys,
+        np.concatenate(groups).astype(int),
+        np.array(times, dtype=float),
+        np.array(values, dtype=float),
+    )
+
+
+def start_times(keys):
+    """Scheduled start of every entry of `read_columns` in seconds, 0 if not recorded"""
+    return np.array([float(meta.get("start_time", 0)) for (_, _, meta) in keys])
+
+
+# pylint: disable=too-many-arguments
+def mean_rates(entry, times, values, count, start, end, warmup=0.0):
+    """
+    Time-weighted mean rate of every entry over a window
+
+    Parameters
+    ----------
+    entry, times, values : numpy.ndarray
+        Entry number, timestamp and rate of every sample
+    count : int
+        Number of entries
+    start, end : float
+        Window of the run, as timestamps
+    warmup : float
+        Seconds after `start` that are left out (Default value = 0.0)
+
+    Returns
+    -------
+    numpy.ndarray
+        Mean rate of every entry, NaN for those without samples
+    """
+    means = np.full(count, np.nan)
+    if not len(times) or end - start - warmup <= 0:
+        return means
+    order = np.lexsort((times, entry))
+    (entry, times, values) = (entry[order], times[order], values[order])
+    first = np.concatenate(([True], entry[1:] != entry[:-1]))
+    gaps = np.diff(times)[~first[1:]]
+    interval = float(np.median(gaps)) if len(gaps) else 1.0
+    previous = np.concatenate(([start], times[:-1]))
+    previous[first] = np.maximum(times[first] - interval, start)
+    covered = np.clip(times - np.maximum(previous, start + warmup), 0, None)
+    sums = np.bincount(entry, covered * values, minlength=count)
+    reported = np.bincount(entry, minlength=count) > 0
+    means[reported] = sums[reported] / (end - start - warmup)
+    return means
+
+
+def launch(keys, group, sent):
+    """
+    Launch of the flows by NeST, as a timestamp, from when the first sample
+    of every entry was sent and the scheduled start of the entry
+
+    Parameters
+    ----------
+    keys : list
+        Entry keys of `read_columns`
+    group : numpy.ndarray
+        Entry number of every sample
+    sent : numpy.ndarray
+        Send time of every sample, such as the reply time of a ping minus
+        its RTT
+    """
+    first = np.full(len(keys), np.inf)
+    np.fmin.at(first, group, sent)
+    return float(np.min(first - start_times(keys)))
+
+
+def baselines(count, group, rtts, idle, rtt=None):
+    """
+    Baseline RTT of every host pair
+
+    Parameters
+    ----------
+    count : int
+        Number of pairs
+    group, rtts : numpy.ndarray
+        Pair number and RTT of every sample
+    idle : numpy.ndarray
+        Whether every sample was sent before the first flow started
+    rtt : float
+        Path RTT of the topology, in the unit of `rtts` (Default value =
+        None, unknown)
+
+    Returns
+    -------
+    (numpy.ndarray, list(str))
+        Baseline of every pair and where it comes from, 'idle' or
+        'estimated'
+    """
+    values = np.full(count, np.nan)
+    if rtt is None:
+        np.fmin.at(values, group, rtts)
+    else:
+        values[:] = rtt
+    sources = ["estimated"] * count
+    for pair in np.unique(group[idle]):
+        values[pair] = np.median(rtts[idle & (group == pair)])
+        sources[pair] = "idle"
+    return (values, sources)
+
+
+def ping_baselines(pairs, group, times, rtts, flows, rtt=None):
+    """
+    `baselines` of the pairs of `ping.json`, whose pings are idle when they
+    were sent before the earliest scheduled start of `flows`
+
+    Parameters
+    ----------
+    pairs : list
+        Entry keys of the pings, from `read_columns`
+    group, times, rtts : numpy.ndarray
+        Pair number, reply time and RTT in ms of every ping
+    flows : list
+        Entry keys of the flows, from `read_columns`
+    rtt : float
+        See `baselines` (Default value = None)
+    """
+    sent = times - rtts / 1000
+    first_flow = start_times(flows).min() if flows else np.inf
+    idle = sent < launch(pairs, group, sent) + first_flow
+    return baselines(len(pairs), group, rtts, idle, rtt)
@@ -0,0 +1,230 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Base class for helpers that run their own programs inside the namespaces.
+
+Traffic generators and probes that NeST does not know about are started as
+`python3 -m helpers.<module> <role> ...` through `ip netns exec`, write
+their results to a temporary file and exit at the end of the experiment.
+All processes share one `epoch`, the wall clock time of second 0, so that
+their start and stop times line up with each other and with the flows of
+the experiment. The programs start when the tool is entered, so that
+servers listen before any client starts, and wait for the epoch: the time
+at which NeST launches its flows, written to a file once it is known, as
+the setup of the runners between the two can take many seconds.
+
+This module does not import NeST, so the programs started in the
+namespaces do not pay for importing it.
+"""
+
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from .profiler import span
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EPOCH = "epoch"
+
+
+class StopFlag:
+    """
+    Set when the process is asked to stop
+
+    NeST kills every process in the namespaces once the experiment is over;
+    programs check this flag to write their results instead of dying.
+    """
+
+    def __init__(self):
+        self.stopped = False
+        signal.signal(signal.SIGTERM, self._set)
+        signal.signal(signal.SIGINT, self._set)
+
+    def _set(self, *_):
+        self.stopped = True
+
+
+def wait_for_epoch(epoch, epoch_file, poll=0.01):
+    """
+    Second 0 of a program: `epoch`, else the time written to `epoch_file`
+    once NeST launches the flows, else now
+
+    Returns
+    -------
+    float
+        The epoch, or None if the program was stopped while waiting
+    """
+    if epoch or not epoch_file:
+        return epoch or time.time()
+    stop_flag = StopFlag()
+    while not stop_flag.stopped:
+        try:
+            with open(epoch_file, "r") as file:
+                return float(file.read())
+        except (OSError, ValueError):
+            time.sleep(poll)
+    return None
+
+
+class NamespaceTool:
+    """
+    Starts programs in namespaces around `exp.run()` and collects their output
+
+    Use it as a context manager around `exp.run()`. Subclasses set `name`,
+    start their programs with `spawn()` in `launch()`, return the last
+    second of the experiment they use from `end()`, and return the files to
+    write into the dump from `results()`.
+
+    Second 0 is the launch of the flows by NeST, or `delay` seconds after
+    the programs were started if that is later; `offset` is then the
+    difference.
+
+    Parameters
+    ----------
+    delay : float
+        Least seconds between starting the programs and second 0, so that
+        servers are listening before clients start (Default value = 1.0)
+    """
+
+    name = ""
+
+    def __init__(self, delay=1.0):
+        self.delay = delay
+        self.processes = []
+        self.folder = None
+        self.started = None
+        self.epoch = None
+        self.offset = None
+
+    def launch(self):
+        """Start the programs with `spawn()`"""
+        raise NotImplementedError
+
+    def end(self):
+        """Second of the experiment by which every program has finished"""
+        raise NotImplementedError
+
+    def results(self):
+        """Files to write into the dump, as {file name: JSON content}"""
+        raise NotImplementedError
+
+    def spawn(self, node, arguments, output=None):
+        """
+        Run this module with `arguments` in the namespace of `node`
+
+        Parameters
+        ----------
+        node : Node or str
+            Node to run in, or its namespace id
+        arguments : list(str)
+            Command line arguments, starting with the role
+        output : str
+            Name of a file in the temporary folder for the results of the
+            program, passed as `--output` (Default value = None)
+
+        Returns
+        -------
+        str
+            Path of `output`, if given
+        """
+        module = type(self).__module__
+        ns_id = getattr(node, "id", node)
+        command = ["ip", "netns", "exec", ns_id, sys.executable, "-m", module]
+        command += arguments + ["--epoch_file", os.path.join(self.folder, EPOCH)]
+        if output:
+            output = os.path.join(self.folder, output)
+            command += ["--output", output]
+        self.processes.append(
+            (node, arguments[0], output, subprocess.Popen(command, cwd=ROOT))
+        )
+        return output
+
+    def read(self, output):
+        """Results written by a program to `output`, or None"""
+        try:
+            with open(output, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError, TypeError):
+            logger.warning("%s: no results in %s", self.name, output)
+            return None
+
+    def _launched(self, _workers):
+        """Tell the programs the epoch, at the launch of the flows"""
+        launched = time.time()
+        self.epoch = max(launched, self.started + self.delay)
+        self.offset = round(self.epoch - launched, 3)
+        if self.offset:
+            logger.warning(
+                "%s: second 0 is %.2f s after the launch of the flows", self.name, self.offset
+            )
+        path = os.path.join(self.folder, EPOCH)
+        with open(f"{path}.tmp", "w") as file:
+            file.write(repr(self.epoch))
+        os.replace(f"{path}.tmp", path)
+
+    def start(self):
+        """Start every program"""
+        # Imported here so that the programs in the namespaces do not load NeST
+        from .collector import add_launch_callback  # pylint: disable=import-outside-toplevel
+
+        self.folder = tempfile.mkdtemp(prefix=f"{self.name}-")
+        self.started = time.time()
+        self.epoch = None
+        add_launch_callback(self._launched)
+        self.launch()
+
+    def stop(self):
+        """Wait for every program to finish, killing those that do not"""
+        from .collector import remove_launch_callback  # pylint: disable=import-outside-toplevel
+
+        remove_launch_callback(self._launched)
+        for (node, role, _, process) in self.processes:
+            if self.epoch is None:
+                # The flows were never launched, and the programs still wait
+                process.terminate()
+                timeout = 5.0
+            else:
+                timeout = max(5.0, self.epoch + self.end() + 5 - time.time())
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(
+                    "%s: %s in %s did not stop",
+                    self.name,
+                    role,
+                    getattr(node, "name", node),
+                )
+                process.terminate()
+                process.wait()
+
+    def write(self):
+        """Write `results()` into the dump folder of the experiment"""
+        # Imported here so that the programs in the namespaces do not load NeST
+        from nest.experiment.pack import Pack  # pylint: disable=import-outside-toplevel
+
+        if not Pack.FOLDER or not os.path.isdir(Pack.FOLDER):
+            logger.warning("%s: no dump folder to write the results to", self.name)
+            return
+        for (filename, content) in self.results().items():
+            Pack.dump_file(filename, json.dumps(content, indent=4))
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def __enter__(self):
+        with span(f"{self.name} start", "collector"):
+            self.start()
+        return self
+
+    def __exit__(self, *args):
+        with span(f"{self.name} stop", "collector"):
+            self.stop()
+        with span(f"{self.name} write", "collector"):
+            self.write()
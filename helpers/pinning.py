@@ -0,0 +1,287 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Pin traffic generators and stats collectors to dedicated CPU cores.
+
+NeST starts netperf, iperf3, ss and ping inside the namespaces of the
+experiment and leaves their placement to the scheduler, so they move across
+cores and compete with the softirq work of the veth pairs. `CpuPinner`
+plans a core set for every namespace from the number of streams it handles
+and, optionally, steers receive packet processing (RPS) of all veths to
+separate cores.
+
+Every runner of NeST is a process of its own that starts its tool, and
+ss and ping again and again, inside a namespace. The runners are pinned to
+the set of their namespace before they start, so every process they spawn
+inherits it, however short-lived. The servers that NeST starts before the
+traffic, `netserver` and `iperf3 -s`, are found and pinned by a scan of
+`/proc`.
+
+The plan and the placement of every runner and server are written to
+`pinning.json` in the dump.
+"""
+
+import functools
+import logging
+import os
+import subprocess
+
+from nest.topology_map import TopologyMap
+
+from .collector import BackgroundCollector, namespace_inode
+
+logger = logging.getLogger(__name__)
+
+# Started by NeST outside the runners; iperf3 clients match too, and are
+# pinned to the set they inherited
+SERVERS = ("netserver", "iperf3")
+# Runners of NeST and the role of their tool
+RUNNERS = {
+    "NetperfRunner": "generators",
+    "Iperf3Runner": "generators",
+    "SsRunner": "collectors",
+    "PingRunner": "collectors",
+    "TcRunner": "collectors",
+}
+
+
+def flow_demands(exp):
+    """
+    Weight of every namespace, from the flows of `exp`
+
+    Sources run the clients and the ss and ping collectors, destinations
+    run the servers.
+
+    Returns
+    -------
+    dict
+        namespace id -> weight
+    """
+    demands = {}
+    for flow in exp.flows:
+        source = flow.source_node.id
+        destination = flow.destination_node.id
+        # One unit for the collectors of the source
+        demands[source] = demands.get(source, 1) + flow.number_of_streams
+        demands[destination] = demands.get(destination, 0) + flow.number_of_streams
+    return demands
+
+
+def plan_layout(demands, cpus=None, rps=False, softirq_share=0.25):
+    """
+    Split the CPUs between namespaces in proportion to their demand
+
+    The first CPU is left for the experiment itself (NeST, `ip`, `tc`).
+    With `rps`, a share of the rest is set aside for softirq processing.
+    A namespace with two or more cores keeps one of them for collectors.
+    When there are fewer cores than namespaces, namespaces share cores.
+
+    Parameters
+    ----------
+    demands : dict
+        namespace id -> weight, see `flow_demands`
+    cpus : list(int)
+        CPUs to plan for (Default value = None, all usable CPUs)
+    rps : bool
+        Set aside cores for softirq processing (Default value = False)
+    softirq_share : float
+        Share of the cores set aside for softirq (Default value = 0.25)
+
+    Returns
+    -------
+    dict
+        {"housekeeping": [...], "softirq": [...],
+         "namespaces": {ns id: {"generators": [...], "collectors": [...]}}}
+    """
+    cpus = sorted(cpus or os.sched_getaffinity(0))
+    housekeeping = cpus[:1]
+    rest = cpus[1:] or cpus
+
+    softirq = []
+    if rps and len(rest) > 1:
+        count = max(1, int(round(len(rest) * softirq_share)))
+        (softirq, rest) = (rest[:count], rest[count:])
+
+    namespaces = sorted(demands, key=lambda ns: (-demands[ns], ns))
+    shares = {}
+
+    if len(rest) < len(namespaces):
+        for (index, ns) in enumerate(namespaces):
+            shares[ns] = [rest[index % len(rest)]]
+    else:
+        # One core each, then the spare cores by largest remainder
+        total = sum(demands.values())
+        spare = len(rest) - len(namespaces)
+        exact = {ns: spare * demands[ns] / total for ns in namespaces}
+        counts = {ns: 1 + int(exact[ns]) for ns in namespaces}
+        leftover = len(rest) - sum(counts.values())
+        for ns in sorted(namespaces, key=lambda ns: int(exact[ns]) - exact[ns])[
+            :leftover
+        ]:
+            counts[ns] += 1
+
+        position = 0
+        for ns in namespaces:
+            shares[ns] = rest[position : position + counts[ns]]
+            position += counts[ns]
+
+    layout = {}
+    for (ns, share) in shares.items():
+        if len(share) > 1:
+            layout[ns] = {"generators": share[:-1], "collectors": share[-1:]}
+        else:
+            layout[ns] = {"generators": share, "collectors": share}
+
+    return {"housekeeping": housekeeping, "softirq": softirq, "namespaces": layout}
+
+
+def _run_pinned(cpus, target):
+    """Run `target` pinned to `cpus`, in the process of a runner"""
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as err:
+        logger.warning("Could not pin a runner to %s: %s", cpus, err)
+    target()
+
+
+def cpu_mask(cpus):
+    """Hexadecimal CPU mask, as used in `rps_cpus`"""
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    return format(mask, "x")
+
+
+class CpuPinner(BackgroundCollector):
+    """
+    Pins the processes of every namespace while an experiment runs
+
+        with CpuPinner(exp, rps=True):
+            exp.run()
+
+    Parameters
+    ----------
+    exp : Experiment
+        Experiment whose flows decide the plan
+    rps : bool
+        Steer receive processing of all veths to dedicated cores
+        (Default value = False)
+    cpus : list(int)
+        CPUs to use (Default value = None, all usable CPUs)
+    interval : float
+        Seconds between two scans for new servers (Default value = 1.0)
+    """
+
+    name = "pinning"
+
+    def __init__(self, exp, rps=False, cpus=None, interval=1.0):
+        super().__init__(interval)
+        self.rps = rps
+        self.plan = plan_layout(flow_demands(exp), cpus, rps)
+        self.names = {ns["id"]: ns["name"] for ns in TopologyMap.get_namespaces()}
+        self.inodes = {}
+        self.seen = set()
+        self.processes = []
+
+    def setup(self):
+        for ns_id in self.plan["namespaces"]:
+            self.inodes[namespace_inode(ns_id)] = ns_id
+
+        if self.rps and self.plan["softirq"]:
+            self._steer_rps(cpu_mask(self.plan["softirq"]))
+
+    def launch(self, workers):
+        for worker in workers:
+            # `Process(target=runner.run)`; the progress bar has no runner
+            # pylint: disable=protected-access
+            runner = getattr(worker._target, "__self__", None)
+            role = RUNNERS.get(type(runner).__name__)
+            if role is None or runner.ns_id not in self.plan["namespaces"]:
+                continue
+            cpus = self.plan["namespaces"][runner.ns_id][role]
+            worker._target = functools.partial(_run_pinned, cpus, worker._target)
+            self.processes.append(
+                {
+                    "runner": type(runner).__name__,
+                    "node": self.names.get(runner.ns_id, runner.ns_id),
+                    "role": role,
+                    "cpus": cpus,
+                }
+            )
+
+    def _steer_rps(self, mask):
+        """Write `mask` to `rps_cpus` of every interface in every namespace"""
+        for namespace in TopologyMap.get_namespaces():
+            # `ip netns exec` mounts the sysfs of the namespace
+            commands = "; ".join(
+                f"echo {mask} > /sys/class/net/{interface['id']}/queues/rx-0/rps_cpus"
+                for interface in namespace["interfaces"]
+            )
+            if not commands:
+                continue
+            status = subprocess.run(
+                ["ip", "netns", "exec", namespace["id"], "sh", "-c", commands],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=False,
+            )
+            if status.returncode != 0:
+                logger.warning(
+                    "RPS steering failed in %s: %s",
+                    namespace["name"],
+                    status.stderr.decode().strip(),
+                )
+
+    def sample(self):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit() or entry in self.seen:
+                continue
+            try:
+                # A single stat for processes outside the experiment
+                ns_id = self.inodes.get(os.stat(f"/proc/{entry}/ns/net").st_ino)
+                if ns_id is None:
+                    continue
+                with open(f"/proc/{entry}/comm", "r") as comm_file:
+                    comm = comm_file.read().strip()
+            except OSError:
+                # Exited between listdir and stat
+                continue
+
+            if comm == "ip":
+                # `ip netns exec` before it execs the tool; look again later
+                continue
+            self.seen.add(entry)
+            if comm not in SERVERS:
+                # Spawned by a runner, and pinned with it
+                continue
+
+            role = "generators"
+            cpus = self.plan["namespaces"][ns_id][role]
+            try:
+                os.sched_setaffinity(int(entry), cpus)
+            except OSError as err:
+                logger.warning("Could not pin %s (%s) to %s: %s", comm, entry, cpus, err)
+                continue
+
+            self.processes.append(
+                {
+                    "pid": int(entry),
+                    "command": comm,
+                    "node": self.names.get(ns_id, ns_id),
+                    "role": role,
+                    "cpus": cpus,
+                }
+            )
+
+    def results(self):
+        return {
+            "housekeeping": self.plan["housekeeping"],
+            "softirq": self.plan["softirq"],
+            "rps": self.rps,
+            "namespaces": {
+                self.names.get(ns_id, ns_id): layout
+                for (ns_id, layout) in self.plan["namespaces"].items()
+            },
+            "processes": self.processes,
+        }
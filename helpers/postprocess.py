@@ -0,0 +1,369 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Parse and plot the results of runs in a background worker.
+
+`exp.run()` parses the output of every tool, writes the JSON files and
+plots every graph before it returns, while the namespaces of the run still
+exist and the next run of a sweep waits. With a post-processing queue, the
+run stops as soon as the traffic does: the raw output of every tool and
+what is needed to parse it are saved as a job in the queue, the program
+exits and its namespaces are deleted. A worker parses, writes and plots
+the jobs into their dump folders, in the same way as NeST would have, and
+then calls the hooks of the job, such as the bufferbloat score:
+
+    run_with_collectors(exp, collectors, queue="/srv/postprocess",
+                        after=[functools.partial(score_dump, catalog="catalog.jsonl")])
+
+The queue is a directory:
+
+    queue/
+        pending/<job>/      waiting for a worker
+        running/<job>/      claimed by a worker
+        done/<job>/         parsed and plotted
+        failed/<job>/       with the output of the worker in `log`
+
+A job holds `job.pickle` (runners, topology map and hooks) and the raw
+output of every tool in `raw/`. Jobs are claimed by renaming them, so any
+number of workers can share a queue. A worker touches the `claim` file of
+its jobs on every poll; a job whose claim is older than `--timeout`
+seconds belongs to a dead worker and is put back into `pending/` by the
+next worker that notices. The raw output of a finished job is deleted
+unless `--keep` is given.
+
+Usage (as root, from the repository root):
+
+    sudo python3 rrul_var_up/rrul_var_up.py --postprocess /srv/postprocess
+    sudo python3 -m helpers.postprocess worker /srv/postprocess --capacity 2
+"""
+
+import argparse
+import logging
+import os
+import pickle
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from nest import config
+from nest.clean_up import kill_processes
+from nest.experiment import run_exp
+from nest.experiment.pack import Pack
+from nest.topology_map import TopologyMap
+
+logger = logging.getLogger(__name__)
+
+STATES = ("incoming", "pending", "running", "done", "failed")
+TOOLS = ("netperf", "ss", "tc", "iperf3", "ping")
+# State of `TopologyMap` that the parsers look names up in
+TOPOLOGY_STATE = ("topology_map", "namespaces_pointer", "orphan_interfaces")
+
+
+@contextmanager
+def _deferred(captured):
+    """
+    Stop `run_experiment` after the traffic, keeping its runners
+
+    The parsers, JSON output and plotters of NeST are replaced by stubs for
+    the duration of the block; the processes in the namespaces are still
+    killed at the end of the run.
+    """
+    saved = {
+        name: getattr(run_exp, name)
+        for name in ("setup_parser_workers", "dump_json_ouputs", "setup_plotter_workers", "cleanup")
+    }
+
+    def capture(exp_runners):
+        captured.update(exp_runners._asdict())
+        return []
+
+    run_exp.setup_parser_workers = capture
+    run_exp.dump_json_ouputs = lambda: None
+    run_exp.setup_plotter_workers = lambda: []
+    run_exp.cleanup = kill_processes
+    try:
+        yield
+    finally:
+        for (name, function) in saved.items():
+            setattr(run_exp, name, function)
+
+
+def _runner_state(runner):
+    """Picklable state of a runner, without its temporary files"""
+    state = {k: v for (k, v) in vars(runner).items() if k not in ("out", "err")}
+    return (type(runner), state)
+
+
+def run_deferred(exp, queue, after=(), collectors=()):
+    """
+    Run `exp` and queue its post-processing instead of doing it
+
+    Parameters
+    ----------
+    exp : Experiment
+        Experiment to run
+    queue : str
+        Post-processing queue directory
+    after : list(callable)
+        Picklable functions called with the dump folder once the results
+        are written, such as `functools.partial` of a module function
+        (Default value = ())
+    collectors : list(BackgroundCollector)
+        Collectors started before and stopped after the experiment; their
+        results are written before the job is queued (Default value = ())
+
+    Returns
+    -------
+    str
+        Id of the job
+    """
+    captured = {}
+    with ExitStack() as stack:
+        for collector in collectors:
+            stack.enter_context(collector)
+        with _deferred(captured):
+            exp.run()
+
+    job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+    for state in STATES:
+        os.makedirs(os.path.join(queue, state), exist_ok=True)
+    incoming = os.path.join(queue, "incoming", job_id)
+    os.makedirs(os.path.join(incoming, "raw"))
+
+    runners = {}
+    for tool in TOOLS:
+        runners[tool] = []
+        for runner in captured.get(tool, []):
+            raw = f"{tool}-{len(runners[tool])}.out"
+            runner.out.seek(0)
+            with open(os.path.join(incoming, "raw", raw), "wb") as file:
+                shutil.copyfileobj(runner.out, file)
+            runners[tool].append((raw,) + _runner_state(runner))
+
+    job = {
+        "id": job_id,
+        "experiment": exp.name,
+        "dump": os.path.abspath(Pack.FOLDER),
+        "runners": runners,
+        "topology": {name: getattr(TopologyMap, name) for name in TOPOLOGY_STATE},
+        "plot": config.get_value("plot_results"),
+        "after": list(after),
+        "queued": time.time(),
+    }
+    with open(os.path.join(incoming, "job.pickle"), "wb") as file:
+        pickle.dump(job, file)
+    # Complete jobs only ever appear in pending/
+    os.rename(incoming, os.path.join(queue, "pending", job_id))
+    logger.info("Queued the post-processing of %s as %s", job["dump"], job_id)
+    return job_id
+
+
+def process(job_dir):
+    """
+    Parse, write and plot the results of the job in `job_dir`
+
+    Runs in a process of its own, as the results of NeST are global.
+    """
+    with open(os.path.join(job_dir, "job.pickle"), "rb") as file:
+        job = pickle.load(file)
+
+    for (name, value) in job["topology"].items():
+        setattr(TopologyMap, name, value)
+    Pack.FOLDER = job["dump"]
+
+    runners = {}
+    for (tool, entries) in job["runners"].items():
+        runners[tool] = []
+        for (raw, cls, state) in entries:
+            runner = cls.__new__(cls)
+            runner.__dict__.update(state)
+            # pylint: disable=consider-using-with
+            runner.out = open(os.path.join(job_dir, "raw", raw), "rb")
+            runner.err = tempfile.TemporaryFile()
+            runners[tool].append(runner)
+    exp_runners = types.SimpleNamespace(**runners)
+
+    run_exp.run_workers(run_exp.setup_parser_workers(exp_runners))
+    run_exp.dump_json_ouputs()
+    if job["plot"]:
+        run_exp.run_workers(run_exp.setup_plotter_workers())
+    for hook in job["after"]:
+        hook(job["dump"])
+
+
+class Worker:
+    """
+    Post-processes the jobs of a queue, at most `capacity` at a time
+
+    Parameters
+    ----------
+    queue : str
+        Post-processing queue directory
+    capacity : int
+        Maximum number of concurrent jobs (Default value = 1)
+    poll : float
+        Seconds between checks for new jobs (Default value = 2)
+    keep : bool
+        Keep the raw output of finished jobs (Default value = False)
+    timeout : float
+        Age of the claim of a running job after which its worker is
+        considered dead (Default value = 60)
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, queue, capacity=1, poll=2, keep=False, timeout=60):
+        self.queue = os.path.abspath(queue)
+        self.capacity = capacity
+        self.poll = poll
+        self.keep = keep
+        self.timeout = timeout
+        self.active = {}  # job id -> Popen
+        for state in STATES:
+            os.makedirs(os.path.join(self.queue, state), exist_ok=True)
+
+    def _dir(self, *parts):
+        return os.path.join(self.queue, *parts)
+
+    def _claim(self):
+        for job_id in sorted(os.listdir(self._dir("pending"))):
+            try:
+                os.rename(self._dir("pending", job_id), self._dir("running", job_id))
+            except (FileNotFoundError, OSError):
+                # Another worker renamed it first
+                continue
+            self._touch(job_id)
+            return job_id
+        return None
+
+    def _touch(self, job_id):
+        with open(self._dir("running", job_id, "claim"), "w") as file:
+            file.write(f"{socket.gethostname()} {os.getpid()}\n")
+
+    def recover(self):
+        """
+        Put the jobs of dead workers back into `pending/`
+
+        A job is abandoned when its claim has not been touched for
+        `timeout` seconds; a job renamed into `running/` whose claim is not
+        written yet is aged by the change time of its directory.
+
+        Returns
+        -------
+        int
+            Number of jobs recovered
+        """
+        recovered = 0
+        now = time.time()
+        for job_id in os.listdir(self._dir("running")):
+            if job_id in self.active:
+                continue
+            try:
+                stat = os.stat(self._dir("running", job_id, "claim"))
+                age = now - stat.st_mtime
+            except FileNotFoundError:
+                try:
+                    stat = os.stat(self._dir("running", job_id))
+                except FileNotFoundError:
+                    continue
+                age = now - max(stat.st_mtime, stat.st_ctime)
+            if age < self.timeout:
+                continue
+            try:
+                # A fresh claim is written by the next worker
+                os.remove(self._dir("running", job_id, "claim"))
+            except FileNotFoundError:
+                pass
+            try:
+                os.rename(self._dir("running", job_id), self._dir("pending", job_id))
+            except OSError:
+                # Finished, or recovered by another worker first
+                continue
+            logger.warning("Recovered %s, abandoned by a dead worker", job_id)
+            recovered += 1
+        return recovered
+
+    def _start(self, job_id):
+        # pylint: disable=consider-using-with
+        log = open(self._dir("running", job_id, "log"), "a")
+        process_ = subprocess.Popen(
+            [sys.executable, "-m", "helpers.postprocess", "process", self._dir("running", job_id)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        log.close()
+        self.active[job_id] = process_
+        logger.info("Post-processing %s", job_id)
+
+    def _reap(self):
+        for (job_id, process_) in list(self.active.items()):
+            returncode = process_.poll()
+            if returncode is None:
+                continue
+            del self.active[job_id]
+            state = "done" if returncode == 0 else "failed"
+            if state == "done" and not self.keep:
+                shutil.rmtree(self._dir("running", job_id, "raw"), ignore_errors=True)
+            os.rename(self._dir("running", job_id), self._dir(state, job_id))
+            logger.info("Post-processed %s: %s", job_id, state)
+
+    def run(self, once=False):
+        """
+        Post-process jobs until interrupted
+
+        Parameters
+        ----------
+        once : bool
+            Exit when the queue is empty and all jobs are finished
+            (Default value = False)
+        """
+        try:
+            while True:
+                self._reap()
+                for job_id in self.active:
+                    self._touch(job_id)
+                self.recover()
+                while len(self.active) < self.capacity:
+                    job_id = self._claim()
+                    if job_id is None:
+                        break
+                    self._start(job_id)
+                if once and not self.active:
+                    return
+                time.sleep(self.poll)
+        except KeyboardInterrupt:
+            logger.warning("Post-processing worker interrupted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Post-process the jobs of a queue")
+    worker.add_argument("queue")
+    worker.add_argument("--capacity", type=int, default=1, help="Concurrent jobs")
+    worker.add_argument("--poll", type=float, default=2)
+    worker.add_argument("--once", action="store_true", help="Exit when idle")
+    worker.add_argument("--keep", action="store_true", help="Keep the raw output of done jobs")
+    worker.add_argument("--timeout", type=float, default=60, help="Seconds after which a claim is stale")
+
+    single = commands.add_parser("process", help="Post-process one job directory")
+    single.add_argument("job_dir")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    if args.command == "worker":
+        Worker(args.queue, args.capacity, args.poll, args.keep, args.timeout).run(args.once)
+    else:
+        process(args.job_dir)
+
+
+if __name__ == "__main__":
+    main()
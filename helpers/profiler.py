@@ -0,0 +1,409 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Time every phase of a run and every command it spawns, into `profile.json`.
+
+Past the traffic itself, the wall clock of a run goes to creating the
+namespaces, connecting and addressing them, setting up links and routes,
+starting and stopping the generators and collectors, parsing and plotting.
+`install` wraps the functions of NeST that do these, and the `Popen` through
+which NeST runs `ip`, `tc`, `sysctl`, `netperf`, `iperf3`, `ss` and `ping`,
+so that each call is recorded as a span with its start and duration. The
+spans of the processes that NeST forks for the traffic, parsers and
+plotters are recorded as well. Like `startup.defer_imports`, it must be
+called before NeST is imported, as `helpers/example.py` does for the
+example programs run with `--profile`:
+
+    from helpers import profiler, startup
+    startup.defer_imports()
+    profiler.install()
+
+    from nest.topology import *
+    ...
+    exp.run()
+    startup.report()
+    profiler.save()
+
+`save` writes `profile.json` into the dump: the startup phases (see
+`helpers/startup.py`), count, total and longest duration per function and
+per command, and every span. Helpers add spans of their own with `span`,
+as the collectors do around their start, stop and write. The spans export
+to the Chrome trace event format, for `chrome://tracing` or Perfetto, with
+`save(trace=True)` or afterwards:
+
+    python3 -m helpers.profiler show "tcp_4_smackdown(...)_dump"
+    python3 -m helpers.profiler trace "tcp_4_smackdown(...)_dump"
+
+This module does not import NeST until `install`, so that
+`helpers/netns_tool.py`, which the programs started in the namespaces
+import, can use `span` without importing NeST.
+"""
+
+import argparse
+import atexit
+import functools
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE = "profile.json"
+TRACE = "trace.json"
+# (module, class or None, function, category) of NeST that are timed
+NEST_FUNCTIONS = (
+    ("nest.topology.node", "Node", "__init__", "topology"),
+    ("nest.topology.node", "Node", "add_route", "topology"),
+    ("nest.topology.node", "Node", "configure_tcp_param", "topology"),
+    ("nest.topology.node", "Node", "enable_ip_forwarding", "topology"),
+    ("nest.topology.interface", None, "connect", "topology"),
+    ("nest.topology.interface", "Interface", "set_address", "topology"),
+    ("nest.topology.interface", "Interface", "set_attributes", "topology"),
+    ("nest.topology.interface", "Interface", "set_qdisc", "topology"),
+    ("nest.topology.address_helper", "AddressHelper", "assign_addresses", "topology"),
+    ("nest.experiment.run_exp", None, "get_dependency_status", "experiment"),
+    ("nest.experiment.run_exp", None, "dump_json_ouputs", "experiment"),
+    ("nest.experiment.run_exp", None, "cleanup", "experiment"),
+)
+# Setup function of NeST -> name of the `run_workers` call that follows it
+WORKER_PHASES = {
+    "setup_flow_workers": "traffic",
+    "setup_parser_workers": "parse",
+    "setup_plotter_workers": "plot",
+}
+# Modules that import a timed function by name, and so need it replaced too
+REEXPORTS = {"connect": ("nest.topology",), "run_experiment": ("nest.experiment.experiment",)}
+
+_folder = None  # Directory of the per-process span files, once installed
+_file = (None, None)  # (pid, fd) of the span file of this process
+_origin = time.perf_counter()
+
+
+def _record(name, category, start, end, args=None):
+    global _file  # pylint: disable=global-statement
+    if _folder is None:
+        return
+    (pid, fd) = _file
+    if pid != os.getpid():
+        # First span of this process, or of a process forked from it
+        pid = os.getpid()
+        fd = os.open(
+            os.path.join(_folder, f"{pid}.jsonl"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        _file = (pid, fd)
+    event = {
+        "name": name,
+        "cat": category,
+        "ts": round((start - _origin) * 1e6, 1),
+        "dur": round((end - start) * 1e6, 1),
+        "pid": pid,
+        "tid": threading.get_native_id(),
+    }
+    if args:
+        event["args"] = args
+    os.write(fd, (json.dumps(event) + "\n").encode())
+
+
+@contextmanager
+def span(name, category="helpers", **args):
+    """
+    Record the block as a span, if the profiler is installed
+
+    Parameters
+    ----------
+    name : str
+        Name of the span
+    category : str
+        Category of the span (Default value = 'helpers')
+    **args
+        Details shown with the span in a trace
+    """
+    if _folder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, category, start, time.perf_counter(), args)
+
+
+def _timed(function, name, category):
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        with span(name, category):
+            return function(*args, **kwargs)
+
+    timed.__profiled__ = True
+    return timed
+
+
+def _command(argv):
+    """Name of a command line as '<tool> [<object>]' and its namespace"""
+    if isinstance(argv, str):
+        argv = shlex.split(argv)
+    argv = [str(arg) for arg in argv]
+    namespace = None
+    if argv[:3] == ["ip", "netns", "exec"] and len(argv) > 4:
+        (namespace, argv) = (argv[3], argv[4:])
+    tool = os.path.basename(argv[0]) if argv else "?"
+    if tool in ("ip", "tc"):
+        objects = [arg for arg in argv[1:] if not arg.startswith("-")]
+        if objects:
+            tool = f"{tool} {objects[0]}"
+    return (tool, namespace)
+
+
+class _Popen(subprocess.Popen):
+    """`Popen` that records the command as a span when it is left"""
+
+    def __init__(self, args, *rest, **kwargs):
+        self._profile = (args, time.perf_counter())
+        super().__init__(args, *rest, **kwargs)
+
+    def __exit__(self, *exc):
+        try:
+            return super().__exit__(*exc)
+        finally:
+            (argv, start) = self._profile
+            (tool, namespace) = _command(argv)
+            details = {"cmd": argv if isinstance(argv, str) else " ".join(map(str, argv))}
+            if namespace:
+                details["ns"] = namespace
+            details["returncode"] = self.returncode
+            _record(tool, "command", start, time.perf_counter(), details)
+
+
+def _patch_workers(run_exp):
+    """Name every `run_workers` call after the setup function before it"""
+    pending = {"phase": "workers"}
+    for (setup, phase) in WORKER_PHASES.items():
+        function = getattr(run_exp, setup)
+        if getattr(function, "__profiled__", False):
+            continue
+
+        def setup_workers(*args, _function=function, _phase=phase, **kwargs):
+            pending["phase"] = _phase
+            with span(f"{_phase} setup", "experiment"):
+                return _function(*args, **kwargs)
+
+        setup_workers.__profiled__ = True
+        setattr(run_exp, setup, setup_workers)
+
+    run_workers = run_exp.run_workers
+    if not getattr(run_workers, "__profiled__", False):
+
+        def timed_run_workers(workers):
+            if not workers:
+                return run_workers(workers)
+            with span(pending["phase"], "experiment", workers=len(workers)):
+                return run_workers(workers)
+
+        timed_run_workers.__profiled__ = True
+        run_exp.run_workers = timed_run_workers
+
+
+def install():
+    """
+    Start recording the spans of NeST and of `span`, in this process and
+    in the processes it forks
+
+    Returns
+    -------
+    str
+        Directory the spans are recorded in until `save`
+    """
+    global _folder  # pylint: disable=global-statement
+    if _folder is not None:
+        return _folder
+    # pylint: disable=import-outside-toplevel
+    import importlib
+
+    _folder = tempfile.mkdtemp(prefix="nest-profile-")
+    # Left behind by a run that fails before `save`
+    atexit.register(shutil.rmtree, _folder, ignore_errors=True)
+    for (module_name, class_name, function_name, category) in NEST_FUNCTIONS:
+        module = importlib.import_module(module_name)
+        owner = getattr(module, class_name) if class_name else module
+        original = owner.__dict__[function_name]
+        if getattr(getattr(original, "__func__", original), "__profiled__", False):
+            continue
+        name = f"{class_name}.{function_name}" if class_name else function_name
+        if isinstance(original, staticmethod):
+            setattr(owner, function_name, staticmethod(_timed(original.__func__, name, category)))
+        else:
+            timed = _timed(original, name, category)
+            setattr(owner, function_name, timed)
+            for reexport in REEXPORTS.get(function_name, ()):
+                setattr(importlib.import_module(reexport), function_name, timed)
+
+    run_exp = importlib.import_module("nest.experiment.run_exp")
+    timed = _timed(run_exp.run_experiment, "run_experiment", "experiment")
+    run_exp.run_experiment = timed
+    for reexport in REEXPORTS["run_experiment"]:
+        setattr(importlib.import_module(reexport), "run_experiment", timed)
+    _patch_workers(run_exp)
+    importlib.import_module("nest.engine.exec").Popen = _Popen
+    return _folder
+
+
+def _events():
+    events = []
+    for filename in sorted(os.listdir(_folder)):
+        with open(os.path.join(_folder, filename), "r") as file:
+            events.extend(json.loads(line) for line in file if line.strip())
+    events.sort(key=lambda event: event["ts"])
+    return events
+
+
+def _totals(events, category):
+    totals = {}
+    for event in events:
+        if event["cat"] != category:
+            continue
+        total = totals.setdefault(event["name"], {"count": 0, "total": 0.0, "max": 0.0})
+        total["count"] += 1
+        total["total"] += event["dur"] / 1e6
+        total["max"] = max(total["max"], event["dur"] / 1e6)
+    for total in totals.values():
+        (total["total"], total["max"]) = (round(total["total"], 4), round(total["max"], 4))
+    return dict(sorted(totals.items(), key=lambda item: -item[1]["total"]))
+
+
+def summarize(events, phases=None):
+    """
+    Content of `profile.json` for the spans in `events`
+
+    Parameters
+    ----------
+    events : list(dict)
+        Spans, as recorded
+    phases : list((str, float))
+        Startup phases (Default value = None, those of `helpers.startup`
+        if it is imported)
+
+    Returns
+    -------
+    dict
+        "phases", the totals per name of every category of span, such as
+        "topology" or "commands", and "events", every span
+    """
+    if phases is None and "helpers.startup" in sys.modules:
+        phases = sys.modules["helpers.startup"].phases()
+    categories = sorted({event["cat"] for event in events} | {"experiment", "topology", "command"})
+    profile = {"phases": {name: round(seconds, 4) for (name, seconds) in phases or []}}
+    for category in categories:
+        key = "commands" if category == "command" else category
+        profile[key] = _totals(events, category)
+    profile["events"] = events
+    return profile
+
+
+def chrome_trace(events):
+    """
+    Spans in the Chrome trace event format
+
+    Returns
+    -------
+    dict
+        Content of a trace file for `chrome://tracing` or Perfetto
+    """
+    trace = [dict(event, ph="X") for event in events]
+    for pid in sorted({event["pid"] for event in events}):
+        names = [event["name"] for event in events if event["pid"] == pid and event["cat"] == "command"]
+        if pid == events[0]["pid"]:
+            # The program itself, which records the first span
+            label = f"run ({pid})"
+        else:
+            label = f"{names[0].split()[0] if names else 'worker'} ({pid})"
+        trace.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def save(dump=None, trace=False):
+    """
+    Write the spans recorded since `install` to `profile.json`
+
+    Recording stops; the processes forked by the run have exited by now.
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder (Default value = None, the dump of the last experiment)
+    trace : bool
+        Also write the spans as a Chrome trace into `trace.json`
+        (Default value = False)
+
+    Returns
+    -------
+    dict
+        Content of `profile.json`, or None if the profiler is not installed
+    """
+    global _folder, _file  # pylint: disable=global-statement
+    if _folder is None:
+        return None
+    events = _events()
+    (pid, fd) = _file
+    if pid == os.getpid():
+        os.close(fd)
+    shutil.rmtree(_folder, ignore_errors=True)
+    (_folder, _file) = (None, (None, None))
+
+    profile = summarize(events)
+    if dump is None and "nest.experiment.pack" in sys.modules:
+        dump = sys.modules["nest.experiment.pack"].Pack.FOLDER or None
+    if dump and os.path.isdir(dump):
+        with open(os.path.join(dump, PROFILE), "w") as file:
+            json.dump(profile, file, indent=4)
+        if trace:
+            with open(os.path.join(dump, TRACE), "w") as file:
+                json.dump(chrome_trace(events), file)
+    return profile
+
+
+def _show(profile, top):
+    if profile["phases"]:
+        print("Phases:")
+        for (name, seconds) in profile["phases"].items():
+            print(f"  {seconds:10.3f} s  {name}")
+    for key in [k for k in profile if k not in ("phases", "events")]:
+        if not profile[key]:
+            continue
+        print(f"\n{key.capitalize()} (count, total, longest):")
+        for (name, total) in list(profile[key].items())[:top]:
+            print(f"  {total['count']:6d} {total['total']:10.3f} s {total['max']:9.3f} s  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="Summarize the profile.json of a dump")
+    show.add_argument("dump")
+    show.add_argument("--top", type=int, default=10, help="Entries to list per category")
+    trace = commands.add_parser("trace", help="Export the profile.json of a dump as a Chrome trace")
+    trace.add_argument("dump")
+    trace.add_argument("--output", type=str, default=None, help="Trace file (Default: trace.json in the dump)")
+    args = parser.parse_args()
+
+    path = os.path.join(args.dump, PROFILE)
+    if not os.path.isfile(path):
+        parser.error(f"No {PROFILE} in {args.dump}")
+    with open(path, "r") as file:
+        profile = json.load(file)
+    if args.command == "show":
+        _show(profile, args.top)
+        return
+    output = args.output or os.path.join(args.dump, TRACE)
+    with open(output, "w") as file:
+        json.dump(chrome_trace(profile["events"]), file)
+    print(f"{len(profile['events'])} spans written to {output}")
+
+
+if __name__ == "__main__":
+    main()
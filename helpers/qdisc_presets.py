@@ -0,0 +1,349 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Qdisc parameters derived from the rate and delay of the link.
+
+The example programs used to hard-code one parameter set per qdisc, tuned
+by hand for a 10mbit, 10ms bottleneck. A preset computes the parameters
+that depend on the link from its bandwidth and delay instead, so a sweep
+over link speeds gets matching RED thresholds, codel marking thresholds and
+fq_codel quantum without editing the programs:
+
+    (qdisc, parameters) = qdisc_preset("red", "10mbit", "10ms")
+    etr1b.set_attributes("10mbit", "10ms", qdisc, **parameters)
+
+The round trip time defaults to twice the delay of the link; pass `rtt`
+for paths with more delay elsewhere. Every parameter set is tried on a
+veth in a throwaway namespace before it is used, so an unsupported qdisc or
+a value the kernel rejects fails before the topology is built, with the
+message of tc. Parameter sets that the kernel accepted are cached for the
+boot session in `CACHE_DIR`, a directory of root that is emptied at every
+boot, so the runs of a sweep check every parameter set once. Failures are
+not cached: they are checked again once the module is loaded.
+
+Presets:
+
+* `pfifo`: one BDP of packets, at least 100.
+* `choke`, `red`: thresholds at a fifth of a BDP, at least 5 packets, max
+  three times min and limit twenty times min. RED gets the bandwidth of the
+  link for its idle time estimate.
+* `pie`: 2ms target, limit as for `pfifo`.
+* `codel`, `fq_codel`: 5ms target, raised to one and a half MTU times on
+  slow links as in RFC 8289, and an interval of at least one RTT. fq_codel
+  uses a 300 byte quantum below 40mbit so that small packets are not held
+  behind full sized ones.
+* `dctcp`: codel with ECN as a step marker for DCTCP, marking above
+  K = 0.17 x BDP, the threshold of the DCTCP paper, and never dropping.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+
+PRESETS = {}
+# Cache of the parameter sets the kernel accepted, owned by root
+CACHE_DIR = "/run/nest-examples"
+
+RATE_UNITS = {"bit": 1, "kbit": 1e3, "mbit": 1e6, "gbit": 1e9, "tbit": 1e12}
+TIME_UNITS = {"us": 1e-6, "ms": 1e-3, "s": 1.0}
+QUANTITY = re.compile(r"^\s*([0-9.]+)\s*([a-z]*)\s*$")
+
+
+def parse_rate(rate):
+    """Bits per second of a tc rate such as '10mbit'"""
+    match = QUANTITY.match(str(rate).lower())
+    if not match or match.group(2) not in RATE_UNITS:
+        raise ValueError(f"Not a rate: {rate}")
+    return float(match.group(1)) * RATE_UNITS[match.group(2)]
+
+
+def parse_time(value):
+    """Seconds of a tc time such as '10ms'; plain numbers are ms"""
+    match = QUANTITY.match(str(value).lower())
+    if not match or match.group(2) not in TIME_UNITS:
+        if match and not match.group(2):
+            return float(match.group(1)) * TIME_UNITS["ms"]
+        raise ValueError(f"Not a time: {value}")
+    return float(match.group(1)) * TIME_UNITS[match.group(2)]
+
+
+def format_time(seconds):
+    """tc time for `seconds`, in whole ms where exact, else in us"""
+    micro = max(1, int(round(seconds * 1e6)))
+    return f"{micro // 1000}ms" if micro % 1000 == 0 else f"{micro}us"
+
+
+class Link:
+    """
+    Rate, delay and derived sizes of a link
+
+    Parameters
+    ----------
+    bandwidth : str
+        Rate of the link, such as '10mbit'
+    delay : str
+        One way delay of the link, such as '10ms'
+    rtt : str
+        Round trip time of the flows (Default value = None, twice `delay`)
+    mtu : int
+        Packet size in bytes (Default value = 1500)
+    """
+
+    def __init__(self, bandwidth, delay, rtt=None, mtu=1500):
+        self.rate = parse_rate(bandwidth)
+        self.delay = parse_time(delay)
+        self.rtt = parse_time(rtt) if rtt is not None else 2 * self.delay
+        self.mtu = mtu
+        self.bandwidth = bandwidth
+
+    @property
+    def bdp_bytes(self):
+        return self.rate * self.rtt / 8
+
+    @property
+    def bdp_packets(self):
+        return self.bdp_bytes / self.mtu
+
+    @property
+    def mtu_time(self):
+        """Seconds to send one full sized packet"""
+        return self.mtu * 8 / self.rate
+
+
+def register(name, kind=None):
+    """Add the decorated function to `PRESETS` as `name`, for qdisc `kind`"""
+
+    def decorator(function):
+        PRESETS[name] = (kind or name, function)
+        return function
+
+    return decorator
+
+
+@register("pfifo")
+def _pfifo(link):
+    return {"limit": str(max(100, math.ceil(link.bdp_packets)))}
+
+
+def _red_thresholds(link):
+    """min, max and limit in packets"""
+    low = max(5, math.ceil(link.bdp_packets / 5))
+    return (low, 3 * low, 20 * low)
+
+
+@register("choke")
+def _choke(link):
+    (low, high, limit) = _red_thresholds(link)
+    return {
+        "limit": str(limit),
+        "min": str(low),
+        "max": str(high),
+        "bandwidth": link.bandwidth,
+    }
+
+
+@register("red")
+def _red(link):
+    (low, high, limit) = _red_thresholds(link)
+    return {
+        "limit": str(limit * link.mtu),
+        "min": str(low * link.mtu),
+        "max": str(high * link.mtu),
+        "avpkt": str(link.mtu),
+        "bandwidth": link.bandwidth,
+    }
+
+
+@register("pie")
+def _pie(link):
+    return {
+        "limit": _pfifo(link)["limit"],
+        "target": format_time(max(0.002, 1.5 * link.mtu_time)),
+    }
+
+
+def _codel_times(link):
+    return {
+        "target": format_time(max(0.005, 1.5 * link.mtu_time)),
+        "interval": format_time(max(0.1, link.rtt)),
+    }
+
+
+@register("codel")
+def _codel(link):
+    return dict(_codel_times(link), limit="1000", ecn="")
+
+
+@register("fq_codel")
+def _fq_codel(link):
+    quantum = 300 if link.rate < 40e6 else link.mtu + 14
+    return dict(_codel_times(link), limit="10240", quantum=str(quantum), ecn="")
+
+
+@register("dctcp", kind="codel")
+def _dctcp(link):
+    return {
+        "limit": str(max(1000, math.ceil(4 * link.bdp_packets))),
+        # Far above any queue, so that codel only marks and never drops
+        "target": "10000ms",
+        "interval": "100ms",
+        "ce_threshold": format_time(max(0.17 * link.rtt, link.mtu_time)),
+        "ecn": "",
+    }
+
+
+def _tc_arguments(qdisc, parameters):
+    arguments = [qdisc]
+    for (key, value) in parameters.items():
+        arguments += [key] + ([str(value)] if str(value) else [])
+    return arguments
+
+
+def _cache_dir():
+    """
+    `CACHE_DIR`, created if needed, or None unless it is a directory that
+    only its owner, the caller, can write to
+    """
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        stat = os.lstat(CACHE_DIR)
+    except OSError:
+        return None
+    if not os.path.isdir(CACHE_DIR) or os.path.islink(CACHE_DIR):
+        return None
+    if stat.st_uid != os.geteuid() or stat.st_mode & 0o022:
+        return None
+    return CACHE_DIR
+
+
+def _session_cache():
+    """Cache file of the current boot, shared by all runs of a sweep"""
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as file:
+            boot_id = file.read().strip()
+    except OSError:
+        boot_id = "unknown"
+    return os.path.join(directory, f"qdisc-check-{boot_id}.json")
+
+
+def _read_cache(path):
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return {}
+    try:
+        with os.fdopen(fd, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(path, checked):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(checked, file, indent=4)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+# Key -> qdisc and parameters, of the parameter sets the kernel accepted
+_checked = {}
+
+
+def check(qdisc, parameters):
+    """
+    Try `qdisc` with `parameters` on a veth in a throwaway namespace
+
+    Accepted parameter sets are cached for the boot session; rejected ones
+    are tried again on every call, as the qdisc may be loaded meanwhile.
+
+    Returns
+    -------
+    str
+        Error message of tc, or None if the kernel accepted the qdisc
+    """
+    arguments = _tc_arguments(qdisc, parameters)
+    key = hashlib.sha1(" ".join(arguments).encode()).hexdigest()
+    cache = _session_cache()
+    if key not in _checked and cache:
+        _checked.update(_read_cache(cache))
+    if key in _checked:
+        return None
+
+    namespace = f"qdisc-check-{os.getpid()}"
+    commands = [
+        ["ip", "netns", "add", namespace],
+        ["ip", "-n", namespace, "link", "add", "check0", "type", "veth", "peer", "name", "check1"],
+        ["tc", "-n", namespace, "qdisc", "add", "dev", "check0", "root"] + arguments,
+    ]
+    error = None
+    try:
+        for command in commands:
+            process = subprocess.run(command, capture_output=True, text=True)
+            if process.returncode != 0:
+                error = process.stderr.strip() or process.stdout.strip() or "failed"
+                error = f"{' '.join(command[3:])}: {error}"
+                break
+    finally:
+        subprocess.run(["ip", "netns", "del", namespace], capture_output=True)
+
+    if error is None:
+        _checked[key] = " ".join(arguments)
+        if cache:
+            _write_cache(cache, dict(_read_cache(cache), **_checked))
+    return error
+
+
+def qdisc_preset(name, bandwidth, delay, rtt=None, mtu=1500, overrides=None, validate=True):
+    """
+    Qdisc and parameters of preset `name` for a link
+
+    Parameters
+    ----------
+    name : str
+        Preset, see `PRESETS`
+    bandwidth : str
+        Rate of the link, such as '10mbit'
+    delay : str
+        One way delay of the link, such as '10ms'
+    rtt : str
+        Round trip time of the flows (Default value = None, twice `delay`)
+    mtu : int
+        Packet size in bytes (Default value = 1500)
+    overrides : dict
+        Parameters that replace the derived ones (Default value = None)
+    validate : bool
+        Check the parameters against the kernel (Default value = True)
+
+    Returns
+    -------
+    (str, dict)
+        Qdisc and its parameters, for `Interface.set_attributes`
+    """
+    if name not in PRESETS:
+        raise ValueError(f"Unknown qdisc preset {name}, choose from {sorted(PRESETS)}")
+    (qdisc, function) = PRESETS[name]
+    parameters = function(Link(bandwidth, delay, rtt, mtu))
+    parameters.update(overrides or {})
+
+    if validate:
+        error = check(qdisc, parameters)
+        if error:
+            raise ValueError(f"The kernel rejects the {name} preset: {error}")
+    return (qdisc, parameters)
@@ -0,0 +1,360 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Sample the queues of bottleneck links every 10 to 100 ms over netlink.
+
+`exp.require_qdisc_stats` runs `tc -s -j qdisc` in a loop and parses its
+text, which is too slow for sub-RTT sampling and only works on links with
+a qdisc. `QdiscStats` keeps one rtnetlink socket open in every namespace
+and asks the kernel for the statistics of all its qdiscs with a single
+RTM_GETQDISC dump per sample. The htb and netem qdiscs that NeST puts on
+every link are sampled along with the qdisc of the link, which NeST puts on
+the IFB of the interface.
+
+    with QdiscStats([etr1b], interval=0.05):
+        exp.run()
+
+Every qdisc gets a series of columns in `qdisc_stats.json`:
+
+    {"interval": 0.05, "interfaces": {"<node>:<interface>": [
+        {"device", "handle", "parent", "kind",
+         "series": {"timestamp": [...], "qlen": [...], "backlog": [...],
+                    "drops": [...], "overlimits": [...], "requeues": [...],
+                    "bytes": [...], "packets": [...], <qdisc counters>}}]}}
+
+`qlen` (packets) and `backlog` (bytes) are the queue at the time of the
+sample; the other columns are counters since the qdisc was created.
+Qdisc counters are those of the kernel's xstats: `ecn_mark` and `ce_mark`
+(codel, fq_codel), `prob` (0 to 1), `delay` (us) and `ecn_mark` (pie,
+fq_pie) and `marked` (red, choke), among others. Queue length, drops,
+marks and drop probability are also plotted into the `tc/` folder of the
+dump by `plot`, a hook that runs after the results of NeST are written, in
+the worker of `helpers.postprocess` for queued runs.
+"""
+
+import json
+import logging
+import os
+import socket
+import struct
+import time
+
+from nest.experiment.pack import Pack
+from nest.topology_map import TopologyMap
+
+from .collector import BackgroundCollector, netns
+from .samples import Series
+
+logger = logging.getLogger(__name__)
+
+NETLINK_ROUTE = 0
+RTM_GETQDISC = 38
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLMSG = struct.Struct("=IHHII")
+TCMSG = struct.Struct("=BxxxiIII")
+RTATTR = struct.Struct("=HH")
+
+TCA_KIND = 1
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TCA_STATS_APP = 4
+
+BASIC = struct.Struct("=QI")
+QUEUE = struct.Struct("=IIIII")
+QUEUE_FIELDS = ("qlen", "backlog", "drops", "requeues", "overlimits")
+
+# Layout of the xstats of every qdisc, by their size in bytes
+XSTATS = {
+    "codel": {
+        36: (
+            "=IIIIiIIII",
+            ("maxpacket", "count", "lastcount", "ldelay", "drop_next",
+             "drop_overlimit", "ecn_mark", "dropping", "ce_mark"),
+        ),
+    },
+    "fq_codel": {
+        40: (
+            "=IIIIIIIIII",
+            ("type", "maxpacket", "drop_overlimit", "ecn_mark", "new_flow_count",
+             "new_flows_len", "old_flows_len", "ce_mark", "memory_usage",
+             "drop_overmemory"),
+        ),
+    },
+    "pie": {
+        # Since Linux 5.7, with a 64 bit probability
+        40: (
+            "=QIIIIIIII",
+            ("prob", "delay", "avg_dq_rate", "dq_rate_estimating", "packets_in",
+             "dropped", "overlimit", "maxq", "ecn_mark"),
+        ),
+        32: (
+            "=IIIIIIII",
+            ("prob", "delay", "avg_dq_rate", "packets_in", "dropped",
+             "overlimit", "maxq", "ecn_mark"),
+        ),
+    },
+    "fq_pie": {
+        36: (
+            "=IIIIIIIII",
+            ("packets_in", "dropped", "overlimit", "overmemory", "ecn_mark",
+             "new_flow_count", "new_flows_len", "old_flows_len", "memory_usage"),
+        ),
+    },
+    "red": {16: ("=IIII", ("early", "pdrop", "other", "marked"))},
+    "choke": {20: ("=IIIII", ("early", "pdrop", "other", "marked", "matched"))},
+}
+# Full scale of the pie drop probability, by the size of the xstats
+PIE_MAX_PROB = {40: float(2 ** 64 - 1), 32: float(2 ** 32 - 1)}
+
+# Quantum of the counters that are not integers, see `helpers/samples.py`
+QUANTA = {"prob": 1e-6}
+
+# Columns plotted into `tc/`, when the qdisc has them
+PLOTTED = {
+    "qlen": "Queue length (packets)",
+    "backlog": "Backlog (bytes)",
+    "drops": "Drops (packets)",
+    "ecn_mark": "ECN marks (packets)",
+    "ce_mark": "CE marks (packets)",
+    "marked": "Marks (packets)",
+    "prob": "Drop probability",
+    "ldelay": "Sojourn time (us)",
+}
+
+
+def _handle(value):
+    """tc notation of a handle, such as 11: or 1:1"""
+    if value == 0xFFFFFFFF:
+        return "root"
+    (major, minor) = (value >> 16, value & 0xFFFF)
+    return f"{major:x}:{minor:x}" if minor else f"{major:x}:"
+
+
+def _attributes(data, offset, end):
+    """(type, payload offset, payload end) of the rtattrs in data[offset:end]"""
+    while offset + RTATTR.size <= end:
+        (length, kind) = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        yield (kind & 0x3FFF, offset + RTATTR.size, offset + length)
+        offset += (length + 3) & ~3
+
+
+def _parse_qdisc(data, offset, end):
+    """Ifindex, handle, parent and statistics of one RTM_NEWQDISC message"""
+    (_, ifindex, handle, parent, _) = TCMSG.unpack_from(data, offset)
+    qdisc = {"ifindex": ifindex, "handle": handle, "parent": parent, "stats": {}}
+    app = None
+    for (kind, start, stop) in _attributes(data, offset + TCMSG.size, end):
+        if kind == TCA_KIND:
+            qdisc["kind"] = data[start:stop].rstrip(b"\0").decode()
+        elif kind == TCA_STATS2:
+            for (stat, start2, stop2) in _attributes(data, start, stop):
+                if stat == TCA_STATS_BASIC:
+                    (qdisc["stats"]["bytes"], qdisc["stats"]["packets"]) = (
+                        BASIC.unpack_from(data, start2)
+                    )
+                elif stat == TCA_STATS_QUEUE:
+                    qdisc["stats"].update(
+                        zip(QUEUE_FIELDS, QUEUE.unpack_from(data, start2))
+                    )
+                elif stat == TCA_STATS_APP:
+                    app = data[start2:stop2]
+
+    layouts = XSTATS.get(qdisc.get("kind"), {})
+    if app is not None and len(app) in layouts:
+        (layout, fields) = layouts[len(app)]
+        xstats = dict(zip(fields, struct.unpack_from(layout, app)))
+        if qdisc["kind"] == "pie":
+            xstats["prob"] = round(xstats["prob"] / PIE_MAX_PROB[len(app)], 6)
+        if qdisc["kind"] != "fq_codel" or xstats["type"] == 0:
+            xstats.pop("type", None)
+            qdisc["stats"].update(xstats)
+    return qdisc
+
+
+class _Namespace:
+    """rtnetlink socket of one namespace and the interfaces sampled in it"""
+
+    def __init__(self, ns_id):
+        self.ns_id = ns_id
+        self.sequence = 0
+        self.devices = {}  # ifindex -> (interface key, "veth" or "ifb")
+        # The socket stays in the namespace it was opened in
+        with netns(ns_id):
+            self.socket = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE
+            )
+            self.socket.bind((0, 0))
+
+    def add(self, key, device, role):
+        """Sample the qdiscs of `device`, as `role` of interface `key`"""
+        with netns(self.ns_id):
+            self.devices[socket.if_nametoindex(device)] = (key, role)
+
+    def dump(self):
+        """Every qdisc of the sampled interfaces in this namespace"""
+        self.sequence += 1
+        request = TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        self.socket.send(
+            NLMSG.pack(
+                NLMSG.size + len(request),
+                RTM_GETQDISC,
+                NLM_F_REQUEST | NLM_F_DUMP,
+                self.sequence,
+                0,
+            )
+            + request
+        )
+
+        qdiscs = []
+        while True:
+            data = self.socket.recv(65536)
+            offset = 0
+            while offset + NLMSG.size <= len(data):
+                (length, kind, _, sequence, _) = NLMSG.unpack_from(data, offset)
+                if length < NLMSG.size:
+                    return qdiscs
+                end = offset + length
+                if sequence == self.sequence:
+                    if kind == NLMSG_DONE:
+                        return qdiscs
+                    if kind == NLMSG_ERROR:
+                        (error,) = struct.unpack_from("=i", data, offset + NLMSG.size)
+                        raise OSError(-error, os.strerror(-error))
+                    qdisc = _parse_qdisc(data, offset + NLMSG.size, end)
+                    if qdisc["ifindex"] in self.devices:
+                        qdiscs.append(qdisc)
+                offset = (end + 3) & ~3
+
+    def close(self):
+        self.socket.close()
+
+
+class QdiscStats(BackgroundCollector):
+    """
+    Samples the qdiscs of interfaces with one netlink dump per namespace
+
+    Parameters
+    ----------
+    interfaces : list(Interface)
+        Interfaces to sample, such as the bottleneck
+    interval : float
+        Seconds between two samples, 0.01 to 0.1 (Default value = 0.05)
+    plot : bool
+        Plot the series into the `tc/` folder of the dump
+        (Default value = True)
+    """
+
+    name = "qdisc_stats"
+
+    def __init__(self, interfaces, interval=0.05, plot=True):
+        super().__init__(interval)
+        self.interfaces = interfaces
+        self.plot = plot
+        self.namespaces = {}
+        # (interface key, ifindex, handle) -> qdisc, with its samples in a
+        # compact `Series` while the experiment runs
+        self.series = {}
+
+    def setup(self):
+        names = {ns["id"]: ns["name"] for ns in TopologyMap.get_namespaces()}
+        for interface in self.interfaces:
+            if interface.node_id not in self.namespaces:
+                self.namespaces[interface.node_id] = _Namespace(interface.node_id)
+            namespace = self.namespaces[interface.node_id]
+            key = f"{names.get(interface.node_id, interface.node_id)}:{interface.name}"
+            namespace.add(key, interface.id, "veth")
+            try:
+                namespace.add(key, interface.ifb_id, "ifb")
+            except AttributeError:
+                # No qdisc on the link, so no IFB
+                pass
+
+    def sample(self):
+        for namespace in self.namespaces.values():
+            qdiscs = namespace.dump()
+            now = round(time.time(), 4)
+            for qdisc in qdiscs:
+                (key, role) = namespace.devices[qdisc["ifindex"]]
+                series_id = (key, qdisc["ifindex"], qdisc["handle"])
+                if series_id not in self.series:
+                    self.series[series_id] = {
+                        "device": role,
+                        "handle": _handle(qdisc["handle"]),
+                        "parent": _handle(qdisc["parent"]),
+                        "kind": qdisc.get("kind"),
+                        # Counters that first appear late are None before
+                        "series": Series(resolution=1e-4, quanta=QUANTA, quantum=1),
+                    }
+                self.series[series_id]["series"].append(now, qdisc["stats"])
+
+    def teardown(self):
+        for namespace in self.namespaces.values():
+            namespace.close()
+        self.namespaces = {}
+
+    def results(self):
+        interfaces = {}
+        for ((key, _, _), qdisc) in sorted(self.series.items()):
+            interfaces.setdefault(key, []).append(dict(qdisc, series=qdisc["series"].columns()))
+        return {"interval": self.interval, "interfaces": interfaces}
+
+    def after(self):
+        return [plot] if self.plot else []
+
+
+def plot(dump):
+    """
+    Plot `PLOTTED` columns of every qdisc in `qdisc_stats.json` into `tc/`
+
+    A hook of `QdiscStats`, run after the results of NeST are written, in
+    the worker of `helpers.postprocess` for queued runs, so that a run
+    does not import matplotlib.
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    """
+    # pylint: disable=import-outside-toplevel
+    import matplotlib.pyplot as plt
+    from nest.experiment.plotter.common import simple_plot
+
+    path = os.path.join(dump, "qdisc_stats.json")
+    if not os.path.isfile(path):
+        return
+    with open(path, "r") as file:
+        results = json.load(file)
+    os.makedirs(os.path.join(dump, "tc"), exist_ok=True)
+    for (key, qdiscs) in results["interfaces"].items():
+        (node, interface) = key.split(":", 1)
+        for qdisc in qdiscs:
+            columns = qdisc["series"]
+            if not columns["timestamp"]:
+                continue
+            start = columns["timestamp"][0]
+            times = [timestamp - start for timestamp in columns["timestamp"]]
+            handle = qdisc["handle"].replace(":", "_")
+            for (column, label) in PLOTTED.items():
+                if column not in columns:
+                    continue
+                fig = simple_plot(
+                    "Traffic Control (tc) Statistics",
+                    times,
+                    columns[column],
+                    "Time (Seconds)",
+                    label,
+                    legend_string=f"{qdisc['kind']} {qdisc['handle']} on "
+                    f"{interface} ({qdisc['device']}) in {node}",
+                )
+                filename = f"{node}_{interface}_{qdisc['device']}_{handle}{qdisc['kind']}_{column}.png"
+                fig.savefig(os.path.join(dump, "tc", filename))
+                Pack.set_owner(os.path.join(dump, "tc", filename))
+                plt.close(fig)
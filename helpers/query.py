@@ -0,0 +1,600 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Query the samples of many archived dumps with a small expression language.
+
+A query selects aggregates of collector columns, filters the runs, flows
+and time window, and groups the result:
+
+    p99(ss.rtt) where experiment ~ westwood and algorithm = westwood
+    mean(netperf.sending_rate), max(ss.cwnd) where host = h1 and time in 10..60 by dump, flow
+    median(ping.rtt) where qdisc = fq_codel and suspect != True by experiment
+
+Aggregates are `count`, `sum`, `mean`, `min`, `max`, `std`, `median` and
+`pNN` such as `p99` or `p99.9`. Columns are `<collector>.<field>` of the
+collectors with NeST samples: `netperf`, `ss`, `ping`, `iperf3`,
+`iperf3Server`, `udp_flood` and `udp_floodServer`. Conditions are joined by
+`and` and compare with `=`, `!=`, `<`, `<=`, `>`, `>=` or `~` (regular
+expression); values with spaces are quoted. `time in A..B` keeps the
+samples between A and B seconds after the first sample of the dump.
+
+Fields of a run: `experiment`, `dump`, `started`, `qdisc`, `suspect`.
+Fields of a flow (see `helpers.flow_index`): `flow`, `source`,
+`destination`, `host` (either end), `algorithm`, `role`, `protocol`,
+`direction`, `port`. `by` groups by any of them; the default is `dump`.
+
+Every dump is parsed once into `.query/` inside the dump: `index.json`
+with the run and the entries of every collector, one numpy column file per
+collector and `aggregates.json` with the aggregates computed so far. A
+repeated query over hundreds of runs reads the small indexes and cached
+aggregates only; the caches are rebuilt when a collector file or the
+`roles.json` of the dump changes. Runs that predate the algorithm in the
+netperf keys get their algorithms and roles from `roles.json`, see
+`helpers.flow_index`.
+
+Usage (from the repository root):
+
+    python3 -m helpers.query "p99(ss.rtt) where experiment ~ westwood and algorithm = westwood"
+    python3 -m helpers.query --root /srv/spool/results "mean(ping.rtt) by experiment" --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .catalog import describe
+from .flow_index import ROLES, FlowIndex
+
+logger = logging.getLogger(__name__)
+
+CACHE = ".query"
+COLLECTORS = ("netperf", "ss", "ping", "iperf3", "iperf3Server", "udp_flood", "udp_floodServer")
+# Bump when the layout of the cache changes
+VERSION = 2
+
+RUN_FIELDS = {"experiment", "dump", "started", "qdisc", "suspect"}
+ENTRY_FIELDS = {
+    "flow", "source", "destination", "host", "algorithm", "role", "protocol", "direction", "port",
+}
+AGGREGATE = re.compile(r"^(count|sum|mean|min|max|std|median|p[0-9]+(?:\.[0-9]+)?)$")
+OPERATORS = ("!=", "<=", ">=", "=", "<", ">", "~")
+TOKEN = re.compile(
+    r"""\s*(?:(?P<quoted>"[^"]*"|'[^']*')|(?P<token>!=|<=|>=|[=<>~(),]|[^\s=!<>~(),"']+))"""
+)
+# Aggregates that are merged exactly from the cached moments of each part
+MOMENTS = ("count", "sum", "sumsq", "min", "max")
+
+
+class QueryError(ValueError):
+    """A query that does not parse or names unknown fields"""
+
+
+class Query:
+    """
+    Parsed query, see the module documentation
+
+    Parameters
+    ----------
+    text : str
+        The query
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.selects = []
+        self.conditions = []
+        self.window = [None, None]
+        self.by = []
+        self._parse(self._tokens(text))
+
+    @staticmethod
+    def _tokens(text):
+        tokens = []
+        for match in TOKEN.finditer(text.strip()):
+            if match.group("quoted") is not None:
+                tokens.append(match.group("quoted")[1:-1])
+            else:
+                tokens.append(match.group("token"))
+        return tokens
+
+    def _parse(self, tokens):
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        while True:
+            function = peek()
+            if function is None or not AGGREGATE.match(function):
+                raise QueryError(f"Expected an aggregate such as p99(ss.rtt), got {function}")
+            if tokens[position + 1 : position + 2] != ["("] or tokens[position + 3 : position + 4] != [")"]:
+                raise QueryError(f"Expected {function}(<collector>.<column>)")
+            column = tokens[position + 2]
+            (collector, _, name) = column.partition(".")
+            if collector not in COLLECTORS or not name:
+                raise QueryError(f"Unknown column {column}, use one of {', '.join(COLLECTORS)}")
+            self.selects.append((function, collector, name))
+            position += 4
+            if peek() != ",":
+                break
+            position += 1
+
+        if peek() == "where":
+            position += 1
+            while True:
+                position = self._condition(tokens, position)
+                if peek() != "and":
+                    break
+                position += 1
+
+        if peek() == "by":
+            position += 1
+            while True:
+                name = peek()
+                if name not in RUN_FIELDS | ENTRY_FIELDS - {"host"}:
+                    raise QueryError(f"Cannot group by {name}")
+                self.by.append(name)
+                position += 1
+                if peek() != ",":
+                    break
+                position += 1
+
+        if peek() is not None:
+            raise QueryError(f"Unexpected {peek()}")
+        self.by = self.by or ["dump"]
+
+    def _condition(self, tokens, position):
+        name = tokens[position] if position < len(tokens) else None
+        if name == "time":
+            try:
+                return self._time(tokens, position)
+            except (IndexError, ValueError) as error:
+                raise QueryError(f"time takes in A..B, <, <=, > or >= seconds: {error}")
+        if name not in RUN_FIELDS | ENTRY_FIELDS:
+            raise QueryError(f"Unknown field {name}")
+        (operator, value) = self._operator(tokens, position + 1)
+        self.conditions.append((name, operator, value))
+        return position + 3
+
+    def _time(self, tokens, position):
+        if tokens[position + 1] == "in":
+            (low, _, high) = tokens[position + 2].partition("..")
+            self.window = [float(low), float(high)]
+            return position + 3
+        (operator, value) = self._operator(tokens, position + 1)
+        if operator in (">", ">="):
+            self.window[0] = float(value)
+        elif operator in ("<", "<="):
+            self.window[1] = float(value)
+        else:
+            raise ValueError(f"not {operator}")
+        return position + 3
+
+    @staticmethod
+    def _operator(tokens, position):
+        operator = tokens[position] if position < len(tokens) else None
+        if operator not in OPERATORS:
+            raise QueryError(f"Expected an operator after {tokens[position - 1]}")
+        if position + 1 >= len(tokens):
+            raise QueryError(f"Expected a value after {operator}")
+        return (operator, tokens[position + 1])
+
+    def matches(self, record, fields):
+        """True if `record` passes the conditions on `fields`"""
+        for (name, operator, expected) in self.conditions:
+            if name not in fields:
+                continue
+            if name == "host":
+                values = [record.get("source"), record.get("destination")]
+                if not any(_compare(v, operator, expected) for v in values):
+                    return False
+            elif not _compare(record.get(name), operator, expected):
+                return False
+        return True
+
+
+def _compare(value, operator, expected):
+    if isinstance(value, list):
+        hits = [_compare(v, "~" if operator == "~" else "=", expected) for v in value]
+        return not any(hits) if operator == "!=" else any(hits)
+    if operator == "~":
+        return value is not None and re.search(expected, str(value)) is not None
+    try:
+        (value, expected) = (float(value), float(expected))
+    except (TypeError, ValueError):
+        (value, expected) = (str(value), expected)
+    return {
+        "=": value == expected,
+        "!=": value != expected,
+        "<": value < expected,
+        "<=": value <= expected,
+        ">": value > expected,
+        ">=": value >= expected,
+    }[operator]
+
+
+def _replace(path, write, mode="w"):
+    """
+    Write `path` with `write(file)` into a temporary file and rename it over
+    `path`, so that other threads and processes never read it half written
+    """
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp_path, mode) as file:
+        write(file)
+    os.replace(temp_path, path)
+
+
+def _samples(data):
+    """(source, name, port, samples) of every entry of a NeST JSON file"""
+    for (source, entries) in data.items():
+        for entry in entries:
+            for (name, value) in entry.items():
+                if isinstance(value, list):
+                    yield (source, name, None, value)
+                else:
+                    for (port, samples) in value.items():
+                        yield (source, name, port, samples)
+
+
+class DumpCache:
+    """
+    Index, columns and aggregates of one dump in `<dump>/.query/`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    """
+
+    def __init__(self, dump):
+        self.dump = dump
+        self.path = os.path.join(dump, CACHE)
+        self.index = None
+        self._columns = {}
+        self._aggregates = None
+        self._dirty = False
+        self.built = False
+
+    def _signature(self):
+        signature = {}
+        for collector in COLLECTORS:
+            path = os.path.join(self.dump, f"{collector}.json")
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                signature[collector] = [stat.st_size, stat.st_mtime]
+        path = os.path.join(self.dump, f"{ROLES}.json")
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            signature[ROLES] = [stat.st_size, stat.st_mtime]
+        return signature
+
+    def load(self):
+        """Read `index.json`, or parse the dump if it changed since"""
+        signature = self._signature()
+        try:
+            with open(os.path.join(self.path, "index.json"), "r") as file:
+                index = json.load(file)
+            if index["version"] == VERSION and index["signature"] == signature:
+                self.index = index
+                return self
+        except (OSError, ValueError, KeyError):
+            pass
+        self._build(signature)
+        return self
+
+    def _build(self, signature):
+        os.makedirs(self.path, exist_ok=True)
+        flows = FlowIndex.load(self.dump)
+        parsed = {}
+        for collector in (c for c in COLLECTORS if c in signature):
+            with open(os.path.join(self.dump, f"{collector}.json"), "r") as file:
+                parsed[collector] = json.load(file)
+        starts = [
+            float(sample["timestamp"])
+            for data in parsed.values()
+            for (_, _, _, samples) in _samples(data)
+            for sample in samples[:2]
+            if "timestamp" in sample
+        ]
+        origin = min(starts, default=0.0)
+
+        entries = {}
+        for (collector, data) in parsed.items():
+            (entries[collector], columns) = self._parse(collector, data, flows, origin)
+            _replace(
+                os.path.join(self.path, f"{collector}.npz"),
+                lambda file, columns=columns: np.savez(file, **columns),
+                "wb",
+            )
+
+        self.index = {
+            "version": VERSION,
+            "signature": signature,
+            "origin": origin,
+            "run": describe(self.dump, flows),
+            "entries": entries,
+        }
+        # Last, so that an index is never older than the columns it describes
+        _replace(
+            os.path.join(self.path, "index.json"),
+            lambda file: json.dump(self.index, file, indent=4),
+        )
+        # Aggregates of the previous contents are stale
+        self._aggregates = {}
+        self._dirty = True
+        self.built = True
+
+    @staticmethod
+    def _entry(collector, source, name, port, meta, flows):
+        if collector == "netperf":
+            flow_id = flows.lookup(collector, source, name)
+        elif collector == "ping":
+            flow_id = None
+        else:
+            flow_id = flows.lookup(collector, source, name, port)
+        record = flows.flows.get(flow_id, {})
+        if flow_id is None:
+            # Host pair of a ping, with the algorithm of its flows if they agree
+            siblings = [flows.flows[f] for f in flows.pair(source, name)]
+            algorithms = {f["algorithm"] for f in siblings}
+            destination = meta.get("destination_node") or name
+            return {
+                "flow": f"{source}-{destination}",
+                "source": source,
+                "destination": destination,
+                "algorithm": algorithms.pop() if len(algorithms) == 1 else None,
+                "role": None,
+                "protocol": "icmp" if collector == "ping" else None,
+                "direction": None,
+                "port": port,
+            }
+        return {
+            "flow": flow_id,
+            "source": record["source"],
+            "destination": record["destination"],
+            "algorithm": record["algorithm"],
+            "role": record.get("role"),
+            "protocol": record["protocol"],
+            "direction": record.get("direction"),
+            "port": record["port"],
+        }
+
+    def _parse(self, collector, data, flows, origin):
+        (entries, numbers, rows) = ([], [], [])
+        for (source, name, port, samples) in _samples(data):
+            meta = samples[0] if samples and samples[0].get("meta") else {}
+            samples = [s for s in samples if "timestamp" in s]
+            numbers.append(np.full(len(samples), len(entries)))
+            rows.extend(samples)
+            entries.append(self._entry(collector, source, name, port, meta, flows))
+
+        names = sorted({key for row in rows for key in row} - {"timestamp"})
+        columns = {
+            "entry": np.concatenate(numbers).astype(np.int32) if numbers else np.zeros(0, np.int32),
+            "time": np.array([float(r["timestamp"]) for r in rows]) - origin,
+        }
+        for name in names:
+            values = []
+            for row in rows:
+                try:
+                    values.append(float(row.get(name, "nan")))
+                except ValueError:
+                    values.append(np.nan)
+            columns[f"column_{name}"] = np.array(values)
+        return (entries, columns)
+
+    def columns(self, collector):
+        """Columns of `collector`, loaded on first use"""
+        if collector not in self._columns:
+            with np.load(os.path.join(self.path, f"{collector}.npz")) as file:
+                self._columns[collector] = dict(file)
+        return self._columns[collector]
+
+    def values(self, collector, column, entries, window):
+        """Samples of `column` of the `entries` of `collector` in `window`"""
+        columns = self.columns(collector)
+        if f"column_{column}" not in columns:
+            return np.zeros(0)
+        mask = np.isin(columns["entry"], entries)
+        if window[0] is not None:
+            mask &= columns["time"] >= window[0]
+        if window[1] is not None:
+            mask &= columns["time"] <= window[1]
+        values = columns[f"column_{column}"][mask]
+        return values[~np.isnan(values)]
+
+    def aggregate(self, function, collector, column, entries, window):
+        """
+        Moments and `function` of the selected samples, cached
+
+        Returns
+        -------
+        dict
+            "count", "sum", "sumsq", "min", "max" and `function`
+        """
+        if self._aggregates is None:
+            try:
+                with open(os.path.join(self.path, "aggregates.json"), "r") as file:
+                    self._aggregates = json.load(file)
+            except (OSError, ValueError):
+                self._aggregates = {}
+        key = f"{collector}.{column}|{','.join(map(str, entries))}|{window[0]}:{window[1]}"
+        cached = self._aggregates.setdefault(key, {})
+        if function not in cached:
+            values = self.values(collector, column, entries, window)
+            if "count" not in cached:
+                cached.update(
+                    count=int(len(values)),
+                    sum=float(values.sum()),
+                    sumsq=float((values ** 2).sum()),
+                    min=float(values.min()) if len(values) else None,
+                    max=float(values.max()) if len(values) else None,
+                )
+            if function not in cached:
+                cached[function] = _apply(function, values)
+            self._dirty = True
+        return cached
+
+    def save(self):
+        """Write the aggregates computed since `load`"""
+        if self._dirty and self._aggregates is not None:
+            _replace(
+                os.path.join(self.path, "aggregates.json"),
+                lambda file: json.dump(self._aggregates, file),
+            )
+            self._dirty = False
+
+
+def _apply(function, values):
+    if not len(values):
+        return None if function != "count" else 0
+    if function == "count":
+        return int(len(values))
+    if function in ("sum", "mean", "min", "max", "std", "median"):
+        return float(getattr(np, function)(values))
+    return float(np.percentile(values, float(function[1:])))
+
+
+def _merge(function, parts, caches, collector, column, window):
+    """`function` over several parts, from their moments where possible"""
+    count = sum(part["count"] for part in parts)
+    if function in ("count", "sum", "min", "max", "mean", "std"):
+        if not count:
+            return 0 if function == "count" else None
+        total = sum(part["sum"] for part in parts)
+        if function == "count":
+            return count
+        if function == "sum":
+            return total
+        if function == "min":
+            return min(part["min"] for part in parts if part["min"] is not None)
+        if function == "max":
+            return max(part["max"] for part in parts if part["max"] is not None)
+        mean = total / count
+        if function == "mean":
+            return mean
+        variance = sum(part["sumsq"] for part in parts) / count - mean ** 2
+        return float(np.sqrt(max(variance, 0.0)))
+    # Percentiles need the samples of every part
+    values = np.concatenate(
+        [cache.values(collector, column, entries, window) for (cache, entries) in caches]
+    )
+    return _apply(function, values)
+
+
+def find_dumps(roots):
+    """Dump folders below `roots`"""
+    dumps = []
+    for root in roots:
+        for (path, directories, files) in os.walk(root):
+            directories[:] = [d for d in directories if d != CACHE]
+            if any(f"{collector}.json" in files for collector in COLLECTORS):
+                dumps.append(path)
+                directories.clear()
+    return sorted(dumps)
+
+
+def run(query, dumps):
+    """
+    Evaluate `query` over `dumps`
+
+    Parameters
+    ----------
+    query : Query
+        Parsed query
+    dumps : list(str)
+        Dump folders
+
+    Returns
+    -------
+    (list(str), list(list))
+        Column names and rows of the result
+    """
+    groups = {}
+    built = 0
+    for dump in dumps:
+        cache = DumpCache(dump).load()
+        built += cache.built
+        run_record = dict(cache.index["run"], qdisc=cache.index["run"]["qdiscs"])
+        run_record["dump"] = os.path.basename(os.path.normpath(dump))
+        if not query.matches(run_record, RUN_FIELDS):
+            continue
+        for (function, collector, column) in query.selects:
+            selected = {}
+            for (number, entry) in enumerate(cache.index["entries"].get(collector, [])):
+                if query.matches(entry, ENTRY_FIELDS):
+                    record = dict(run_record, **entry)
+                    group = tuple(str(record.get(name)) for name in query.by)
+                    selected.setdefault(group, []).append(number)
+            for (group, entries) in selected.items():
+                groups.setdefault(group, {}).setdefault((function, collector, column), []).append(
+                    (cache, entries)
+                )
+    logger.debug("%d dumps, %d parsed", len(dumps), built)
+
+    names = list(query.by) + [f"{f}({c}.{n})" for (f, c, n) in query.selects]
+    rows = []
+    for (group, results) in sorted(groups.items()):
+        row = list(group)
+        for select in query.selects:
+            (function, collector, column) = select
+            parts = results.get(select, [])
+            if len(parts) == 1:
+                (cache, entries) = parts[0]
+                value = cache.aggregate(function, collector, column, entries, query.window)[function]
+            else:
+                moments = [
+                    cache.aggregate(function if function in MOMENTS else "count", collector, column, entries, query.window)
+                    for (cache, entries) in parts
+                ]
+                value = _merge(function, moments, parts, collector, column, query.window) if parts else None
+            row.append(value)
+        rows.append(row)
+
+    for cache in {cache for results in groups.values() for parts in results.values() for (cache, _) in parts}:
+        cache.save()
+    return (names, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("query", help="Query, see the module documentation")
+    parser.add_argument(
+        "--root", action="append", default=[], help="Directory holding dumps (Default: .)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    try:
+        query = Query(args.query)
+    except QueryError as error:
+        parser.error(str(error))
+
+    started = time.perf_counter()
+    dumps = find_dumps(args.root or ["."])
+    (names, rows) = run(query, dumps)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps([dict(zip(names, row)) for row in rows], indent=4))
+    else:
+        cells = [names] + [
+            [f"{value:.3f}" if isinstance(value, float) else str(value) for value in row]
+            for row in rows
+        ]
+        widths = [max(len(row[i]) for row in cells) for i in range(len(names))]
+        for row in cells:
+            print("  ".join(cell.ljust(width) for (cell, width) in zip(row, widths)))
+    logger.info("%d rows from %d dumps in %.3f s", len(rows), len(dumps), elapsed)
+
+
+if __name__ == "__main__":
+    main()
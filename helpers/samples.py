@@ -0,0 +1,374 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Keep the samples of NeST and of the collectors in compact typed columns.
+
+A sample of `ss.json` such as `{"timestamp": "1700056022.638097061",
+"cwnd": "20", "rtt": "41.914", ...}` takes about a kilobyte as a dict of
+strings, so a few runs of `ss.json` loaded side by side take gigabytes. A
+`Series` keeps every field of its samples in an `array` of integers:
+
+* timestamps are stored as the difference to the previous sample, in
+  ticks of `resolution` seconds (1 us by default);
+* values are quantized to a `quantum` per field, see `QUANTA`, no coarser
+  than the precision NeST prints them with;
+* a field missing from some samples, such as `ssthresh` before the first
+  loss, has a bit mask of the samples that have it. Fields present in all
+  samples have no mask.
+
+Columns start as 32 bit integers and are widened to 64 bit when a value
+does not fit, so a sample of `ss.json` takes about 30 bytes. `SampleStore`
+holds the series of every entry of a NeST JSON file:
+
+    store = SampleStore.load(dump, "ss")
+    series = store[("h1", "192.168.3.2", "42589")]
+    rtt = series.array("rtt")           # numpy array, NaN where missing
+    for sample in series:               # dicts, as in the JSON file
+        ...
+
+Collectors append to a `Series` as they sample and write its columns with
+`columns()`, see `helpers/qdisc_stats.py`.
+
+Usage (from the repository root), for the memory taken by the samples of a
+dump as dicts and as series:
+
+    python3 -m helpers.samples "cisco_5tcpup_conf/cisco-5tcpup-conf(...)_dump"
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from array import array
+
+# Fields of NeST samples and their quantum, in the units of the JSON files
+QUANTA = {
+    "cwnd": 1,
+    "ssthresh": 1,
+    "rto": 1,
+    "bytes": 1,
+    "packets": 1,
+    "rtt": 0.001,
+    "dev_rtt": 0.001,
+    "delivery_rate": 1e-6,
+    "pacing_rate": 1e-6,
+    "sending_rate": 1e-6,
+    "duration": 1e-6,
+}
+# Quantum of the fields not in `QUANTA`
+QUANTUM = 1e-6
+# Seconds per tick of the timestamps
+RESOLUTION = 1e-6
+COLLECTORS = ("ss", "netperf", "ping", "iperf3", "iperf3Server", "udp_flood", "udp_floodServer")
+
+
+def _digits(quantum):
+    """Decimals that values quantized to `quantum` are rounded to"""
+    return max(0, -math.floor(math.log10(quantum) + 1e-9))
+
+
+def _push(column, value):
+    """Append `value` to `column`, widened to 64 bit if it does not fit"""
+    try:
+        column.append(value)
+    except OverflowError:
+        column = array("q", column)
+        column.append(value)
+    return column
+
+
+def _mask(length):
+    """Bit mask of `length` samples that all have the field"""
+    return bytearray(b"\xff" * (length // 8) + (bytes([(1 << length % 8) - 1]) if length % 8 else b""))
+
+
+def _mark(mask, index, present):
+    """Record in `mask` whether sample `index` has the field"""
+    if len(mask) <= index >> 3:
+        mask.append(0)
+    if present:
+        mask[index >> 3] |= 1 << (index & 7)
+
+
+class Series:
+    """
+    Samples of one entry of a collector, in typed columns
+
+    Parameters
+    ----------
+    resolution : float
+        Seconds per tick of the timestamps (Default value = 1e-6)
+    quanta : dict
+        Field -> quantum, over `QUANTA` (Default value = None)
+    quantum : float
+        Quantum of the other fields (Default value = 1e-6)
+    """
+
+    __slots__ = (
+        "resolution", "quanta", "quantum", "origin", "_ticks", "_deltas", "_columns", "_masks",
+        "_length",
+    )
+
+    def __init__(self, resolution=RESOLUTION, quanta=None, quantum=QUANTUM):
+        self.resolution = resolution
+        self.quanta = dict(QUANTA, **(quanta or {}))
+        self.quantum = quantum
+        self.origin = None
+        self._ticks = 0
+        self._deltas = array("I")
+        self._columns = {}
+        self._masks = {}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def fields(self):
+        """Fields of the samples, in the order they first appeared"""
+        return list(self._columns)
+
+    def append(self, timestamp, values):
+        """
+        Add a sample
+
+        Parameters
+        ----------
+        timestamp : float or str
+            Time of the sample in seconds
+        values : dict
+            Field -> number, or a string of a number as in NeST samples; a
+            `timestamp` key is ignored
+        """
+        timestamp = float(timestamp)
+        if self.origin is None:
+            self.origin = timestamp
+        ticks = round((timestamp - self.origin) / self.resolution)
+        self._deltas = _push(self._deltas, ticks - self._ticks)
+        self._ticks = ticks
+
+        index = self._length
+        for (name, value) in values.items():
+            if name == "timestamp":
+                continue
+            column = self._columns.get(name)
+            if column is None:
+                # A field that first appears late is missing before
+                column = array("i", bytes(4 * index))
+                if index:
+                    self._masks[name] = bytearray(-(-index // 8))
+            quantized = round(float(value) / self.quanta.get(name, self.quantum))
+            self._columns[name] = _push(column, quantized)
+            if name in self._masks:
+                _mark(self._masks[name], index, True)
+        for (name, column) in self._columns.items():
+            if len(column) > index:
+                continue
+            column.append(0)
+            if name not in self._masks:
+                self._masks[name] = _mask(index)
+            _mark(self._masks[name], index, False)
+        self._length += 1
+
+    def timestamps(self):
+        """Time of every sample in seconds"""
+        (ticks, times) = (0, [])
+        digits = _digits(self.resolution)
+        for delta in self._deltas:
+            ticks += delta
+            times.append(round(self.origin + ticks * self.resolution, digits))
+        return times
+
+    def present(self, name):
+        """Whether every sample has field `name`, as a list of bools"""
+        mask = self._masks.get(name)
+        if name not in self._columns:
+            return [False] * self._length
+        if mask is None:
+            return [True] * self._length
+        return [bool(mask[i >> 3] >> (i & 7) & 1) for i in range(self._length)]
+
+    def values(self, name):
+        """Values of field `name`, None where a sample does not have it"""
+        quantum = self.quanta.get(name, self.quantum)
+        digits = _digits(quantum)
+        column = self._columns.get(name, ())
+        decoded = [round(value * quantum, digits) if digits else value * quantum for value in column]
+        if name in self._masks or name not in self._columns:
+            decoded = [
+                value if present else None
+                for (value, present) in zip(decoded or [None] * self._length, self.present(name))
+            ]
+        return decoded
+
+    def array(self, name):
+        """Values of field `name` as a numpy array, NaN where missing"""
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        if not self._length:
+            return np.empty(0)
+        if name == "timestamp":
+            return self.origin + np.cumsum(np.array(self._deltas, dtype=np.int64)) * self.resolution
+        if name not in self._columns:
+            return np.full(self._length, np.nan)
+        values = np.array(self._columns[name], dtype=float) * self.quanta.get(name, self.quantum)
+        if name in self._masks:
+            present = np.unpackbits(
+                np.frombuffer(bytes(self._masks[name]), dtype=np.uint8), bitorder="little"
+            )[: self._length]
+            values[present == 0] = np.nan
+        return values
+
+    def columns(self):
+        """Timestamps and fields as lists, None where missing"""
+        columns = {"timestamp": self.timestamps()}
+        for name in self._columns:
+            columns[name] = self.values(name)
+        return columns
+
+    def __iter__(self):
+        """Every sample as a dict of numbers, without the missing fields"""
+        columns = self.columns()
+        names = list(columns)
+        for row in zip(*columns.values()):
+            yield {name: value for (name, value) in zip(names, row) if value is not None}
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the columns and masks"""
+        total = self._deltas.itemsize * len(self._deltas)
+        for column in self._columns.values():
+            total += column.itemsize * len(column)
+        return total + sum(len(mask) for mask in self._masks.values())
+
+
+class SampleStore:
+    """
+    Series of every entry of a NeST JSON file such as `ss.json`
+
+    Entries are keyed by (source node, name, port), as in the file: the
+    name is the destination address of `ss`, `iperf3` and `udp_flood` and
+    the destination node of `netperf` and `ping`, which have no port.
+
+    Parameters
+    ----------
+    resolution : float
+        Seconds per tick of the timestamps (Default value = 1e-6)
+    quanta : dict
+        Field -> quantum, over `QUANTA` (Default value = None)
+    """
+
+    def __init__(self, resolution=RESOLUTION, quanta=None):
+        self.resolution = resolution
+        self.quanta = quanta
+        self.series = {}
+        self.meta = {}
+
+    def __getitem__(self, key):
+        return self.series[key]
+
+    def __contains__(self, key):
+        return key in self.series
+
+    def __iter__(self):
+        return iter(self.series)
+
+    def __len__(self):
+        return len(self.series)
+
+    def items(self):
+        return self.series.items()
+
+    def add(self, key, samples):
+        """
+        Add the samples of entry `key`, as in a NeST JSON file
+
+        Returns
+        -------
+        Series
+            Series of the entry
+        """
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series(self.resolution, self.quanta)
+        for sample in samples:
+            if "timestamp" in sample:
+                series.append(sample["timestamp"], sample)
+            elif sample.get("meta"):
+                self.meta[key] = {k: v for (k, v) in sample.items() if k != "meta"}
+        return series
+
+    @classmethod
+    def from_nest(cls, data, **kwargs):
+        """
+        Store of the parsed content of a NeST JSON file
+
+        The entries are removed from `data` as they are stored, so the
+        dicts of one entry at a time are alive alongside the store.
+        """
+        store = cls(**kwargs)
+        for (source, entries) in data.items():
+            # Popped from the end, in the order of the file
+            entries.reverse()
+            while entries:
+                entry = entries.pop()
+                for (name, value) in entry.items():
+                    if isinstance(value, list):
+                        store.add((source, name, None), value)
+                    else:
+                        for (port, samples) in value.items():
+                            store.add((source, name, port), samples)
+        data.clear()
+        return store
+
+    @classmethod
+    def load(cls, dump, collector, **kwargs):
+        """Store of `<collector>.json` in the dump folder `dump`"""
+        with open(os.path.join(dump, f"{collector}.json"), "r") as file:
+            return cls.from_nest(json.load(file), **kwargs)
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the columns and masks of every series"""
+        return sum(series.nbytes for series in self.series.values())
+
+
+def _deep_size(value, seen=None):
+    """Bytes taken by `value` and everything it refers to"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for (k, v) in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(v, seen) for v in value)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dump", help="Dump folder of an experiment")
+    args = parser.parse_args()
+
+    print(f"{'collector':16} {'samples':>9} {'dicts':>11} {'series':>11} {'per sample':>15}")
+    for collector in COLLECTORS:
+        path = os.path.join(args.dump, f"{collector}.json")
+        if not os.path.isfile(path):
+            continue
+        with open(path, "r") as file:
+            data = json.load(file)
+        dicts = _deep_size(data)
+        store = SampleStore.from_nest(data)
+        samples = sum(len(series) for (_, series) in store.items())
+        print(
+            f"{collector:16} {samples:9d} {dicts / 2**20:9.2f} MB {store.nbytes / 2**20:8.2f} MB "
+            f"{dicts / max(samples, 1):6.0f} -> {store.nbytes / max(samples, 1):3.0f} B"
+        )
+
+
+if __name__ == "__main__":
+    main()
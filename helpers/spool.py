@@ -0,0 +1,426 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Run sweeps of the example programs through a job spool directory.
+
+A sweep is written into the spool as one JSON job per run. Workers, on this
+host or on any other host that mounts the same spool, claim jobs by renaming
+them out of `pending/`, run the example program and leave its dump in
+`results/<job id>/`.
+
+    spool/
+        pending/<job>.json           waiting to be claimed
+        running/<worker>/<job>.json  claimed by <worker>
+        done/<job>.json              finished, with the return code
+        failed/<job>.json            out of attempts
+        workers/<worker>.json        heartbeat of <worker>
+        workers/<worker>.lock        held by <worker> while it lives
+        results/<job>/               working directory of the run
+
+Claiming is a single `rename`, which is atomic on a local filesystem and on
+NFS, so two workers never run the same job. A worker that stops refreshing
+its heartbeat is considered dead and its jobs are put back into `pending/`
+by the next worker that notices, with their half-written dumps set aside.
+
+Usage (as root, from the repository root):
+
+    python3 -m helpers.spool submit SPOOL cisco_5tcpup_conf/cisco_5tcpup.py \\
+        --sweep tcp=cubic,bbr,reno --sweep qdisc=pie,codel,red
+    python3 -m helpers.spool worker SPOOL --capacity 2
+    python3 -m helpers.spool status SPOOL
+"""
+
+import argparse
+import fcntl
+import itertools
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATES = ("pending", "running", "done", "failed", "workers", "results")
+
+
+def _write_json(path, content):
+    """Write `content` to `path` atomically"""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(content, file, indent=4)
+    os.rename(temp_path, path)
+
+
+def _read_json(path):
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+class Spool:
+    """
+    Spool directory shared by submitters and workers
+
+    Parameters
+    ----------
+    path : str
+        Root of the spool, created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        for state in STATES:
+            os.makedirs(os.path.join(self.path, state), exist_ok=True)
+
+    def _dir(self, *parts):
+        return os.path.join(self.path, *parts)
+
+    def submit(self, script, args=(), max_attempts=3):
+        """
+        Add a run of `script` to the spool
+
+        Parameters
+        ----------
+        script : str
+            Path of the example program
+        args : list(str)
+            Command line arguments of the program
+        max_attempts : int
+            Number of times the job is retried after a worker dies
+            (Default value = 3)
+
+        Returns
+        -------
+        str
+            Id of the job
+        """
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        job = {
+            "id": job_id,
+            "script": os.path.abspath(script),
+            "args": list(args),
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "submitted": time.time(),
+        }
+        _write_json(self._dir("pending", f"{job_id}.json"), job)
+        return job_id
+
+    def claim(self, worker):
+        """
+        Claim the oldest pending job for `worker`
+
+        Returns
+        -------
+        dict
+            The claimed job, or None if nothing is pending
+        """
+        os.makedirs(self._dir("running", worker), exist_ok=True)
+
+        for name in sorted(os.listdir(self._dir("pending"))):
+            if not name.endswith(".json"):
+                continue
+            try:
+                os.rename(
+                    self._dir("pending", name), self._dir("running", worker, name)
+                )
+            except FileNotFoundError:
+                # Another worker renamed it first
+                continue
+            return _read_json(self._dir("running", worker, name))
+
+        return None
+
+    def finish(self, worker, job, returncode):
+        """
+        Move a job of `worker` to `done/`
+
+        The job may have been put back into `pending/` meanwhile by a worker
+        that took `worker` for dead; it is then withdrawn from `pending/`
+        unless it was claimed again already.
+        """
+        job["returncode"] = returncode
+        job["finished"] = time.time()
+        job["worker"] = worker
+        _write_json(self._dir("done", f"{job['id']}.json"), job)
+        try:
+            os.remove(self._dir("running", worker, f"{job['id']}.json"))
+        except FileNotFoundError:
+            logger.warning("Job %s was recovered by another worker before it finished", job["id"])
+            try:
+                os.remove(self._dir("pending", f"{job['id']}.json"))
+            except FileNotFoundError:
+                pass
+
+    def heartbeat(self, worker, capacity, active):
+        """Record that `worker` is alive"""
+        _write_json(
+            self._dir("workers", f"{worker}.json"),
+            {
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "capacity": capacity,
+                "active": active,
+                "time": time.time(),
+            },
+        )
+
+    def recover(self, timeout, alive=(), workers=None):
+        """
+        Put the jobs of dead workers back into `pending/`
+
+        A worker is dead if its heartbeat is older than `timeout` seconds.
+        Partial results of its jobs are renamed so that the retry starts
+        from an empty directory.
+
+        Parameters
+        ----------
+        timeout : float
+            Heartbeat age after which a worker is considered dead
+        alive : list(str)
+            Workers that are known to be alive, such as the caller
+        workers : list(str)
+            Only look at these workers (Default value = None, all workers)
+
+        Returns
+        -------
+        int
+            Number of jobs recovered
+        """
+        recovered = 0
+        now = time.time()
+
+        for worker in workers or os.listdir(self._dir("running")):
+            if worker in alive or not os.path.isdir(self._dir("running", worker)):
+                continue
+
+            heartbeat = self._dir("workers", f"{worker}.json")
+            try:
+                if now - os.stat(heartbeat).st_mtime < timeout:
+                    continue
+            except FileNotFoundError:
+                pass
+
+            for name in os.listdir(self._dir("running", worker)):
+                path = self._dir("running", worker, name)
+                try:
+                    job = _read_json(path)
+                except (FileNotFoundError, ValueError):
+                    continue
+
+                state = "pending"
+                if job["attempts"] >= job["max_attempts"]:
+                    state = "failed"
+                try:
+                    os.rename(path, self._dir(state, name))
+                except FileNotFoundError:
+                    # Another worker recovered it first
+                    continue
+
+                results = self._dir("results", job["id"])
+                if os.path.isdir(results):
+                    os.rename(results, f"{results}.attempt-{job['attempts']}")
+
+                recovered += 1
+                logger.warning(
+                    "Job %s of dead worker %s moved to %s", job["id"], worker, state
+                )
+
+        return recovered
+
+    def status(self):
+        """Number of jobs in each state"""
+        counts = {}
+        for state in ("pending", "done", "failed"):
+            counts[state] = len(
+                [n for n in os.listdir(self._dir(state)) if n.endswith(".json")]
+            )
+        counts["running"] = sum(
+            len(os.listdir(self._dir("running", worker)))
+            for worker in os.listdir(self._dir("running"))
+        )
+        return counts
+
+
+class Worker:
+    """
+    Runs jobs from a spool, at most `capacity` at a time
+
+    Parameters
+    ----------
+    spool : Spool
+        Spool to take jobs from
+    name : str
+        Unique name of the worker (Default value = None, '<host>-<n>' with
+        the smallest `n` not taken by a live worker of this host, so that a
+        restarted worker finds the jobs of its previous life)
+    capacity : int
+        Maximum number of concurrent runs (Default value = 1)
+    poll : float
+        Seconds between checks for new jobs (Default value = 2)
+    timeout : float
+        Heartbeat age after which other workers are considered dead
+        (Default value = 60)
+    """
+
+    def __init__(self, spool, name=None, capacity=1, poll=2, timeout=60):
+        self.spool = spool
+        self._lock = None
+        self.name = name or self._default_name()
+        self.capacity = capacity
+        self.poll = poll
+        self.timeout = timeout
+        self.active = {}  # job id -> (job, Popen)
+
+    def _default_name(self):
+        """
+        '<host>-<n>', held with a lock in `workers/` for the life of the
+        worker
+        """
+        host = socket.gethostname()
+        for number in itertools.count():
+            name = f"{host}-{number}"
+            # pylint: disable=consider-using-with
+            lock = open(self.spool._dir("workers", f"{name}.lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                continue
+            self._lock = lock
+            return name
+
+    def _start(self, job):
+        """Run the example program of `job` in its results directory"""
+        job["attempts"] += 1
+        _write_json(self.spool._dir("running", self.name, f"{job['id']}.json"), job)
+
+        results = self.spool._dir("results", job["id"])
+        os.makedirs(results, exist_ok=True)
+
+        with open(os.path.join(results, "output.log"), "a") as log:
+            process = subprocess.Popen(
+                [sys.executable, job["script"]] + job["args"],
+                cwd=results,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        logger.info("Started job %s: %s %s", job["id"], job["script"], job["args"])
+        self.active[job["id"]] = (job, process)
+
+    def _reap(self):
+        """Move finished runs to `done/`"""
+        for (job_id, (job, process)) in list(self.active.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            del self.active[job_id]
+            self.spool.finish(self.name, job, returncode)
+            logger.info("Finished job %s with return code %d", job_id, returncode)
+
+    def run(self, once=False):
+        """
+        Run jobs until interrupted
+
+        Parameters
+        ----------
+        once : bool
+            Exit when the spool is empty and all runs are finished
+            (Default value = False)
+        """
+        # Jobs left in our own directory by a previous life of this worker
+        self.spool.recover(0, workers=[self.name])
+
+        try:
+            while True:
+                self._reap()
+                self.spool.heartbeat(self.name, self.capacity, len(self.active))
+                self.spool.recover(self.timeout, alive=(self.name,))
+
+                while len(self.active) < self.capacity:
+                    job = self.spool.claim(self.name)
+                    if job is None:
+                        break
+                    self._start(job)
+
+                if once and not self.active:
+                    return
+                time.sleep(self.poll)
+        except KeyboardInterrupt:
+            # Running programs get the same SIGINT and clean up their
+            # namespaces; leave their jobs to be recovered
+            logger.warning("Worker %s interrupted", self.name)
+
+
+def expand_sweep(sweeps):
+    """
+    Expand ['tcp=cubic,bbr', 'qdisc=pie,red'] into argument lists for every
+    combination, such as ['--tcp', 'cubic', '--qdisc', 'pie']
+    """
+    axes = []
+    for sweep in sweeps:
+        (name, values) = sweep.split("=", 1)
+        axes.append([(f"--{name}", value) for value in values.split(",")])
+
+    for combination in itertools.product(*axes):
+        yield [item for pair in combination for item in pair]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Add a sweep to the spool")
+    submit.add_argument("spool")
+    submit.add_argument("script", help="Example program to run")
+    submit.add_argument(
+        "--sweep",
+        action="append",
+        default=[],
+        help="ARG=V1,V2,... runs the program once per value of --ARG",
+    )
+    submit.add_argument("--repeat", type=int, default=1, help="Runs per combination")
+    submit.add_argument("--max_attempts", type=int, default=3)
+
+    worker = commands.add_parser("worker", help="Run jobs from the spool")
+    worker.add_argument("spool")
+    worker.add_argument("--name", type=str, default=None)
+    worker.add_argument("--capacity", type=int, default=1, help="Concurrent runs")
+    worker.add_argument("--poll", type=float, default=2)
+    worker.add_argument("--timeout", type=float, default=60)
+    worker.add_argument("--once", action="store_true", help="Exit when idle")
+
+    status = commands.add_parser("status", help="Count jobs in each state")
+    status.add_argument("spool")
+
+    # Arguments after `--` are passed on to every run of the program
+    argv = sys.argv[1:]
+    extra = []
+    if "--" in argv:
+        (argv, extra) = (argv[: argv.index("--")], argv[argv.index("--") + 1 :])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    spool = Spool(args.spool)
+
+    if args.command == "submit":
+        count = 0
+        for sweep_args in expand_sweep(args.sweep):
+            for _ in range(args.repeat):
+                spool.submit(args.script, sweep_args + extra, args.max_attempts)
+                count += 1
+        logger.info("Submitted %d jobs to %s", count, spool.path)
+    elif args.command == "worker":
+        Worker(
+            spool, args.name, args.capacity, args.poll, args.timeout
+        ).run(args.once)
+    else:
+        print(json.dumps(spool.status(), indent=4))
+
+
+if __name__ == "__main__":
+    main()
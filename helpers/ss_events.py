@@ -0,0 +1,334 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Find congestion events of every TCP flow in the `ss.json` of a dump.
+
+The ss samples of a flow are loaded into a compact `SampleStore`, see
+`helpers/samples.py`, turned into numpy columns once, and the events are
+found with array operations on the whole flow:
+
+* `md`: multiplicative decrease after a loss or an ECN mark. ssthresh drops
+  or is set for the first time, or cwnd falls by more than `--drop`,
+  without falling to the loss window.
+* `rto`: retransmission timeout. cwnd falls to the loss window of 1 or 2
+  segments.
+* `ss_exit`: end of slow start. cwnd reaches ssthresh after being below it
+  or after ssthresh was unset.
+
+Events of all flows are then counted in windows of one RTT. A window in
+which at least `--sync` of the active flows back off is a synchronized loss
+at the bottleneck, and the per-flow event counts per window give the
+correlation of every pair of flows.
+
+Usage (from the repository root):
+
+    python3 -m helpers.ss_events "cisco_5tcpup_conf/cisco-5tcpup-conf(...)_dump" --plot
+
+Results are written to `ss_events.json` in the dump:
+
+    {"flows": {"<flow id>": {"destination_node", "algorithm", "role",
+        "samples", "duration", "events": {"md": [t], "rto": [t], "ss_exit": [t]},
+        "rates": {"md": per second, ...}}},
+     "sync": {"window", "threshold", "backoffs", "synchronized",
+              "synchronized_fraction", "windows": [{"timestamp", "flows"}],
+              "flows": [flow], "correlation": [[r]]}}
+
+Flows are named by their id in the flow index of the dump, see
+`helpers.flow_index`. Times are in seconds since the first ss sample of the
+dump.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .flow_index import FlowIndex
+from .samples import SampleStore
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("md", "rto", "ss_exit")
+COLUMNS = ("timestamp", "cwnd", "ssthresh", "rtt")
+# cwnd at or below this many segments after a fall is a timeout
+LOSS_WINDOW = 2
+
+
+def load_flows(dump, index=None):
+    """
+    Columns of every flow in the `ss.json` of `dump`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    index : FlowIndex
+        Flow ids of the dump (Default value = None, the index of `dump`)
+
+    Returns
+    -------
+    dict
+        Flow id -> {"destination_node", "algorithm", "role", column ->
+        array}; missing values are NaN
+    """
+    store = SampleStore.load(dump, "ss")
+    index = index or FlowIndex.load(dump)
+
+    flows = {}
+    for ((node, address, port), series) in store.items():
+        columns = {column: series.array(column) for column in COLUMNS}
+        columns["destination_node"] = store.meta.get((node, address, port), {}).get(
+            "destination_node"
+        )
+        flow_id = index.lookup("ss", node, address, port)
+        record = index.flows.get(flow_id, {})
+        columns["algorithm"] = record.get("algorithm")
+        columns["role"] = record.get("role")
+        flows[flow_id or f"{node}:{address}:{port}"] = columns
+    return flows
+
+
+def detect(flow, drop=0.15):
+    """
+    Events of one flow
+
+    Parameters
+    ----------
+    flow : dict
+        Columns of the flow, from `load_flows`
+    drop : float
+        Relative fall of cwnd taken as a decrease when ssthresh does not
+        show it (Default value = 0.15)
+
+    Returns
+    -------
+    dict
+        Event -> boolean array, true at the sample that shows the event
+    """
+    (cwnd, ssthresh) = (flow["cwnd"], flow["ssthresh"])
+    previous_cwnd = np.concatenate(([np.nan], cwnd[:-1]))
+    previous_ssthresh = np.concatenate(([np.nan], ssthresh[:-1]))
+
+    with np.errstate(invalid="ignore"):
+        rto = (cwnd <= LOSS_WINDOW) & (previous_cwnd > LOSS_WINDOW)
+        ssthresh_set = ~np.isnan(ssthresh) & np.isnan(previous_ssthresh)
+        # The first sample cannot show a change
+        ssthresh_set[0] = False
+        ssthresh_lower = ssthresh < previous_ssthresh
+        cwnd_fell = cwnd < previous_cwnd * (1 - drop)
+        md = (ssthresh_set | ssthresh_lower | cwnd_fell) & ~rto
+
+        in_slow_start = np.isnan(ssthresh) | (cwnd < ssthresh)
+    was_in_slow_start = np.concatenate(([True], in_slow_start[:-1]))
+    ss_exit = was_in_slow_start & ~in_slow_start & ~md & ~rto
+    # A decrease out of slow start also ends it
+    ss_exit |= md & was_in_slow_start & np.isnan(previous_ssthresh)
+
+    return {"md": md, "rto": rto, "ss_exit": ss_exit}
+
+
+def synchronization(times, start, end, window, threshold):
+    """
+    Windows in which many flows back off together
+
+    Parameters
+    ----------
+    times : dict
+        Flow -> (first sample, last sample, array of back-off times)
+    start : float
+        Start of the first window
+    end : float
+        End of the last window
+    window : float
+        Width of a window in seconds
+    threshold : float
+        Fraction of the active flows that must back off in a window
+
+    Returns
+    -------
+    dict
+        See the module documentation
+    """
+    names = sorted(times)
+    edges = np.arange(start, end + window, window)
+    counts = np.zeros((len(names), max(len(edges) - 1, 1)))
+    active = np.zeros_like(counts, dtype=bool)
+    for (row, name) in enumerate(names):
+        (first, last, events) = times[name]
+        if len(edges) > 1:
+            counts[row] = np.histogram(events, bins=edges)[0]
+            active[row] = (edges[1:] > first) & (edges[:-1] <= last)
+
+    backing_off = (counts > 0).sum(axis=0)
+    needed = np.maximum(2, np.ceil(threshold * active.sum(axis=0)))
+    synchronized = backing_off >= needed
+    total = int(counts.sum())
+    in_sync = int(counts[:, synchronized].sum())
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = np.corrcoef(counts) if len(names) > 1 else np.ones((1, 1))
+    correlation = np.where(np.isnan(correlation), 0.0, correlation)
+
+    return {
+        "window": round(window, 4),
+        "threshold": threshold,
+        "backoffs": total,
+        "synchronized": int(synchronized.sum()),
+        "synchronized_fraction": round(in_sync / total, 4) if total else 0.0,
+        "windows": [
+            {"timestamp": round(float(edges[index]), 3), "flows": int(backing_off[index])}
+            for index in np.nonzero(synchronized)[0]
+        ],
+        "flows": names,
+        "correlation": np.round(correlation, 3).tolist(),
+    }
+
+
+def analyze(dump, window=None, threshold=0.5, drop=0.15, index=None):
+    """
+    Events, event rates and synchronization of every flow in `dump`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    window : float
+        Seconds per synchronization window (Default value = None, the
+        median RTT, but at least the median gap between ss samples)
+    threshold : float
+        Fraction of the active flows that makes a window synchronized
+        (Default value = 0.5)
+    drop : float
+        See `detect` (Default value = 0.15)
+    index : FlowIndex
+        See `load_flows` (Default value = None)
+
+    Returns
+    -------
+    dict
+        Content of `ss_events.json`
+    """
+    flows = load_flows(dump, index)
+    starts = [f["timestamp"][0] for f in flows.values() if len(f["timestamp"])]
+    if not starts:
+        return {"flows": {}, "sync": {}}
+    origin = min(starts)
+
+    results = {}
+    backoffs = {}
+    (rtts, gaps) = ([], [])
+    for (name, flow) in flows.items():
+        timestamps = flow["timestamp"] - origin
+        if not len(timestamps):
+            continue
+        events = detect(flow, drop)
+        duration = float(timestamps[-1] - timestamps[0])
+        results[name] = {
+            "destination_node": flow["destination_node"],
+            "algorithm": flow["algorithm"],
+            "role": flow["role"],
+            "samples": len(timestamps),
+            "duration": round(duration, 3),
+            "events": {
+                event: np.round(timestamps[mask], 3).tolist()
+                for (event, mask) in events.items()
+            },
+            "rates": {
+                event: round(int(mask.sum()) / duration, 4) if duration else 0.0
+                for (event, mask) in events.items()
+            },
+        }
+        backoffs[name] = (
+            timestamps[0],
+            timestamps[-1],
+            timestamps[events["md"] | events["rto"]],
+        )
+        rtts.append(np.nanmedian(flow["rtt"]) / 1000 if len(flow["rtt"]) else np.nan)
+        gaps.append(np.median(np.diff(timestamps)) if len(timestamps) > 1 else np.nan)
+
+    if window is None:
+        window = float(np.nanmax([np.nanmedian(rtts), np.nanmedian(gaps), 0.01]))
+    end = max(last for (_, last, _) in backoffs.values())
+    return {
+        "flows": results,
+        "sync": synchronization(backoffs, 0.0, end, window, threshold),
+    }
+
+
+def plot(dump, results):
+    """Event timeline of every flow, as `ss/events.png` in `dump`"""
+    # pylint: disable=import-outside-toplevel
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    names = sorted(results["flows"])
+    fig = plt.figure(figsize=(10, 1 + 0.4 * len(names)))
+    ax = fig.add_subplot(1, 1, 1)
+    for (marker, event) in zip(("v", "x", "|"), EVENTS):
+        for (row, name) in enumerate(names):
+            times = results["flows"][name]["events"][event]
+            ax.scatter(
+                times, [row] * len(times), marker=marker, s=25,
+                color=f"C{EVENTS.index(event)}", label=event if row == 0 else None,
+            )
+    for window in results["sync"].get("windows", []):
+        ax.axvspan(
+            window["timestamp"],
+            window["timestamp"] + results["sync"]["window"],
+            color="grey",
+            alpha=0.2,
+        )
+    ax.set_yticks(range(len(names)))
+    ax.set_yticklabels(names)
+    ax.set_xlabel("Time (Seconds)")
+    ax.set_title("Congestion events (synchronized windows shaded)")
+    ax.legend(loc="upper right")
+    fig.tight_layout()
+    os.makedirs(os.path.join(dump, "ss"), exist_ok=True)
+    fig.savefig(os.path.join(dump, "ss", "events.png"))
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dump", help="Dump folder of an experiment")
+    parser.add_argument("--window", type=float, default=None, help="Seconds per window")
+    parser.add_argument("--sync", type=float, default=0.5, help="Fraction of flows")
+    parser.add_argument("--drop", type=float, default=0.15, help="Relative cwnd fall")
+    parser.add_argument("--plot", action="store_true", help="Also plot ss/events.png")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    if not os.path.isfile(os.path.join(args.dump, "ss.json")):
+        parser.error(f"No ss.json in {args.dump}")
+
+    started = time.perf_counter()
+    results = analyze(args.dump, args.window, args.sync, args.drop)
+    elapsed = time.perf_counter() - started
+    with open(os.path.join(args.dump, "ss_events.json"), "w") as file:
+        json.dump(results, file, indent=4)
+    if args.plot:
+        plot(args.dump, results)
+
+    for (name, flow) in sorted(results["flows"].items()):
+        rates = ", ".join(f"{event} {rate:.3f}/s" for (event, rate) in flow["rates"].items())
+        logger.info("%s: %s", name, rates)
+    if results["sync"]:
+        logger.info(
+            "%d back-offs, %.0f%% of them in %d synchronized windows of %.3f s",
+            results["sync"]["backoffs"],
+            100 * results["sync"]["synchronized_fraction"],
+            results["sync"]["synchronized"],
+            results["sync"]["window"],
+        )
+    logger.info("Analyzed in %.3f s", elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Start the example programs without the plotting stack of NeST, and time it.
+
+`from nest.experiment import *` imports the plotters of NeST, and with them
+matplotlib and numpy, before the first namespace is created: most of the
+startup time of a short run. `defer_imports` replaces the plotter modules
+with stand-ins whose functions import the real plotters when they are
+first called, so a run only pays for matplotlib when it plots, and not at
+all when its plotting is left to `helpers/postprocess.py`. It must be called
+before anything imports `nest.experiment`:
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    from helpers import startup
+    startup.defer_imports()
+
+    from nest.topology import *
+    from nest.experiment import *
+    ...
+    startup.mark("imports")
+    ...                             # build the topology and the flows
+    startup.mark("topology")
+    exp.run()
+    startup.report()
+
+`mark` ends a phase of the startup, timed from the end of the previous one.
+The first phase, `python`, is the start of the interpreter up to the import
+of this module; `defer_imports` adds `launch`, from `exp.run()` to the start
+of the traffic; `report` ends the `run` phase, logs the breakdown and writes
+it to `startup.json` in the dump.
+
+Usage (from the repository root), for the import time of NeST per module,
+with the plotters deferred or, with `--eager`, as the programs did before:
+
+    python3 -m helpers.startup imports
+    python3 -m helpers.startup imports --eager --top 20
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+PLOTTER_PACKAGE = "nest.experiment.plotter"
+# Plotter module -> function that `nest.experiment.run_exp` imports from it
+PLOTTERS = {
+    "ss": "plot_ss",
+    "netperf": "plot_netperf",
+    "iperf3": "plot_iperf3",
+    "tc": "plot_tc",
+    "ping": "plot_ping",
+}
+RUN_EXP = "nest.experiment.run_exp"
+
+
+def _process_age():
+    """Seconds since this process started, from /proc, or 0 if unknown"""
+    try:
+        with open("/proc/self/stat", "r") as file:
+            # The command may contain spaces; fields after it are fixed
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return 0.0
+    return max(uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+_phases = [("python", _process_age())]
+_last = time.perf_counter()
+_deferred = False
+
+
+def mark(phase):
+    """
+    End `phase`, which started at the end of the previous phase
+
+    Parameters
+    ----------
+    phase : str
+        Name of the phase, such as 'imports' or 'topology'
+    """
+    global _last  # pylint: disable=global-statement
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+
+def phases():
+    """
+    Phases so far
+
+    Returns
+    -------
+    list((str, float))
+        Name and duration in seconds of every phase, in order
+    """
+    return list(_phases)
+
+
+class _Plotter:
+    """Stand-in for a plotter function of NeST that imports it when called"""
+
+    def __init__(self, module, function):
+        self.module = module
+        self.function = function
+
+    def __call__(self, *args, **kwargs):
+        return load_plotters()[self.function](*args, **kwargs)
+
+
+def load_plotters():
+    """
+    Import the real plotters of NeST in place of the stand-ins
+
+    Returns
+    -------
+    dict
+        Function name -> plotter function
+    """
+    for name in [PLOTTER_PACKAGE] + [f"{PLOTTER_PACKAGE}.{m}" for m in PLOTTERS]:
+        if getattr(sys.modules.get(name), "__deferred__", False):
+            del sys.modules[name]
+    functions = {
+        function: getattr(importlib.import_module(f"{PLOTTER_PACKAGE}.{module}"), function)
+        for (module, function) in PLOTTERS.items()
+    }
+    run_exp = sys.modules.get(RUN_EXP)
+    if run_exp is not None:
+        for (function, plotter) in functions.items():
+            setattr(run_exp, function, plotter)
+    return functions
+
+
+class _Loader:
+    """Loader that calls `callback` with the module once it is executed"""
+
+    def __init__(self, loader, callback):
+        self.loader = loader
+        self.callback = callback
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.loader.exec_module(module)
+        self.callback(module)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _AfterImport:
+    """
+    Meta path finder that calls `callback` with module `name` right after
+    its first import
+
+    Duck-typed rather than derived from `importlib.abc`, whose import costs
+    more than the rest of this module.
+    """
+
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.name:
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _Loader(spec.loader, self.callback)
+        return spec
+
+
+def _patch_run_exp(run_exp):
+    setup_flow_workers = run_exp.setup_flow_workers
+    setup_plotter_workers = run_exp.setup_plotter_workers
+
+    def timed_setup_flow_workers(*args, **kwargs):
+        workers = setup_flow_workers(*args, **kwargs)
+        mark("launch")
+        return workers
+
+    def loaded_setup_plotter_workers():
+        # Import matplotlib once, before the plotting processes fork
+        load_plotters()
+        return setup_plotter_workers()
+
+    run_exp.setup_flow_workers = timed_setup_flow_workers
+    run_exp.setup_plotter_workers = loaded_setup_plotter_workers
+
+
+def defer_imports():
+    """
+    Defer the import of the plotters of NeST until results are plotted
+
+    Returns
+    -------
+    bool
+        Whether the plotters are deferred; not if `nest.experiment` was
+        already imported
+    """
+    global _deferred  # pylint: disable=global-statement
+    if _deferred:
+        return True
+    if RUN_EXP in sys.modules:
+        logger.warning("nest.experiment is already imported, its plotters are not deferred")
+        return False
+
+    # Only the modules that `run_exp` imports are stand-ins: the package
+    # keeps its real path, so that its other modules, such as `common`,
+    # import as usual
+    nest = importlib.util.find_spec("nest")
+    package = type(sys)(PLOTTER_PACKAGE)
+    package.__path__ = [
+        os.path.join(location, *PLOTTER_PACKAGE.split(".")[1:]) for location in nest.submodule_search_locations
+    ]
+    package.__deferred__ = True
+    sys.modules[PLOTTER_PACKAGE] = package
+    for (name, function) in PLOTTERS.items():
+        module = type(sys)(f"{PLOTTER_PACKAGE}.{name}")
+        module.__deferred__ = True
+        setattr(module, function, _Plotter(name, function))
+        setattr(package, name, module)
+        sys.modules[module.__name__] = module
+    sys.meta_path.insert(0, _AfterImport(RUN_EXP, _patch_run_exp))
+    _deferred = True
+    return True
+
+
+def report(dump=None, phase="run"):
+    """
+    End `phase`, log the breakdown and write it to `startup.json`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder to write `startup.json` in (Default value = None, the
+        dump of the last experiment, if any)
+    phase : str
+        Name of the phase that ends now (Default value = 'run')
+
+    Returns
+    -------
+    dict
+        Content of `startup.json`
+    """
+    mark(phase)
+    total = sum(seconds for (_, seconds) in _phases)
+    for (name, seconds) in _phases:
+        logger.info("%-10s %8.3f s %5.1f%%", name, seconds, 100 * seconds / max(total, 1e-9))
+    results = {
+        "deferred": _deferred,
+        "phases": {name: round(seconds, 4) for (name, seconds) in _phases},
+        "total": round(total, 4),
+    }
+    if dump is None and "nest.experiment.pack" in sys.modules:
+        dump = sys.modules["nest.experiment.pack"].Pack.FOLDER or None
+    if dump and os.path.isdir(dump):
+        with open(os.path.join(dump, "startup.json"), "w") as file:
+            json.dump(results, file, indent=4)
+    return results
+
+
+def import_times(eager=False):
+    """
+    Import time of `nest.topology` and `nest.experiment`, per module
+
+    The imports run in a fresh interpreter with `-X importtime`.
+
+    Parameters
+    ----------
+    eager : bool
+        Import the plotters as well, as without `defer_imports`
+        (Default value = False)
+
+    Returns
+    -------
+    (float, list((str, float, float)))
+        Total seconds, and the name, own and cumulative seconds of every
+        module imported
+    """
+    code = "from helpers import startup\n"
+    if not eager:
+        code += "startup.defer_imports()\n"
+    code += "from nest.topology import *\nfrom nest.experiment import *\n"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    (total, modules) = (0.0, [])
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        (own, cumulative, name) = line[len("import time:"):].split("|")
+        (own, cumulative) = (int(own) / 1e6, int(cumulative) / 1e6)
+        if not name[1:].startswith(" "):
+            # Imported by the code itself, not by another module
+            total += cumulative
+        modules.append((name.strip(), own, cumulative))
+    return (total, modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    imports = commands.add_parser("imports", help="Import time of NeST per module")
+    imports.add_argument("--eager", action="store_true", help="Import the plotters as well")
+    imports.add_argument("--top", type=int, default=15, help="Number of modules to list")
+    args = parser.parse_args()
+
+    (total, modules) = import_times(args.eager)
+    packages = {}
+    for (name, own, _) in modules:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + own
+    print(f"Imports: {total:.3f} s ({'eager' if args.eager else 'plotters deferred'})")
+    print("\nPer package (own time):")
+    for (root, seconds) in sorted(packages.items(), key=lambda p: -p[1])[: args.top]:
+        print(f"  {seconds:8.3f} s  {root}")
+    print("\nPer module (cumulative time):")
+    for (name, _, cumulative) in sorted(modules, key=lambda m: -m[2])[: args.top]:
+        print(f"  {cumulative:8.3f} s  {name}")
+
+
+if __name__ == "__main__":
+    main()
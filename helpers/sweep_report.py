@@ -0,0 +1,505 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Render the runs of a sweep as heatmaps and rankings over two of its arguments.
+
+A sweep such as `--tcp` x `--qdisc` of `cisco_5tcpup.py` or `--tcp1` x
+`--tcp2` of `tcp_2_smackdown.py` leaves one dump per run, each with dozens
+of plots. This report reduces every dump to a summary, averages the
+summaries of the runs of every cell of the grid and draws one heatmap per
+metric, with the rows and columns of the grid:
+
+* `throughput`: sum over flows of the mean rate over the run (Mbps), the
+  sending rate in `netperf.json` and the receiving rate in
+  `iperf3Server.json` (or the sending rate in `iperf3.json` without it).
+  Every sample counts for the time since the previous sample of its flow,
+  and a flow counts as idle while it does not report, as netperf does
+  with starved flows;
+* `share`: throughput of the flows of the algorithm of the row over its
+  fair share, 1 when it gets as much per flow as the other flows, only if
+  the row argument is a TCP algorithm;
+* `fairness`: Jain's index of the mean rates of the TCP flows, 1 when all
+  flows get the same;
+* `rtt_p50`, `rtt_p95`: percentiles of the RTT in `ping.json`, or of
+  `ss.json` without pings (ms).
+
+The first `--warmup` seconds of every run are left out. Cells whose runs
+have problems in `bottleneck.json`, `watchdog.json` or `host.json` are
+marked with `!` in the heatmaps and the rankings.
+
+Runs are found in a spool of `helpers.spool`, whose jobs hold the arguments
+of every run, or as dump folders below directories, whose arguments are
+those of `helpers.catalog.describe` (`experiment`, `algorithms`, `qdiscs`).
+Summaries are kept in `OUTPUT/cells.json` with the size and time of the
+files they were computed from, so running the report again as a sweep
+progresses only reads the dumps that are new or changed. The columns of
+every dump are those of its `helpers.query` cache. Everything goes to
+`OUTPUT/`: `report.json` with the matrices and rankings, `report.md` with
+the ranking tables and `heatmap_<metric>.png`.
+
+Usage (from the repository root):
+
+    python3 -m helpers.sweep_report --spool /srv/spool --rows tcp --cols qdisc
+    python3 -m helpers.sweep_report --spool /srv/spool --rows tcp1 --cols tcp2 --output report
+    python3 -m helpers.sweep_report --root results/ --rows algorithms --cols qdiscs
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .catalog import describe
+from .flow_index import ROLES
+from .metrics import mean_rates
+from .query import COLLECTORS, DumpCache, find_dumps
+
+logger = logging.getLogger(__name__)
+
+OUTPUT = "sweep_report"
+# Bump when the summary of a dump changes
+VERSION = 3
+# Files the problems of a run are read from, besides the collectors
+CHECKS = ("bottleneck.json", "watchdog.json", "host.json")
+# Metric -> (label, True if higher is better)
+METRICS = {
+    "throughput": ("Throughput (Mbps)", True),
+    "share": ("Throughput over fair share of the row algorithm", None),
+    "fairness": ("Jain's fairness index", True),
+    "rtt_p50": ("Median RTT (ms)", False),
+    "rtt_p95": ("95th percentile RTT (ms)", False),
+}
+
+
+def _signature(dump):
+    """Size and modification time of the files a summary is computed from"""
+    signature = {}
+    for name in [f"{collector}.json" for collector in COLLECTORS + (ROLES,)] + list(CHECKS):
+        path = os.path.join(dump, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            signature[name] = [stat.st_size, stat.st_mtime]
+    return signature
+
+
+def _problems(dump):
+    problems = []
+    for name in ("bottleneck.json", "watchdog.json"):
+        path = os.path.join(dump, name)
+        if os.path.isfile(path):
+            with open(path, "r") as file:
+                problems.extend(json.load(file).get("problems", []))
+    path = os.path.join(dump, "host.json")
+    if os.path.isfile(path):
+        with open(path, "r") as file:
+            if json.load(file).get("suspect"):
+                problems.append("the host saturated, see host.json")
+    return problems
+
+
+def _rate_columns(cache):
+    """
+    (collector, column) of the rates of the flows of the run: the sending
+    rate of TCP flows, the receiving rate of UDP flows if their servers
+    report it, as their senders do not slow down for the bottleneck
+    """
+    columns = [("netperf", "sending_rate")]
+    for client in ("iperf3", "udp_flood"):
+        if cache.index["entries"].get(f"{client}Server"):
+            columns.append((f"{client}Server", "receiving_rate"))
+        else:
+            columns.append((client, "sending_rate"))
+    return [
+        (collector, column)
+        for (collector, column) in columns
+        if cache.index["entries"].get(collector) and f"column_{column}" in cache.columns(collector)
+    ]
+
+
+def _mean_rates(cache, warmup):
+    """
+    Mean rate of every entry of `_rate_columns` over the run, the window of
+    all their samples after `warmup`, see `helpers.metrics.mean_rates`
+
+    Returns
+    -------
+    dict
+        Collector -> mean rate of every entry, None if it has no samples
+    """
+    samples = {}
+    for (collector, column) in _rate_columns(cache):
+        columns = cache.columns(collector)
+        keep = ~np.isnan(columns[f"column_{column}"])
+        samples[collector] = (columns["entry"][keep], columns["time"][keep], columns[f"column_{column}"][keep])
+    times = [stamps for (_, stamps, _) in samples.values() if len(stamps)]
+    if not times:
+        return {}
+    start = min(stamps.min() for stamps in times)
+    end = max(stamps.max() for stamps in times)
+    means = {}
+    for (collector, (entry, stamps, rate)) in samples.items():
+        count = len(cache.index["entries"][collector])
+        means[collector] = [
+            None if np.isnan(mean) else float(mean)
+            for mean in mean_rates(entry, stamps, rate, count, start, end, warmup)
+        ]
+    return means
+
+
+def summarize(dump, warmup=5.0):
+    """
+    Summary of the run in `dump`
+
+    Parameters
+    ----------
+    dump : str
+        Dump folder of an experiment
+    warmup : float
+        Seconds left out at the start of the run (Default value = 5.0)
+
+    Returns
+    -------
+    dict
+        "throughput", "fairness", "rtt_p50", "rtt_p95", "share" and
+        "flows" per algorithm, "rates" of the flows, sorted, "problems"
+    """
+    cache = DumpCache(dump).load()
+    window = (warmup, None)
+    (rates, tcp_rates, share, flows) = ([], [], {}, {})
+    for (collector, means) in _mean_rates(cache, warmup).items():
+        for (entry, rate) in zip(cache.index["entries"][collector], means):
+            if rate is None:
+                continue
+            rates.append(rate)
+            algorithm = entry["algorithm"] or entry["protocol"] or collector
+            share[algorithm] = share.get(algorithm, 0.0) + rate
+            flows[algorithm] = flows.get(algorithm, 0) + 1
+            if collector == "netperf":
+                tcp_rates.append(rate)
+    total = sum(rates)
+    if total:
+        share = {algorithm: rate / total for (algorithm, rate) in share.items()}
+
+    collector = "ping" if cache.index["entries"].get("ping") else "ss"
+    entries = list(range(len(cache.index["entries"].get(collector, []))))
+    rtt = cache.values(collector, "rtt", entries, window) if entries else np.zeros(0)
+    tcp_rates = np.array(tcp_rates)
+    fairness = None
+    if len(tcp_rates) and (tcp_rates ** 2).sum():
+        fairness = float(tcp_rates.sum() ** 2 / (len(tcp_rates) * (tcp_rates ** 2).sum()))
+    cache.save()
+    return {
+        "throughput": round(total, 4),
+        "fairness": round(fairness, 4) if fairness is not None else None,
+        "rtt_p50": round(float(np.percentile(rtt, 50)), 4) if len(rtt) else None,
+        "rtt_p95": round(float(np.percentile(rtt, 95)), 4) if len(rtt) else None,
+        "share": share,
+        "flows": flows,
+        "rates": sorted(round(rate, 4) for rate in rates),
+        "problems": _problems(dump),
+    }
+
+
+def split_arguments(args):
+    """{'tcp': 'cubic', ...} from ['--tcp', 'cubic', ...]"""
+    arguments = {}
+    (position, args) = (0, list(args))
+    while position < len(args):
+        if args[position].startswith("--"):
+            name = args[position][2:]
+            if position + 1 < len(args) and not args[position + 1].startswith("--"):
+                arguments[name] = args[position + 1]
+                position += 2
+                continue
+            arguments[name] = "true"
+        position += 1
+    return arguments
+
+
+def spool_runs(spool):
+    """
+    (dump, arguments) of every finished run of a spool of `helpers.spool`
+    """
+    runs = []
+    for path in sorted(glob.glob(os.path.join(spool, "done", "*.json"))):
+        with open(path, "r") as file:
+            job = json.load(file)
+        arguments = split_arguments(job["args"])
+        for dump in find_dumps([os.path.join(spool, "results", job["id"])]):
+            runs.append((dump, arguments))
+    return runs
+
+
+def dump_runs(roots):
+    """(dump, arguments) of every dump below `roots`, see `describe`"""
+    runs = []
+    for dump in find_dumps(roots):
+        run = describe(dump)
+        runs.append(
+            (
+                dump,
+                {
+                    "experiment": run["experiment"],
+                    "algorithms": "+".join(run["algorithms"]) or "-",
+                    "qdiscs": "+".join(run["qdiscs"]) or "-",
+                },
+            )
+        )
+    return runs
+
+
+class SweepReport:
+    """
+    Summaries of the runs of a sweep, kept in `output/cells.json`
+
+    Parameters
+    ----------
+    output : str
+        Directory of the report (Default value = 'sweep_report')
+    warmup : float
+        Seconds left out at the start of every run (Default value = 5.0)
+    """
+
+    def __init__(self, output=OUTPUT, warmup=5.0):
+        self.output = output
+        self.warmup = warmup
+        self.cells = {}
+        path = os.path.join(output, "cells.json")
+        if os.path.isfile(path):
+            with open(path, "r") as file:
+                cached = json.load(file)
+            if cached.get("version") == VERSION and cached.get("warmup") == warmup:
+                self.cells = cached["dumps"]
+
+    def update(self, runs):
+        """
+        Summarize the runs that are new or changed since the last report
+
+        Parameters
+        ----------
+        runs : list((str, dict))
+            Dump and arguments of every run
+
+        Returns
+        -------
+        int
+            Number of dumps summarized
+        """
+        summarized = 0
+        dumps = {}
+        for (dump, arguments) in runs:
+            dump = os.path.abspath(dump)
+            signature = _signature(dump)
+            cell = self.cells.get(dump)
+            if cell is None or cell["signature"] != signature:
+                try:
+                    summary = summarize(dump, self.warmup)
+                except (OSError, ValueError, KeyError) as error:
+                    logger.warning("Skipping %s: %s", dump, error)
+                    continue
+                cell = {"signature": signature, "summary": summary}
+                summarized += 1
+            dumps[dump] = dict(cell, arguments=arguments)
+        # Runs that left the sweep are dropped
+        self.cells = dumps
+        os.makedirs(self.output, exist_ok=True)
+        with open(os.path.join(self.output, "cells.json"), "w") as file:
+            json.dump({"version": VERSION, "warmup": self.warmup, "dumps": self.cells}, file)
+        return summarized
+
+    def grid(self, rows, cols):
+        """
+        Metrics of every cell of the grid, averaged over its runs
+
+        Parameters
+        ----------
+        rows, cols : str
+            Arguments of the runs along the rows and columns
+
+        Returns
+        -------
+        dict
+            "rows", "cols" (values), "runs" and "problems" per cell, and
+            "metrics": metric -> matrix, None where a cell has no value
+        """
+        cells = {}
+        for cell in self.cells.values():
+            key = (cell["arguments"].get(rows, "-"), cell["arguments"].get(cols, "-"))
+            cells.setdefault(key, []).append(cell["summary"])
+        row_values = sorted({row for (row, _) in cells})
+        col_values = sorted({col for (_, col) in cells})
+        shared = any(len(s["flows"]) > 1 for summaries in cells.values() for s in summaries)
+
+        def metric(summary, name, row):
+            if name != "share":
+                return summary[name]
+            # Share of the flows of `row` over their part of all flows
+            flows = sum(summary["flows"].values())
+            if row not in summary["flows"] or not flows:
+                return None
+            return summary["share"].get(row, 0.0) / (summary["flows"][row] / flows)
+
+        grid = {
+            "rows": row_values,
+            "cols": col_values,
+            "axes": [rows, cols],
+            "runs": [[len(cells.get((r, c), [])) for c in col_values] for r in row_values],
+            "problems": [
+                [sorted({p for s in cells.get((r, c), []) for p in s["problems"]}) for c in col_values]
+                for r in row_values
+            ],
+            "metrics": {},
+        }
+        for name in METRICS:
+            if name == "share" and not shared:
+                continue
+            matrix = []
+            for row in row_values:
+                line = []
+                for col in col_values:
+                    values = [metric(s, name, row) for s in cells.get((row, col), [])]
+                    values = [v for v in values if v is not None]
+                    line.append(round(float(np.mean(values)), 4) if values else None)
+                matrix.append(line)
+            if any(v is not None for line in matrix for v in line):
+                grid["metrics"][name] = matrix
+        return grid
+
+
+def rankings(grid):
+    """
+    Cells of the grid ordered from best to worst for every metric
+
+    Returns
+    -------
+    dict
+        metric -> [{"row", "col", "value", "runs", "problems"}]
+    """
+    ranked = {}
+    for (name, matrix) in grid["metrics"].items():
+        higher = METRICS[name][1]
+        cells = []
+        for (i, row) in enumerate(grid["rows"]):
+            for (j, col) in enumerate(grid["cols"]):
+                if matrix[i][j] is None:
+                    continue
+                cells.append(
+                    {
+                        "row": row,
+                        "col": col,
+                        "value": matrix[i][j],
+                        "runs": grid["runs"][i][j],
+                        "problems": len(grid["problems"][i][j]),
+                    }
+                )
+        if higher is None:
+            # Closest to the fair share first
+            cells.sort(key=lambda cell: abs(np.log(max(cell["value"], 1e-9))))
+        else:
+            cells.sort(key=lambda cell: cell["value"], reverse=higher)
+        ranked[name] = cells
+    return ranked
+
+
+def plot(grid, output):
+    """One heatmap per metric of the grid, as `output/heatmap_<metric>.png`"""
+    # pylint: disable=import-outside-toplevel
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import TwoSlopeNorm
+
+    (rows, cols) = (grid["rows"], grid["cols"])
+    for (name, matrix) in grid["metrics"].items():
+        (label, higher) = METRICS[name]
+        values = np.array([[np.nan if v is None else v for v in line] for line in matrix])
+        fig = plt.figure(figsize=(2 + 1.1 * len(cols), 1.5 + 0.6 * len(rows)))
+        ax = fig.add_subplot(1, 1, 1)
+        if higher is None:
+            spread = max(np.nanmax(np.abs(values - 1.0)), 1e-3)
+            image = ax.imshow(
+                values, cmap="coolwarm", norm=TwoSlopeNorm(1.0, 1.0 - spread, 1.0 + spread)
+            )
+        else:
+            image = ax.imshow(values, cmap="RdYlGn" if higher else "RdYlGn_r")
+        for (i, line) in enumerate(matrix):
+            for (j, value) in enumerate(line):
+                if value is None:
+                    continue
+                mark = "!" if grid["problems"][i][j] else ""
+                ax.text(j, i, f"{value:.3g}{mark}", ha="center", va="center", fontsize=9)
+        ax.set_xticks(range(len(cols)))
+        ax.set_xticklabels(cols, rotation=45, ha="right")
+        ax.set_yticks(range(len(rows)))
+        ax.set_yticklabels(rows)
+        ax.set_xlabel(f"--{grid['axes'][1]}")
+        ax.set_ylabel(f"--{grid['axes'][0]}")
+        ax.set_title(label)
+        fig.colorbar(image, ax=ax)
+        fig.tight_layout()
+        fig.savefig(os.path.join(output, f"heatmap_{name}.png"))
+        plt.close(fig)
+
+
+def markdown(grid, ranked):
+    """Ranking tables of every metric, in Markdown"""
+    (rows, cols) = grid["axes"]
+    lines = [f"# Sweep over --{rows} x --{cols}", ""]
+    for (name, cells) in ranked.items():
+        lines += [f"## {METRICS[name][0]}", "", f"| # | {rows} | {cols} | {name} | runs |", "|---|---|---|---|---|"]
+        for (rank, cell) in enumerate(cells, 1):
+            mark = " !" if cell["problems"] else ""
+            lines.append(
+                f"| {rank} | {cell['row']} | {cell['col']} | {cell['value']:.4g}{mark} | {cell['runs']} |"
+            )
+        lines.append("")
+    lines.append("`!`: some runs of the cell have problems, see `report.json`.")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--spool", action="append", default=[], help="Spool of helpers.spool")
+    parser.add_argument("--root", action="append", default=[], help="Directory holding dumps")
+    parser.add_argument("--rows", required=True, help="Argument along the rows, such as tcp")
+    parser.add_argument("--cols", required=True, help="Argument along the columns, such as qdisc")
+    parser.add_argument("--output", default=OUTPUT, help="Directory of the report")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds left out of every run")
+    parser.add_argument("--no_plot", action="store_true", help="Skip the heatmaps")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    if not args.spool and not args.root:
+        parser.error("Give a --spool or a --root")
+    runs = [run for spool in args.spool for run in spool_runs(spool)] + (
+        dump_runs(args.root) if args.root else []
+    )
+    if not runs:
+        parser.error("No runs found")
+
+    started = time.perf_counter()
+    report = SweepReport(args.output, args.warmup)
+    summarized = report.update(runs)
+    grid = report.grid(args.rows, args.cols)
+    ranked = rankings(grid)
+    with open(os.path.join(args.output, "report.json"), "w") as file:
+        json.dump(dict(grid, rankings=ranked), file, indent=4)
+    with open(os.path.join(args.output, "report.md"), "w") as file:
+        file.write(markdown(grid, ranked))
+    if not args.no_plot:
+        plot(grid, args.output)
+    logger.info(
+        "%d runs in %d x %d cells, %d summarized, in %.2f s, see %s",
+        len(report.cells), len(grid["rows"]), len(grid["cols"]), summarized,
+        time.perf_counter() - started, args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""Topology builders for scenarios that are too large to wire by hand"""
+
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+from nest.topology import Node, Router, connect
+from nest.experiment import Flow
+
+
+class AddressPool:
+    """
+    Hands out point to point subnets from a larger address pool.
+
+    The example programs give every link its own `192.168.N.0/24` network,
+    which runs out after 255 links. The pool instead carves `/30` or `/31`
+    subnets out of any network, so `10.0.0.0/8` is good for millions of links.
+
+    Parameters
+    ----------
+    pool : str
+        Address pool in CIDR notation (Default value = '10.0.0.0/8')
+    prefix : int
+        Prefix length of every point to point subnet, 30 or 31
+        (Default value = 30)
+    """
+
+    def __init__(self, pool="10.0.0.0/8", prefix=30):
+        if prefix not in (30, 31):
+            raise ValueError("Point to point subnets should be /30 or /31")
+
+        self.pool = ipaddress.ip_network(pool)
+        if prefix < self.pool.prefixlen:
+            raise ValueError(f"Address pool {pool} is smaller than a /{prefix}")
+
+        self.prefix = prefix
+        self.allocated = 0
+        # `subnets()` is a generator, so large pools are never expanded
+        self._subnets = self.pool.subnets(new_prefix=prefix)
+
+    @property
+    def capacity(self):
+        """Number of point to point subnets in the pool"""
+        return 2 ** (self.prefix - self.pool.prefixlen)
+
+    def next_pair(self):
+        """
+        Allocate the next subnet from the pool
+
+        Returns
+        -------
+        (str, str)
+            Addresses (with prefix length) of the two ends of the link
+        """
+        try:
+            subnet = next(self._subnets)
+        except StopIteration as err:
+            raise ValueError(f"Address pool {self.pool} is exhausted") from err
+
+        self.allocated += 1
+
+        # A /31 has no network and broadcast address (RFC 3021)
+        if self.prefix == 31:
+            (first, second) = (subnet[0], subnet[1])
+        else:
+            (first, second) = (subnet[1], subnet[2])
+
+        return (f"{first}/{self.prefix}", f"{second}/{self.prefix}")
+
+
+def run_batched(function, items, workers=16):
+    """
+    Call `function` on every item using a pool of worker threads.
+
+    Every NeST call that configures an interface or a route spawns an `ip`
+    or `tc` process, so topologies with hundreds of links spend most of their
+    setup time waiting on process startup. Items that touch different
+    namespaces are independent and can be configured in parallel.
+
+    Parameters
+    ----------
+    function : callable
+        Function called with a single item
+    items : list
+        Items to configure
+    workers : int
+        Number of parallel workers (Default value = 16)
+    """
+    if workers <= 1:
+        for item in items:
+            function(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Consume the iterator so that the first exception is raised here
+        for _ in pool.map(function, items):
+            pass
+
+
+def assign_addresses(links, addresses, workers=16):
+    """
+    Give every link the next subnet from `addresses`
+
+    Subnets are allocated up front so that the address of a link does not
+    depend on the order in which the workers finish.
+
+    Parameters
+    ----------
+    links : list((Interface, Interface))
+        Interface pairs returned by `connect`
+    addresses : AddressPool
+        Pool the subnets are allocated from
+    workers : int
+        Number of parallel workers (Default value = 16)
+    """
+    assignments = [(link, addresses.next_pair()) for link in links]
+
+    def assign(assignment):
+        ((interface1, interface2), (address1, address2)) = assignment
+        interface1.set_address(address1)
+        interface2.set_address(address2)
+
+    run_batched(assign, assignments, workers)
+
+
+def set_link_attributes(interfaces, bandwidth, delay, workers=16):
+    """
+    Set the same bandwidth and delay on many interfaces
+
+    Parameters
+    ----------
+    interfaces : list(Interface)
+        Interfaces to configure
+    bandwidth : str
+        Bandwidth, for example '1000mbit'
+    delay : str
+        Delay, for example '1ms'
+    workers : int
+        Number of parallel workers (Default value = 16)
+    """
+    run_batched(
+        lambda interface: interface.set_attributes(bandwidth, delay),
+        interfaces,
+        workers,
+    )
+
+
+class FanOut:
+    """
+    Dumbbell with a single host on one side and `leaves` hosts on the other.
+
+    ##########################################################################
+    #                                                                        #
+    #                                                 |------------ h2       #
+    #          <- edge ->          <- bottleneck ->   |------------ h3       #
+    #   h1 ----------------- r1 ------------------- r2        .              #
+    #                                                 |        .             #
+    #                                                 |------------ hN+1     #
+    #                                                       <- edge ->       #
+    #                                                                        #
+    ##########################################################################
+
+    Every link gets its own point to point subnet from an `AddressPool`.
+    Nodes and veth pairs are created one after the other since NeST draws
+    their ids from a shared counter. Addresses, link attributes and routes of
+    the leaves are then configured in parallel batches.
+
+    Attributes
+    ----------
+    source : Node
+        `h1`, the host on the single side of the fan
+    r1, r2 : Router
+        Routers on either side of the bottleneck
+    eth1, etr1a : Interface
+        Interfaces of the `h1` -- `r1` link
+    etr1b, etr2a : Interface
+        Interfaces of the `r1` -- `r2` bottleneck link
+    hosts : list(Node)
+        Leaf hosts `h2` onwards
+    leaf_links : list((Interface, Interface))
+        (interface at `r2`, interface at leaf) for every leaf
+    """
+
+    def __init__(self, leaves, pool="10.0.0.0/8", prefix=30, workers=16):
+        """
+        Parameters
+        ----------
+        leaves : int
+            Number of leaf hosts
+        pool : str
+            Address pool for all the links (Default value = '10.0.0.0/8')
+        prefix : int
+            Prefix length of each link, 30 or 31 (Default value = 30)
+        workers : int
+            Number of parallel workers used during setup (Default value = 16)
+        """
+        if leaves < 1:
+            raise ValueError("A fan-out topology needs at least one leaf")
+
+        self.addresses = AddressPool(pool, prefix)
+        if self.addresses.capacity < leaves + 2:
+            raise ValueError(
+                f"Address pool {pool} has only {self.addresses.capacity} "
+                f"/{prefix} subnets, but {leaves + 2} links are needed"
+            )
+
+        self.leaves = leaves
+        self.workers = workers
+        self.hosts = []
+        self.leaf_links = []
+
+        self._build()
+
+    def _build(self):
+        """Create nodes, connect them, assign addresses and add routes"""
+        self.source = Node("h1")
+        self.r1 = Router("r1")
+        self.r2 = Router("r2")
+
+        (self.eth1, self.etr1a) = connect(self.source, self.r1)
+        (self.etr1b, self.etr2a) = connect(self.r1, self.r2)
+
+        for index in range(self.leaves):
+            host = Node(f"h{index + 2}")
+            self.hosts.append(host)
+            self.leaf_links.append(connect(self.r2, host))
+
+        links = [(self.eth1, self.etr1a), (self.etr1b, self.etr2a)]
+        assign_addresses(links + self.leaf_links, self.addresses, self.workers)
+
+        self.source.add_route("DEFAULT", self.eth1)
+        self.r1.add_route("DEFAULT", self.etr1b)
+        self.r2.add_route("DEFAULT", self.etr2a)
+        run_batched(
+            lambda pair: pair[0].add_route("DEFAULT", pair[1]),
+            list(zip(self.hosts, (eth for (_, eth) in self.leaf_links))),
+            self.workers,
+        )
+
+    def set_bottleneck(self, bandwidth, delay, qdisc=None, **qdisc_parameters):
+        """
+        Set the attributes of the `r1` <--> `r2` link
+
+        Parameters
+        ----------
+        bandwidth : str
+            Bottleneck bandwidth, for example '10mbit'
+        delay : str
+            Bottleneck delay, for example '10ms'
+        qdisc : str
+            Qdisc installed from `r1` to `r2` (Default value = None)
+        **qdisc_parameters :
+            Parameters of `qdisc`
+        """
+        if qdisc:
+            self.etr1b.set_attributes(bandwidth, delay, qdisc, **qdisc_parameters)
+        else:
+            self.etr1b.set_attributes(bandwidth, delay)
+        self.etr2a.set_attributes(bandwidth, delay)
+
+    def set_edges(self, bandwidth, delay):
+        """
+        Set the attributes of every edge link in both directions
+
+        Parameters
+        ----------
+        bandwidth : str
+            Edge bandwidth, for example '1000mbit'
+        delay : str
+            Edge delay, for example '1ms'
+        """
+        interfaces = [self.eth1, self.etr1a]
+        for (etr2, eth) in self.leaf_links:
+            interfaces += [etr2, eth]
+
+        set_link_attributes(interfaces, bandwidth, delay, self.workers)
+
+    def add_flows(
+        self, exp, congestion_algorithm="cubic", start=0, stop=200, incast=False
+    ):
+        """
+        Add one TCP flow between `h1` and every leaf
+
+        Parameters
+        ----------
+        exp : Experiment
+            Experiment the flows are added to
+        congestion_algorithm : str
+            TCP congestion algorithm (Default value = 'cubic')
+        start : int
+            Start time of every flow (Default value = 0)
+        stop : int
+            Stop time of every flow (Default value = 200)
+        incast : bool
+            Send from every leaf to `h1` instead of from `h1` to every leaf
+            (Default value = False)
+        """
+        for (host, (_, eth)) in zip(self.hosts, self.leaf_links):
+            if incast:
+                flow = Flow(host, self.source, self.eth1.get_address(), start, stop, 1)
+            else:
+                flow = Flow(self.source, host, eth.get_address(), start, stop, 1)
+            exp.add_tcp_flow(flow, congestion_algorithm)
+
+
+class ParkingLot:
+    """
+    Chain of `routers` routers with cross traffic entering at every hop.
+
+    ##########################################################################
+    #                                                                        #
+    #       c1s         c1d c2s          c2d c3s        c(K-1)d              #
+    #        |            | |              | |             |                 #
+    #  h1 -- r1 -- hop 1 -- r2 -- hop 2 -- r3 -- ... ----- rK -- h2          #
+    #                                                                        #
+    ##########################################################################
+
+    The main flows run from `h1` to `h2` and cross all the K - 1 hops. The
+    cross traffic of hop `i` runs from `c<i>s` at `r<i>` to `c<i>d` at
+    `r<i+1>`, so it shares only that hop with the main flows. Every hop gets
+    its own bandwidth, delay and qdisc through `set_hop`.
+
+    Attributes
+    ----------
+    source, sink : Node
+        `h1` and `h2`, the end points of the main flows
+    routers : list(Router)
+        `r1` to `rK`
+    hop_links : list((Interface, Interface))
+        (interface at `r<i>`, interface at `r<i+1>`) for every hop
+    cross_hosts : list((Node, Node))
+        (`c<i>s`, `c<i>d`) for every hop
+    """
+
+    def __init__(self, routers, pool="10.0.0.0/8", prefix=30, workers=16):
+        """
+        Parameters
+        ----------
+        routers : int
+            Number of routers in the chain, at least 2
+        pool : str
+            Address pool for all the links (Default value = '10.0.0.0/8')
+        prefix : int
+            Prefix length of each link, 30 or 31 (Default value = 30)
+        workers : int
+            Number of parallel workers used during setup (Default value = 16)
+        """
+        if routers < 2:
+            raise ValueError("A parking lot topology needs at least two routers")
+
+        self.addresses = AddressPool(pool, prefix)
+        # 2 main hosts, K - 1 hops and 2 cross hosts per hop
+        if self.addresses.capacity < 2 + 3 * (routers - 1):
+            raise ValueError(f"Address pool {pool} is too small for {routers} routers")
+
+        self.workers = workers
+        self.routers = []
+        self.hop_links = []
+        self.cross_hosts = []
+        self.cross_links = []
+
+        self._build(routers)
+
+    def _build(self, count):
+        """Create nodes, connect them, assign addresses and add routes"""
+        self.source = Node("h1")
+        self.sink = Node("h2")
+        self.routers = [Router(f"r{index + 1}") for index in range(count)]
+
+        self.source_link = connect(self.source, self.routers[0])
+        self.sink_link = connect(self.sink, self.routers[-1])
+
+        for index in range(count - 1):
+            left, right = self.routers[index], self.routers[index + 1]
+            self.hop_links.append(connect(left, right))
+
+            cross_source = Node(f"c{index + 1}s")
+            cross_sink = Node(f"c{index + 1}d")
+            self.cross_hosts.append((cross_source, cross_sink))
+            self.cross_links.append(
+                (connect(cross_source, left), connect(cross_sink, right))
+            )
+
+        links = [self.source_link, self.sink_link] + self.hop_links
+        for (source_link, sink_link) in self.cross_links:
+            links += [source_link, sink_link]
+        assign_addresses(links, self.addresses, self.workers)
+
+        # Hosts hang off a single router, so a default route is enough
+        host_routes = [(self.source, self.source_link[0]), (self.sink, self.sink_link[0])]
+        for ((cross_source, cross_sink), (source_link, sink_link)) in zip(
+            self.cross_hosts, self.cross_links
+        ):
+            host_routes += [(cross_source, source_link[0]), (cross_sink, sink_link[0])]
+
+        run_batched(
+            lambda route: route[0].add_route("DEFAULT", route[1]),
+            host_routes,
+            self.workers,
+        )
+
+        # Routers send everything downstream by default and need explicit
+        # routes only for the hosts attached upstream of them
+        run_batched(self._add_router_routes, range(count), self.workers)
+
+    def _add_router_routes(self, index):
+        """Add the routes of router `index` (counted from 0)"""
+        router = self.routers[index]
+
+        if index == len(self.routers) - 1:
+            router.add_route("DEFAULT", self.hop_links[-1][1])
+            return
+
+        router.add_route("DEFAULT", self.hop_links[index][0])
+
+        if index == 0:
+            return
+
+        upstream = [self.source_link[1]]
+        for (source_link, sink_link) in self.cross_links[:index]:
+            upstream += [source_link[1], sink_link[1]]
+
+        for interface in upstream:
+            # Interfaces attached to `router` itself are directly connected
+            if interface.node_id == router.id:
+                continue
+            subnet = ipaddress.ip_interface(interface.get_address().get_addr()).network
+            router.add_route(str(subnet), self.hop_links[index - 1][1])
+
+    def set_hop(self, hop, bandwidth, delay, qdisc=None, **qdisc_parameters):
+        """
+        Set the attributes of hop `hop`, between `r<hop>` and `r<hop+1>`
+
+        The qdisc is installed in the forward direction only, as in the
+        other examples.
+
+        Parameters
+        ----------
+        hop : int
+            Hop number, from 1 to K - 1
+        bandwidth : str
+            Bandwidth of the hop, for example '10mbit'
+        delay : str
+            Delay of the hop, for example '10ms'
+        qdisc : str
+            Qdisc installed from `r<hop>` to `r<hop+1>` (Default value = None)
+        **qdisc_parameters :
+            Parameters of `qdisc`
+        """
+        if not 1 <= hop <= len(self.hop_links):
+            raise ValueError(f"Hop should be between 1 and {len(self.hop_links)}")
+
+        (forward, reverse) = self.hop_links[hop - 1]
+        if qdisc:
+            forward.set_attributes(bandwidth, delay, qdisc, **qdisc_parameters)
+        else:
+            forward.set_attributes(bandwidth, delay)
+        reverse.set_attributes(bandwidth, delay)
+
+    def set_edges(self, bandwidth, delay):
+        """
+        Set the attributes of every host link in both directions
+
+        Parameters
+        ----------
+        bandwidth : str
+            Edge bandwidth, for example '1000mbit'
+        delay : str
+            Edge delay, for example '1ms'
+        """
+        interfaces = list(self.source_link) + list(self.sink_link)
+        for (source_link, sink_link) in self.cross_links:
+            interfaces += list(source_link) + list(sink_link)
+
+        set_link_attributes(interfaces, bandwidth, delay, self.workers)
+
+    def add_main_flows(
+        self, exp, congestion_algorithm="cubic", start=0, stop=200, streams=1
+    ):
+        """
+        Add TCP flows from `h1` to `h2` across every hop
+
+        Parameters
+        ----------
+        exp : Experiment
+            Experiment the flows are added to
+        congestion_algorithm : str
+            TCP congestion algorithm (Default value = 'cubic')
+        start : int
+            Start time of the flows (Default value = 0)
+        stop : int
+            Stop time of the flows (Default value = 200)
+        streams : int
+            Number of parallel streams (Default value = 1)
+        """
+        address = self.sink_link[0].get_address()
+        flow = Flow(self.source, self.sink, address, start, stop, streams)
+        exp.add_tcp_flow(flow, congestion_algorithm)
+
+    def add_cross_flows(
+        self, exp, congestion_algorithm="cubic", start=0, stop=200, streams=1
+    ):
+        """
+        Add TCP cross traffic across each hop
+
+        Parameters
+        ----------
+        exp : Experiment
+            Experiment the flows are added to
+        congestion_algorithm : str
+            TCP congestion algorithm (Default value = 'cubic')
+        start : int
+            Start time of the flows (Default value = 0)
+        stop : int
+            Stop time of the flows (Default value = 200)
+        streams : int
+            Number of parallel streams per hop (Default value = 1)
+        """
+        for ((cross_source, cross_sink), (_, sink_link)) in zip(
+            self.cross_hosts, self.cross_links
+        ):
+            address = sink_link[0].get_address()
+            flow = Flow(cross_source, cross_sink, address, start, stop, streams)
+            exp.add_tcp_flow(flow, congestion_algorithm)
@@ -0,0 +1,525 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Search the parameters of a qdisc for the best throughput and queueing delay.
+
+The example programs hard-code one parameter set per qdisc. The tuner
+samples configurations from a parameter space and runs the program once
+per configuration, with `--qdisc_params` and `--duration`, several runs in
+parallel. It uses successive halving: every configuration first gets a
+short run, only the best part of them are run again for `eta` times as
+long, and so on up to the full duration, so bad settings cost a short run
+only.
+
+Configurations are ranked by Pareto front of throughput (higher is better)
+against queueing delay (lower is better), and within a front by power,
+throughput divided by RTT. Every rung keeps its best `1/eta` by that order,
+so a large first front is cut by power as well, and the last rung reports
+the Pareto front of its runs at full duration.
+
+Usage (as root, from the repository root):
+
+    python3 -m helpers.tune cisco_5tcpup_conf/cisco_5tcpup.py --qdisc pie \\
+        --param target=1ms:50ms:log --param limit=20:1000:int \\
+        --configs 27 --eta 3 --min_duration 20 --max_duration 180 --parallel 3
+
+Parameters are given as NAME=LOW:HIGH, optionally followed by `:log` to
+sample on a log scale and `:int` for whole numbers, or as NAME=V1,V2,... to
+pick from a list. LOW and HIGH may carry a unit, such as `ms`, that is
+added to the sampled values. Arguments after `--` are passed on to every
+run. Every run is kept in `OUTPUT/rung-<r>/<config>/` and the results in
+`OUTPUT/tuning.json`.
+
+Throughput and queueing delay are those of `helpers.bufferbloat` and
+`helpers.sweep_report`, see `helpers.metrics`: throughput is the sum over
+flows of their time-weighted mean rate in `netperf.json`, and queueing
+delay a percentile of the RTT above the baseline of its host pair, the
+median of its idle RTTs or, without any, the path RTT given with `--rtt`.
+RTTs come from `latency.json` if the program probed latency and from
+`ping.json` otherwise. The first `--warmup` fraction of every run is left
+out.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .hdr import HdrHistogram
+from .metrics import baselines, mean_rates, ping_baselines, read_columns, start_times
+
+logger = logging.getLogger(__name__)
+
+NUMBER = re.compile(r"^([-+]?[0-9.]+(?:e[-+]?[0-9]+)?)(.*)$")
+
+
+class Parameter:
+    """
+    One axis of the search space, see the module documentation
+
+    Parameters
+    ----------
+    spec : str
+        NAME=LOW:HIGH[:log][:int] or NAME=V1,V2,...
+    """
+
+    def __init__(self, spec):
+        (self.name, values) = spec.split("=", 1)
+        self.choices = None
+        if ":" not in values:
+            self.choices = values.split(",")
+            return
+
+        (low, high, *options) = values.split(":")
+        (self.low, unit) = self._split(low)
+        (self.high, high_unit) = self._split(high)
+        self.unit = unit or high_unit
+        self.log = "log" in options
+        self.integer = "int" in options
+        if self.low > self.high or (self.log and self.low <= 0):
+            raise ValueError(f"Invalid range for {self.name}: {values}")
+
+    @staticmethod
+    def _split(value):
+        match = NUMBER.match(value.strip())
+        if not match:
+            raise ValueError(f"Not a number: {value}")
+        return (float(match.group(1)), match.group(2))
+
+    def sample(self, rng):
+        """Random value of the parameter, as given to tc"""
+        if self.choices is not None:
+            return rng.choice(self.choices)
+        if self.log:
+            value = math.exp(rng.uniform(math.log(self.low), math.log(self.high)))
+        else:
+            value = rng.uniform(self.low, self.high)
+        if self.integer:
+            return f"{int(round(value))}{self.unit}"
+        return f"{value:.3g}{self.unit}"
+
+    def describe(self):
+        if self.choices is not None:
+            return {"choices": self.choices}
+        return {
+            "low": self.low,
+            "high": self.high,
+            "unit": self.unit,
+            "log": self.log,
+            "int": self.integer,
+        }
+
+
+def _delay_from_ping(dump, flows, start, end, percentile, rtt):
+    """Queueing delay and base RTT from `ping.json`, in ms"""
+    (pairs, pair_of, times, rtts) = read_columns(dump, "ping", "rtt")
+    if not len(times):
+        return (None, None)
+    (bases, _) = ping_baselines(pairs, pair_of, times, rtts, flows, rtt)
+    loaded = (times >= start) & (times <= end)
+    if not loaded.any():
+        return (None, None)
+    delay = np.percentile(rtts[loaded] - bases[pair_of[loaded]], percentile)
+    return (float(delay), float(np.median(bases)))
+
+
+def _delay_from_latency(dump, flows, start, end, percentile, rtt):
+    """Queueing delay and base RTT from `latency.json`, in ms"""
+    path = os.path.join(dump, "latency.json")
+    if not os.path.isfile(path):
+        return (None, None)
+    with open(path, "r") as file:
+        data = json.load(file)
+    first_flow = start_times(flows).min() if flows else np.inf
+    (delays, bases) = ([], [])
+    for targets in data.values():
+        for target in targets.values():
+            (meta, windows) = (target["meta"], target["windows"])
+            windows = [w for w in windows if w["received"]]
+            if not windows:
+                continue
+            # Windows start at second 0 of the probes, `offset` after the
+            # launch of the flows, and are idle when they end before the
+            # first flow starts
+            launch = windows[0]["timestamp"] - float(meta["start_time"]) - meta.get("offset", 0.0)
+            ends = np.array([w["timestamp"] + meta["window"] for w in windows])
+            idle = ends <= launch + first_flow
+            rtts = np.array([w["min"] for w in windows])
+            (base, _) = baselines(1, np.zeros(len(windows), dtype=int), rtts, idle, rtt)
+            histogram = HdrHistogram()
+            for window in windows:
+                if start <= window["timestamp"] <= end:
+                    histogram.add(HdrHistogram.from_sparse(window["histogram"]))
+            if not histogram.total:
+                continue
+            delays.append(histogram.percentile(percentile) / 1000 - base[0])
+            bases.append(base[0])
+    if not delays:
+        return (None, None)
+    return (float(np.mean(delays)), float(np.mean(bases)))
+
+
+# pylint: disable=too-many-arguments
+def score(directory, duration, warmup=0.2, percentile=95, rtt=None):
+    """
+    Throughput and queueing delay of the run in `directory`
+
+    Parameters
+    ----------
+    directory : str
+        Working directory of the run, holding its dump
+    duration : float
+        Duration of the run
+    warmup : float
+        Fraction of the run to leave out (Default value = 0.2)
+    percentile : float
+        Percentile of the queueing delay (Default value = 95)
+    rtt : float
+        Path RTT of the topology in ms, the base RTT of pairs without idle
+        samples (Default value = None, their smallest RTT)
+
+    Returns
+    -------
+    dict
+        {"throughput" (Mbps), "delay", "base_rtt" (ms)}, or None if the run
+        left no usable dump
+    """
+    dumps = sorted(glob.glob(os.path.join(directory, "*_dump")))
+    if not dumps:
+        return None
+    dump = dumps[-1]
+
+    # NeST sets up the topology before second 0, so the load is the window
+    # of the reports of the flows, as in `helpers.bufferbloat`
+    (flows, flow_of, times, rates) = read_columns(dump, "netperf", "sending_rate")
+    if not len(times):
+        return None
+    (start, end) = (times.min(), times.max())
+    skip = warmup * duration
+    throughput = float(np.nansum(mean_rates(flow_of, times, rates, len(flows), start, end, skip)))
+    (delay, base_rtt) = _delay_from_latency(dump, flows, start + skip, end, percentile, rtt)
+    if delay is None:
+        (delay, base_rtt) = _delay_from_ping(dump, flows, start + skip, end, percentile, rtt)
+    if delay is None:
+        return None
+    return {"throughput": throughput, "delay": max(delay, 0.0), "base_rtt": base_rtt}
+
+
+def pareto_ranks(points):
+    """
+    Front of every (throughput, delay) point, 0 for the non-dominated ones
+
+    A point dominates another if its throughput is not lower, its delay
+    not higher, and at least one of them strictly better.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    ranks = np.full(len(points), -1)
+    (throughput, delay) = (points[:, 0], points[:, 1])
+    dominates = (
+        (throughput[:, None] >= throughput[None, :])
+        & (delay[:, None] <= delay[None, :])
+        & ((throughput[:, None] > throughput[None, :]) | (delay[:, None] < delay[None, :]))
+    )
+    rank = 0
+    remaining = np.ones(len(points), dtype=bool)
+    while remaining.any():
+        dominated = (dominates & remaining[:, None]).any(axis=0)
+        front = remaining & ~dominated
+        ranks[front] = rank
+        remaining &= ~front
+        rank += 1
+    return ranks.tolist()
+
+
+class Tuner:
+    """
+    Successive halving over a qdisc parameter space
+
+    Parameters
+    ----------
+    script : str
+        Example program, which takes `--qdisc`, `--qdisc_params` and
+        `--duration`
+    qdisc : str
+        Qdisc to tune
+    parameters : list(Parameter)
+        Search space
+    output : str
+        Folder for the runs and `tuning.json`
+    extra : list(str)
+        Arguments passed on to every run (Default value = ())
+    configs : int
+        Configurations in the first rung (Default value = 27)
+    eta : int
+        Factor by which the number of configurations shrinks and the
+        duration grows from one rung to the next (Default value = 3)
+    min_duration : float
+        Duration of the first rung (Default value = 20)
+    max_duration : float
+        Duration of the last rung (Default value = 200)
+    parallel : int
+        Runs at a time (Default value = 1)
+    warmup : float
+        Fraction of every run left out of the score (Default value = 0.2)
+    percentile : float
+        Percentile of the queueing delay (Default value = 95)
+    seed : int
+        Seed of the sampler (Default value = None)
+    rtt : float
+        Path RTT of the topology in ms, see `score` (Default value = None)
+    """
+
+    def __init__(
+        self,
+        script,
+        qdisc,
+        parameters,
+        output,
+        extra=(),
+        configs=27,
+        eta=3,
+        min_duration=20,
+        max_duration=200,
+        parallel=1,
+        warmup=0.2,
+        percentile=95,
+        seed=None,
+        rtt=None,
+    ):
+        self.script = os.path.abspath(script)
+        self.qdisc = qdisc
+        self.parameters = parameters
+        self.output = os.path.abspath(output)
+        self.extra = list(extra)
+        self.configs = configs
+        self.eta = eta
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.parallel = parallel
+        self.warmup = warmup
+        self.percentile = percentile
+        self.rng = random.Random(seed)
+        self.rtt = rtt
+        self.rungs = []
+
+    def durations(self):
+        """Duration of every rung, growing by `eta` up to `max_duration`"""
+        durations = []
+        duration = self.min_duration
+        while duration * self.eta <= self.max_duration:
+            durations.append(int(round(duration)))
+            duration *= self.eta
+        durations.append(int(round(self.max_duration)))
+        return durations
+
+    def sample(self):
+        """Distinct configurations for the first rung"""
+        configs = []
+        seen = set()
+        for _ in range(self.configs * 20):
+            config = {p.name: p.sample(self.rng) for p in self.parameters}
+            key = tuple(sorted(config.items()))
+            if key not in seen:
+                seen.add(key)
+                configs.append(config)
+            if len(configs) == self.configs:
+                break
+        return configs
+
+    def _run(self, rung, index, config, duration):
+        """Run the program once and score it"""
+        directory = os.path.join(self.output, f"rung-{rung}", f"config-{index:03d}")
+        os.makedirs(directory, exist_ok=True)
+        qdisc_params = ",".join(f"{key}={value}" for (key, value) in config.items())
+        command = [
+            sys.executable,
+            self.script,
+            "--qdisc",
+            self.qdisc,
+            "--qdisc_params",
+            qdisc_params,
+            "--duration",
+            str(duration),
+        ] + self.extra
+
+        started = time.time()
+        with open(os.path.join(directory, "output.log"), "w") as log:
+            returncode = subprocess.run(
+                command, cwd=directory, stdout=log, stderr=subprocess.STDOUT
+            ).returncode
+        result = {
+            "config": index,
+            "params": config,
+            "directory": directory,
+            "returncode": returncode,
+            "seconds": round(time.time() - started, 1),
+        }
+        try:
+            metrics = score(directory, duration, self.warmup, self.percentile, self.rtt)
+        except (OSError, ValueError, KeyError) as error:
+            logger.warning("Could not score %s: %s", directory, error)
+            metrics = None
+        if returncode != 0 or metrics is None:
+            logger.warning("Run of config %d failed, see %s", index, directory)
+        else:
+            result.update(metrics)
+            logger.info(
+                "rung %d config %d %s: %.2f Mbps, %.2f ms",
+                rung,
+                index,
+                qdisc_params,
+                metrics["throughput"],
+                metrics["delay"],
+            )
+        return result
+
+    def _select(self, results, keep):
+        """Rank the scored runs of a rung and mark the `keep` best as kept"""
+        scored = [r for r in results if "throughput" in r]
+        ranks = pareto_ranks([(r["throughput"], r["delay"]) for r in scored])
+        for (result, rank) in zip(scored, ranks):
+            result["rank"] = rank
+            result["power"] = result["throughput"] / max(
+                result["delay"] + (result["base_rtt"] or 0), 1e-3
+            )
+        # By front and, within a front, by power, so that a front larger
+        # than `keep` is cut too and every rung prunes
+        scored.sort(key=lambda r: (r["rank"], -r["power"]))
+        for (position, result) in enumerate(scored):
+            result["kept"] = position < keep
+        return [r["config"] for r in scored[:keep]]
+
+    def run(self):
+        """
+        Run every rung
+
+        Returns
+        -------
+        list(dict)
+            Runs of the last rung on the Pareto front, by power
+        """
+        configs = dict(enumerate(self.sample()))
+        alive = list(configs)
+        durations = self.durations()
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            for (rung, duration) in enumerate(durations):
+                logger.info(
+                    "Rung %d: %d configurations for %d s", rung, len(alive), duration
+                )
+                results = list(
+                    pool.map(
+                        lambda index: self._run(rung, index, configs[index], duration),
+                        alive,
+                    )
+                )
+                last = rung == len(durations) - 1
+                keep = len(alive) if last else max(1, len(alive) // self.eta)
+                alive = self._select(results, keep)
+                self.rungs.append({"duration": duration, "runs": results})
+                self.write()
+                if not alive:
+                    logger.error("No run of rung %d could be scored", rung)
+                    break
+
+        return self.front()
+
+    def front(self):
+        """Pareto front of the last rung"""
+        if not self.rungs:
+            return []
+        return sorted(
+            (r for r in self.rungs[-1]["runs"] if r.get("rank") == 0),
+            key=lambda r: -r["power"],
+        )
+
+    def write(self):
+        """Write `tuning.json` into the output folder"""
+        report = {
+            "script": self.script,
+            "qdisc": self.qdisc,
+            "space": {p.name: p.describe() for p in self.parameters},
+            "extra": self.extra,
+            "eta": self.eta,
+            "percentile": self.percentile,
+            "warmup": self.warmup,
+            "rtt": self.rtt,
+            "rungs": self.rungs,
+            "front": self.front(),
+        }
+        with open(os.path.join(self.output, "tuning.json"), "w") as file:
+            json.dump(report, file, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("script", help="Example program to tune")
+    parser.add_argument("--qdisc", required=True)
+    parser.add_argument(
+        "--param",
+        action="append",
+        required=True,
+        help="NAME=LOW:HIGH[:log][:int] or NAME=V1,V2,...",
+    )
+    parser.add_argument("--output", default=None, help="Folder for the runs")
+    parser.add_argument("--configs", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min_duration", type=float, default=20)
+    parser.add_argument("--max_duration", type=float, default=200)
+    parser.add_argument("--parallel", type=int, default=1, help="Concurrent runs")
+    parser.add_argument("--warmup", type=float, default=0.2)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rtt", type=float, default=None, help="Path RTT in ms")
+
+    # Arguments after `--` are passed on to every run of the program
+    argv = sys.argv[1:]
+    extra = []
+    if "--" in argv:
+        (argv, extra) = (argv[: argv.index("--")], argv[argv.index("--") + 1 :])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+
+    output = args.output or time.strftime(f"tune-{args.qdisc}-%Y%m%d-%H%M%S")
+    os.makedirs(output, exist_ok=True)
+    tuner = Tuner(
+        args.script,
+        args.qdisc,
+        [Parameter(spec) for spec in args.param],
+        output,
+        extra,
+        args.configs,
+        args.eta,
+        args.min_duration,
+        args.max_duration,
+        args.parallel,
+        args.warmup,
+        args.percentile,
+        args.seed,
+        args.rtt,
+    )
+    front = tuner.run()
+
+    print(f"Pareto front of throughput and p{args.percentile:g} queueing delay:")
+    for result in front:
+        params = ",".join(f"{k}={v}" for (k, v) in result["params"].items())
+        print(
+            f"  {result['throughput']:8.2f} Mbps  {result['delay']:8.2f} ms  {params}"
+        )
+    print(f"Results in {os.path.join(tuner.output, 'tuning.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,593 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Generate many paced UDP streams from one process per namespace.
+
+`exp.add_udp_flow` starts an iperf3 client and server for every stream, so
+200 streams mean 400 processes and interval records to match. `UdpFlood`
+starts one sender in every source namespace and one receiver in every
+destination namespace instead. The sender paces all of its streams on a
+1 ms grid and hands each batch to the kernel with a single `sendmmsg`; the
+receiver drains every stream socket with `recvmmsg`. Counters are kept per
+stream in arrays and written out at the end in the layout of `iperf3.json`
+and `iperf3Server.json`, as `udp_flood.json` and `udp_floodServer.json`.
+
+Every stream is sent to its own destination port, so the streams are
+separate flows for flow-aware qdiscs, as they are with iperf3.
+
+    flood = UdpFlood()
+    flood.add_flow(flow, "12mbit")
+    with flood:
+        exp.run()
+
+Senders and receivers are started as `python3 -m helpers.udp_flood` and
+can be run by hand for testing:
+
+    ip netns exec ns2 python3 -m helpers.udp_flood receive --output r.json \\
+        --flow 20000:200:0:10
+    ip netns exec ns1 python3 -m helpers.udp_flood send --output s.json \\
+        --flow 10.0.0.2:20000:200:12mbit:0:10
+"""
+
+import argparse
+import ctypes
+import errno
+import json
+import logging
+import os
+import select
+import socket
+import struct
+import time
+
+import numpy as np
+
+from .netns_tool import NamespaceTool, StopFlag, wait_for_epoch
+
+# Largest batch accepted by sendmmsg/recvmmsg (UIO_MAXIOV)
+BATCH = 1024
+# Same datagram size as iperf3
+SIZE = 1448
+BASE_PORT = 20000
+TICK = 0.001
+CATCH_UP = 0.01
+# Seconds below which a last, partial interval is rounding of the boundaries
+EPSILON = 1e-6
+
+UNITS = {"bit": 1, "kbit": 10 ** 3, "mbit": 10 ** 6, "gbit": 10 ** 9}
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+_libc.recvmmsg.argtypes = [
+    ctypes.c_int,
+    ctypes.c_void_p,
+    ctypes.c_uint,
+    ctypes.c_int,
+    ctypes.c_void_p,
+]
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.c_void_p),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def parse_rate(rate):
+    """Rate in bits per second, from tc notation such as '12mbit'"""
+    rate = rate.strip().lower()
+    for (unit, scale) in sorted(UNITS.items(), key=lambda item: -len(item[0])):
+        if rate.endswith(unit):
+            return float(rate[: -len(unit)]) * scale
+    return float(rate)
+
+
+class _Batch:
+    """
+    `BATCH` messages of `size` bytes, each with its own buffer and address
+
+    `names` and `lengths` are numpy views of the `msg_name` and `msg_len`
+    fields, and `streams` and `sequences` views of the first eight bytes of
+    every payload, so a whole batch is filled or read without a Python loop.
+    """
+
+    def __init__(self, size):
+        self.messages = (_MMsgHdr * BATCH)()
+        self.iovecs = (_IoVec * BATCH)()
+        self.payload = np.zeros((BATCH, size), dtype=np.uint8)
+        self.addresses = ctypes.create_string_buffer(16 * BATCH)
+
+        base = self.payload.ctypes.data
+        for index in range(BATCH):
+            self.iovecs[index].iov_base = base + index * size
+            self.iovecs[index].iov_len = size
+            header = self.messages[index].msg_hdr
+            header.msg_iov = ctypes.addressof(self.iovecs[index])
+            header.msg_iovlen = 1
+
+        words = ctypes.sizeof(_MMsgHdr) // 8
+        self.names = np.frombuffer(self.messages, dtype=np.uint64).reshape(
+            BATCH, words
+        )[:, 0]
+        self.lengths = np.frombuffer(self.messages, dtype=np.uint32).reshape(
+            BATCH, 2 * words
+        )[:, _MMsgHdr.msg_len.offset // 4]
+        self.streams = np.ndarray(
+            (BATCH,), np.uint32, buffer=self.payload, offset=0, strides=(size,)
+        )
+        self.sequences = np.ndarray(
+            (BATCH,), np.uint32, buffer=self.payload, offset=4, strides=(size,)
+        )
+
+    def receive_addresses(self):
+        """Let the kernel fill in the source address of every message"""
+        base = ctypes.addressof(self.addresses)
+        for index in range(BATCH):
+            header = self.messages[index].msg_hdr
+            header.msg_name = base + 16 * index
+            header.msg_namelen = 16
+
+
+def _sockaddr(address, port):
+    return struct.pack(
+        "=HH4s8x", socket.AF_INET, socket.htons(port), socket.inet_aton(address)
+    )
+
+
+class _Clock:
+    """Seconds since `epoch`, and the interval counters that go with it"""
+
+    def __init__(self, epoch, interval, streams):
+        self.epoch = epoch
+        self.interval = interval
+        self.rows = []
+        self.current = np.zeros(streams, dtype=np.int64)
+        self.current_bytes = np.zeros(streams, dtype=np.int64)
+        self.bytes_rows = []
+        self.boundary = interval
+
+    def now(self):
+        return time.time() - self.epoch
+
+    def roll(self, now):
+        """Close every interval that ended before `now`"""
+        while now >= self.boundary:
+            self.rows.append(self.current.copy())
+            self.bytes_rows.append(self.current_bytes.copy())
+            self.current[:] = 0
+            self.current_bytes[:] = 0
+            self.boundary += self.interval
+
+    def close(self, now):
+        """Close the last, partial interval, and return the length of the last row"""
+        self.roll(now)
+        last = now - (self.boundary - self.interval)
+        if last > EPSILON:
+            self.rows.append(self.current.copy())
+            self.bytes_rows.append(self.current_bytes.copy())
+            return last
+        if self.rows:
+            # Too short for a rate; what it counted goes to the last full interval
+            self.rows[-1] += self.current
+            self.bytes_rows[-1] += self.current_bytes
+            return self.interval
+        return max(last, 0.0)
+
+    def counters(self, now):
+        last = self.close(now)
+        return {
+            "epoch": self.epoch,
+            "interval": self.interval,
+            "last_interval": last,
+            "packets": np.array(self.rows, dtype=np.int64).T.tolist(),
+            "bytes": np.array(self.bytes_rows, dtype=np.int64).T.tolist(),
+        }
+
+
+def send(flows, epoch, size=SIZE, interval=0.2):
+    """
+    Send every stream of `flows` at its rate between its start and stop
+
+    Parameters
+    ----------
+    flows : list(dict)
+        {"address", "port", "streams", "rate", "start", "stop"}, with the
+        streams of a flow sent to consecutive ports from `port`
+    epoch : float
+        Wall clock time of second 0 of the experiment
+    size : int
+        Datagram size in bytes (Default value = 1448)
+    interval : float
+        Length of a counter interval in seconds (Default value = 0.2)
+
+    Returns
+    -------
+    dict
+        Packets and bytes sent by every stream in every interval
+    """
+    stop_flag = StopFlag()
+    streams = sum(flow["streams"] for flow in flows)
+
+    pps = np.zeros(streams)
+    start = np.zeros(streams)
+    stop = np.zeros(streams)
+    names = ctypes.create_string_buffer(16 * streams)
+    position = 0
+    for flow in flows:
+        rate = parse_rate(flow["rate"]) / (8 * size)
+        for offset in range(flow["streams"]):
+            pps[position] = rate
+            start[position] = flow["start"]
+            stop[position] = flow["stop"]
+            ctypes.memmove(
+                ctypes.addressof(names) + 16 * position,
+                _sockaddr(flow["address"], flow["port"] + offset),
+                16,
+            )
+            position += 1
+    name_pointers = ctypes.addressof(names) + 16 * np.arange(streams, dtype=np.uint64)
+
+    batch = _Batch(size)
+    for index in range(BATCH):
+        batch.messages[index].msg_hdr.msg_namelen = 16
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+    fd = sock.fileno()
+
+    clock = _Clock(epoch, interval, streams)
+    sent = np.zeros(streams, dtype=np.int64)
+    end = stop.max()
+    identities = np.arange(streams)
+    backlog = np.ceil(pps * CATCH_UP).astype(np.int64) + 1
+
+    while not stop_flag.stopped:
+        now = clock.now()
+        if now >= end:
+            break
+        clock.roll(now)
+
+        # Packets due by now that have not been sent yet
+        elapsed = np.clip(np.minimum(now, stop) - start, 0, None)
+        due = np.where(now >= start, np.floor(elapsed * pps).astype(np.int64) + 1, 0)
+        due = np.maximum(due - sent, 0)
+        # After a stall, skip what is more than `CATCH_UP` late instead of
+        # sending it in a burst
+        skipped = np.maximum(due - backlog, 0)
+        sent += skipped
+        due -= skipped
+        total = int(due.sum())
+
+        if total:
+            ids = np.repeat(identities, due)
+            offsets = np.arange(total) - np.repeat(np.cumsum(due) - due, due)
+            sequences = np.repeat(sent, due) + offsets
+            for first in range(0, total, BATCH):
+                chunk = ids[first : first + BATCH]
+                count = len(chunk)
+                batch.names[:count] = name_pointers[chunk]
+                batch.streams[:count] = chunk
+                batch.sequences[:count] = sequences[first : first + BATCH]
+                done = _libc.sendmmsg(fd, batch.messages, count, 0)
+                if done < 0:
+                    error = ctypes.get_errno()
+                    if error not in (errno.ENOBUFS, errno.EAGAIN, errno.EINTR):
+                        raise OSError(error, os.strerror(error))
+                    done = 0
+                counts = np.bincount(chunk[:done], minlength=streams)
+                clock.current += counts
+                clock.current_bytes += counts * size
+                # Datagrams the kernel refused are dropped, as iperf3 does
+                sent += np.bincount(chunk, minlength=streams)
+
+        time.sleep(max(0.0, TICK - (clock.now() - now)))
+
+    sock.close()
+    return clock.counters(min(clock.now(), end))
+
+
+def _bind(flows):
+    """Receiving socket of every stream of `flows`"""
+    sockets = []
+    for flow in flows:
+        for offset in range(flow["streams"]):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+            sock.bind(("0.0.0.0", flow["port"] + offset))
+            sock.setblocking(False)
+            sockets.append(sock)
+    return sockets
+
+
+# pylint: disable=too-many-arguments
+def receive(flows, epoch, size=SIZE, interval=0.2, linger=1.0, sockets=None):
+    """
+    Count what arrives for every stream of `flows`
+
+    Parameters
+    ----------
+    flows : list(dict)
+        {"port", "streams", "start", "stop"}, as for `send`
+    epoch : float
+        Wall clock time of second 0 of the experiment
+    size : int
+        Largest datagram size in bytes (Default value = 1448)
+    interval : float
+        Length of a counter interval in seconds (Default value = 0.2)
+    linger : float
+        Seconds to keep receiving after the last stop time, for packets
+        still queued in the network (Default value = 1.0)
+    sockets : list(socket)
+        Sockets of the streams, bound before the epoch is known
+        (Default value = None, bound here)
+
+    Returns
+    -------
+    dict
+        Packets and bytes received by every stream in every interval, and
+        the source address of every stream
+    """
+    stop_flag = StopFlag()
+    sockets = sockets or _bind(flows)
+
+    streams = len(sockets)
+    stream_of = {sock.fileno(): index for (index, sock) in enumerate(sockets)}
+    sources = [None] * streams
+
+    poller = select.epoll()
+    for sock in sockets:
+        poller.register(sock.fileno(), select.EPOLLIN)
+
+    batch = _Batch(size)
+    batch.receive_addresses()
+    clock = _Clock(epoch, interval, streams)
+    end = max(flow["stop"] for flow in flows) + linger
+
+    while not stop_flag.stopped:
+        now = clock.now()
+        if now >= end:
+            break
+        clock.roll(now)
+        try:
+            events = poller.poll(max(0.0, min(clock.boundary, end) - now))
+        except InterruptedError:
+            continue
+
+        for (fd, _) in events:
+            stream = stream_of[fd]
+            while True:
+                count = _libc.recvmmsg(fd, batch.messages, BATCH, socket.MSG_DONTWAIT, None)
+                if count <= 0:
+                    break
+                clock.current[stream] += count
+                clock.current_bytes[stream] += int(batch.lengths[:count].sum())
+                if sources[stream] is None:
+                    sources[stream] = socket.inet_ntoa(batch.addresses.raw[4:8])
+                if count < BATCH:
+                    break
+
+    poller.close()
+    for sock in sockets:
+        sock.close()
+    counters = clock.counters(min(clock.now(), end))
+    counters["sources"] = sources
+    return counters
+
+
+class UdpFlood(NamespaceTool):
+    """
+    Runs UDP flows with one batched sender and receiver per namespace
+
+    Use it in place of `exp.add_udp_flow` and as a context manager around
+    `exp.run()`. The flows are not added to the experiment, so NeST starts
+    no iperf3 for them.
+
+    Parameters
+    ----------
+    interval : float
+        Length of a counter interval in seconds (Default value = 0.2)
+    size : int
+        Datagram size in bytes (Default value = 1448)
+    delay : float
+        Least seconds between starting the processes and second 0, the
+        launch of the flows by NeST, so that all receivers are bound before
+        the first datagram (Default value = 1.0)
+    """
+
+    name = "udp_flood"
+
+    def __init__(self, interval=0.2, size=SIZE, delay=1.0):
+        super().__init__(delay)
+        self.interval = interval
+        self.size = size
+        self.flows = []
+        self.port = BASE_PORT
+        self.outputs = {}
+
+    def add_flow(self, flow, target_bandwidth):
+        """
+        Add a UDP flow, with every stream sent at `target_bandwidth`
+
+        Parameters
+        ----------
+        flow : Flow
+            Flow with the source, destination, times and number of streams
+        target_bandwidth : str
+            Rate of every stream, such as '12mbit'
+        """
+        self.flows.append(
+            {
+                "flow": flow,
+                "rate": target_bandwidth,
+                "port": self.port,
+            }
+        )
+        self.port += flow.number_of_streams
+
+    def end(self):
+        return max(entry["flow"].stop_time for entry in self.flows)
+
+    def launch(self):
+        """Start one receiver per destination and one sender per source"""
+        receivers = {}
+        senders = {}
+        for entry in self.flows:
+            flow = entry["flow"]
+            times = f"{flow.start_time}:{flow.stop_time}"
+            streams = flow.number_of_streams
+            (_, receiver_specs) = receivers.setdefault(
+                flow.destination_node.id, (flow.destination_node, [])
+            )
+            receiver_specs.append(f"{entry['port']}:{streams}:{times}")
+            address = flow.destination_address.get_addr(with_subnet=False)
+            (_, sender_specs) = senders.setdefault(
+                flow.source_node.id, (flow.source_node, [])
+            )
+            sender_specs.append(
+                f"{address}:{entry['port']}:{streams}:{entry['rate']}:{times}"
+            )
+
+        for (role, nodes) in (("receive", receivers), ("send", senders)):
+            for (node, specs) in nodes.values():
+                arguments = [role, "--interval", str(self.interval)]
+                arguments += ["--size", str(self.size)]
+                for spec in specs:
+                    arguments += ["--flow", spec]
+                self.outputs[(role, node.id)] = self.spawn(
+                    node, arguments, f"{role}-{node.id}.json"
+                )
+
+    def _records(self, counters, stream, rate_key):
+        """Interval records of one stream, as in iperf3.json"""
+        records = []
+        packets = counters["packets"][stream]
+        for (index, (count, size)) in enumerate(zip(packets, counters["bytes"][stream])):
+            duration = counters["interval"]
+            if index == len(packets) - 1:
+                duration = counters["last_interval"]
+            records.append(
+                {
+                    "timestamp": str(counters["epoch"] + index * counters["interval"]),
+                    rate_key: str(size * 8 / duration / 10 ** 6 if duration else 0.0),
+                    "duration": str(duration),
+                    "bytes": str(size),
+                    "packets": str(count),
+                }
+            )
+        return records
+
+    def results(self):
+        """
+        Sender and receiver records in the layout of `iperf3.json` and
+        `iperf3Server.json`, keyed by the destination port of every stream
+        """
+        clients = {}
+        servers = {}
+        positions = {}
+        outputs = {key: self.read(output) for (key, output) in self.outputs.items()}
+        for entry in self.flows:
+            flow = entry["flow"]
+            (source, destination) = (flow.source_node, flow.destination_node)
+            sent = outputs[("send", source.id)]
+            received = outputs[("receive", destination.id)]
+            meta = {
+                "meta": True,
+                "start_time": str(flow.start_time),
+                "stop_time": str(flow.stop_time),
+            }
+            address = flow.destination_address.get_addr(with_subnet=False)
+
+            for offset in range(flow.number_of_streams):
+                port = str(entry["port"] + offset)
+                send_index = positions.get(("send", source.id), 0)
+                positions[("send", source.id)] = send_index + 1
+                receive_index = positions.get(("receive", destination.id), 0)
+                positions[("receive", destination.id)] = receive_index + 1
+
+                if sent is not None:
+                    clients.setdefault(source.name, {}).setdefault(address, {})[
+                        port
+                    ] = [dict(meta, destination_node=destination.name)] + self._records(
+                        sent, send_index, "sending_rate"
+                    )
+                if received is not None:
+                    source_address = received["sources"][receive_index] or "unknown"
+                    servers.setdefault(destination.name, {}).setdefault(
+                        source_address, {}
+                    )[port] = [dict(meta)] + self._records(
+                        received, receive_index, "receiving_rate"
+                    )
+
+        def nest_layout(by_node):
+            return {node: [streams] for (node, streams) in by_node.items()}
+
+        return {
+            f"{self.name}.json": nest_layout(clients),
+            f"{self.name}Server.json": nest_layout(servers),
+        }
+
+
+def _parse_flow(role, spec):
+    fields = spec.split(":")
+    if role == "send":
+        (address, port, streams, rate, start, stop) = fields
+        flow = {"address": address, "rate": rate}
+    else:
+        (port, streams, start, stop) = fields
+        flow = {}
+    flow.update(
+        port=int(port), streams=int(streams), start=float(start), stop=float(stop)
+    )
+    return flow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("role", choices=["send", "receive"])
+    parser.add_argument(
+        "--flow",
+        action="append",
+        required=True,
+        help="ADDRESS:PORT:STREAMS:RATE:START:STOP to send, PORT:STREAMS:START:STOP to receive",
+    )
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--epoch", type=float, default=None)
+    parser.add_argument("--epoch_file", default=None, help="Wait for the epoch to be written here")
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--size", type=int, default=SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+    flows = [_parse_flow(args.role, spec) for spec in args.flow]
+    # Receivers listen before the senders can start
+    sockets = _bind(flows) if args.role == "receive" else None
+    epoch = wait_for_epoch(args.epoch, args.epoch_file)
+    if epoch is None:
+        return
+
+    if args.role == "send":
+        counters = send(flows, epoch, args.size, args.interval)
+    else:
+        counters = receive(flows, epoch, args.size, args.interval, sockets=sockets)
+
+    with open(args.output, "w") as file:
+        json.dump(counters, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Watch every flow of an experiment while it runs and fail fast when one stalls.
+
+NeST only reports a netperf or iperf3 that did not start, or died after a
+few seconds, as a missing curve once the experiment is over. `FlowWatchdog`
+checks the flows before and during the run:
+
+* before the traffic starts, that the congestion control of every TCP flow
+  is available in the kernel, loading its module if needed (`cdg` and
+  `dctcp` are not loaded by default), and that the receivers of DCTCP flows
+  accept ECN (`net.ipv4.tcp_ecn`);
+* every `interval` seconds, the TCP sockets of every source namespace with
+  one sock_diag dump over netlink, with their congestion control, ECN and
+  acknowledged bytes.
+
+Times are counted from the launch of the flows by NeST, which is time 0 of
+their schedules, so that the setup of a run with many runners does not eat
+into `grace`. A flow is `not_started` when fewer of its streams than
+configured have a socket with its congestion control `grace` seconds after
+its start; the congestion controls of the sockets to the same address are
+counted in the diagnosis, as a generator that cannot set its algorithm may
+run with the default one. It `died` when streams that were seen are gone
+before its stop, and is `stalled` when none of its streams had bytes
+acknowledged for `stall` seconds. A DCTCP socket that did not negotiate ECN
+falls back to Reno, and is reported as `fallback`. UDP flows are alive
+while the TCP control connection of their iperf3 client is open.
+
+With `abort=True`, the default, a problem found before the traffic starts
+raises `StalledFlowError` right away, and one found during the run stops
+the traffic of every namespace, so NeST parses and dumps what ran so far,
+and then raises `StalledFlowError` once the results are written. The
+program exits with an error, which `helpers.spool` records as the return
+code of the job. Every check is written to `watchdog.json`:
+
+    {"interval", "grace", "stall", "preflight": [...], "aborted",
+     "flows": [{"source", "destination", "address", "protocol",
+                "algorithm", "streams", "start", "stop", "state",
+                "since", "sockets", "bytes_acked", "others"}],
+     "problems": [...]}
+
+    collectors.append(FlowWatchdog(exp))
+    run_with_collectors(exp, collectors)
+"""
+
+import logging
+import os
+import socket
+import struct
+import subprocess
+import time
+
+from nest.clean_up import kill_processes
+from nest.topology_map import TopologyMap
+
+from .collector import BackgroundCollector, netns
+
+logger = logging.getLogger(__name__)
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLMSG = struct.Struct("=IHHII")
+RTATTR = struct.Struct("=HH")
+# inet_diag_req_v2, with an empty inet_diag_sockid
+REQUEST = struct.Struct("=BBBxI48x")
+# inet_diag_msg up to the end of inet_diag_sockid, ports in network order
+MESSAGE = struct.Struct("=BBBB")
+PORTS = struct.Struct("!HH")
+MESSAGE_SIZE = 72
+
+INET_DIAG_INFO = 2
+INET_DIAG_CONG = 4
+TCP_ESTABLISHED = 1
+TCP_TIME_WAIT = 6
+TCP_LISTEN = 10
+# Every TCP state but the sockets that carry no traffic
+STATES = 0xFFF & ~(1 << TCP_TIME_WAIT | 1 << TCP_LISTEN)
+
+# Offsets into struct tcp_info
+TCPI_OPTIONS = 5
+TCPI_BYTES_ACKED = 120
+TCPI_OPT_ECN = 8
+
+# Control connections of the traffic generators of NeST
+NETPERF_PORT = 12865
+IPERF3_PORT = 5201
+# Ports of TCP connections that are not streams of a flow: the control
+# connections, and the server of `helpers/web_workload.py`
+IGNORED_PORTS = {NETPERF_PORT, IPERF3_PORT, 8080}
+
+AVAILABLE = "/proc/sys/net/ipv4/tcp_available_congestion_control"
+
+
+class StalledFlowError(RuntimeError):
+    """A flow of the experiment did not start, died or stalled"""
+
+
+def _attributes(data, offset, end):
+    """(type, payload offset, payload end) of the rtattrs in data[offset:end]"""
+    while offset + RTATTR.size <= end:
+        (length, kind) = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        yield (kind & 0x3FFF, offset + RTATTR.size, offset + length)
+        offset += (length + 3) & ~3
+
+
+def _parse_socket(data, offset, end):
+    """Address, ports, congestion control, ECN and bytes acked of a socket"""
+    (family, state, _, _) = MESSAGE.unpack_from(data, offset)
+    (sport, dport) = PORTS.unpack_from(data, offset + 4)
+    size = 4 if family == socket.AF_INET else 16
+    address = socket.inet_ntop(family, data[offset + 24 : offset + 24 + size])
+    entry = {
+        "address": address,
+        "sport": sport,
+        "dport": dport,
+        "state": state,
+        "algorithm": None,
+        "ecn": False,
+        "bytes_acked": None,
+    }
+    for (kind, start, stop) in _attributes(data, offset + MESSAGE_SIZE, end):
+        if kind == INET_DIAG_CONG:
+            entry["algorithm"] = data[start:stop].rstrip(b"\0").decode()
+        elif kind == INET_DIAG_INFO:
+            entry["ecn"] = bool(data[start + TCPI_OPTIONS] & TCPI_OPT_ECN)
+            if stop - start >= TCPI_BYTES_ACKED + 8:
+                (entry["bytes_acked"],) = struct.unpack_from("=Q", data, start + TCPI_BYTES_ACKED)
+    return entry
+
+
+class _Namespace:
+    """sock_diag socket of one namespace"""
+
+    def __init__(self, ns_id):
+        self.ns_id = ns_id
+        self.sequence = 0
+        # The socket stays in the namespace it was opened in
+        with netns(ns_id):
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+            self.socket.bind((0, 0))
+
+    def dump(self, family):
+        """Every TCP socket of `family` in this namespace"""
+        self.sequence += 1
+        extensions = 1 << (INET_DIAG_INFO - 1) | 1 << (INET_DIAG_CONG - 1)
+        request = REQUEST.pack(family, socket.IPPROTO_TCP, extensions, STATES)
+        self.socket.send(
+            NLMSG.pack(
+                NLMSG.size + len(request),
+                SOCK_DIAG_BY_FAMILY,
+                NLM_F_REQUEST | NLM_F_DUMP,
+                self.sequence,
+                0,
+            )
+            + request
+        )
+
+        sockets = []
+        while True:
+            data = self.socket.recv(65536)
+            offset = 0
+            while offset + NLMSG.size <= len(data):
+                (length, kind, _, sequence, _) = NLMSG.unpack_from(data, offset)
+                if length < NLMSG.size:
+                    return sockets
+                end = offset + length
+                if sequence == self.sequence:
+                    if kind == NLMSG_DONE:
+                        return sockets
+                    if kind == NLMSG_ERROR:
+                        (error,) = struct.unpack_from("=i", data, offset + NLMSG.size)
+                        raise OSError(-error, os.strerror(-error))
+                    sockets.append(_parse_socket(data, offset + NLMSG.size, end))
+                offset = (end + 3) & ~3
+
+    def close(self):
+        self.socket.close()
+
+
+def available_algorithms():
+    """Congestion controls available in the kernel"""
+    with open(AVAILABLE, "r") as file:
+        return file.read().split()
+
+
+def load_algorithm(algorithm):
+    """
+    Make congestion control `algorithm` available, loading its module
+
+    Returns
+    -------
+    str
+        None if it is available, else why not
+    """
+    if algorithm in available_algorithms():
+        return None
+    try:
+        completed = subprocess.run(
+            ["modprobe", f"tcp_{algorithm}"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        )
+        reason = completed.stderr.strip() or f"modprobe exited with {completed.returncode}"
+    except OSError as error:
+        reason = str(error)
+    if algorithm in available_algorithms():
+        logger.info("Watchdog: loaded tcp_%s", algorithm)
+        return None
+    return f"{algorithm} is not available in the kernel: {reason}"
+
+
+def _tcp_ecn(ns_id):
+    """net.ipv4.tcp_ecn of namespace `ns_id`"""
+    with netns(ns_id):
+        with open("/proc/sys/net/ipv4/tcp_ecn", "r") as file:
+            return int(file.read())
+
+
+class _Flow:
+    """Flows of an experiment that share a source, address and algorithm"""
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, source, destination, address, protocol, algorithm):
+        (self.source, self.destination) = (source, destination)
+        (self.address, self.protocol, self.algorithm) = (address, protocol, algorithm)
+        self.schedule = []  # (start, stop, streams) of every flow
+        self.state = "ok"
+        self.since = None
+        self.seen = 0
+        self.acked = {}  # source port -> bytes acked
+        self.progress = None
+        self.others = {}  # algorithm -> sockets to the address, if not started
+
+    def expected(self, elapsed, grace):
+        """Streams that should be running `elapsed` seconds into the run"""
+        return sum(
+            streams
+            for (start, stop, streams) in self.schedule
+            if start + grace <= elapsed <= stop - grace
+        )
+
+    def matches(self, entry):
+        """Whether socket `entry` is a stream of these flows"""
+        if entry["address"] != self.address:
+            return False
+        if self.protocol == "UDP":
+            return entry["dport"] == IPERF3_PORT
+        if entry["sport"] in IGNORED_PORTS or entry["dport"] in IGNORED_PORTS:
+            return False
+        # dctcp falls back to `dctcp-reno` without ECN
+        algorithm = entry["algorithm"] or ""
+        return algorithm == self.algorithm or algorithm.startswith(f"{self.algorithm}-")
+
+    def describe(self, names):
+        return (
+            f"{self.algorithm or self.protocol} from {names[self.source]} to "
+            f"{names[self.destination]} ({self.address})"
+        )
+
+
+class FlowWatchdog(BackgroundCollector):
+    """
+    Checks that every flow of an experiment starts and makes progress
+
+    Parameters
+    ----------
+    exp : Experiment
+        Experiment whose flows are watched
+    interval : float
+        Seconds between two checks (Default value = 1.0)
+    grace : float
+        Seconds after the start of a flow before it must run, and before
+        its stop after which it may end (Default value = 5.0)
+    stall : float
+        Seconds without acknowledged bytes after which a flow is stalled
+        (Default value = 10.0)
+    abort : bool
+        Stop the run and raise `StalledFlowError` on the first problem
+        (Default value = True)
+    load : bool
+        Load the module of congestion controls that are not available
+        (Default value = True)
+    """
+
+    name = "watchdog"
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, exp, interval=1.0, grace=5.0, stall=10.0, abort=True, load=True):
+        super().__init__(interval)
+        self.exp = exp
+        self.grace = grace
+        self.stall = stall
+        self.abort = abort
+        self.load = load
+        self.flows = {}
+        self.namespaces = {}
+        self.names = {}
+        self.preflight = []
+        self.problems = []
+        self.aborted = False
+
+    def _group(self):
+        for flow in self.exp.flows:
+            # pylint: disable=protected-access
+            (source, destination, address, start, stop, streams, options) = flow._get_props()
+            address = address.get_addr(with_subnet=False)
+            algorithm = options.get("cong_algo") if options["protocol"] == "TCP" else None
+            key = (source, address, options["protocol"], algorithm)
+            if key not in self.flows:
+                self.flows[key] = _Flow(source, destination, address, options["protocol"], algorithm)
+            self.flows[key].schedule.append((start, stop, streams))
+
+    def check_setup(self):
+        """
+        Problems that keep flows from running as configured, found before
+        the traffic starts
+
+        Returns
+        -------
+        list(str)
+            The problems
+        """
+        problems = []
+        algorithms = sorted({flow.algorithm for flow in self.flows.values() if flow.algorithm})
+        for algorithm in algorithms:
+            if self.load:
+                reason = load_algorithm(algorithm)
+            elif algorithm not in available_algorithms():
+                reason = f"{algorithm} is not available in the kernel"
+            else:
+                reason = None
+            if reason:
+                problems.append(reason)
+        for flow in self.flows.values():
+            if flow.algorithm == "dctcp" and _tcp_ecn(flow.destination) == 0:
+                problems.append(
+                    f"{flow.describe(self.names)}: {self.names[flow.destination]} refuses "
+                    "ECN (net.ipv4.tcp_ecn = 0), so DCTCP falls back to Reno"
+                )
+        return problems
+
+    def setup(self):
+        self.names = {ns["id"]: ns["name"] for ns in TopologyMap.get_namespaces()}
+        self._group()
+        self.preflight = self.check_setup()
+        for problem in self.preflight:
+            logger.error("Watchdog: %s", problem)
+        if self.preflight and self.abort:
+            raise StalledFlowError("; ".join(self.preflight))
+        for source in {flow.source for flow in self.flows.values()}:
+            self.namespaces[source] = _Namespace(source)
+
+    def _report(self, flow, state, elapsed, problem):
+        if flow.state != "ok":
+            return
+        (flow.state, flow.since) = (state, round(elapsed, 1))
+        problem = f"{flow.describe(self.names)} {problem} at {elapsed:.0f} s"
+        self.problems.append(problem)
+        logger.error("Watchdog: %s", problem)
+        if self.abort and not self.aborted:
+            logger.error("Watchdog: stopping the traffic")
+            self.aborted = True
+            kill_processes()
+
+    def _check(self, flow, sockets, elapsed):
+        expected = flow.expected(elapsed, self.grace)
+        streams = [entry for entry in sockets if flow.matches(entry)]
+        flow.seen = max(flow.seen, len(streams))
+        if flow.protocol == "TCP":
+            if flow.algorithm == "dctcp":
+                # ECN is negotiated by the handshake
+                fallback = [e for e in streams if e["state"] == TCP_ESTABLISHED and not e["ecn"]]
+                if fallback:
+                    self._report(
+                        flow, "fallback", elapsed,
+                        f"did not negotiate ECN and runs as {fallback[0]['algorithm']}",
+                    )
+        if not expected:
+            flow.progress = None
+            return
+
+        if len(streams) < expected:
+            if flow.state != "ok":
+                return
+            if flow.seen:
+                self._report(flow, "died", elapsed, f"lost {expected - len(streams)} of {expected} streams")
+            else:
+                # A generator that could not set the algorithm may run with
+                # the default one instead
+                flow.others = {}
+                for entry in sockets:
+                    if entry["address"] == flow.address and entry["algorithm"] and not (
+                        {entry["sport"], entry["dport"]} & IGNORED_PORTS
+                    ):
+                        flow.others[entry["algorithm"]] = flow.others.get(entry["algorithm"], 0) + 1
+                found = ", ".join(f"{count} {name}" for (name, count) in sorted(flow.others.items()))
+                self._report(
+                    flow, "not_started", elapsed,
+                    f"did not start (sockets to {flow.address}: {found or 'none'})",
+                )
+            return
+
+        progressed = flow.progress is None
+        for entry in streams:
+            acked = entry["bytes_acked"]
+            if acked is None or acked > flow.acked.get(entry["sport"], -1):
+                progressed = True
+            flow.acked[entry["sport"]] = acked if acked is not None else 0
+        if flow.protocol == "UDP" or progressed:
+            flow.progress = elapsed
+        elif elapsed - flow.progress >= self.stall:
+            self._report(flow, "stalled", elapsed, f"had no bytes acknowledged for {self.stall:.0f} s")
+
+    def sample(self):
+        if self.aborted or self.launched is None:
+            return
+        elapsed = time.monotonic() - self.launched
+        for (source, namespace) in self.namespaces.items():
+            flows = [flow for flow in self.flows.values() if flow.source == source]
+            families = {socket.AF_INET6 if ":" in flow.address else socket.AF_INET for flow in flows}
+            sockets = [entry for family in families for entry in namespace.dump(family)]
+            for flow in flows:
+                self._check(flow, sockets, elapsed)
+
+    def teardown(self):
+        for namespace in self.namespaces.values():
+            namespace.close()
+        self.namespaces = {}
+
+    def results(self):
+        return {
+            "interval": self.interval,
+            "grace": self.grace,
+            "stall": self.stall,
+            "preflight": self.preflight,
+            "aborted": self.aborted,
+            "flows": [
+                {
+                    "source": self.names.get(flow.source, flow.source),
+                    "destination": self.names.get(flow.destination, flow.destination),
+                    "address": flow.address,
+                    "protocol": flow.protocol,
+                    "algorithm": flow.algorithm,
+                    "streams": max(streams for (_, _, streams) in flow.schedule),
+                    "start": min(start for (start, _, _) in flow.schedule),
+                    "stop": max(stop for (_, stop, _) in flow.schedule),
+                    "state": flow.state,
+                    "since": flow.since,
+                    "sockets": flow.seen,
+                    "bytes_acked": sum(flow.acked.values()),
+                    "others": flow.others,
+                }
+                for flow in self.flows.values()
+            ],
+            "problems": self.preflight + self.problems,
+        }
+
+    def __exit__(self, *args):
+        super().__exit__(*args)
+        if self.aborted and args[0] is None:
+            raise StalledFlowError("; ".join(self.problems))
@@ -0,0 +1,459 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""
+Run short request/response TCP transfers and measure flow completion times.
+
+The example programs load the bottleneck with a few long-lived flows. The
+short transfers of web traffic behave differently: most of them finish in
+slow start, and their completion time is dominated by the queue built up
+by the bulk flows. `WebWorkload` starts a server in the namespace of every
+server node and a client per workload that opens a new connection for
+every transfer. Transfers arrive as a Poisson process, and their sizes are
+drawn from a distribution.
+
+    web = WebWorkload()
+    web.add_workload(h1, eth1.get_address(), h3, 0, 200, rate=5,
+                     sizes="websearch", tcp="cubic")
+    with web:
+        exp.run()
+
+The server sends the requested number of bytes with the requested TCP
+algorithm. The completion time of a transfer runs from the start of the
+connection to its last byte. `web.json` keeps the arrival time, size and
+completion time of every transfer as arrays, with percentile summaries per
+size class:
+
+    {"<client node>": {"<server address>": [{
+        "meta": {"server_node", "start_time", "stop_time", "rate", "sizes",
+                 "tcp"},
+        "arrival": [...], "size": [...], "fct": [...],
+        "summary": {"all": {...}, "short": {...}, "medium": {...},
+                    "long": {...}}}, ...]}}
+
+Arrival times are in seconds and completion times are in milliseconds. A
+completion time of null marks a transfer that did not finish before the
+end of its workload.
+
+Size distributions:
+
+    websearch                 web search workload, 1 to 20000 packets
+    fixed:BYTES
+    uniform:LOW:HIGH
+    lognormal:MEDIAN:SIGMA
+    pareto:MEAN:SHAPE         SHAPE > 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import socket
+import struct
+import time
+
+import numpy as np
+
+from .netns_tool import NamespaceTool, StopFlag, wait_for_epoch
+
+PORT = 8080
+# Size to send and TCP algorithm to send it with
+REQUEST = struct.Struct("!Q16s")
+CHUNK = bytes(256 * 1024)
+# Seconds after the end of a workload to wait for transfers in progress
+LINGER = 5.0
+MAX_SIZE = 100 * 10 ** 6
+MSS = 1460
+
+# CDF of the web search workload, in packets of MSS bytes
+WEBSEARCH = (
+    (1, 0.0),
+    (6, 0.15),
+    (13, 0.2),
+    (19, 0.3),
+    (33, 0.4),
+    (53, 0.53),
+    (133, 0.6),
+    (667, 0.7),
+    (1333, 0.8),
+    (3333, 0.9),
+    (6667, 0.97),
+    (20000, 1.0),
+)
+
+# Upper size limit of every class, in bytes
+SIZE_CLASSES = (("short", 100 * 1000), ("medium", 1000 * 1000), ("long", None))
+PERCENTILES = (("p50", 50), ("p90", 90), ("p99", 99))
+
+
+def sample_sizes(spec, count, rng):
+    """
+    Draw `count` transfer sizes in bytes
+
+    Parameters
+    ----------
+    spec : str
+        Size distribution, see the module documentation
+    count : int
+        Number of sizes
+    rng : numpy.random.Generator
+        Source of randomness
+
+    Returns
+    -------
+    numpy.ndarray
+        Sizes, at least 1 and at most `MAX_SIZE` bytes
+    """
+    (kind, *params) = spec.split(":")
+    params = [float(param) for param in params]
+
+    if kind == "websearch":
+        (packets, cdf) = zip(*WEBSEARCH)
+        sizes = np.interp(rng.random(count), cdf, packets) * MSS
+    elif kind == "fixed":
+        sizes = np.full(count, params[0])
+    elif kind == "uniform":
+        sizes = rng.uniform(params[0], params[1], count)
+    elif kind == "lognormal":
+        sizes = rng.lognormal(np.log(params[0]), params[1], count)
+    elif kind == "pareto":
+        (mean, shape) = params
+        if shape <= 1:
+            raise ValueError("The shape of a pareto distribution must be above 1")
+        sizes = (rng.pareto(shape, count) + 1) * mean * (shape - 1) / shape
+    else:
+        raise ValueError(f"Unknown size distribution {spec}")
+
+    return np.clip(np.round(sizes), 1, MAX_SIZE).astype(np.int64)
+
+
+def summarize(sizes, fcts):
+    """
+    Percentiles of the completion times, overall and per size class
+
+    Parameters
+    ----------
+    sizes : numpy.ndarray
+        Size of every transfer in bytes
+    fcts : numpy.ndarray
+        Completion time of every transfer in ms, NaN if it did not finish
+
+    Returns
+    -------
+    dict
+        {"all": {...}, "<class>": {...}}, each with the number of transfers,
+        how many finished, the mean and the percentiles
+    """
+    classes = {"all": np.ones(len(sizes), dtype=bool)}
+    lower = 0
+    for (name, upper) in SIZE_CLASSES:
+        classes[name] = sizes >= lower
+        if upper is not None:
+            classes[name] &= sizes < upper
+        lower = upper
+
+    summary = {}
+    for (name, members) in classes.items():
+        finished = fcts[members & ~np.isnan(fcts)]
+        entry = {"transfers": int(members.sum()), "finished": len(finished)}
+        entry["mean"] = round(float(finished.mean()), 3) if len(finished) else None
+        for (key, percentile) in PERCENTILES:
+            entry[key] = (
+                round(float(np.percentile(finished, percentile)), 3)
+                if len(finished)
+                else None
+            )
+        summary[name] = entry
+    return summary
+
+
+def _set_congestion(sock, tcp):
+    if tcp:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, tcp.encode())
+
+
+async def _handle(reader, writer):
+    try:
+        (size, tcp) = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+        _set_congestion(writer.get_extra_info("socket"), tcp.rstrip(b"\0").decode())
+        remaining = size
+        while remaining:
+            chunk = CHUNK[: min(remaining, len(CHUNK))]
+            writer.write(chunk)
+            remaining -= len(chunk)
+            await writer.drain()
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(port, end, stop_flag):
+    server = await asyncio.start_server(_handle, "0.0.0.0", port, backlog=4096)
+    async with server:
+        while not stop_flag.stopped and time.monotonic() < end:
+            await asyncio.sleep(0.5)
+
+
+def serve(port=PORT, duration=None):
+    """
+    Send every client the number of bytes it asks for
+
+    Parameters
+    ----------
+    port : int
+        TCP port to listen on (Default value = 8080)
+    duration : float
+        Seconds to run for (Default value = None, until killed)
+    """
+    stop_flag = StopFlag()
+    end = time.monotonic() + duration if duration else float("inf")
+    asyncio.run(_serve(port, end, stop_flag))
+
+
+async def _fetch(address, port, size, tcp):
+    """Completion time of one transfer in seconds"""
+    started = time.monotonic()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        _set_congestion(sock, tcp)
+        await asyncio.get_running_loop().sock_connect(sock, (address, port))
+        (reader, writer) = await asyncio.open_connection(sock=sock)
+    except BaseException:
+        # Also on cancellation; once connected, the writer owns the socket
+        sock.close()
+        raise
+    try:
+        writer.write(REQUEST.pack(size, tcp.encode()))
+        received = 0
+        while received < size:
+            data = await reader.read(len(CHUNK))
+            if not data:
+                raise ConnectionError("Server closed the connection early")
+            received += len(data)
+        return time.monotonic() - started
+    finally:
+        writer.close()
+
+
+async def _run_workload(workload, epoch, stop_flag):
+    arrivals = workload["arrivals"]
+    sizes = workload["sizes"]
+    fcts = np.full(len(arrivals), np.nan)
+    tasks = []
+
+    async def transfer(index):
+        try:
+            fcts[index] = 1000 * await _fetch(
+                workload["address"], workload["port"], int(sizes[index]), workload["tcp"]
+            )
+        except (OSError, ConnectionError):
+            pass
+
+    for (index, arrival) in enumerate(arrivals):
+        if stop_flag.stopped:
+            break
+        await asyncio.sleep(max(0.0, epoch + arrival - time.time()))
+        tasks.append(asyncio.ensure_future(transfer(index)))
+
+    deadline = epoch + workload["stop"] + LINGER
+    while tasks and not stop_flag.stopped and time.time() < deadline:
+        tasks = [task for task in tasks if not task.done()]
+        await asyncio.sleep(0.1)
+    for task in tasks:
+        task.cancel()
+    return fcts
+
+
+def fetch(workload, epoch):
+    """
+    Run the transfers of `workload` and time them
+
+    Parameters
+    ----------
+    workload : dict
+        {"address", "port", "rate", "sizes", "tcp", "start", "stop",
+        "seed"}
+    epoch : float
+        Wall clock time of second 0 of the experiment
+
+    Returns
+    -------
+    dict
+        Arrival, size and completion time arrays, as in `web.json`
+    """
+    stop_flag = StopFlag()
+
+    # Every transfer needs its own socket
+    (_, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    rng = np.random.default_rng(workload["seed"])
+    duration = workload["stop"] - workload["start"]
+    # Enough gaps to cover the duration with a wide margin
+    gaps = rng.exponential(1 / workload["rate"], int(duration * workload["rate"] * 2) + 20)
+    arrivals = workload["start"] + np.cumsum(gaps)
+    arrivals = arrivals[arrivals < workload["stop"]]
+    sizes = sample_sizes(workload["sizes"], len(arrivals), rng)
+
+    fcts = asyncio.run(
+        _run_workload(dict(workload, arrivals=arrivals, sizes=sizes), epoch, stop_flag)
+    )
+    return {
+        "arrival": np.round(arrivals, 4).tolist(),
+        "size": sizes.tolist(),
+        "fct": [None if np.isnan(fct) else round(fct, 3) for fct in fcts],
+        "summary": summarize(sizes, fcts),
+    }
+
+
+class WebWorkload(NamespaceTool):
+    """
+    Runs short TCP transfers with Poisson arrivals while an experiment runs
+
+    Parameters
+    ----------
+    delay : float
+        Least seconds between starting the servers and clients and second
+        0, the launch of the flows by NeST (Default value = 1.0)
+    """
+
+    name = "web"
+
+    def __init__(self, delay=1.0):
+        super().__init__(delay)
+        self.workloads = []
+        self.outputs = []
+
+    # pylint: disable=too-many-arguments
+    def add_workload(
+        self,
+        server,
+        server_address,
+        client,
+        start,
+        stop,
+        rate=5,
+        sizes="websearch",
+        tcp="cubic",
+        seed=None,
+    ):
+        """
+        Add transfers from `server` to `client`
+
+        Parameters
+        ----------
+        server : Node
+            Node that sends the data
+        server_address : Address
+            Address of `server` that the client connects to
+        client : Node
+            Node that requests the transfers
+        start : float
+            Time of the first possible arrival (in seconds)
+        stop : float
+            No transfers arrive after this time (in seconds)
+        rate : float
+            Mean number of transfers per second (Default value = 5)
+        sizes : str
+            Size distribution (Default value = 'websearch')
+        tcp : str
+            TCP algorithm of the server (Default value = 'cubic')
+        seed : int
+            Seed of arrivals and sizes (Default value = None, the index of
+            the workload)
+        """
+        self.workloads.append(
+            {
+                "server": server,
+                "client": client,
+                "address": server_address.get_addr(with_subnet=False),
+                "start": start,
+                "stop": stop,
+                "rate": rate,
+                "sizes": sizes,
+                "tcp": tcp,
+                "seed": len(self.workloads) if seed is None else seed,
+            }
+        )
+
+    def end(self):
+        return max(workload["stop"] for workload in self.workloads) + LINGER
+
+    def launch(self):
+        """Start one server per server node, then one client per workload"""
+        servers = {w["server"].id: w["server"] for w in self.workloads}
+        for node in servers.values():
+            # Until NeST kills the processes in the namespaces at the end
+            self.spawn(node, ["serve"])
+
+        for (index, workload) in enumerate(self.workloads):
+            arguments = ["fetch", "--address", workload["address"]]
+            for key in ("start", "stop", "rate", "sizes", "tcp", "seed"):
+                arguments += [f"--{key}", str(workload[key])]
+            self.outputs.append(
+                self.spawn(workload["client"], arguments, f"fetch-{index}.json")
+            )
+
+    def results(self):
+        """Content of `web.json`"""
+        results = {}
+        for (workload, output) in zip(self.workloads, self.outputs):
+            transfers = self.read(output)
+            if transfers is None:
+                continue
+            meta = {
+                "server_node": workload["server"].name,
+                "start_time": workload["start"],
+                "stop_time": workload["stop"],
+                "rate": workload["rate"],
+                "sizes": workload["sizes"],
+                "tcp": workload["tcp"],
+            }
+            results.setdefault(workload["client"].name, {}).setdefault(
+                workload["address"], []
+            ).append(dict(meta=meta, **transfers))
+        return {f"{self.name}.json": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("role", choices=["serve", "fetch"])
+    parser.add_argument("--address")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--start", type=float, default=0)
+    parser.add_argument("--stop", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=5)
+    parser.add_argument("--sizes", default="websearch")
+    parser.add_argument("--tcp", default="cubic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=None)
+    parser.add_argument("--epoch", type=float, default=None)
+    parser.add_argument("--epoch_file", default=None, help="Wait for the epoch to be written here")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] : %(message)s")
+
+    if args.role == "serve":
+        serve(args.port, args.duration)
+        return
+
+    if not args.address or not args.output:
+        parser.error("fetch needs --address and --output")
+    workload = {
+        key: getattr(args, key)
+        for key in ("address", "port", "start", "stop", "rate", "sizes", "tcp", "seed")
+    }
+    epoch = wait_for_epoch(args.epoch, args.epoch_file)
+    if epoch is None:
+        return
+    transfers = fetch(workload, epoch)
+    with open(args.output, "w") as file:
+        json.dump(transfers, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+########################
+# SHOULD BE RUN AS ROOT
+########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
+from nest.experiment import *
+from helpers.topology import ParkingLot
+import argparse
+
+# Create the parser
+parser = argparse.ArgumentParser()
+
+# Add an argument
+parser.add_argument('--tcp', type=str, default="cubic", help="TCP algorithm of the main flows")
+parser.add_argument('--cross_tcp', type=str, default="cubic", help="TCP algorithm of the cross traffic")
+parser.add_argument('--routers', type=int, default=4, help="Number of routers in the chain")
+parser.add_argument('--streams', type=int, default=1, help="Number of main TCP streams")
+parser.add_argument('--cross_streams', type=int, default=1, help="Number of cross TCP streams per hop")
+parser.add_argument('--bandwidth', type=str, default="10mbit", help="Bandwidth of every hop, or a comma separated list with one value per hop")
+parser.add_argument('--delay', type=str, default="10ms", help="Delay of every hop, or a comma separated list with one value per hop")
+parser.add_argument('--qdisc', type=str, default="", help="Qdisc of every hop, or a comma separated list with one value per hop")
+example.add_arguments(parser)
+
+# Parse the argument
+args = parser.parse_args()
+
+
+def per_hop(value, hops):
+	"""Expand a single value, or a comma separated list, to one value per hop"""
+	values = value.split(",")
+	if len(values) == 1:
+		return values * hops
+	if len(values) != hops:
+		parser.error(f"expected 1 or {hops} comma separated values, got '{value}'")
+	return values
+
+
+# This program emulates a parking lot topology: `--routers` routers in series
+# with the main flows from `h1` to `h2` crossing every hop. Each hop also
+# carries its own cross traffic, from a host at its upstream router to a host
+# at its downstream router, so that the main flows see several congested
+# hops. Each hop gets its own bandwidth, delay and qdisc.
+
+##############################################################################
+#                              Network Topology                              #
+#                                                                            #
+#            c1s           c1d  c2s           c2d  c3s        c(K-1)d        #
+#             |              |   |              |   |            |           #
+#   h1 ----- r1 -- hop 1 --- r2 ---- hop 2 ---- r3 ---- ... ---- rK ----- h2 #
+#                                                                            #
+#   <- 1000mbit, 1ms -> on every host link                                   #
+#   <- --bandwidth, --delay, --qdisc -> on every hop                         #
+#                                                                            #
+##############################################################################
+
+# This program runs for 200 seconds and creates a new directory called
+# `parking-lot(date-timestamp)_dump`. It contains a `README` that
+# provides details about the sub-directories and files within this directory.
+# See the plots in `netperf`, `ping` and `ss` sub-directories for this program.
+
+# Create the chain of routers, the main and cross traffic hosts, connect them
+# and assign addresses and routes to all of them.
+lot = ParkingLot(args.routers)
+
+# Set the link attributes of every hop
+hops = args.routers - 1
+for (hop, bandwidth, delay, qdisc) in zip(
+	range(1, hops + 1),
+	per_hop(args.bandwidth, hops),
+	per_hop(args.delay, hops),
+	per_hop(args.qdisc, hops),
+):
+	lot.set_hop(hop, bandwidth, delay, qdisc or None)
+
+# Set the link attributes of every host link, in both directions
+lot.set_edges("1000mbit", "1ms")
+
+# Set up an Experiment. This API takes the name of the experiment as a string.
+exp = Experiment("parking-lot")
+
+# Main flows from `h1` to `h2` and cross traffic on every hop
+lot.add_main_flows(exp, args.tcp, 0, 200, args.streams)
+lot.add_cross_flows(exp, args.cross_tcp, 0, 200, args.cross_streams)
+
+# Run the experiment
+example.run(exp, args)
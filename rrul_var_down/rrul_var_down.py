@@ -4,11 +4,21 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.bufferbloat import score_dump
+from helpers.qdisc_presets import qdisc_preset
 import argparse
+import functools
 
 # Create the parser
 parser = argparse.ArgumentParser()
@@ -16,6 +26,8 @@ parser = argparse.ArgumentParser()
 # Add an argument
 parser.add_argument('--tcp', type=str, default="cubic", help = "TCP algorithm to use")
 parser.add_argument('--streams', type=int, default=20, help = "Number of TCP upload streams")
+parser.add_argument('--catalog', type=str, default="", help = "Run catalog to record the bufferbloat score of the run in")
+example.add_arguments(parser)
 
 # Parse the argument
 args = parser.parse_args()
@@ -81,14 +93,7 @@ AddressHelper.assign_addresses()
 # Configure the parameters of `codel` qdisc to enable step marking with ECN,
 # which is essential for DCTCP. 
 if args.tcp == "dctcp":
-	qdisc = "codel"
-	codel_parameters = {
-    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-    		"ecn": "",  # enables ecn marking for codel
-	}
+	(qdisc, codel_parameters) = qdisc_preset("dctcp", "10mbit", "10ms")
 	etr1c.set_attributes("10mbit", "10ms", qdisc, **codel_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1c.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -140,5 +145,7 @@ exp.add_tcp_flow(flow5, args.tcp)
 exp.add_udp_flow(flow4, "12mbit")
 exp.add_udp_flow(flow6, "12mbit")
 
-# Run the experiment
-exp.run()
\ No newline at end of file
+# Run the experiment, and score its latency under load over the path RTT
+# of 24 ms into `bufferbloat.json`, see `helpers/bufferbloat.py`
+score = functools.partial(score_dump, catalog=args.catalog, upload=["h1", "h2"], capacity=10, rtt=24)
+example.run(exp, args, etr1c, "10mbit", "10ms", qdisc if args.tcp == "dctcp" else None, after=[score])
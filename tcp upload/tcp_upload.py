@@ -4,10 +4,18 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.qdisc_presets import qdisc_preset
 import argparse
 
 # Create the parser
@@ -17,6 +25,7 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--tcp1', type=str, default="cubic")
 parser.add_argument('--tcp2', type=str, default="bbr")
 parser.add_argument('--num_uploadstream', type=int, default=1)
+example.add_arguments(parser)
 # Parse the argument
 args = parser.parse_args()
 
@@ -82,14 +91,7 @@ AddressHelper.assign_addresses()
 # Configure the parameters of `codel` qdisc to enable step marking with ECN,
 # which is essential for DCTCP. 
 if args.tcp2 == "dctcp":
-	qdisc = "codel"
-	codel_parameters = {
-    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-    		"ecn": "",  # enables ecn marking for codel
-	}
+	(qdisc, codel_parameters) = qdisc_preset("dctcp", "10mbit", "10ms")
 	etr1c.set_attributes("10mbit", "10ms", qdisc, **codel_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1c.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -140,6 +142,4 @@ exp.add_tcp_flow(flow3, args.tcp1)
 exp.add_tcp_flow(flow4, args.tcp2)
 
 # Run the experiment
-exp.run()
-
-
+example.run(exp, args, etr1c, "10mbit", "10ms", qdisc if args.tcp2 == "dctcp" else None)
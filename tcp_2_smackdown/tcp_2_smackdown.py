@@ -4,10 +4,19 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.qdisc_presets import qdisc_preset
+from helpers.web_workload import WebWorkload
 import argparse
 
 # Create the parser
@@ -16,6 +25,10 @@ parser = argparse.ArgumentParser()
 # Add an argument
 parser.add_argument('--tcp1', type=str, default="cubic")
 parser.add_argument('--tcp2', type=str, default="bbr")
+parser.add_argument('--web_rate', type=float, default=0, help="Short transfers per second from `h1` to `h3` and from `h2` to `h4`, 0 to disable")
+parser.add_argument('--web_sizes', type=str, default="lognormal:20000:1.5", help="Size distribution of the short transfers, see helpers/web_workload.py")
+parser.add_argument('--web_tcp', type=str, default="cubic", help="TCP algorithm of the short transfers")
+example.add_arguments(parser)
 
 # Parse the argument
 args = parser.parse_args()
@@ -82,14 +95,7 @@ AddressHelper.assign_addresses()
 # Configure the parameters of `codel` qdisc to enable step marking with ECN,
 # which is essential for DCTCP. 
 if args.tcp2 == "dctcp":
-	qdisc = "codel"
-	codel_parameters = {
-    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-    		"ecn": "",  # enables ecn marking for codel
-	}
+	(qdisc, codel_parameters) = qdisc_preset("dctcp", "10mbit", "10ms")
 	etr1c.set_attributes("10mbit", "10ms", qdisc, **codel_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1c.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -146,5 +152,13 @@ exp.add_tcp_flow(flow7, args.tcp1)
 exp.add_tcp_flow(flow8, args.tcp2)
 
 
+# Optionally, run short transfers with Poisson arrivals in the upload
+# direction next to the bulk flows, with their completion times in `web.json`.
+web = WebWorkload()
+if args.web_rate:
+	web.add_workload(h1, eth1.get_address(), h3, 0, 200, args.web_rate, args.web_sizes, args.web_tcp)
+	web.add_workload(h2, eth2.get_address(), h4, 0, 200, args.web_rate, args.web_sizes, args.web_tcp)
+
 # Run the experiment
-exp.run()
+example.run(exp, args, etr1c, "10mbit", "10ms", qdisc if args.tcp2 == "dctcp" else None,
+	tools=[web] if args.web_rate else [])
@@ -4,10 +4,18 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.link_schedule import LinkSchedule, LinkScheduler
 import argparse
 
 # Create the parser
@@ -17,6 +25,11 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--length', type=int, default=200)
 parser.add_argument('--delay', type=int, default=50)
 
+# Arguments to vary the bottleneck during the run
+parser.add_argument('--trace', type=str, default=None, help="CSV trace of bandwidth, delay and loss of the bottleneck, see helpers/link_schedule.py")
+parser.add_argument('--square', type=str, default=None, help="LOW,HIGH,PERIOD: switch the bottleneck bandwidth between LOW and HIGH every half PERIOD seconds")
+example.add_arguments(parser)
+
 # Parse the argument
 args = parser.parse_args()
 length, delay = args.length, args.delay
@@ -122,5 +135,13 @@ exp.add_tcp_flow(flow6, "cubic")
 exp.add_tcp_flow(flow7, "reno")
 exp.add_tcp_flow(flow8, "westwood")
 
-# Run the experiment
-exp.run()
+# Run the experiment, optionally with the bandwidth of the bottleneck from
+# `r1` to `r2` following a trace or a square wave. The applied steps are
+# saved in `link_schedule.json`.
+schedule = None
+if args.trace:
+	schedule = LinkSchedule.from_trace(args.trace, bandwidth="10mbit", delay="10ms")
+elif args.square:
+	low, high, period = args.square.split(",")
+	schedule = LinkSchedule.square_wave(low, high, float(period), length, delay="10ms")
+example.run(exp, args, etr1c, "10mbit", "10ms", tools=[LinkScheduler({etr1c: schedule})] if schedule else [])
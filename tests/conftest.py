@@ -0,0 +1,34 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+"""Fixtures shared by the tests of the helpers"""
+
+import glob
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# As the example programs do, so that `helpers` imports
+sys.path.append(ROOT)
+
+
+@pytest.fixture
+def archived_dump(tmp_path):
+    """
+    Copy of the NeST results of an archived dump of this repository, by the
+    folder of its program, without the caches that analyses leave in it
+    """
+
+    def copy(program):
+        (source,) = glob.glob(os.path.join(ROOT, glob.escape(program), "*_dump"))
+        dump = tmp_path / os.path.basename(source)
+        dump.mkdir()
+        for path in glob.glob(os.path.join(glob.escape(source), "*.json")):
+            if os.path.basename(path) != "flow_index.json":
+                shutil.copy(path, dump)
+        return str(dump)
+
+    return copy
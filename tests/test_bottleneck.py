@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+from types import SimpleNamespace
+
+import pytest
+
+from helpers import bottleneck
+from helpers.bottleneck import BottleneckCheck, BottleneckError, utilization
+
+NAMESPACES = [
+    {"id": "r1-1", "name": "r1", "interfaces": [{"id": "etr1c-1", "name": "etr1c"}]},
+    {"id": "r2-1", "name": "r2", "interfaces": [{"id": "etr2c-1", "name": "etr2c"}]},
+]
+
+
+def htb(rate):
+    """`tc -j class show` of a link of NeST, rates in bytes per second"""
+    return [{"class": "htb", "handle": "1:1", "root": True, "leaf": "11:", "rate": rate / 8}]
+
+
+def netem(delay):
+    return [
+        {"kind": "htb", "handle": "1:", "root": True},
+        {"kind": "netem", "handle": "11:", "parent": "1:1", "options": {"delay": {"delay": delay}}},
+    ]
+
+
+def leaf(kind):
+    return [{"kind": "htb", "handle": "1:", "root": True}, {"kind": kind, "handle": "11:"}]
+
+
+@pytest.fixture
+def topology(monkeypatch):
+    """Output of tc for the links of two routers, by namespace and device"""
+    links = {
+        ("r1-1", "class", "etr1c-1"): htb(10e6),
+        ("r1-1", "qdisc", "etr1c-1"): netem(0.01),
+        ("r1-1", "qdisc", "ifb-1"): leaf("fq_codel"),
+        ("r2-1", "class", "etr2c-1"): htb(100e6),
+    }
+
+    def tc(ns_id, kind, _, __, device):
+        return links.get((ns_id, kind, device), [])
+
+    monkeypatch.setattr(bottleneck, "_tc", tc)
+    monkeypatch.setattr(bottleneck.TopologyMap, "get_namespaces", staticmethod(lambda: NAMESPACES))
+    return links
+
+
+def check(delay="10ms", qdisc="fq_codel", **kwargs):
+    interface = SimpleNamespace(node_id="r1-1", id="etr1c-1", ifb_id="ifb-1", name="etr1c")
+    return BottleneckCheck(interface, "10mbit", delay, qdisc, **kwargs)
+
+
+@pytest.mark.usefixtures("topology")
+def test_setup_as_intended():
+    collector = check()
+    collector.setup()
+    assert collector.problems == []
+    assert collector.installed == {"rate": 10e6, "delay": 0.01, "qdisc": "fq_codel"}
+
+
+def test_rate_delay_and_qdisc_that_differ(topology):  # pylint: disable=redefined-outer-name
+    topology[("r1-1", "class", "etr1c-1")] = htb(5e6)
+    del topology[("r1-1", "qdisc", "etr1c-1")]
+    collector = check(qdisc="codel")
+    collector.setup()
+    assert collector.problems == [
+        "r1:etr1c has rate 5000000.0, expected 10000000.0",
+        "r1:etr1c has delay None, expected 0.01",
+        "r1:etr1c has qdisc fq_codel, expected codel",
+    ]
+    # Within the tolerance
+    topology[("r1-1", "class", "etr1c-1")] = htb(10.1e6)
+    collector = check(delay=None)
+    collector.setup()
+    assert collector.problems == []
+
+
+def test_narrower_links(topology):  # pylint: disable=redefined-outer-name
+    topology[("r2-1", "class", "etr2c-1")] = htb(8e6)
+    collector = check()
+    collector.setup()
+    assert collector.narrower == [{"interface": "r2:etr2c", "rate": 8e6}]
+    assert collector.problems == ["r2:etr2c (8000000 bit/s) is narrower than r1:etr1c"]
+    with pytest.raises(BottleneckError):
+        check(strict=True).setup()
+
+
+@pytest.mark.usefixtures("topology")
+def test_utilization_while_busy():
+    # Idle for 2 s, then 4 s at 90 % of 10 Mbit/s
+    timestamps = list(range(7))
+    sent = [0, 100, 200] + [200 + int(step * 0.9 * 10e6 / 8) for step in range(1, 5)]
+    used = utilization(timestamps, sent, 10e6)
+    assert (used["busy"], used["mean"], used["p50"]) == (4.0, 0.9, 0.9)
+
+    collector = check()
+    collector.setup()
+    collector.series = {"timestamp": timestamps, "tx_bytes": sent}
+    assert collector.results()["problems"] == []
+    collector.series["tx_bytes"] = [int(byte * 0.5) for byte in sent]
+    assert collector.results()["problems"] == ["r1:etr1c is 45% utilized while busy"]
+    collector.series["tx_bytes"] = [int(byte * 1.5) for byte in sent]
+    assert "shaped elsewhere" in collector.results()["problems"][0]
+    collector.series["tx_bytes"] = [0] * 7
+    assert collector.results()["problems"] == ["no traffic crossed r1:etr1c"]
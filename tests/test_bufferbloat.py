@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import json
+
+import pytest
+
+from helpers.bufferbloat import score
+
+LAUNCH = 1700000000.0
+
+
+def meta(start, destination="h3"):
+    return {"meta": True, "start_time": str(start), "stop_time": "20", "destination_node": destination}
+
+
+def write_dump(path, flow_start):
+    """A ping from 0 s, 24 ms when idle and 224 ms under the flow, every 0.5 s"""
+    pings = [meta(0)]
+    for step in range(40):
+        sent = step * 0.5
+        rtt = 224.0 if sent >= flow_start else 24.0
+        pings.append({"timestamp": f"{LAUNCH + sent + rtt / 1000:.6f}", "rtt": str(rtt)})
+    reports = [meta(flow_start)]
+    for step in range(1, int((20 - flow_start) / 0.5) + 1):
+        reports.append({"timestamp": f"{LAUNCH + flow_start + step * 0.5:.3f}", "sending_rate": "9.5"})
+    with open(path / "ping.json", "w") as file:
+        json.dump({"h1": [{"192.168.4.2": pings}]}, file)
+    with open(path / "netperf.json", "w") as file:
+        json.dump({"h1": [{"192.168.4.2:40000": reports}]}, file)
+    return str(path)
+
+
+def test_idle_pings_before_the_flows_start(tmp_path):
+    results = score(write_dump(tmp_path, flow_start=5), capacity=10)
+    pair = results["pairs"]["h1-h3"]
+    assert (pair["baseline"], pair["baseline_source"]) == (24.0, "idle")
+    assert results["inflation"]["p50"] == pytest.approx(200.0)
+
+
+def test_pings_with_the_flows_are_not_idle(tmp_path):
+    # The first reply already carries the load, and the first report of the
+    # flow comes half a second after the pings start
+    dump = write_dump(tmp_path, flow_start=0)
+    pair = score(dump)["pairs"]["h1-h3"]
+    assert (pair["baseline"], pair["baseline_source"]) == (224.0, "estimated")
+    pair = score(dump, rtt=24)["pairs"]["h1-h3"]
+    assert (pair["baseline"], pair["baseline_source"]) == (24.0, "estimated")
+    assert pair["p50"] == pytest.approx(200.0)
+
+
+def test_score_an_archived_dump(archived_dump):
+    results = score(archived_dump("rrul_var_up"), upload=["h1", "h2"], capacity=10, rtt=24)
+    throughput = results["throughput"]
+    assert throughput["directions"] == pytest.approx({"download": 8.837, "upload": 0.348}, abs=1e-3)
+    assert throughput["total"] == pytest.approx(9.186, abs=1e-3)
+    assert results["baseline"] == 24.0
+    assert len(results["pairs"]) == 4
+    # The programs start the pings with the flows
+    assert {pair["baseline_source"] for pair in results["pairs"].values()} == {"estimated"}
+    assert results["grade"]["overall"] == "F"
+    assert results["utilization"] == pytest.approx(0.0348, abs=1e-4)
+    assert len(throughput["flows"]) == 42
+
+
+def test_loaded_pings_do_not_set_the_baseline(archived_dump):
+    # The first replies of rrul_var_down came back after 118 to 196 ms
+    results = score(archived_dump("rrul_var_down"), upload=["h1", "h2"], capacity=10, rtt=24)
+    assert {pair["baseline"] for pair in results["pairs"].values()} == {24.0}
+    assert results["inflation"]["p50"] > 2000
+
+
+def test_a_dump_without_load(archived_dump):
+    dump = archived_dump("rrul_var_up")
+    with open(f"{dump}/netperf.json", "w") as file:
+        file.write("{}")
+    with pytest.raises(ValueError, match="No TCP samples"):
+        score(dump)
@@ -0,0 +1,104 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import json
+import os
+
+from helpers.flow_index import INDEX, FlowIndex
+
+
+def meta(start, destination=None):
+    fields = {"meta": True, "start_time": str(start), "stop_time": "20"}
+    if destination:
+        fields["destination_node"] = destination
+    return fields
+
+
+def write(dump, collector, data):
+    with open(os.path.join(dump, f"{collector}.json"), "w") as file:
+        json.dump(data, file)
+
+
+def write_dump(path, algorithms=True):
+    """
+    h1 runs three TCP flows to h3, in this order: one from 10 s and two
+    from 0 s; h2 runs two UDP flows of iperf3 to h4, whose control
+    connection to the server port of the first shows in ss.json
+    """
+    flows = [("40001", 10, "cubic"), ("40002", 0, "cubic"), ("40003", 0, "bbr")]
+    write(
+        path,
+        "netperf",
+        {
+            "h1": [
+                {f"10.0.3.2:{port}" + (f", {algorithm}" if algorithms else ""): [meta(start, "h3")]}
+                for (port, start, algorithm) in flows
+            ]
+        },
+    )
+    write(
+        path,
+        "ss",
+        {
+            "h1": [{"10.0.3.2": {"40002": [meta(0, "h3")]}}],
+            "h2": [{"10.0.4.2": {"5201": [meta(0, "h4")]}}],
+        },
+    )
+    write(
+        path,
+        "iperf3",
+        {"h2": [{"10.0.4.2": {"50001": [meta(0, "h4")], "50000": [meta(0, "h4")]}}]},
+    )
+    write(path, "iperf3Server", {"h4": [{"10.0.2.1": {"5202": [meta(0)], "5201": [meta(0)]}}]})
+    return str(path)
+
+
+def test_roles_by_start_time_and_order(tmp_path):
+    dump = write_dump(tmp_path)
+    index = FlowIndex.load(dump, roles={"a": "cubic", "b": "cubic", "c": "bbr"})
+    flows = index.flows
+    # Ordered by start time, then by the order of netperf.json
+    assert [flows[f"h1-h3-{port}"]["order"] for port in (40002, 40003, 40001)] == [0, 1, 2]
+    # Each flow takes the next role of its algorithm
+    assert [flows[f"h1-h3-{port}"]["role"] for port in (40002, 40003, 40001)] == ["a", "c", "b"]
+    assert index.lookup("ss", "h1", "10.0.3.2", "40002") == "h1-h3-40002"
+    assert index.key("h1-h3-40002", "netperf") == ("h1", "10.0.3.2:40002, cubic")
+
+    flows = FlowIndex.load(dump, order={"h1": ["x", "y", "z"]}).flows
+    assert [flows[f"h1-h3-{port}"]["role"] for port in (40002, 40003, 40001)] == ["x", "y", "z"]
+
+
+def test_roles_give_their_algorithm(tmp_path):
+    dump = write_dump(tmp_path, algorithms=False)
+    flows = FlowIndex.load(dump, roles={"tcp1": "cubic", "tcp2": "bbr"}, upload=["h1"]).flows
+    assert [flows[f"h1-h3-{port}"]["role"] for port in (40002, 40003, 40001)] == [
+        "tcp1",
+        "tcp2",
+        "tcp1",
+    ]
+    assert flows["h1-h3-40003"]["algorithm"] == "bbr"
+    assert flows["h1-h3-40001"]["direction"] == "upload"
+    # Flows without a role keep their protocol
+    assert flows["h2-h4-50000"]["role"] == "udp"
+
+
+def test_servers_and_control_connections(tmp_path):
+    index = FlowIndex.load(write_dump(tmp_path))
+    flows = index.flows
+    # Server ports are matched to the clients in the order of their ports
+    assert index.key("h2-h4-50000", "iperf3Server") == ("h4", "10.0.2.1", "5201")
+    assert index.key("h2-h4-50001", "iperf3Server") == ("h4", "10.0.2.1", "5202")
+    assert index.lookup("iperf3Server", "h4", "10.0.2.1", "5202") == "h2-h4-50001"
+    # The TCP connection to the server port is the control of its flow
+    control = flows["h2-h4-5201"]
+    assert (control["protocol"], control["parent"]) == ("control", "h2-h4-50000")
+    assert flows["h1-h3-40002"]["protocol"] == "tcp"
+
+
+def test_cache_is_opt_in(tmp_path):
+    dump = write_dump(tmp_path)
+    FlowIndex.load(dump)
+    assert not os.path.exists(os.path.join(dump, INDEX))
+    built = FlowIndex.load(dump, cache=True)
+    assert os.path.isfile(os.path.join(dump, INDEX))
+    assert FlowIndex.load(dump, cache=True).flows == built.flows
@@ -0,0 +1,34 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import os
+
+from helpers.fluid import TOLERANCE, prune, validate
+
+
+def test_validate_against_an_archived_dump(archived_dump):
+    dump = archived_dump("cisco_5tcpup_conf")
+    (result,) = validate([os.path.dirname(dump)])
+    assert (result["dump"], result["experiment"]) == (dump, "cisco-5tcpup-conf")
+    (predicted, measured) = (result["predicted"], result["measured"])
+    error = result["error"]
+    assert error["rtt_p95"] == round((predicted["rtt_p95"] - measured["rtt_p95"]) / measured["rtt_p95"], 4)
+    # Five cubic flows over a drop-tail queue, within the error of the model
+    assert abs(error["throughput"]) <= TOLERANCE
+    assert abs(error["rtt_p50"]) <= TOLERANCE and abs(error["rtt_p95"]) <= 0.3
+    assert error["share"] <= 0.05
+
+
+def test_prune_keeps_the_fronts_and_what_it_cannot_predict():
+    cells = prune("cisco_5tcpup.py", ["tcp=cubic,bbr", "qdisc=pfifo,codel,fq_codel"], fronts=1)
+    assert len(cells) == 6
+    unknown = [cell for cell in cells if "fq_codel" in cell["args"]]
+    assert len(unknown) == 2
+    assert all(cell["prediction"] is None and cell["rank"] is None and cell["keep"] for cell in unknown)
+    modelled = [cell for cell in cells if cell["prediction"]]
+    assert all(cell["keep"] == (cell["rank"] == 0) for cell in modelled)
+    # Some of the configurations are dominated by others
+    assert not all(cell["keep"] for cell in modelled)
+    # Within a wide enough tolerance every prediction is on the first front
+    cells = prune("cisco_5tcpup.py", ["tcp=cubic,bbr", "qdisc=pfifo,codel"], fronts=1, tolerance=1000)
+    assert all(cell["rank"] == 0 and cell["keep"] for cell in cells)
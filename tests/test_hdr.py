@@ -0,0 +1,68 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import json
+
+import numpy as np
+import pytest
+
+from helpers.hdr import HdrHistogram
+
+
+@pytest.fixture
+def rtts():
+    return np.random.default_rng(1).lognormal(mean=10, sigma=1, size=20000).astype(np.int64)
+
+
+@pytest.mark.parametrize("percentile", [50, 90, 99, 99.9, 100])
+def test_percentiles_keep_three_significant_figures(rtts, percentile):
+    histogram = HdrHistogram()
+    histogram.record_values(rtts)
+    exact = np.percentile(rtts, percentile, method="inverted_cdf")
+    assert histogram.percentile(percentile) == pytest.approx(exact, rel=1e-3)
+
+
+def test_small_values_are_exact():
+    histogram = HdrHistogram()
+    histogram.record_values(np.arange(1, 1001))
+    assert histogram.percentile(50) == 500
+    assert (histogram.min, histogram.max, histogram.total) == (1, 1000, 1000)
+
+
+def test_large_values_are_clamped():
+    histogram = HdrHistogram(highest=10 ** 6)
+    histogram.record_values([10 ** 9])
+    assert histogram.total == 1
+    assert histogram.counts.sum() == 1
+
+
+def test_empty_histogram():
+    histogram = HdrHistogram()
+    histogram.record_values([])
+    assert histogram.percentile(99) is None
+    assert histogram.to_sparse()["index"] == []
+
+
+def test_sparse_round_trip(rtts):
+    histogram = HdrHistogram()
+    histogram.record_values(rtts)
+    sparse = json.loads(json.dumps(histogram.to_sparse()))
+    copy = HdrHistogram.from_sparse(sparse)
+    assert np.array_equal(copy.counts, histogram.counts)
+    assert (copy.total, copy.min, copy.max) == (histogram.total, histogram.min, histogram.max)
+    assert len(sparse["index"]) < len(histogram.counts) // 2
+
+
+def test_add_is_recording_both(rtts):
+    (first, second, both) = (HdrHistogram(), HdrHistogram(), HdrHistogram())
+    first.record_values(rtts[:5000])
+    second.record_values(rtts[5000:])
+    both.record_values(rtts)
+    first.add(second)
+    assert np.array_equal(first.counts, both.counts)
+    assert (first.total, first.min, first.max) == (both.total, both.min, both.max)
+
+
+def test_add_needs_the_same_layout():
+    with pytest.raises(ValueError):
+        HdrHistogram().add(HdrHistogram(significant_figures=2))
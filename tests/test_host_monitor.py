@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+from helpers.host_monitor import HostMonitor
+
+# Seconds since the monitor started, busiest core in %: setup before the
+# launch at 10 s, traffic until 30 s, then parsing and plotting
+SAMPLES = [(4, 99.0), (9, 97.0), (15, 40.0), (20, 55.0), (25, 50.0), (34, 99.5), (40, 98.0)]
+
+
+def monitor(duration=20.0, launched=10.0):
+    monitor = HostMonitor(interval=1.0, duration=duration)
+    monitor.launched = launched
+    for (second, busy) in SAMPLES:
+        monitor.intervals.append((second - 1.0, float(second)))
+        for (metric, values) in monitor.series.items():
+            values.append(0.0)
+        monitor.series["timestamp"][-1] = 1700000000.0 + second
+        monitor.series["cpu_busy_max"][-1] = busy
+    return monitor
+
+
+def test_only_the_traffic_is_judged():
+    healthy = monitor()
+    assert healthy.traffic() == [2, 3, 4]
+    assert healthy.violations() == []
+    assert not healthy.results()["suspect"]
+
+
+def test_saturation_during_the_traffic():
+    saturated = monitor()
+    saturated.series["cpu_busy_max"][3] = 96.0
+    assert saturated.violations() == [
+        {
+            "metric": "cpu_busy_max",
+            "threshold": 95.0,
+            "peak": 96.0,
+            "samples": 1,
+            "first_seen": 1700000020.0,
+        }
+    ]
+
+
+def test_samples_across_the_launch_are_not_judged():
+    late = monitor(duration=15.5, launched=14.5)
+    assert late.traffic() == [3, 4]
+
+
+def test_without_a_duration_until_the_monitor_stops():
+    assert monitor(duration=None).traffic() == [2, 3, 4, 5, 6]
+    assert len(monitor(duration=None).violations()) == 1
+
+
+def test_nothing_is_judged_without_a_launch():
+    assert monitor(launched=None).violations() == []
@@ -0,0 +1,38 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import math
+
+import numpy as np
+import pytest
+
+from helpers.metrics import baselines, mean_rates
+
+
+def test_rates_are_weighted_by_time_over_the_window():
+    # Flow 0 reports 10 every second over the window; flow 1 starts at 5 s
+    # and stops reporting after 7 s; flow 2 never reports
+    entry = np.array([0] * 10 + [1, 1, 1])
+    times = np.concatenate((np.arange(1.0, 11.0), [5.0, 6.0, 7.0]))
+    values = np.array([10.0] * 10 + [4.0, 4.0, 4.0])
+    means = mean_rates(entry, times, values, 3, 0.0, 10.0)
+    assert means[0] == pytest.approx(10.0)
+    assert means[1] == pytest.approx(4.0 * 3 / 10)
+    assert math.isnan(means[2])
+
+
+def test_warmup_is_left_out():
+    entry = np.zeros(10, dtype=int)
+    times = np.arange(1.0, 11.0)
+    values = np.array([0.0] * 5 + [8.0] * 5)
+    assert mean_rates(entry, times, values, 1, 0.0, 10.0, warmup=5.0)[0] == pytest.approx(8.0)
+
+
+def test_baselines_are_idle_or_estimated():
+    group = np.array([0, 0, 0, 1, 1])
+    rtts = np.array([20.0, 22.0, 90.0, 150.0, 160.0])
+    idle = np.array([True, True, False, False, False])
+    (values, sources) = baselines(2, group, rtts, idle)
+    assert values.tolist() == [21.0, 150.0] and sources == ["idle", "estimated"]
+    (values, sources) = baselines(2, group, rtts, idle, rtt=24)
+    assert values.tolist() == [21.0, 24.0] and sources == ["idle", "estimated"]
@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import functools
+import json
+import os
+import pickle
+import shutil
+import time
+
+import pytest
+from nest.experiment.parser.ping import PingRunner
+from nest.topology_map import TopologyMap
+
+from helpers.postprocess import TOOLS, TOPOLOGY_STATE, Worker, _runner_state
+
+PING = (
+    "[1700000000.100000] 64 bytes from 10.0.0.2: icmp_seq=1 ttl=63 time=24.1 ms\n"
+    "[1700000000.300000] 64 bytes from 10.0.0.2: icmp_seq=2 ttl=63 time=30 ms\n"
+)
+
+
+@pytest.fixture
+def topology(monkeypatch):
+    """An empty topology map with hosts h1 and h2"""
+    monkeypatch.setattr(TopologyMap, "topology_map", {"namespaces": [], "hosts": [], "routers": []})
+    monkeypatch.setattr(TopologyMap, "namespaces_pointer", {})
+    monkeypatch.setattr(TopologyMap, "orphan_interfaces", 0)
+    TopologyMap.add_namespace("h1-1", "h1")
+    TopologyMap.add_namespace("h2-1", "h2")
+
+
+def queue_job(queue, job_id, dump, after=()):
+    """A job of a run that pinged h2 from h1, as `run_deferred` queues it"""
+    job_dir = os.path.join(queue, "pending", job_id)
+    os.makedirs(os.path.join(job_dir, "raw"))
+    with open(os.path.join(job_dir, "raw", "ping-0.out"), "w") as file:
+        file.write(PING)
+    runners = {tool: [] for tool in TOOLS}
+    runner = PingRunner("h1-1", "10.0.0.2", 0, 5, "h2-1")
+    runners["ping"].append(("ping-0.out",) + _runner_state(runner))
+    job = {
+        "id": job_id,
+        "experiment": "ping",
+        "dump": dump,
+        "runners": runners,
+        "topology": {name: getattr(TopologyMap, name) for name in TOPOLOGY_STATE},
+        "plot": False,
+        "after": list(after),
+        "queued": time.time(),
+    }
+    with open(os.path.join(job_dir, "job.pickle"), "wb") as file:
+        pickle.dump(job, file)
+
+
+@pytest.mark.usefixtures("topology")
+def test_worker_parses_and_runs_the_hooks(tmp_path):
+    (queue, dump) = (str(tmp_path / "queue"), tmp_path / "dump")
+    dump.mkdir()
+    marker = tmp_path / "marker.txt"
+    marker.write_text("hook")
+    worker = Worker(queue, poll=0.05)
+    queue_job(queue, "job1", str(dump), after=[functools.partial(shutil.copy, str(marker))])
+    os.makedirs(os.path.join(queue, "pending", "job0"))
+    worker.run(once=True)
+
+    assert sorted(os.listdir(os.path.join(queue, "done"))) == ["job1"]
+    # The raw output of a finished job is deleted
+    assert "raw" not in os.listdir(os.path.join(queue, "done", "job1"))
+    with open(dump / "ping.json", "r") as file:
+        samples = json.load(file)["h1"][0]["10.0.0.2"]
+    assert samples[0]["destination_node"] == "h2"
+    assert [sample["rtt"] for sample in samples[1:]] == ["24.1", "30"]
+    assert (dump / "marker.txt").read_text() == "hook"
+    # A job without job.pickle fails, with the output of the worker
+    assert "job0" in os.listdir(os.path.join(queue, "failed"))
+    assert os.path.isfile(os.path.join(queue, "failed", "job0", "log"))
+
+
+@pytest.mark.usefixtures("topology")
+def test_jobs_are_claimed_once(tmp_path):
+    queue = str(tmp_path / "queue")
+    (first, second) = (Worker(queue), Worker(queue))
+    queue_job(queue, "job1", str(tmp_path))
+    queue_job(queue, "job2", str(tmp_path))
+    # pylint: disable=protected-access
+    assert (first._claim(), second._claim(), first._claim()) == ("job1", "job2", None)
+    assert os.path.isfile(os.path.join(queue, "running", "job1", "claim"))
+
+
+def test_recover_the_jobs_of_dead_workers(tmp_path):
+    queue = str(tmp_path / "queue")
+    worker = Worker(queue, timeout=60)
+    old = time.time() - 120
+    for job_id in ("stale", "fresh", "unclaimed", "active"):
+        os.makedirs(os.path.join(queue, "running", job_id))
+    for job_id in ("stale", "fresh", "active"):
+        with open(os.path.join(queue, "running", job_id, "claim"), "w") as file:
+            file.write("host 1\n")
+    os.utime(os.path.join(queue, "running", "stale", "claim"), (old, old))
+    os.utime(os.path.join(queue, "running", "active", "claim"), (old, old))
+    worker.active["active"] = None
+
+    assert worker.recover() == 1
+    assert os.listdir(os.path.join(queue, "pending")) == ["stale"]
+    # The next worker writes its own claim
+    assert os.listdir(os.path.join(queue, "pending", "stale")) == []
+    # Claims being touched, jobs just renamed, and jobs of this worker stay
+    assert sorted(os.listdir(os.path.join(queue, "running"))) == ["active", "fresh", "unclaimed"]
@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import pytest
+
+from helpers.qdisc_presets import PRESETS, format_time, parse_rate, parse_time, qdisc_preset
+
+
+def preset(name, bandwidth="10mbit", delay="10ms", **kwargs):
+    # Without the kernel check, which needs root
+    return qdisc_preset(name, bandwidth, delay, validate=False, **kwargs)
+
+
+def test_units():
+    assert parse_rate("10mbit") == 10e6
+    assert parse_rate("1.5Gbit") == 1.5e9
+    assert parse_time("250us") == pytest.approx(250e-6)
+    assert parse_time("20") == pytest.approx(0.02)
+    assert format_time(0.005) == "5ms"
+    assert format_time(0.0034) == "3400us"
+    with pytest.raises(ValueError):
+        parse_rate("10")
+    with pytest.raises(ValueError):
+        parse_time("10 parsecs")
+
+
+def test_presets_of_the_example_bottleneck():
+    # 10mbit and a 20ms RTT: a BDP of 25000 bytes, under 17 packets
+    assert preset("pfifo") == ("pfifo", {"limit": "100"})
+    assert preset("choke") == (
+        "choke",
+        {"limit": "100", "min": "5", "max": "15", "bandwidth": "10mbit"},
+    )
+    assert preset("red")[1] == {
+        "limit": "150000",
+        "min": "7500",
+        "max": "22500",
+        "avpkt": "1500",
+        "bandwidth": "10mbit",
+    }
+    assert preset("pie") == ("pie", {"limit": "100", "target": "2ms"})
+    assert preset("codel") == (
+        "codel",
+        {"target": "5ms", "interval": "100ms", "limit": "1000", "ecn": ""},
+    )
+    assert preset("fq_codel")[1]["quantum"] == "300"
+
+
+def test_dctcp_marks_at_a_fraction_of_the_bdp():
+    (qdisc, parameters) = preset("dctcp")
+    assert qdisc == "codel"
+    assert parameters["ce_threshold"] == "3400us"
+    assert parameters["target"] == "10000ms"
+    assert "ecn" in parameters
+
+
+def test_presets_scale_with_the_link():
+    (_, fast) = preset("pfifo", "1gbit", "50ms")
+    assert fast["limit"] == str(8334)
+    (_, slow) = preset("codel", "1mbit", "10ms")
+    # One and a half times the 12ms of a full sized packet
+    assert slow["target"] == "18ms"
+    assert preset("fq_codel", "100mbit")[1]["quantum"] == "1514"
+    assert preset("codel", rtt="300ms")[1]["interval"] == "300ms"
+
+
+def test_overrides_replace_derived_parameters():
+    (_, parameters) = preset("pie", overrides={"target": "15ms"})
+    assert parameters == {"limit": "100", "target": "15ms"}
+
+
+def test_every_preset_derives_parameters():
+    for name in PRESETS:
+        (qdisc, parameters) = preset(name)
+        assert qdisc and parameters
+
+
+def test_unknown_preset():
+    with pytest.raises(ValueError, match="Unknown qdisc preset"):
+        preset("sfq")
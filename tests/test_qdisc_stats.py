@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import struct
+
+import pytest
+
+from helpers.qdisc_stats import (
+    TCA_KIND,
+    TCA_STATS2,
+    TCA_STATS_APP,
+    TCA_STATS_BASIC,
+    TCA_STATS_QUEUE,
+    _parse_qdisc,
+)
+
+
+def attribute(kind, payload):
+    """rtattr of `payload`, padded to 4 bytes"""
+    data = struct.pack("=HH", 4 + len(payload), kind) + payload
+    return data + b"\0" * (-len(data) % 4)
+
+
+def message(kind, xstats, ifindex=3, handle=0x10000, parent=0xFFFFFFFF):
+    """RTM_NEWQDISC payload as the kernel sends it, after the nlmsghdr"""
+    stats = (
+        attribute(TCA_STATS_BASIC, struct.pack("=QI", 123456, 789))
+        + attribute(TCA_STATS_QUEUE, struct.pack("=IIIII", 7, 10500, 42, 1, 5))
+        + attribute(TCA_STATS_APP, xstats)
+    )
+    return (
+        struct.pack("=BxxxiIII", 0, ifindex, handle, parent, 1)
+        + attribute(TCA_KIND, kind.encode() + b"\0")
+        + attribute(TCA_STATS2, stats)
+    )
+
+
+def parse(kind, xstats):
+    data = message(kind, xstats)
+    return _parse_qdisc(data, 0, len(data))
+
+
+def test_queue_and_basic_statistics():
+    qdisc = parse("red", struct.pack("=IIII", 1, 2, 3, 4))
+    assert (qdisc["kind"], qdisc["ifindex"], qdisc["handle"], qdisc["parent"]) == (
+        "red",
+        3,
+        0x10000,
+        0xFFFFFFFF,
+    )
+    stats = qdisc["stats"]
+    assert (stats["bytes"], stats["packets"]) == (123456, 789)
+    assert (stats["qlen"], stats["backlog"], stats["drops"]) == (7, 10500, 42)
+    assert (stats["requeues"], stats["overlimits"]) == (1, 5)
+    assert (stats["early"], stats["pdrop"], stats["other"], stats["marked"]) == (1, 2, 3, 4)
+
+
+def test_codel():
+    stats = parse("codel", struct.pack("=IIIIiIIII", 1514, 3, 2, 4800, -20, 0, 17, 1, 9))["stats"]
+    assert (stats["maxpacket"], stats["ldelay"], stats["drop_next"]) == (1514, 4800, -20)
+    assert (stats["ecn_mark"], stats["dropping"], stats["ce_mark"]) == (17, 1, 9)
+
+
+def test_fq_codel_qdisc_and_class_statistics():
+    qdisc = struct.pack("=IIIIIIIIII", 0, 1514, 6, 11, 40, 1, 2, 8, 65536, 0)
+    stats = parse("fq_codel", qdisc)["stats"]
+    assert (stats["maxpacket"], stats["ecn_mark"], stats["new_flow_count"]) == (1514, 11, 40)
+    assert (stats["ce_mark"], stats["memory_usage"]) == (8, 65536)
+    assert "type" not in stats
+    # The statistics of a class of fq_codel are not those of the qdisc
+    stats = parse("fq_codel", struct.pack("=IIIIIIIIII", 1, *range(9)))["stats"]
+    assert "maxpacket" not in stats and stats["qlen"] == 7
+
+
+def test_pie_probability_of_both_layouts():
+    stats = parse("pie", struct.pack("=QIIIIIIII", 2 ** 62, 15000, 125000, 1, 900, 12, 0, 80, 5))[
+        "stats"
+    ]
+    assert stats["prob"] == pytest.approx(0.25, abs=1e-6)
+    assert (stats["delay"], stats["dropped"], stats["ecn_mark"]) == (15000, 12, 5)
+    # Before Linux 5.7
+    stats = parse("pie", struct.pack("=IIIIIIII", 2 ** 31, 15000, 125000, 900, 12, 0, 80, 5))[
+        "stats"
+    ]
+    assert stats["prob"] == pytest.approx(0.5, abs=1e-6)
+    assert (stats["packets_in"], stats["maxq"]) == (900, 80)
+
+
+def test_fq_pie_and_choke():
+    stats = parse("fq_pie", struct.pack("=IIIIIIIII", 900, 12, 3, 0, 5, 40, 1, 2, 65536))["stats"]
+    assert (stats["packets_in"], stats["ecn_mark"], stats["memory_usage"]) == (900, 5, 65536)
+    stats = parse("choke", struct.pack("=IIIII", 1, 2, 3, 4, 5))["stats"]
+    assert (stats["marked"], stats["matched"]) == (4, 5)
+
+
+def test_unknown_layouts_are_left_out():
+    # Extended xstats of a newer kernel, and a qdisc without xstats
+    stats = parse("red", struct.pack("=IIIII", 1, 2, 3, 4, 5))["stats"]
+    assert "marked" not in stats and stats["drops"] == 42
+    assert set(parse("htb", b"")["stats"]) == {
+        "bytes",
+        "packets",
+        "qlen",
+        "backlog",
+        "drops",
+        "requeues",
+        "overlimits",
+    }
@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helpers.query import CACHE, DumpCache, Query, QueryError
+
+
+def test_selects_conditions_and_groups():
+    query = Query(
+        "mean(netperf.sending_rate), p99.9(ss.rtt) where host = h1 and "
+        "experiment ~ 'TCP 2 up' and time in 10..60 by dump, flow"
+    )
+    assert query.selects == [("mean", "netperf", "sending_rate"), ("p99.9", "ss", "rtt")]
+    assert query.conditions == [("host", "=", "h1"), ("experiment", "~", "TCP 2 up")]
+    assert query.window == [10.0, 60.0]
+    assert query.by == ["dump", "flow"]
+
+
+def test_defaults():
+    query = Query("count(ping.rtt)")
+    assert query.conditions == []
+    assert query.window == [None, None]
+    assert query.by == ["dump"]
+
+
+def test_open_time_windows():
+    assert Query("max(ss.cwnd) where time >= 5").window == [5.0, None]
+    assert Query("max(ss.cwnd) where time < 50 and suspect != True").window == [None, 50.0]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "p99 ss.rtt",
+        "average(ss.rtt)",
+        "p99(tc.backlog)",
+        "p99(ss)",
+        "p99(ss.rtt) where colour = red",
+        "p99(ss.rtt) where algorithm",
+        "p99(ss.rtt) where algorithm =",
+        "p99(ss.rtt) where time = 5",
+        "p99(ss.rtt) by host",
+        "p99(ss.rtt) by flow extra",
+    ],
+)
+def test_errors(text):
+    with pytest.raises(QueryError):
+        Query(text)
+
+
+def test_matches():
+    query = Query("p50(ss.rtt) where host = h3 and algorithm ~ ^cub and port > 40000")
+    fields = {"host", "algorithm", "port"}
+    record = {"source": "h1", "destination": "h3", "algorithm": "cubic", "port": "42589"}
+    assert query.matches(record, fields)
+    assert not query.matches(dict(record, port="39000"), fields)
+    assert not query.matches(dict(record, destination="h4"), fields)
+    # Conditions on fields that a record does not have are left to others
+    assert query.matches({"source": "h3"}, {"host"})
+
+
+def test_caches_built_together(archived_dump):
+    dump = archived_dump("tcp_2up_square")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        caches = list(pool.map(lambda _: DumpCache(dump).load(), range(8)))
+    assert all(cache.index == caches[0].index for cache in caches)
+    # Every thread wrote whole files, renamed into place
+    assert not [name for name in os.listdir(os.path.join(dump, CACHE)) if name.endswith(".tmp")]
+    cache = DumpCache(dump).load()
+    assert not cache.built
+    assert len(cache.columns("ss")["time"]) == len(caches[0].columns("ss")["time"])
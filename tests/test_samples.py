@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import json
+import math
+
+import pytest
+
+from helpers.samples import SampleStore, Series
+
+SAMPLES = [
+    {"timestamp": "1700056022.638097061", "cwnd": "10", "rtt": "41.914", "delivery_rate": "2.014392"},
+    {"timestamp": "1700056022.838097", "cwnd": "40", "rtt": "52.5", "delivery_rate": "8.5"},
+    {"timestamp": "1700056023.0381", "cwnd": "20", "ssthresh": "20", "rtt": "60.001"},
+]
+
+
+def test_round_trip_with_missing_fields():
+    series = Series()
+    for sample in SAMPLES:
+        series.append(sample["timestamp"], sample)
+    assert len(series) == 3
+    assert series.fields() == ["cwnd", "rtt", "delivery_rate", "ssthresh"]
+    assert series.timestamps() == [1700056022.638097, 1700056022.838097, 1700056023.0381]
+    assert series.values("cwnd") == [10, 40, 20]
+    assert series.values("rtt") == [41.914, 52.5, 60.001]
+    assert series.values("ssthresh") == [None, None, 20]
+    assert series.values("delivery_rate") == [2.014392, 8.5, None]
+    assert series.values("pacing_rate") == [None, None, None]
+    assert list(series)[2] == {"timestamp": 1700056023.0381, "cwnd": 20, "rtt": 60.001, "ssthresh": 20}
+
+
+def test_arrays_have_nan_where_missing():
+    series = Series()
+    for sample in SAMPLES:
+        series.append(sample["timestamp"], sample)
+    ssthresh = series.array("ssthresh")
+    assert math.isnan(ssthresh[0]) and ssthresh[2] == 20
+    assert series.array("timestamp")[1] - series.array("timestamp")[0] == pytest.approx(0.2)
+
+
+def test_masks_span_many_bytes():
+    series = Series()
+    for index in range(20):
+        values = {"cwnd": index}
+        if index % 3 == 0:
+            values["ssthresh"] = index
+        series.append(index * 0.1, values)
+    assert series.present("ssthresh") == [index % 3 == 0 for index in range(20)]
+    assert series.present("cwnd") == [True] * 20
+
+
+def test_columns_widen_for_large_values():
+    series = Series()
+    series.append(0, {"bytes": 1})
+    series.append(1, {"bytes": 10 ** 12})
+    series.append(10 ** 5, {"bytes": 2})
+    assert series.values("bytes") == [1, 10 ** 12, 2]
+    assert series.timestamps() == [0, 1, 10 ** 5]
+
+
+def test_samples_are_compact():
+    series = Series()
+    for index in range(1000):
+        series.append(1700056022 + index * 0.2, {"cwnd": 10 + index % 50, "rtt": 40 + index % 7})
+    assert series.nbytes < 13 * 1000
+
+
+def test_store_of_an_archived_dump(archived_dump):
+    dump = archived_dump("tcp_2up_square")
+    store = SampleStore.load(dump, "ss")
+    with open(f"{dump}/ss.json", "r") as file:
+        data = json.load(file)
+    entries = [
+        (node, address, port, samples)
+        for (node, hosts) in data.items()
+        for host in hosts
+        for (address, ports) in host.items()
+        for (port, samples) in ports.items()
+    ]
+    assert len(store) == len(entries)
+    (node, address, port, samples) = entries[0]
+    series = store[(node, address, port)]
+    samples = [sample for sample in samples if "timestamp" in sample]
+    assert len(series) == len(samples)
+    assert series.values("cwnd") == [float(sample["cwnd"]) for sample in samples]
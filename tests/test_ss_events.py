@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import numpy as np
+
+from helpers.ss_events import analyze, detect
+
+NAN = np.nan
+
+
+def events(cwnd, ssthresh, drop=0.15):
+    flow = {"cwnd": np.array(cwnd, dtype=float), "ssthresh": np.array(ssthresh, dtype=float)}
+    return {event: np.flatnonzero(mask).tolist() for (event, mask) in detect(flow, drop).items()}
+
+
+def test_first_loss_ends_slow_start():
+    # Slow start, a halving that first sets ssthresh, then congestion avoidance
+    assert events([10, 20, 40, 20, 21, 22], [NAN, NAN, NAN, 20, 20, 20]) == {
+        "md": [3],
+        "rto": [],
+        "ss_exit": [3],
+    }
+
+
+def test_decrease_and_timeout():
+    cwnd = [10, 31, 15, 16, 1, 2, 4, 8, 9]
+    ssthresh = [20, 20, 15, 15, 8, 8, 8, 8, 8]
+    assert events(cwnd, ssthresh) == {"md": [2], "rto": [4], "ss_exit": [1, 7]}
+
+
+def test_cwnd_fall_without_ssthresh():
+    # BBR and others leave ssthresh unset; only a large enough fall counts
+    cwnd = [100, 90, 60, 58]
+    assert events(cwnd, [NAN] * 4)["md"] == [2]
+    assert events(cwnd, [NAN] * 4, drop=0.05)["md"] == [1, 2]
+
+
+def test_analyze_an_archived_dump(archived_dump):
+    results = analyze(archived_dump("tcp_2up_square"))
+    flows = results["flows"]
+    assert len(flows) == 8
+    assert {flow["algorithm"] for flow in flows.values()} == {"cubic", "westwood", "reno"}
+    for flow in flows.values():
+        assert flow["events"]["md"]
+        assert flow["rates"]["md"] > 0
+        assert len(flow["events"]["md"]) <= flow["samples"]
+    assert results["sync"]["backoffs"] == 61
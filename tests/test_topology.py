@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import pytest
+
+from helpers.topology import AddressPool
+
+
+def test_pairs_of_slash_30_skip_network_and_broadcast():
+    pool = AddressPool("10.0.0.0/29", 30)
+    assert pool.capacity == 2
+    assert pool.next_pair() == ("10.0.0.1/30", "10.0.0.2/30")
+    assert pool.next_pair() == ("10.0.0.5/30", "10.0.0.6/30")
+    assert pool.allocated == 2
+
+
+def test_pairs_of_slash_31_use_both_addresses():
+    pool = AddressPool("192.168.0.0/30", 31)
+    assert pool.capacity == 2
+    assert pool.next_pair() == ("192.168.0.0/31", "192.168.0.1/31")
+    assert pool.next_pair() == ("192.168.0.2/31", "192.168.0.3/31")
+
+
+def test_large_pools_are_not_expanded():
+    pool = AddressPool("10.0.0.0/8", 31)
+    assert pool.capacity == 2 ** 23
+    assert pool.next_pair() == ("10.0.0.0/31", "10.0.0.1/31")
+
+
+def test_exhausted_pool():
+    pool = AddressPool("10.0.0.0/30", 30)
+    pool.next_pair()
+    with pytest.raises(ValueError, match="exhausted"):
+        pool.next_pair()
+
+
+@pytest.mark.parametrize(("pool", "prefix"), [("10.0.0.0/8", 29), ("10.0.0.0/31", 30)])
+def test_invalid_pools(pool, prefix):
+    with pytest.raises(ValueError):
+        AddressPool(pool, prefix)
@@ -0,0 +1,36 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+from helpers.tune import Tuner, pareto_ranks
+
+
+def test_fronts_of_throughput_against_delay():
+    points = [
+        (9.5, 20.0),  # front 0
+        (8.0, 5.0),  # front 0
+        (9.0, 25.0),  # dominated by the first
+        (7.0, 6.0),  # dominated by the second
+        (6.0, 30.0),  # dominated by every other point
+        (9.5, 20.0),  # equal to the first, so not dominated
+    ]
+    assert pareto_ranks(points) == [0, 0, 1, 1, 2, 0]
+
+
+def test_single_and_no_points():
+    assert pareto_ranks([(1.0, 1.0)]) == [0]
+    assert pareto_ranks([]) == []
+
+
+def test_a_large_front_is_cut_by_power(tmp_path):
+    tuner = Tuner("cisco_5tcpup.py", "fq_codel", [], str(tmp_path))
+    # Every run trades throughput for delay, so all are on the first front
+    results = [
+        {"config": index, "throughput": 2.0 + index, "delay": 10.0 * (index + 1), "base_rtt": 20.0}
+        for index in range(6)
+    ]
+    results.append({"config": "failed"})
+    kept = tuner._select(results, 2)  # pylint: disable=protected-access
+    powers = sorted(((r["power"], r["config"]) for r in results if "power" in r), reverse=True)
+    assert kept == [config for (_, config) in powers[:2]]
+    assert [r["kept"] for r in results[:6]].count(True) == 2
+    assert all(r["rank"] == 0 for r in results[:6])
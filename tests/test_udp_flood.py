@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import pytest
+
+from helpers.udp_flood import _Clock
+
+
+def clock_with_intervals(count, interval=0.2):
+    """A clock of one stream that counted 10 packets of 1000 bytes per interval"""
+    clock = _Clock(0.0, interval, 1)
+    for index in range(count):
+        clock.current += 10
+        clock.current_bytes += 10000
+        clock.roll((index + 1) * interval)
+    return clock
+
+
+def test_partial_last_interval():
+    clock = clock_with_intervals(3)
+    clock.current += 4
+    clock.current_bytes += 4000
+    counters = clock.counters(0.7)
+    assert counters["packets"] == [[10, 10, 10, 4]]
+    assert counters["last_interval"] == pytest.approx(0.1)
+
+
+def test_no_interval_from_rounding_of_the_boundary():
+    # Boundaries add up 0.2 at a time, so the end of the third interval is
+    # a little off 0.6
+    for end in (0.6, 0.6 + 2e-16, 3 * 0.2):
+        clock = clock_with_intervals(3)
+        clock.current += 1
+        clock.current_bytes += 1000
+        counters = clock.counters(end)
+        assert counters["last_interval"] == pytest.approx(0.2)
+        assert sum(counters["packets"][0]) == 31 and sum(counters["bytes"][0]) == 31000
+        assert len(counters["packets"][0]) == 3
+
+
+def test_stopped_before_the_first_boundary():
+    clock = _Clock(0.0, 0.2, 2)
+    assert clock.counters(0.0) == {
+        "epoch": 0.0,
+        "interval": 0.2,
+        "last_interval": 0.0,
+        "packets": [],
+        "bytes": [],
+    }
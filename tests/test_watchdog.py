@@ -0,0 +1,100 @@
+# SPDX-License-Identifier: GPL-2.0-only
+# Copyright (c) 2019-2023 NITK Surathkal
+
+import socket
+import struct
+
+from helpers.watchdog import (
+    INET_DIAG_CONG,
+    INET_DIAG_INFO,
+    TCP_ESTABLISHED,
+    _Flow,
+    _parse_socket,
+)
+
+# Size of struct tcp_info since Linux 4.19, and before tcpi_bytes_acked
+TCP_INFO_SIZE = 232
+TCP_INFO_OLD_SIZE = 104
+
+
+def attribute(kind, payload):
+    data = struct.pack("=HH", 4 + len(payload), kind) + payload
+    return data + b"\0" * (-len(data) % 4)
+
+
+def tcp_info(options=0, bytes_acked=0, size=TCP_INFO_SIZE):
+    info = bytearray(size)
+    info[0] = TCP_ESTABLISHED
+    info[5] = options
+    if size >= 128:
+        struct.pack_into("=Q", info, 120, bytes_acked)
+    return bytes(info)
+
+
+# pylint: disable=too-many-arguments
+def message(family, source, destination, sport, dport, attributes=b""):
+    """inet_diag_msg of a socket as the kernel sends it, after the nlmsghdr"""
+    addresses = (
+        socket.inet_pton(family, source).ljust(16, b"\0")
+        + socket.inet_pton(family, destination).ljust(16, b"\0")
+    )
+    header = (
+        struct.pack("=BBBB", family, TCP_ESTABLISHED, 0, 0)
+        + struct.pack("!HH", sport, dport)
+        + addresses
+        + struct.pack("=I8x", 0)
+        + struct.pack("=IIIII", 0, 0, 0, 0, 4242)
+    )
+    assert len(header) == 72
+    return header + attributes
+
+
+def parse(data):
+    return _parse_socket(data, 0, len(data))
+
+
+def test_ipv4_socket_with_tcp_info():
+    data = message(
+        socket.AF_INET,
+        "10.0.1.1",
+        "10.0.3.2",
+        40000,
+        5001,
+        attribute(INET_DIAG_INFO, tcp_info(options=8, bytes_acked=2 ** 40 + 3))
+        + attribute(INET_DIAG_CONG, b"dctcp\0"),
+    )
+    entry = parse(data)
+    assert (entry["address"], entry["sport"], entry["dport"]) == ("10.0.3.2", 40000, 5001)
+    assert (entry["state"], entry["algorithm"], entry["ecn"]) == (TCP_ESTABLISHED, "dctcp", True)
+    assert entry["bytes_acked"] == 2 ** 40 + 3
+
+
+def test_ipv6_socket_of_an_older_kernel():
+    data = message(
+        socket.AF_INET6,
+        "fd00::1",
+        "fd00:3::2",
+        40001,
+        5001,
+        attribute(INET_DIAG_CONG, b"cubic\0")
+        + attribute(INET_DIAG_INFO, tcp_info(size=TCP_INFO_OLD_SIZE)),
+    )
+    entry = parse(data)
+    assert (entry["address"], entry["algorithm"], entry["ecn"]) == ("fd00:3::2", "cubic", False)
+    # tcp_info without tcpi_bytes_acked
+    assert entry["bytes_acked"] is None
+
+
+def test_socket_without_attributes():
+    entry = parse(message(socket.AF_INET, "10.0.1.1", "10.0.3.2", 40002, 5001))
+    assert (entry["algorithm"], entry["ecn"], entry["bytes_acked"]) == (None, False, None)
+
+
+def test_streams_of_a_flow():
+    flow = _Flow("h1", "h3", "10.0.3.2", "TCP", "dctcp")
+    stream = {"address": "10.0.3.2", "sport": 40000, "dport": 5001, "algorithm": "dctcp-reno"}
+    assert flow.matches(stream)
+    # The control connection of netperf, and another algorithm
+    assert not flow.matches(dict(stream, dport=12865))
+    assert not flow.matches(dict(stream, algorithm="cubic"))
+    assert not flow.matches(dict(stream, address="10.0.3.3"))
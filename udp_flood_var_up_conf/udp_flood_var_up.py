@@ -4,10 +4,19 @@
 ########################
 # SHOULD BE RUN AS ROOT
 ########################
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers import example
+example.begin()
+
 from nest.topology import *
 from nest.experiment import *
 from nest.topology.network import Network
 from nest.topology.address_helper import AddressHelper
+from helpers.qdisc_presets import qdisc_preset
+from helpers.udp_flood import UdpFlood
 import argparse
 
 # Create the parser
@@ -17,6 +26,8 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--tcp', type=str, default="cubic", help = "TCP algorithm to use")
 parser.add_argument('--tcp_streams', type=int, default=2, help = "Number of TCP upload streams")
 parser.add_argument('--udp_streams', type=int, default=1, help = "Number of UDP upload streams")
+parser.add_argument('--udp_generator', type=str, default="iperf3", choices=["iperf3", "batched"], help = "Run the UDP streams with iperf3 or with one batched sender per host")
+example.add_arguments(parser)
 
 # Parse the argument
 args = parser.parse_args()
@@ -83,14 +94,7 @@ AddressHelper.assign_addresses()
 # Configure the parameters of `codel` qdisc to enable step marking with ECN,
 # which is essential for DCTCP. 
 if args.tcp == "dctcp":
-	qdisc = "codel"
-	codel_parameters = {
-    		"limit": "1000",  # set the queue size to 1000 packets (default is 1000)
-    		"target": "10000ms",  # set the target queue delay to 10000ms (default is 5ms)
-    		"interval": "100ms",  # set the interval value to 100ms (default is 100ms)
-    		"ce_threshold": "40ms",  # ce_threshold = (17% of queue size in pckts * size of each packet * 8) / (bandwidth)
-    		"ecn": "",  # enables ecn marking for codel
-	}
+	(qdisc, codel_parameters) = qdisc_preset("dctcp", "10mbit", "10ms")
 	etr1c.set_attributes("10mbit", "10ms", qdisc, **codel_parameters)  # Setting link attributes from `r1` to `r2`
 else:
 	etr1c.set_attributes("10mbit", "10ms")  # Setting link attributes from `r1` to `r2`
@@ -130,8 +134,17 @@ flow2 = Flow(h2, h4, eth4.get_address(), 0, 200, args.udp_streams)
 
 # using flow 1 as tcp flow and flow2 as udp flow
 exp.add_tcp_flow(flow1, args.tcp)
-exp.add_udp_flow(flow2, "12mbit")
+
+# The batched generator runs all UDP streams of `h2` from one process and
+# saves them as `udp_flood.json` and `udp_floodServer.json` instead of
+# `iperf3.json` and `iperf3Server.json`.
+flood = UdpFlood()
+if args.udp_generator == "batched":
+	flood.add_flow(flow2, "12mbit")
+else:
+	exp.add_udp_flow(flow2, "12mbit")
 
 
 # Run the experiment
-exp.run()
+example.run(exp, args, etr1c, "10mbit", "10ms", qdisc if args.tcp == "dctcp" else None,
+	tools=[flood] if flood.flows else [])